@@ -0,0 +1,270 @@
+import math
+import random
+from array import array
+
+from Common.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+_rng = random.Random(0x5EED) # fixed seed: capped percentile samples are reproducible run to run
+_np_rng = None # numpy Generator with the same fixed seed, created on first use
+NAN = math.nan
+DEFAULT_FLUSH_SIZE = 1 << 20 # observations buffered by a PatternAccumulator between reductions (~8 MB per column)
+PERCENTILE_BLOCK = 4096 # patterns whose duration samples group_percentiles() sorts together
+# Durations kept per pattern for percentiles by default; counts, totals, min and max are always exact
+DEFAULT_PERCENTILE_SAMPLES = 100000
+
+
+def percentile(sorted_values, q):
+    # Linear interpolation between closest ranks (same as numpy's default), q in [0, 100]
+    n = len(sorted_values)
+    if n == 0:
+        return None
+    if n == 1:
+        return sorted_values[0]
+    rank = (n - 1) * (q / 100.0)
+    lower = math.floor(rank)
+    upper = min(lower + 1, n - 1)
+    fraction = rank - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+class PatternStats:
+    """Mergeable aggregate state for one query fingerprint.
+
+    Durations are kept in a compact array('d') so exact percentiles survive merging
+    states built from different files, nodes or chunks without keeping detailed rows.
+    With a `limit`, at most that many durations are kept as a uniform random sample
+    (reservoir), bounding memory per pattern; percentiles then become estimates while
+    count/total/min/max stay exact. `totals` holds per-pattern sums of other numeric
+    columns (e.g. rows examined), filled through add_totals().
+    """
+
+    __slots__ = ('count', 'total', 'min', 'max', 'durations', 'sample', 'limit', 'totals')
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.durations = array('d')
+        self.sample = ''
+        self.totals = None
+
+    def add(self, duration, sample=''):
+        self.count += 1
+        self.total += duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if self.max is None or duration > self.max:
+            self.max = duration
+        if self.limit is None or len(self.durations) < self.limit:
+            self.durations.append(duration)
+        elif self.limit:
+            slot = _rng.randrange(self.count)
+            if slot < self.limit:
+                self.durations[slot] = duration
+        if not self.sample and sample:
+            self.sample = sample
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if other.totals:
+            totals = self.totals if self.totals is not None else {}
+            for name, value in other.totals.items():
+                totals[name] = totals.get(name, 0) + value
+            self.totals = totals
+        if self.limit is not None and len(self.durations) + len(other.durations) > self.limit:
+            # Each side's sample stands for its own count, so draw from them in proportion to the counts
+            keep = min(len(self.durations), round(self.limit * self.count / (self.count + other.count)))
+            take = min(len(other.durations), self.limit - keep)
+            self.durations = array('d', _rng.sample(list(self.durations), keep) + _rng.sample(list(other.durations), take))
+        else:
+            self.durations.extend(other.durations)
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        if not self.sample:
+            self.sample = other.sample
+        return self
+
+    def add_totals(self, values):
+        # values: (column, value) pairs; missing (None) values are skipped
+        totals = self.totals
+        if totals is None:
+            totals = self.totals = {}
+        for name, value in values:
+            if value is not None:
+                totals[name] = totals.get(name, 0) + value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        return percentile(sorted(self.durations), q)
+
+
+def _sample_rng():
+    global _np_rng
+    if _np_rng is None:
+        _np_rng = np.random.default_rng(0x5EED)
+    return _np_rng
+
+
+def _as_python(values, integral):
+    # numpy scalars -> Python numbers; integral columns (all logged values were whole numbers) come back as ints
+    return [int(value) for value in values] if integral else values.tolist()
+
+
+class PatternAccumulator:
+    """Columnar collector of slow-query observations, reduced to PatternStats with vectorized group reductions.
+
+    Each distinct fingerprint gets an integer id on first sight; per observation only the id,
+    the duration and the summed column values are appended to flat arrays. Every
+    `flush_size` observations (and in to_states()) counts, totals, min/max and the per-pattern
+    duration samples are computed with numpy reductions over the ids and merged into
+    PatternStats, so memory stays bounded by the number of patterns, not observations.
+    """
+
+    __slots__ = ('ids', 'keys', 'samples', 'pattern_ids', 'durations', 'total_names', 'total_values', 'limit',
+                 'flush_size', 'states')
+
+    def __init__(self, total_names=(), limit=None, flush_size=DEFAULT_FLUSH_SIZE):
+        self.ids = {} # fingerprint -> pattern id
+        self.keys = [] # pattern id -> fingerprint
+        self.samples = [] # pattern id -> first non-empty sample
+        self.pattern_ids = array('q')
+        self.durations = array('d')
+        self.total_names = tuple(total_names)
+        self.total_values = array('d') # row-major, one value per summed column per observation; None is stored as NaN
+        self.limit = limit
+        self.flush_size = flush_size
+        self.states = {} # fingerprint -> PatternStats for the observations flushed so far
+
+    def add(self, fingerprint, duration, sample='', totals=()):
+        # totals: values of the summed columns, in total_names order
+        pattern_id = self.ids.get(fingerprint)
+        if pattern_id is None:
+            pattern_id = self.ids[fingerprint] = len(self.keys)
+            self.keys.append(fingerprint)
+            self.samples.append(sample)
+        elif sample and not self.samples[pattern_id]:
+            self.samples[pattern_id] = sample
+        self.pattern_ids.append(pattern_id)
+        self.durations.append(duration)
+        if totals:
+            self.total_values.extend([NAN if value is None else value for value in totals])
+        if len(self.pattern_ids) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pattern_ids:
+            return
+        ids = np.frombuffer(self.pattern_ids, dtype=np.int64)
+        order = np.argsort(ids, kind='stable') # groups each pattern's observations, keeping their order
+        counts = np.bincount(ids, minlength=len(self.keys))
+        seen = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts[seen])[:-1]])
+        durations = np.frombuffer(self.durations, dtype=np.float64)[order]
+        integral = bool(np.all(np.mod(durations, 1) == 0))
+        minimums = _as_python(np.minimum.reduceat(durations, starts), integral)
+        maximums = _as_python(np.maximum.reduceat(durations, starts), integral)
+        sums = np.add.reduceat(durations, starts).tolist()
+        totals = []
+        table = np.frombuffer(self.total_values, dtype=np.float64).reshape(len(ids), len(self.total_names))
+        for position, name in enumerate(self.total_names):
+            values = table[order, position]
+            valid = ~np.isnan(values)
+            column_sums = np.add.reduceat(np.where(valid, values, 0), starts)
+            totals.append((name, _as_python(column_sums, bool(np.all(np.mod(values[valid], 1) == 0))),
+                           np.add.reduceat(valid, starts) > 0))
+
+        for i, pattern_id in enumerate(seen.tolist()):
+            stats = PatternStats(self.limit)
+            count, start = int(counts[pattern_id]), starts[i]
+            kept = durations[start:start + count]
+            if self.limit is not None and count > self.limit:
+                kept = kept[np.sort(_sample_rng().choice(count, self.limit, replace=False))] if self.limit else kept[:0]
+            stats.durations.frombytes(kept.tobytes())
+            stats.count, stats.total, stats.min, stats.max = count, sums[i], minimums[i], maximums[i]
+            stats.sample = self.samples[pattern_id]
+            if totals:
+                stats.totals = {name: column_sums[i] for name, column_sums, present in totals if present[i]}
+            existing = self.states.get(self.keys[pattern_id])
+            if existing is None:
+                self.states[self.keys[pattern_id]] = stats
+            else:
+                existing.merge(stats)
+        self.pattern_ids = array('q')
+        self.durations = array('d')
+        self.total_values = array('d')
+
+    def to_states(self):
+        # {fingerprint: PatternStats} over everything added so far
+        self.flush()
+        return self.states
+
+
+def _block_percentiles(block, qs, out):
+    # Patterns with the same number of kept durations are sorted together as the rows of one matrix
+    by_length = {}
+    for key, stats in block:
+        by_length.setdefault(len(stats.durations), []).append((key, stats))
+    for length, items in by_length.items():
+        if not length:
+            out.update((key, [None] * len(qs)) for key, _ in items)
+            continue
+        matrix = np.sort(np.frombuffer(b''.join(stats.durations.tobytes() for _, stats in items),
+                                       dtype=np.float64).reshape(len(items), length), axis=1)
+        columns = []
+        for q in qs:
+            rank = (length - 1) * (q / 100.0)
+            lower = math.floor(rank)
+            low, high = matrix[:, lower], matrix[:, min(lower + 1, length - 1)]
+            columns.append((low + (high - low) * (rank - lower)).tolist())
+        for i, (key, _) in enumerate(items):
+            out[key] = [column[i] for column in columns]
+
+
+def group_percentiles(states, qs, block_size=PERCENTILE_BLOCK):
+    """Percentiles of every pattern's kept durations with vectorized group reductions: {fingerprint: [value per q]}.
+
+    Up to `block_size` patterns are handled at a time: the samples of the patterns that kept
+    the same number of durations (with a reservoir limit, most of them) form the rows of one
+    matrix, which is sorted row-wise, and percentile()'s interpolation is evaluated for all
+    rows at once, so the values equal stats.percentile(q) exactly. Patterns without kept
+    durations get None. Works on any mapping, including spilled pattern tables, in one pass.
+    """
+    out, block = {}, []
+    for item in states.items():
+        block.append(item)
+        if len(block) >= block_size:
+            _block_percentiles(block, qs, out)
+            block = []
+    if block:
+        _block_percentiles(block, qs, out)
+    return out
+
+
+def add_observation(state, fingerprint, duration, sample='', limit=None):
+    # state: dict fingerprint -> PatternStats; limit caps the durations kept per pattern (see PatternStats)
+    pattern = state.get(fingerprint)
+    if pattern is None:
+        pattern = state[fingerprint] = PatternStats(limit)
+    pattern.add(duration, sample)
+    return pattern
+
+
+def merge_states(target, source):
+    # Merges aggregate state `source` into `target` in place and returns `target`
+    for fingerprint, pattern in source.items():
+        existing = target.get(fingerprint)
+        if existing is None:
+            target[fingerprint] = pattern
+        else:
+            existing.merge(pattern)
+    return target
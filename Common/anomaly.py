@@ -0,0 +1,143 @@
+import json
+import math
+from datetime import datetime, timedelta
+
+from Common.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+EPOCH = datetime(1970, 1, 1)
+DEFAULT_BUCKET_SECONDS = 300
+DEFAULT_THRESHOLD = 4.0 # z-score of a bucket's average latency against the pattern's EWMA baseline
+DEFAULT_ALPHA = 0.2 # EWMA weight of the newest bucket
+DEFAULT_WARMUP = 6 # buckets that only build the baseline
+DEFAULT_MIN_EXECUTIONS = 3 # buckets with fewer executions are too noisy to judge and are ignored
+MIN_STD_FRACTION = 0.1 # floor of the baseline deviation, relative to the baseline mean
+MIN_STD_MS = 1.0 # and in absolute terms, so a perfectly steady pattern does not alarm on jitter
+
+# Columns after the pattern column, which is named after the format's (LogFormat.pattern_column)
+anomaly_columns = ['Onset', 'End', 'Ongoing', 'Buckets', 'Executions', 'Baseline Avg(ms)', 'Peak Avg(ms)', 'Magnitude',
+                   'Peak Z', 'Sample Full Query']
+DEFAULT_PATTERN_COLUMN = 'Query Pattern'
+
+
+def bucket_of(timestamp, bucket_seconds):
+    # Bucket number of a naive UTC datetime
+    return int((timestamp - EPOCH).total_seconds() // bucket_seconds)
+
+
+class PatternTrend:
+    # Detection state of one pattern: the open bucket, the EWMA baseline and the open anomaly episode, if any
+
+    __slots__ = ('bucket', 'count', 'total', 'mean', 'var', 'buckets', 'episode')
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.var = 0.0
+        self.buckets = 0 # closed buckets folded into the baseline
+        self.episode = None # [onset bucket, last bucket, buckets, executions, peak avg, peak z, baseline mean]
+
+
+class AnomalyDetector:
+    """Online latency regression detection per query pattern.
+
+    Slow queries are counted per pattern and time bucket; when a pattern's bucket closes, its
+    average latency is compared with an exponentially weighted moving average (and variance)
+    of the pattern's earlier buckets. A z-score of at least `threshold` opens (or extends) an
+    anomaly episode and is kept out of the baseline; the next normal bucket closes it. State
+    is O(1) per pattern, so the detector runs alongside the streaming aggregation of
+    arbitrarily long logs. Buckets must arrive in time order per pattern (chunks in file order).
+    """
+
+    def __init__(self, bucket_seconds=DEFAULT_BUCKET_SECONDS, threshold=DEFAULT_THRESHOLD, alpha=DEFAULT_ALPHA,
+                 warmup=DEFAULT_WARMUP, min_executions=DEFAULT_MIN_EXECUTIONS):
+        self.bucket_seconds = bucket_seconds
+        self.threshold = threshold
+        self.alpha = alpha
+        self.warmup = warmup
+        self.min_executions = min_executions
+        self.trends = {}
+        self.anomalies = [] # (pattern, episode, ongoing)
+
+    def add_buckets(self, buckets):
+        # buckets: {pattern: {bucket number: [executions, total ms]}} of one chunk (ParseResult.buckets)
+        for pattern, series in buckets.items():
+            trend = self.trends.get(pattern)
+            for bucket in sorted(series):
+                count, total = series[bucket]
+                if trend is None:
+                    trend = self.trends[pattern] = PatternTrend(bucket)
+                elif bucket > trend.bucket:
+                    self._close_bucket(pattern, trend)
+                    trend.bucket, trend.count, trend.total = bucket, 0, 0.0
+                trend.count += count # an out-of-order bucket is folded into the open one
+                trend.total += total
+
+    def _close_bucket(self, pattern, trend):
+        if trend.count < self.min_executions:
+            return
+        value = trend.total / trend.count
+        if trend.buckets >= self.warmup:
+            std = max(math.sqrt(trend.var), MIN_STD_FRACTION * trend.mean, MIN_STD_MS)
+            z = (value - trend.mean) / std
+            if z >= self.threshold:
+                episode = trend.episode
+                if episode is None:
+                    trend.episode = [trend.bucket, trend.bucket, 1, trend.count, value, z, trend.mean]
+                else:
+                    episode[1] = trend.bucket
+                    episode[2] += 1
+                    episode[3] += trend.count
+                    if z > episode[5]:
+                        episode[4], episode[5] = value, z
+                return
+        if trend.episode is not None:
+            self.anomalies.append((pattern, trend.episode, False))
+            trend.episode = None
+        if trend.buckets == 0:
+            trend.mean = value
+        else:
+            diff = value - trend.mean
+            increment = self.alpha * diff
+            trend.mean += increment
+            trend.var = (1 - self.alpha) * (trend.var + diff * increment)
+        trend.buckets += 1
+
+    def finish(self):
+        # Closes every open bucket; episodes still open at the end of the log are reported as ongoing
+        for pattern, trend in self.trends.items():
+            self._close_bucket(pattern, trend)
+            if trend.episode is not None:
+                self.anomalies.append((pattern, trend.episode, True))
+                trend.episode = None
+        self.anomalies.sort(key=lambda anomaly: (anomaly[1][0], -anomaly[1][5]))
+        return self
+
+    def _time(self, bucket):
+        return EPOCH + timedelta(seconds=bucket * self.bucket_seconds)
+
+    def rows(self, patterns=None):
+        # Rows of the pattern and anomaly_columns; patterns ({pattern: PatternStats}) supplies the sample queries, looked up in one
+        # pass so a spilled pattern table (Common.spill.SpilledPatterns) is read once
+        flagged = {anomaly[0] for anomaly in self.anomalies}
+        samples = {pattern: stats.sample for pattern, stats in (patterns or {}).items() if pattern in flagged}
+        return [[pattern, self._time(onset), self._time(last + 1), ongoing, buckets, executions, round(baseline, 2),
+                 round(peak, 2), round(peak / baseline, 2) if baseline else None, round(z, 2), samples.get(pattern, '')]
+                for pattern, (onset, last, buckets, executions, peak, z, baseline), ongoing in self.anomalies]
+
+    def to_frame(self, patterns=None, pattern_column=DEFAULT_PATTERN_COLUMN):
+        return pd.DataFrame(self.rows(patterns), columns=[pattern_column] + anomaly_columns)
+
+    def write_json(self, path, source=''):
+        # Alerting feed: one object per anomaly, times in ISO-8601 UTC
+        anomalies = [{
+            'pattern': row[0], 'onset': row[1].isoformat() + 'Z', 'end': row[2].isoformat() + 'Z', 'ongoing': row[3],
+            'buckets': row[4], 'executions': row[5], 'baseline_avg_ms': row[6], 'peak_avg_ms': row[7],
+            'magnitude': row[8], 'peak_z': row[9],
+        } for row in self.rows()]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'source': source, 'bucket_seconds': self.bucket_seconds, 'threshold': self.threshold,
+                       'anomalies': anomalies}, f, indent=2)
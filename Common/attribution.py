@@ -0,0 +1,68 @@
+from Common.aggregates import PatternStats
+from Common.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+TOP_PATTERNS_PER_VALUE = 5
+TOTAL_DIGITS = 3 # durations are logged to the microsecond, so totals rounded to it do not depend on the summing order
+SUMMED_DIGITS = 6 # same for summed columns logged in seconds, e.g. MySQL Lock_time
+UNSET_VALUE = '(none)' # slow queries without a value, e.g. MySQL entries before the log's first `use db;`
+
+
+def _merged(target, key, stats):
+    existing = target.get(key)
+    if existing is None:
+        existing = target[key] = PatternStats(limit=0)
+    existing.merge(stats)
+
+
+def _summed(totals, summed):
+    return [round(totals[name], SUMMED_DIGITS) if isinstance(totals.get(name), float) else totals.get(name)
+            for name in summed]
+
+
+def rollups(attribution, position):
+    # {value: (PatternStats over all its patterns, {fingerprint: PatternStats})} for the key's value at `position`
+    values = {}
+    for key, stats in attribution.items():
+        entry = values.get(key[position])
+        if entry is None:
+            entry = values[key[position]] = (PatternStats(limit=0), {})
+        entry[0].merge(stats)
+        _merged(entry[1], key[-1], stats)
+    return values
+
+
+def build_attribution_sheets(attribution, dimensions, summed, pattern_column, duration_name,
+                             top=TOP_PATTERNS_PER_VALUE):
+    """Workload attribution from ParseResult.attribution: (summary DataFrame, top patterns DataFrame).
+
+    `dimensions` names the attribution columns in key order. The summary has one row per
+    dimension and value, with its executions, total and average duration, share of the
+    dimension's total duration and summed columns, heaviest values first. The top patterns
+    sheet lists the `top` fingerprints that took the most time for each value, with their
+    share of the value's time.
+    """
+    summed_names = [f'Total_{name}' for name in summed]
+    summary, top_rows = [], []
+    for position, dimension in enumerate(dimensions):
+        values = rollups(attribution, position)
+        grand_total = sum(stats.total for stats, _ in values.values())
+        for value, (stats, patterns) in sorted(values.items(), key=lambda item: (-item[1][0].total, str(item[0]))):
+            label = UNSET_VALUE if value is None else value
+            totals = stats.totals or {}
+            patterns = sorted(patterns.items(), key=lambda item: (-item[1].total, item[0]))
+            summary.append([dimension, label, stats.count, round(stats.total, TOTAL_DIGITS),
+                            round(stats.total / grand_total, 4) if grand_total else None, round(stats.mean, 2), stats.max] +
+                           _summed(totals, summed) + [len(patterns), patterns[0][0]])
+            for rank, (fingerprint, pattern) in enumerate(patterns[:top], 1):
+                pattern_totals = pattern.totals or {}
+                top_rows.append([dimension, label, rank, fingerprint, pattern.count, round(pattern.total, TOTAL_DIGITS),
+                                 round(pattern.total / stats.total, 4) if stats.total else None] +
+                                _summed(pattern_totals, summed))
+    summary_df = pd.DataFrame(summary, columns=['Dimension', 'Value', 'Executions', f'Total_{duration_name}',
+                                                'Share_of_Total', f'Avg_{duration_name}', f'Max_{duration_name}'] +
+                                               summed_names + ['Patterns', f'Top_{pattern_column}'])
+    top_df = pd.DataFrame(top_rows, columns=['Dimension', 'Value', 'Rank', pattern_column, 'Executions',
+                                             f'Total_{duration_name}', 'Share_of_Value'] + summed_names)
+    return summary_df, top_df
@@ -0,0 +1,380 @@
+import argparse
+import json
+import os
+import pickle
+import re
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+# Make the repo importable when run as a script (python Common/batch.py)
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from Common.aggregates import merge_states
+from Common.engine import parse_file, build_sheets, save_outputs
+from Common.excel import save_sheets_to_excel, EXCEL_MAX_DATA_ROWS
+from Common.instrumentation import RunStats
+from Common.lazy import lazy_import
+from Common.parallel import default_jobs
+
+pd = lazy_import('pandas')
+
+FORMAT_KEYS = ('mongo', 'mysql', 'postgres-stderr', 'postgres-csvlog', 'postgres-jsonlog')
+JOURNAL_NAME = 'batch_journal.jsonl'
+ROLLUP_NAME = 'fleet_rollup.xlsx'
+STATE_DIR = 'states'
+SNIFF_BYTES = 64 * 1024
+# Rough peak memory of one job: interpreter + libraries, plus detailed rows and report building per MB of log
+WORKER_BASE_MB = 150
+MEMORY_PER_LOG_MB = 5
+TOP_HOSTS = 5
+
+mysql_start_pattern = re.compile(r'^(# Time: |# User@Host: |.*, Version: .* started with:)')
+postgres_stderr_pattern = re.compile(r'^\d{4}-\d{2}-\d{2}[ T][\d:.]+.*\b(LOG|ERROR|FATAL|PANIC|WARNING|STATEMENT|DETAIL):  ')
+postgres_csv_pattern = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?(?: [A-Za-z0-9+:-]+)?,')
+
+# One log file of the fleet: host label, path, format key (FORMAT_KEYS), size in bytes and where its outputs go
+BatchJob = namedtuple('BatchJob', ['host', 'path', 'format_key', 'size', 'report_path', 'state_path', 'max_rows',
+                                   'max_samples'])
+
+host_columns = ['Host', 'Format', 'Log File', 'Size(MB)', 'Status', 'Slow Queries', 'Distinct Patterns', 'Errors',
+                'Parse Failures', 'Seconds', 'Report', 'Error']
+fleet_columns = ['Format', 'Query Pattern', 'Hosts', 'Executions', 'Total Duration(ms)', 'Avg Duration(ms)',
+                 'P95 Duration(ms)', 'Max Duration(ms)', 'Top Hosts', 'Sample Full Query']
+
+
+def get_format(format_key):
+    # Format plugin for a FORMAT_KEYS entry; parser modules are imported on demand (also inside workers)
+    if format_key == 'mongo':
+        from Mongo.mongo_parser import MONGO
+        return MONGO
+    if format_key == 'mysql':
+        from MySql.mysqlLogParser import MYSQL
+        return MYSQL
+    if format_key.startswith('postgres-'):
+        from PostgreSql.postgresLogParser import FORMATS
+        return FORMATS[format_key.split('-', 1)[1]]
+    raise ValueError(f"Unknown log format '{format_key}'. Choose one of: {', '.join(FORMAT_KEYS)}")
+
+
+def detect_log_format(lines):
+    # FORMAT_KEYS entry for the first recognizable line, or None (not a supported log)
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith('{'):
+            if '"$date"' in stripped:
+                return 'mongo'
+            if '"error_severity"' in stripped:
+                return 'postgres-jsonlog'
+        elif mysql_start_pattern.match(line):
+            return 'mysql'
+        elif postgres_csv_pattern.match(line):
+            return 'postgres-csvlog'
+        elif postgres_stderr_pattern.match(line):
+            return 'postgres-stderr'
+    return None
+
+
+def detect_file_format(path, sniff_bytes=SNIFF_BYTES):
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(sniff_bytes).decode('utf-8', errors='replace')
+    except OSError:
+        return None
+    return detect_log_format(head.splitlines())
+
+
+def _host_name(relative_path):
+    # 'db01/mongod.log' -> 'db01/mongod'; the report file name replaces separators
+    base, _ = os.path.splitext(relative_path)
+    return base.replace(os.sep, '/')
+
+
+def read_manifest(path):
+    """Entries of a manifest file, one log per line: [HOST=]PATH [FORMAT].
+
+    Relative paths are relative to the manifest; blank lines and '#' comments are ignored.
+    Returns [(host or None, path, format key or None)].
+    """
+    entries = []
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            spec, _, format_key = line.partition(' ')
+            format_key = format_key.strip() or None
+            if format_key is not None and format_key not in FORMAT_KEYS:
+                raise ValueError(f"Manifest line {number}: unknown format '{format_key}'")
+            host, sep, log_path = spec.partition('=')
+            if not sep:
+                host, log_path = None, spec
+            entries.append((host or None, os.path.join(base_dir, log_path), format_key))
+    return entries
+
+
+def collect_inputs(source, exclude_dir=None):
+    # [(host, path, format key or None)] for a directory (walked recursively, hidden files skipped) or a manifest
+    if not os.path.isdir(source):
+        return [(host or _host_name(os.path.basename(path)), path, format_key)
+                for host, path, format_key in read_manifest(source)]
+    inputs = []
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    for root, dirs, files in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and os.path.join(os.path.abspath(root), d) != exclude_dir)
+        for name in sorted(files):
+            if not name.startswith('.'):
+                path = os.path.join(root, name)
+                inputs.append((_host_name(os.path.relpath(path, source)), path, None))
+    return inputs
+
+
+def estimate_memory_mb(size):
+    return WORKER_BASE_MB + size / (1024 * 1024) * MEMORY_PER_LOG_MB
+
+
+def job_summary(job):
+    return {'host': job.host, 'path': job.path, 'format': job.format_key, 'size': job.size,
+            'report': job.report_path, 'state': job.state_path}
+
+
+def run_batch_job(job):
+    # Worker entry point: full report for one log plus its pickled pattern state for the fleet rollup
+    started = time.perf_counter()
+    summary = job_summary(job)
+    try:
+        fmt = get_format(job.format_key)
+        stats = RunStats(fmt.name)
+        result = parse_file(fmt, job.path, jobs=1, run_stats=stats, max_rows=job.max_rows, max_samples=job.max_samples)
+        sheets = build_sheets(fmt, result, stats)
+        for _, success, error_msg in save_outputs(fmt, sheets, job.report_path, source=job.path, run_stats=stats):
+            if not success:
+                raise RuntimeError(f"saving report failed: {error_msg}")
+        with open(job.state_path, 'wb') as f:
+            pickle.dump(result.patterns, f, protocol=pickle.HIGHEST_PROTOCOL)
+        summary.update(status='done', slow_queries=sum(s.count for s in result.patterns.values()),
+                       patterns=len(result.patterns), errors=result.error_records, failures=result.failures)
+    except Exception as e:
+        summary.update(status='failed', error=f"{type(e).__name__}: {e}")
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def crashed_job_summary(job, exc):
+    # Summary for a job whose worker process died (e.g. killed for running out of memory) before returning one
+    summary = job_summary(job)
+    summary.update(status='failed', error=f"{type(exc).__name__}: the worker process died, e.g. out of memory")
+    return summary
+
+
+def load_journal(path):
+    # Latest journal entry per log path
+    entries = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue # a line cut short by a crash
+                entries[entry['path']] = entry
+    return entries
+
+
+def is_complete(entry, size, mtime):
+    return (entry is not None and entry.get('status') == 'done' and entry.get('size') == size
+            and entry.get('mtime') == mtime and os.path.exists(entry['report']) and os.path.exists(entry['state']))
+
+
+def schedule(jobs, run_job, max_workers=None, memory_budget_mb=None, on_done=None, on_crash=None):
+    """Runs run_job(job) for every job, largest first, and yields the results as they finish.
+
+    At most max_workers jobs run at once, and only as many as fit memory_budget_mb by
+    estimate_memory_mb(); a job that does not fit waits while smaller ones fill the gap, and runs
+    alone when it exceeds the budget by itself. With a single worker jobs run in-process.
+    When a worker process dies (BrokenProcessPool, e.g. after an OOM kill), it takes the pool
+    down with every job running in it, and which of them killed it is unknown. Those jobs are
+    run again one at a time in a new pool, before any other job: one that breaks the pool while
+    running alone gives on_crash(job, exc) as its result. Without on_crash the error is raised.
+    """
+    pending = sorted(jobs, key=lambda job: job.size, reverse=True)
+    max_workers = min(max_workers or default_jobs(), len(pending)) or 1
+    if max_workers <= 1:
+        for job in pending:
+            yield run_job(job)
+        return
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        running = {} # future -> (job, estimated MB, running alone after a crash)
+        suspects = [] # jobs of a broken pool, waiting to run alone
+        while pending or suspects or running:
+            if suspects:
+                if not running:
+                    job = suspects.pop(0)
+                    running[pool.submit(run_job, job)] = (job, 0, True)
+            else:
+                used = sum(estimate for _, estimate, _ in running.values())
+                for job in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    estimate = estimate_memory_mb(job.size)
+                    if memory_budget_mb is None or not running or used + estimate <= memory_budget_mb:
+                        running[pool.submit(run_job, job)] = (job, estimate, False)
+                        used += estimate
+                        pending.remove(job)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            crashed = on_crash is not None and any(isinstance(future.exception(), BrokenProcessPool) for future in done)
+            if crashed:
+                # A dead worker takes the pool down with every job still running in it, so collect them all
+                done = wait(running)[0]
+                pool.shutdown()
+                pool = ProcessPoolExecutor(max_workers=max_workers)
+            for future in done:
+                job, _, alone = running.pop(future)
+                if not crashed or not isinstance(future.exception(), BrokenProcessPool):
+                    yield future.result()
+                elif alone:
+                    yield on_crash(job, future.exception())
+                else:
+                    suspects.append(job)
+    finally:
+        pool.shutdown()
+
+
+def build_fleet_rollup(summaries):
+    # {sheet name: DataFrame}: one row per host, and query patterns merged across the hosts of each format
+    fleet, host_totals = {}, {}
+    for summary in summaries:
+        if summary['status'] != 'done':
+            continue
+        with open(summary['state'], 'rb') as f:
+            patterns = pickle.load(f)
+        for pattern, stats in patterns.items():
+            host_totals.setdefault((summary['format'], pattern), {})[summary['host']] = stats.total
+        merge_states(fleet.setdefault(summary['format'], {}), patterns)
+
+    hosts_df = pd.DataFrame([[
+        summary['host'], summary['format'], summary['path'], round(summary['size'] / (1024 * 1024), 2),
+        summary['status'], summary.get('slow_queries'), summary.get('patterns'), summary.get('errors'),
+        summary.get('failures'), summary.get('seconds'), summary.get('report') if summary['status'] == 'done' else None,
+        summary.get('error'),
+    ] for summary in sorted(summaries, key=lambda summary: summary['host'])], columns=host_columns)
+
+    fleet_rows = []
+    for format_key, patterns in fleet.items():
+        for pattern, stats in patterns.items():
+            totals = host_totals[(format_key, pattern)]
+            top = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:TOP_HOSTS]
+            fleet_rows.append([format_key, pattern, len(totals), stats.count, round(stats.total, 2), round(stats.mean, 2),
+                               round(stats.percentile(95), 2), stats.max,
+                               ", ".join(f"{host} ({round(total)} ms)" for host, total in top), stats.sample])
+    fleet_df = pd.DataFrame(fleet_rows, columns=fleet_columns)
+    if not fleet_df.empty:
+        fleet_df = fleet_df.sort_values(by=['Total Duration(ms)', 'Executions'], ascending=[False, False])
+    return {'Hosts': hosts_df, 'Fleet Query Stats': fleet_df}
+
+
+def plan_batch(source, output_dir, format_key=None, max_rows=None, max_samples=None, resume=True):
+    """Returns (jobs to run, summaries of logs already done, skipped [(path, reason)]).
+
+    With resume, logs whose journal entry says done (same size and mtime, report and state
+    still on disk) are not parsed again.
+    """
+    journal = load_journal(os.path.join(output_dir, JOURNAL_NAME)) if resume else {}
+    jobs, done, skipped, hosts = [], [], [], set()
+    for host, path, entry_format in collect_inputs(source, exclude_dir=output_dir):
+        fmt_key = entry_format or format_key or detect_file_format(path)
+        if fmt_key is None:
+            skipped.append((path, 'unrecognized log format'))
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            skipped.append((path, str(e)))
+            continue
+        if host in hosts:
+            skipped.append((path, f"duplicate host name '{host}'"))
+            continue
+        hosts.add(host)
+        entry = journal.get(path)
+        if is_complete(entry, stat.st_size, stat.st_mtime):
+            done.append(entry)
+            continue
+        file_name = host.replace('/', '_')
+        jobs.append(BatchJob(host, path, fmt_key, stat.st_size, os.path.join(output_dir, f"{file_name}.xlsx"),
+                             os.path.join(output_dir, STATE_DIR, f"{file_name}.pkl"), max_rows, max_samples))
+    return jobs, done, skipped
+
+
+def run_batch(source, output_dir, jobs=None, memory_budget_mb=None, format_key=None, max_rows=None, max_samples=None,
+              resume=True):
+    # Parses every log of a directory or manifest into per-host reports plus the fleet rollup; returns all summaries
+    os.makedirs(os.path.join(output_dir, STATE_DIR), exist_ok=True)
+    batch_jobs, summaries, skipped = plan_batch(source, output_dir, format_key, max_rows, max_samples, resume)
+    for path, reason in skipped:
+        print(f"Skipping '{path}': {reason}")
+    if summaries:
+        print(f"Resuming: {len(summaries)} logs already done, {len(batch_jobs)} to parse")
+    mtimes = {job.path: os.stat(job.path).st_mtime for job in batch_jobs}
+    with open(os.path.join(output_dir, JOURNAL_NAME), 'a', encoding='utf-8') as journal:
+        for count, summary in enumerate(schedule(batch_jobs, run_batch_job, jobs, memory_budget_mb,
+                                                         on_crash=crashed_job_summary), 1):
+            summary['mtime'] = mtimes[summary['path']]
+            journal.write(json.dumps(summary) + "\n")
+            journal.flush() # every finished log survives a crash of the batch
+            summaries.append(summary)
+            outcome = (f"{summary['slow_queries']} slow queries, {summary['patterns']} patterns"
+                       if summary['status'] == 'done' else summary['error'])
+            took = f", {summary['seconds']}s" if 'seconds' in summary else ""
+            print(f"[{count}/{len(batch_jobs)}] {summary['host']} ({summary['format']}{took}): {outcome}")
+
+    success, error_msg = save_sheets_to_excel(build_fleet_rollup(summaries), os.path.join(output_dir, ROLLUP_NAME))
+    if not success:
+        print(f"Error saving fleet rollup: {error_msg}")
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Batch mode: parse every MongoDB/MySQL/PostgreSQL log of a directory or manifest (formats are "
+                    "detected automatically) into per-host Excel reports plus a fleet rollup.",
+        epilog="Manifest lines are [HOST=]PATH [FORMAT]. Re-running with the same output directory resumes: logs "
+               "already done (unchanged since) are skipped and failed ones are retried."
+    )
+    parser.add_argument("-i", "--input", required=True, help="Directory of logs (searched recursively) or manifest file.")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for the per-host reports and fleet_rollup.xlsx.")
+    parser.add_argument("--jobs", type=int, default=default_jobs(),
+                        help="Logs parsed at once, largest first (default: CPU count).")
+    parser.add_argument("--memory-budget", type=float, metavar="MB",
+                        help=f"Only start logs while their estimated memory ({WORKER_BASE_MB} MB + "
+                             f"{MEMORY_PER_LOG_MB}x the log size each) fits this budget.")
+    parser.add_argument("--format", choices=FORMAT_KEYS, help="Skip detection and treat every log as this format.")
+    parser.add_argument("--max-detail-rows", type=int, default=EXCEL_MAX_DATA_ROWS,
+                        help="Keep at most this many detailed rows per host report (default: what fits an Excel sheet).")
+    parser.add_argument("--percentile-samples", type=int, help="Keep at most this many durations per query pattern.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the journal and parse every log again.")
+    args = parser.parse_args()
+
+    print(f"Batch Mode: Parsing logs from '{args.input}' into '{args.output_dir}'...")
+    try:
+        summaries = run_batch(args.input, args.output_dir, args.jobs, args.memory_budget, args.format,
+                              args.max_detail_rows, args.percentile_samples, resume=not args.restart)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+    failed = [summary for summary in summaries if summary['status'] != 'done']
+    print(f"Done: {len(summaries) - len(failed)} host reports, {len(failed)} failed; fleet rollup saved to "
+          f"'{os.path.join(args.output_dir, ROLLUP_NAME)}'")
+    if failed:
+        print("Re-run the same command to retry the failed logs.")
+
+
+if __name__ == "__main__":
+    main()
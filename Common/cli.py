@@ -0,0 +1,418 @@
+import argparse
+
+from Common.aggregates import DEFAULT_PERCENTILE_SAMPLES
+from Common.anomaly import AnomalyDetector, DEFAULT_BUCKET_SECONDS, DEFAULT_THRESHOLD
+from Common.compare import aggregate_inputs, compare_aggregates, save_comparison_to_excel, print_comparison_summary
+from Common.engine import parse_file, build_sheets, save_outputs, sample_file, aggregator, DETAILED_SHEET
+from Common.excel import save_sheets_to_excel, EXCEL_MAX_DATA_ROWS
+from Common.filters import RecordFilter
+from Common.instrumentation import RunStats, print_run_summary
+from Common.logindex import DEFAULT_INDEX_EVERY, build_index, load_index, index_path, format_summary
+from Common.parallel import default_jobs
+from Common.pipeline import PipelinedReport
+from Common.redaction import REDACTION_MODES, Redactor, parse_rule
+from Common.sampling import DEFAULT_RESERVOIR_SIZE, estimate_banner
+from Common.spill import SpilledRows
+from Common.store import BACKENDS as STORE_BACKENDS
+from Common.timeutil import parse_input_spec, parse_log_timestamp
+
+
+def timestamp_arg(text):
+    timestamp = parse_log_timestamp(text)
+    if timestamp is None:
+        raise argparse.ArgumentTypeError(f"invalid timestamp '{text}'")
+    return timestamp
+
+
+def blocks_arg(text):
+    # "FIRST..LAST" or a single block number -> (first, last)
+    first, sep, last = text.partition('..')
+    try:
+        return int(first), int(last) if sep else int(first)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid block range '{text}', expected FIRST..LAST") from None
+
+
+def redaction_rule_arg(text):
+    try:
+        return parse_rule(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def build_arg_parser(fmt, description, input_example, output_example, window_example):
+    # The arguments every parser shares; callers may add their own modes before parse_args()
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog="If no arguments are provided, the script will run in interactive Streamlit mode."
+    )
+    parser.add_argument(
+        "-i", "--input",
+        help=f"Path to the input {fmt.title} log file (e.g., {input_example})."
+    )
+    parser.add_argument(
+        "-o", "--output",
+        help=f"Path to save the generated Excel report (e.g., {output_example})."
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Capture cProfile and tracemalloc data for the run and include it in the run summary."
+    )
+    parser.add_argument(
+        "--stats-json",
+        help="Path to write the run summary (stage timings, counters, profile) as JSON."
+    )
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BASELINE", "TARGET"),
+        help="Compare query patterns between two inputs, each FILE or FILE@SINCE..UNTIL "
+             f"(e.g. {window_example}). Requires --output."
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=default_jobs(),
+        help="Number of worker processes (default: CPU count). Large inputs are split into chunks parsed in parallel."
+    )
+    parser.add_argument(
+        "--max-detail-rows", type=int,
+        help="Keep at most this many detailed rows (the first ones in the file); all slow queries still count "
+             "in the aggregates. Bounds memory on very large logs."
+    )
+    parser.add_argument(
+        "--percentile-samples", type=int,
+        help="Keep at most this many durations per query pattern (uniform sample) for percentiles. Bounds memory "
+             "on very large logs; counts, totals, min and max stay exact. Compare mode keeps at most "
+             f"{DEFAULT_PERCENTILE_SAMPLES} unless given."
+    )
+    parser.add_argument(
+        "--max-memory", type=float, metavar="MB",
+        help="Keep the detailed rows, pattern aggregates and workload attribution within about this many megabytes "
+             "by spilling them to temporary files, merged back for the report; results are unchanged. Excel gets at "
+             f"most {EXCEL_MAX_DATA_ROWS} detailed rows, --store all of them."
+    )
+    parser.add_argument(
+        "--spill-dir",
+        help="Directory for the --max-memory spill files (default: the system temporary directory)."
+    )
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="Write the Excel report while parsing: a writer thread streams detailed rows into the workbook as "
+             "chunks are merged, then writes the other sheets alongside --store. Saves most of the report time "
+             "with --jobs > 1."
+    )
+    parser.add_argument(
+        "--store",
+        help="Path of a SQLite (or .duckdb) database to append parsed rows and aggregates to, for ad-hoc SQL. "
+             "Can be used with or instead of --output."
+    )
+    parser.add_argument(
+        "--store-backend", choices=STORE_BACKENDS, default="auto",
+        help="Database backend for --store (default: duckdb for .duckdb paths when installed, otherwise sqlite)."
+    )
+    parser.add_argument(
+        "--sample", type=float, metavar="FRACTION",
+        help="Sampling mode: read only this fraction (0-1] of the file in random 1 MiB blocks and report extrapolated "
+             "counts with 95%% confidence intervals. Requires --input and --output."
+    )
+    parser.add_argument(
+        "--sample-rows", type=int, default=DEFAULT_RESERVOIR_SIZE,
+        help=f"Number of detailed rows kept (reservoir sample) in sampling mode (default: {DEFAULT_RESERVOIR_SIZE})."
+    )
+    parser.add_argument(
+        "--seed", type=int,
+        help="Random seed for sampling mode, for reproducible estimates."
+    )
+    parser.add_argument(
+        "--since", type=timestamp_arg, metavar="TIME",
+        help="Only parse records at or after this time (e.g. 2023-10-25T14:00). The file is assumed to be in time "
+             "order: a binary search on timestamps seeks straight to the window, so only the window is read."
+    )
+    parser.add_argument(
+        "--until", type=timestamp_arg, metavar="TIME",
+        help="Only parse records at or before this time (e.g. 2023-10-25T14:30)."
+    )
+    for name, columns in (('collection', 'Collection'), ('user', 'user'), ('db', 'database')):
+        if name in fmt.filter_columns:
+            parser.add_argument(
+                f"--{name}", nargs="+", metavar=name.upper(),
+                help=f"Only report slow queries whose {columns} is one of these."
+            )
+    parser.add_argument(
+        "--min-duration", type=float, metavar="MS",
+        help="Only report slow queries that took at least this many milliseconds."
+    )
+    parser.add_argument(
+        "--build-index", action="store_true",
+        help="Index mode: read --input once and write a sidecar index (<input>.idx) with the byte offset, time range "
+             "and slow query/error counts of every block of records, then print the block summary. --since/--until "
+             "and --blocks use the index while the log is unchanged."
+    )
+    parser.add_argument(
+        "--index-every", type=int, default=DEFAULT_INDEX_EVERY, metavar="N",
+        help=f"Records per index block for --build-index (default: {DEFAULT_INDEX_EVERY})."
+    )
+    parser.add_argument(
+        "--index-summary", action="store_true",
+        help="Print the block summary of --input's sidecar index without reading the log."
+    )
+    parser.add_argument(
+        "--blocks", type=blocks_arg, metavar="FIRST..LAST",
+        help="Only parse these blocks of --input's sidecar index (see --index-summary)."
+    )
+    parser.add_argument(
+        "--detect-anomalies", action="store_true",
+        help="Flag query patterns whose average latency in a time bucket jumps above their moving baseline "
+             "(EWMA z-score), reported in an 'Anomalies' sheet."
+    )
+    parser.add_argument(
+        "--anomaly-bucket", type=int, default=DEFAULT_BUCKET_SECONDS, metavar="SECONDS",
+        help=f"Time bucket for anomaly detection (default: {DEFAULT_BUCKET_SECONDS})."
+    )
+    parser.add_argument(
+        "--anomaly-threshold", type=float, default=DEFAULT_THRESHOLD, metavar="Z",
+        help=f"z-score above the baseline that counts as an anomaly (default: {DEFAULT_THRESHOLD})."
+    )
+    parser.add_argument(
+        "--anomalies-json",
+        help="Also write detected anomalies (onset, end, magnitude, pattern) as JSON for alerting. Implies "
+             "--detect-anomalies."
+    )
+    parser.add_argument(
+        "--redact", nargs="?", const="mask", choices=REDACTION_MODES[:3],
+        help=f"Redact literal values so reports can be shared: {', '.join(fmt.redacted_columns)} (and error samples) "
+             "keep only their normalized shape (mask, the default), the shape plus a digest of the original (hash) "
+             "or nothing (remove). Unclassified log lines are left out."
+    )
+    parser.add_argument(
+        "--redact-column", nargs="+", type=redaction_rule_arg, metavar="COLUMN=MODE",
+        help=f"Per-column redaction rules overriding --redact (implies it), e.g. {fmt.redacted_columns[0]}=hash; "
+             f"other detailed columns may be masked too. MODE is one of {', '.join(REDACTION_MODES)}."
+    )
+    parser.add_argument(
+        "--redact-salt", default="", metavar="SALT",
+        help="Secret mixed into redaction digests, so short literals cannot be recovered by hashing guesses."
+    )
+    return parser
+
+
+def record_filter(args):
+    # RecordFilter for the --since/--until/--collection/--user/--db/--min-duration arguments, or None
+    flt = RecordFilter(args.since, args.until, getattr(args, 'collection', None), getattr(args, 'user', None),
+                       getattr(args, 'db', None), args.min_duration)
+    return flt if flt.windowed or flt.has_predicates else None
+
+
+def redactor(args):
+    # Redactor for the --redact/--redact-column/--redact-salt arguments, or None
+    if args.redact is None and not args.redact_column:
+        return None
+    return Redactor(args.redact or 'mask', dict(args.redact_column or ()), args.redact_salt)
+
+
+def destinations(args):
+    return " and ".join(f"'{destination}'" for destination in (args.output, args.store) if destination)
+
+
+def window_byte_range(fmt, path, since, until):
+    # Byte range of a compare input's time window from a current sidecar index, or None to seek (or read it all)
+    if since is None and until is None:
+        return None
+    index = load_index(fmt, path)
+    if index is None:
+        return None
+    print(f"Using index '{index_path(path)}' to locate the time window")
+    return index.window(since, until)
+
+
+def run_compare(fmt, baseline_spec, target_spec, output_filepath, max_samples=DEFAULT_PERCENTILE_SAMPLES,
+                redactor=None):
+    inputs = [(path, since, until, window_byte_range(fmt, path, since, until))
+              for path, since, until in map(parse_input_spec, (baseline_spec, target_spec))]
+    if redactor is not None:
+        redactor.check_format(fmt)
+    baseline_state, target_state = aggregate_inputs(aggregator(fmt, max_samples, redactor), inputs)
+    deltas_df, new_df, disappeared_df = compare_aggregates(baseline_state, target_state, fmt.pattern_column)
+    print_comparison_summary(deltas_df, new_df, disappeared_df)
+    return save_comparison_to_excel(deltas_df, new_df, disappeared_df, output_filepath)
+
+
+def run_sample(fmt, path, output_filepath, fraction, reservoir_size=DEFAULT_RESERVOIR_SIZE, seed=None, redactor=None):
+    if redactor is not None:
+        redactor.check_format(fmt)
+    plan, sheets = sample_file(fmt, path, fraction, reservoir_size, seed, redactor=redactor)
+    print(estimate_banner(plan))
+    return save_sheets_to_excel(sheets, output_filepath)
+
+
+def run_index(fmt, args):
+    # Index Mode: builds the sidecar index (--build-index) or reads it back, then prints the block summary
+    stats = RunStats(fmt.name)
+    try:
+        if args.build_index:
+            print(f"Index Mode: Indexing '{args.input}' into '{index_path(args.input)}'...")
+            with stats.stage('build index'):
+                index = build_index(fmt, args.input, args.index_every, jobs=args.jobs, run_stats=stats)
+        else:
+            index = load_index(fmt, args.input)
+            if index is None:
+                print(f"Error: No current index for '{args.input}'. Build it with --build-index.")
+                return
+        print(f"{len(index)} blocks of up to {index.every} records:")
+        print(format_summary(index))
+    except FileNotFoundError:
+        print(f"Error: Input file '{args.input}' not found.")
+    except Exception as e:
+        print(f"An unexpected error occurred during indexing: {e}")
+    if args.build_index:
+        print_run_summary(stats, args.stats_json)
+
+
+def index_byte_range(fmt, args, flt):
+    # Byte range to parse from the sidecar index for --blocks or a time window, or None to read the file (or seek)
+    if args.blocks is None and (flt is None or not flt.windowed):
+        return None
+    index = load_index(fmt, args.input)
+    if args.blocks is not None:
+        if index is None:
+            raise ValueError(f"--blocks needs a current index of '{args.input}'; build it with --build-index")
+        return index.block_range(*args.blocks)
+    if index is not None:
+        print(f"Using index '{index_path(args.input)}' to locate the time window")
+        return index.window(flt.since, flt.until)
+    return None
+
+
+def print_anomalies(detector, top=10):
+    rows = detector.rows()
+    print(f"Anomaly detection ({detector.bucket_seconds}s buckets, z >= {detector.threshold}): "
+          f"{len(rows)} anomalies in {len(detector.trends)} patterns")
+    for pattern, onset, end, ongoing, _, executions, baseline, peak, magnitude, z, _ in rows[:top]:
+        until = "ongoing" if ongoing else f"until {end:%Y-%m-%d %H:%M}"
+        print(f"  {onset:%Y-%m-%d %H:%M} ({until}): avg {baseline} -> {peak} ms (x{magnitude}, z={z}), "
+              f"{executions} execs: {pattern[:120]}")
+
+
+def run_parse(fmt, args):
+    # CLI Mode: one file through the full pipeline to every requested sink
+    print(f"CLI Mode: Parsing file '{args.input}' and saving report to {destinations(args)}...")
+    stats = RunStats(fmt.name)
+    if args.profile:
+        stats.start_profiling()
+    try:
+        flt = record_filter(args)
+        detector = (AnomalyDetector(args.anomaly_bucket, args.anomaly_threshold)
+                    if args.detect_anomalies or args.anomalies_json else None)
+        report = (PipelinedReport(args.output, DETAILED_SHEET, fmt.detailed_columns)
+                  if args.pipeline and args.output else None)
+        result = parse_file(fmt, args.input, jobs=args.jobs, run_stats=stats, max_rows=args.max_detail_rows,
+                            max_samples=args.percentile_samples, record_filter=flt,
+                            byte_range=index_byte_range(fmt, args, flt), detector=detector, redactor=redactor(args),
+                            max_memory=args.max_memory, spill_dir=args.spill_dir,
+                            row_sink=report.add_rows if report is not None else None)
+        if not result.lines:
+            print(f"Warning: Input file '{args.input}' is empty.")
+        for message in result.issue_messages(fmt):
+            print(f"Parsing Warning: {message}")
+        if result.dropped_rows:
+            print(f"Note: Kept the first {len(result.rows)} detailed rows; {result.dropped_rows} more slow queries "
+                  f"are included in the aggregates only (--max-detail-rows).")
+        if isinstance(result.rows, SpilledRows):
+            print(f"Note: Spilled {result.rows.spilled} detailed rows to disk to stay within --max-memory.")
+            if len(result.rows) > EXCEL_MAX_DATA_ROWS and args.output:
+                print(f"Note: The Excel report holds the first {EXCEL_MAX_DATA_ROWS} of {len(result.rows)} detailed "
+                      f"rows; use --store to keep all of them.")
+
+        sheets = build_sheets(fmt, result, stats)
+        if detector is not None:
+            sheets['Anomalies'] = detector.to_frame(result.patterns, fmt.pattern_column)
+            print_anomalies(detector)
+            if args.anomalies_json:
+                detector.write_json(args.anomalies_json, args.input)
+                print(f"Anomalies written to '{args.anomalies_json}'")
+        for destination, success, error_msg in save_outputs(fmt, sheets, args.output, args.store, args.store_backend,
+                                                            args.input, stats, rows=result.rows, report=report):
+            if destination == args.output and success:
+                print(f"Successfully parsed '{args.input}' and saved Excel report to '{args.output}'")
+            elif destination == args.output:
+                print(f"Error saving Excel file: {error_msg}")
+            elif success:
+                print(f"Successfully appended results for '{args.input}' to store '{args.store}'")
+            else:
+                print(f"Error writing to store: {error_msg}")
+        if not result.patterns and not result.errors:
+            print(f"Note: The log file did not contain any parsable {fmt.empty_note} matching the defined patterns.")
+
+    except FileNotFoundError:
+        print(f"Error: Input file '{args.input}' not found.")
+    except ValueError as e:
+        print(f"Error: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred during CLI processing: {e}")
+    finally:
+        print_run_summary(stats, args.stats_json)
+
+
+def run_cli(fmt, args, parser):
+    """Runs the modes shared by every parser: compare, sampling and parsing a file.
+
+    Returns False when no CLI arguments were given, so the caller can start its Streamlit app.
+    """
+    if record_filter(args) is not None and (args.compare or args.sample is not None):
+        print("Error: --since/--until and the other filters apply when parsing a file; compare mode takes time "
+              "windows as FILE@SINCE..UNTIL and sampling mode reads the whole file.")
+        parser.print_help()
+    elif (args.build_index or args.index_summary) and args.input:
+        run_index(fmt, args)
+    elif args.build_index or args.index_summary:
+        print("Error: --build-index and --index-summary require --input.")
+        parser.print_help()
+    elif args.compare and args.output:
+        # Compare Mode
+        baseline_spec, target_spec = args.compare
+        print(f"Compare Mode: '{baseline_spec}' (baseline) vs '{target_spec}' (target), saving report to '{args.output}'...")
+        try:
+            success, error_msg = run_compare(fmt, baseline_spec, target_spec, args.output,
+                                             DEFAULT_PERCENTILE_SAMPLES if args.percentile_samples is None
+                                             else args.percentile_samples,
+                                             redactor(args))
+            if success:
+                print(f"Successfully saved comparison report to '{args.output}'")
+            else:
+                print(f"Error saving Excel file: {error_msg}")
+        except FileNotFoundError as e:
+            print(f"Error: Input file '{e.filename}' not found.")
+        except ValueError as e:
+            print(f"Error: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred during comparison: {e}")
+    elif args.compare:
+        print("Error: --output is required for compare mode.")
+        parser.print_help()
+    elif args.sample is not None and args.input and args.output:
+        # Sampling Mode
+        print(f"Sampling Mode: Sampling {args.sample:.2%} of '{args.input}' and saving estimated report to '{args.output}'...")
+        try:
+            success, error_msg = run_sample(fmt, args.input, args.output, args.sample, args.sample_rows, args.seed,
+                                            redactor(args))
+            if success:
+                print(f"Successfully saved ESTIMATED report to '{args.output}'")
+            else:
+                print(f"Error saving Excel file: {error_msg}")
+        except FileNotFoundError:
+            print(f"Error: Input file '{args.input}' not found.")
+        except ValueError as e:
+            print(f"Error: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred during sampling: {e}")
+    elif args.sample is not None:
+        print("Error: Sampling mode requires both --input and --output.")
+        parser.print_help()
+    elif args.input and (args.output or args.store):
+        run_parse(fmt, args)
+    elif args.input or args.output or args.store:
+        # User provided one argument but not the other
+        print("Error: Both --input and --output arguments are required for CLI mode.")
+        print("(--store may be used instead of, or in addition to, --output.)")
+        print("To run in interactive Streamlit mode, please provide no arguments.")
+        parser.print_help()
+    else:
+        return False
+    return True
@@ -0,0 +1,92 @@
+from Common.excel import save_sheets_to_excel
+from Common.lazy import lazy_import
+from Common.parallel import map_in_processes
+
+pd = lazy_import('pandas')
+
+DELTA_COLUMNS = ['Change', 'Baseline Executions', 'Target Executions', 'Delta Executions',
+                 'Baseline P95(ms)', 'Target P95(ms)', 'Delta P95(ms)',
+                 'Baseline Total(ms)', 'Target Total(ms)', 'Delta Total(ms)', 'Sample Full Query']
+ONE_SIDED_COLUMNS = ['Executions', 'P95(ms)', 'Total(ms)', 'Avg(ms)', 'Sample Full Query']
+DEFAULT_PATTERN_COLUMN = 'Query Pattern'
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def _one_sided_row(pattern, stats):
+    return [pattern, stats.count, _round(stats.percentile(95)), _round(stats.total), _round(stats.mean), stats.sample]
+
+
+def _change(delta_total):
+    return 'Regression' if delta_total > 0 else 'Improvement' if delta_total < 0 else 'Unchanged'
+
+
+def compare_aggregates(baseline, target, pattern_column=DEFAULT_PATTERN_COLUMN):
+    """Joins two aggregate states (fingerprint -> PatternStats) by fingerprint.
+
+    Returns (deltas_df, new_df, disappeared_df), with the fingerprint in `pattern_column`
+    (the format's own label, e.g. 'Normalized_Query'). Patterns present on both sides are
+    ranked by the signed change in total time, which weighs a small slowdown of a hot
+    query against a large slowdown of a rare one: the worst regressions come first and
+    the biggest improvements last, and 'Change' says which one a row is. New patterns
+    are ranked by their target total time and disappeared ones by their baseline total time.
+    """
+    deltas, new, disappeared = [], [], []
+    for pattern, target_stats in target.items():
+        baseline_stats = baseline.get(pattern)
+        if baseline_stats is None:
+            new.append(_one_sided_row(pattern, target_stats))
+            continue
+        baseline_p95 = baseline_stats.percentile(95)
+        target_p95 = target_stats.percentile(95)
+        delta_total = target_stats.total - baseline_stats.total
+        deltas.append([
+            pattern, _change(delta_total),
+            baseline_stats.count, target_stats.count, target_stats.count - baseline_stats.count,
+            _round(baseline_p95), _round(target_p95), _round(target_p95 - baseline_p95),
+            _round(baseline_stats.total), _round(target_stats.total), _round(delta_total),
+            target_stats.sample or baseline_stats.sample,
+        ])
+    for pattern, baseline_stats in baseline.items():
+        if pattern not in target:
+            disappeared.append(_one_sided_row(pattern, baseline_stats))
+
+    deltas_df = pd.DataFrame(deltas, columns=[pattern_column] + DELTA_COLUMNS)
+    new_df = pd.DataFrame(new, columns=[pattern_column] + ONE_SIDED_COLUMNS)
+    disappeared_df = pd.DataFrame(disappeared, columns=[pattern_column] + ONE_SIDED_COLUMNS)
+    if not deltas_df.empty:
+        deltas_df = deltas_df.sort_values(by=['Delta Total(ms)', 'Delta P95(ms)'], ascending=[False, False])
+    if not new_df.empty:
+        new_df = new_df.sort_values(by='Total(ms)', ascending=False)
+    if not disappeared_df.empty:
+        disappeared_df = disappeared_df.sort_values(by='Total(ms)', ascending=False)
+    return deltas_df, new_df, disappeared_df
+
+
+def aggregate_inputs(aggregate_fn, inputs, parallel=True):
+    """Runs aggregate_fn(*input) for every (path, since, until[, byte_range]) input.
+
+    aggregate_fn must be a module-level function so it can be shipped to worker
+    processes; with parallel=False (or a single input) everything runs in-process.
+    """
+    return map_in_processes(aggregate_fn, inputs, max_workers=len(inputs) if parallel else 1)
+
+
+def save_comparison_to_excel(deltas_df, new_df, disappeared_df, output_filepath):
+    return save_sheets_to_excel({
+        'Pattern Deltas': deltas_df,
+        'New Patterns': new_df,
+        'Disappeared Patterns': disappeared_df,
+    }, output_filepath)
+
+
+def print_comparison_summary(deltas_df, new_df, disappeared_df, top=10):
+    print(f"Compared patterns: {len(deltas_df)} common, {len(new_df)} new, {len(disappeared_df)} disappeared")
+    regressions = deltas_df[deltas_df['Change'] == 'Regression'] if not deltas_df.empty else deltas_df
+    if not regressions.empty:
+        print(f"Top {min(top, len(regressions))} regressions (increase in total time):")
+        for _, row in regressions.head(top).iterrows():
+            print(f"  {row['Delta Total(ms)']:>+12.2f} ms total, p95 {row['Baseline P95(ms)']} -> {row['Target P95(ms)']} ms, "
+                  f"{row['Baseline Executions']} -> {row['Target Executions']} execs: {row.iloc[0][:120]}")
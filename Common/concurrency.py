@@ -0,0 +1,121 @@
+import math
+
+from Common.lazy import lazy_import
+from Common.timeutil import parse_log_timestamp
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+DEFAULT_TOP_WINDOWS = 20
+TOP_PATTERNS_PER_WINDOW = 5
+
+peak_columns = ['Window_Start', 'Window_End', 'Duration_s', 'Peak_Concurrent_Queries', 'Queries_Overlapping',
+                'Total_Lock_time', 'Max_Lock_time', 'Running_Patterns']
+pileup_columns = ['Pileups', 'Queries_In_Pileups', 'Lock_time_In_Pileups', 'Highest_Peak']
+
+
+def to_datetimes(values):
+    # Vectorised ISO-8601 parse to naive UTC; other forms (legacy MySQL "YYMMDD H:MM:SS", "... UTC") fall back to
+    # parse_log_timestamp once per distinct value, which stays cheap because such logs have one-second resolution
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce', utc=True, format='ISO8601').dt.tz_convert(None)
+    missing = parsed.isna()
+    if missing.any():
+        fallback = {text: parse_log_timestamp(text) for text in pd.unique(pd.Series(values)[missing.values])}
+        parsed[missing] = pd.to_datetime(pd.Series(values)[missing.values].map(fallback))
+    return parsed
+
+
+def sweep(starts, ends):
+    """Concurrency timeline of the half-open intervals [starts[i], ends[i]).
+
+    Returns (times, levels): levels[k] intervals are running from times[k] until times[k + 1].
+    Ends sort before starts at the same instant, so back-to-back intervals do not overlap.
+    One sort of the 2n interval endpoints, O(n log n).
+    """
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones(len(starts), dtype=np.int64), np.full(len(ends), -1, dtype=np.int64)])
+    order = np.lexsort((deltas, times))
+    return times[order], np.cumsum(deltas[order])
+
+
+def find_pileups(times, levels, threshold):
+    # (start, end, peak level) arrays for each maximal run of the timeline at or above threshold
+    high = levels >= threshold
+    if not high.any():
+        empty = np.array([], dtype=times.dtype)
+        return empty, empty, np.array([], dtype=np.int64)
+    edges = np.diff(high.astype(np.int8))
+    run_starts = np.flatnonzero(edges == 1) + 1
+    if high[0]:
+        run_starts = np.concatenate([[0], run_starts])
+    run_ends = np.flatnonzero(edges == -1) + 1 # first index after the run; the timeline always ends at level 0
+    peaks = np.maximum.reduceat(levels, np.column_stack([run_starts, run_ends]).ravel())[::2]
+    return times[run_starts], times[run_ends], peaks
+
+
+def analyze_concurrency(df, time_column, duration_column, pattern_column, lock_column=None, threshold=None,
+                        top_n=DEFAULT_TOP_WINDOWS):
+    """Reconstructs execution intervals from each entry's end time and duration (ms) and finds pile-ups.
+
+    A pile-up is a stretch of time with at least `threshold` queries running at once (default: half the
+    peak, at least 2). Returns (peaks_df, pileup_patterns_df): the top_n pile-ups by peak concurrency with
+    the patterns running during each, and per pattern how often it took part in any pile-up.
+    """
+    peaks_df = pd.DataFrame(columns=peak_columns)
+    patterns_df = pd.DataFrame(columns=[pattern_column] + pileup_columns)
+    if df.empty:
+        return peaks_df, patterns_df
+
+    ends = to_datetimes(df[time_column].values)
+    valid = ends.notna().values
+    ends_ns = ends[valid].values.astype('datetime64[ns]').astype(np.int64)
+    durations_ns = (pd.to_numeric(df[duration_column], errors='coerce').fillna(0).values[valid] * 1e6).astype(np.int64)
+    starts_ns = ends_ns - durations_ns
+    patterns = df[pattern_column].values[valid]
+    locks = (pd.to_numeric(df[lock_column], errors='coerce').fillna(0).values[valid] if lock_column and lock_column in df
+             else np.zeros(len(starts_ns)))
+    if not len(starts_ns):
+        return peaks_df, patterns_df
+
+    times, levels = sweep(starts_ns, ends_ns)
+    peak = int(levels.max())
+    if threshold is None:
+        threshold = max(2, math.ceil(peak / 2))
+    window_starts, window_ends, window_peaks = find_pileups(times, levels, threshold)
+    if not len(window_peaks):
+        return peaks_df, patterns_df
+
+    # Involvement counts every pile-up, not only the listed ones. Pile-ups are disjoint and in time order, so the
+    # ones a query overlaps are a contiguous range, found with two binary searches
+    padded_ends = np.maximum(window_ends, window_starts + 1)
+    first = np.searchsorted(padded_ends, starts_ns, side='right')
+    spans = np.maximum(np.searchsorted(window_starts, ends_ns, side='left') - first, 0)
+    queries = np.repeat(np.arange(len(starts_ns)), spans)
+    windows = np.repeat(first - np.cumsum(spans) + spans, spans) + np.arange(spans.sum())
+    pairs = pd.DataFrame({'pattern': patterns[queries], 'window': windows, 'lock': locks[queries],
+                          'peak': window_peaks[windows]})
+    involvement = pairs.groupby('pattern', sort=False).agg(
+        Pileups=('window', 'nunique'), Queries_In_Pileups=('window', 'size'), Lock_time_In_Pileups=('lock', 'sum'),
+        Highest_Peak=('peak', 'max'))
+
+    # Highest peaks first, longer windows first among equal peaks; only the top_n are listed
+    order = np.lexsort((window_starts - window_ends, -window_peaks))[:top_n]
+    peak_rows = []
+    for i in order:
+        start, end = window_starts[i], padded_ends[i]
+        overlapping = (starts_ns < end) & (ends_ns > start)
+        counts = pd.Series(patterns[overlapping]).value_counts()
+        window_locks = locks[overlapping]
+        peak_rows.append([
+            pd.Timestamp(window_starts[i]), pd.Timestamp(window_ends[i]), (window_ends[i] - window_starts[i]) / 1e9,
+            int(window_peaks[i]), int(overlapping.sum()), round(float(window_locks.sum()), 6),
+            round(float(window_locks.max()), 6),
+            " | ".join(f"{count}x {pattern}" for pattern, count in counts.head(TOP_PATTERNS_PER_WINDOW).items()),
+        ])
+
+    peaks_df = pd.DataFrame(peak_rows, columns=peak_columns)
+    patterns_df = pd.DataFrame([[pattern, int(n), int(count), round(float(lock), 6), int(highest)]
+                                for pattern, n, count, lock, highest in involvement.itertuples()],
+                               columns=[pattern_column] + pileup_columns)
+    patterns_df = patterns_df.sort_values(by=['Pileups', 'Queries_In_Pileups'], ascending=[False, False]).reset_index(drop=True)
+    return peaks_df, patterns_df
@@ -0,0 +1,817 @@
+import os
+import time
+from contextlib import nullcontext
+from functools import partial
+from itertools import islice
+
+from Common.aggregates import DEFAULT_PERCENTILE_SAMPLES, PatternAccumulator, merge_states
+from Common.anomaly import bucket_of
+from Common.excel import save_sheets_to_excel, EXCEL_MAX_DATA_ROWS
+from Common.instrumentation import RunStats, LINES_READ, SLOW_QUERIES, ERRORS, PARSE_FAILURES, BYTES
+from Common.lazy import lazy_import
+from Common.parallel import imap_in_processes
+from Common.sampling import (SamplePlan, Reservoir, iter_block_lines, iter_sampled_blocks, build_estimated_stats_df,
+                             build_sampling_info_df, DEFAULT_RESERVOIR_SIZE)
+from Common.spill import MemoryBudget, SpilledRows
+from Common.store import write_to_store
+from Common.timeutil import in_window
+
+pd = lazy_import('pandas')
+
+# Kinds of event a record can hold; LogFormat.classify() returns a tuple of these
+SLOW = 'slow'
+ERROR = 'error'
+OTHER = 'other'
+
+DEFAULT_CHUNK_SIZE = 32 * 1024 * 1024 # 32 MiB of log per parallel work unit
+DEFAULT_TEXT_POOL_SIZE = 100000 # distinct texts a TextPool holds; beyond that new texts are kept unshared
+TEXT_POOL_PROBE = 4096 # rows between checks for pooled columns that turn out to be mostly unique
+SEEK_GRANULARITY = 256 * 1024 # the timestamp binary search stops once a window edge is known to within this many bytes
+SEEK_PROBE_RECORDS = 100 # records read at a probe position to find one with a timestamp
+DETAILED_SHEET = 'Detailed Metrics' # sheet of every format holding one row per slow query
+ISSUE_SAMPLE_SIZE = 100 # per-record issue messages kept; further issues are only counted (MORE_ISSUES)
+ISSUE_EXAMPLE_SIZE = 5 # record numbers kept per counted issue kind, listed as examples
+
+# Issue kinds counted by the engine itself (ParseResult.count_issue)
+MORE_ISSUES = 'more_issues'
+SPLIT_RECORDS = 'split_records'
+ISSUE_DESCRIPTIONS = {
+    MORE_ISSUES: "{count} more issues were not listed individually (first: record {first}).",
+    SPLIT_RECORDS: "{count} records held several records glued together (e.g. by an interrupted writer) and were "
+                   "split apart (first: record {first}).",
+}
+JUNK_CHARACTERS = ' \t\r\n\x00\ufeff' # whitespace, NUL padding left by a crash and byte order marks
+
+
+class RecordError(ValueError):
+    # Raised by a format's decode()/slow_row() to skip a record; the message is reported with the record number
+    pass
+
+
+class ErrorSummary:
+    # Aggregate for one distinct error: the format's descriptive fields, occurrences, first sample and record number
+
+    __slots__ = ('fields', 'count', 'sample', 'first_record')
+
+    def __init__(self, fields, sample='', first_record=0):
+        self.fields = fields
+        self.count = 0
+        self.sample = sample
+        self.first_record = first_record
+
+    def merge(self, other):
+        self.count += other.count
+        return self
+
+
+class TextPool:
+    """Dictionary encoding for the repetitive text of detailed rows.
+
+    A row keeps a reference to the pool's single copy of each distinct text (the same command,
+    query, plan or pattern repeated a million times is stored once); the full text only gets
+    materialized when the rows are written out. One pool serves one column and stops growing
+    at `limit` distinct texts.
+    """
+
+    __slots__ = ('texts', 'limit')
+
+    def __init__(self, limit=DEFAULT_TEXT_POOL_SIZE):
+        self.texts = {}
+        self.limit = limit
+
+    def intern(self, text):
+        pooled = self.texts.get(text)
+        if pooled is not None:
+            return pooled
+        if type(text) is str and len(self.texts) < self.limit:
+            self.texts[text] = text
+        return text
+
+
+def column_pools(fmt):
+    # (detailed row position, pool dict, TextPool) for the format's pooled columns plus the fingerprint
+    indexes = [fmt.detailed_columns.index(name) for name in fmt.pooled_columns] + [len(fmt.detailed_columns) - 1]
+    pools = [TextPool() for _ in indexes]
+    return [(index, pool.texts, pool) for index, pool in zip(indexes, pools)]
+
+
+def intern_rows(pools, rows):
+    for row in rows:
+        for index, _, pool in pools:
+            row[index] = pool.intern(row[index])
+
+
+def counted_issue(template, count, examples, noun=('line', 'lines')):
+    # Fills a counted issue description: {records} and {are} agree with the count, {examples} lists the first record numbers
+    singular, plural = noun
+    listed = ", ".join(map(str, examples)) + (", ..." if count > len(examples) else "")
+    records = singular if count == 1 else plural
+    return template.format(count=count, records=records, are='is' if count == 1 else 'are', examples=f"{records} {listed}")
+
+
+class ParseResult:
+    """Mergeable output of the decode -> classify -> fingerprint -> aggregate stages for one input.
+
+    Record numbers (in issue messages and each error's first occurrence) are relative to the
+    start of the input. merge() shifts the other result's numbers past this one's records, so
+    merging chunk results in file order numbers records exactly like one serial pass. It also
+    gives the other result's slow queries that ran before their input set a carried column
+    (see LogFormat.carried_columns) the value this result ended with.
+    """
+
+    __slots__ = ('rows', 'patterns', 'groups', 'attribution', 'errors', 'other_lines', 'issues', 'issue_counts',
+                 'records', 'lines', 'failures', 'error_records', 'dropped_rows', 'buckets', 'error_buckets', 'carried')
+
+    def __init__(self):
+        self.rows = [] # detailed rows, fingerprint last
+        self.patterns = {} # fingerprint -> PatternStats
+        self.groups = {} # group column -> {column value: PatternStats}, see LogFormat.group_columns
+        self.attribution = {} # (value of each attribution column..., fingerprint) -> PatternStats
+        self.errors = {} # error key -> ErrorSummary
+        self.other_lines = []
+        self.issues = [] # (record number, message) for skipped records and warnings
+        self.issue_counts = {} # issue kind -> [count, first record number, first ISSUE_EXAMPLE_SIZE record numbers]
+        self.records = 0
+        self.lines = 0
+        self.failures = 0
+        self.error_records = 0
+        self.dropped_rows = 0 # slow queries aggregated but not kept as detailed rows (max_rows)
+        self.buckets = {} # fingerprint -> {time bucket: [executions, total duration]}, for an AnomalyDetector
+        self.error_buckets = {} # time bucket -> error records, tallied along with buckets
+        # carried column -> [row index, attribution key index or None, value last set in this input,
+        #                    whether slow queries came before it was set]
+        self.carried = {}
+
+    def warn(self, message):
+        # For format plugins: attaches a warning to the record being processed
+        self.add_issue(message)
+
+    def add_issue(self, message):
+        # Keeps the first ISSUE_SAMPLE_SIZE messages; the rest are only counted, so millions of bad lines stay cheap
+        if len(self.issues) < ISSUE_SAMPLE_SIZE:
+            self.issues.append((self.records, message))
+        else:
+            self.count_issue(MORE_ISSUES)
+
+    def count_issue(self, kind):
+        # For format plugins: counts an issue instead of keeping one message per record (bounded memory at scale)
+        entry = self.issue_counts.get(kind)
+        if entry is None:
+            self.issue_counts[kind] = [1, self.records, [self.records]]
+        else:
+            entry[0] += 1
+            if len(entry[2]) < ISSUE_EXAMPLE_SIZE:
+                entry[2].append(self.records)
+
+    def merge(self, other):
+        # Merges `other` into this result in place (reusing other's objects) and returns self
+        offset = self.records
+        for column, carried in other.carried.items():
+            own = self.carried.get(column)
+            if own is None:
+                self.carried[column] = carried
+                continue
+            if carried[3] and own[2] is not None:
+                other._resolve_carried(carried[0], carried[1], own[2])
+            elif carried[3]:
+                own[3] = True # still unset in both
+            if carried[2] is not None:
+                own[2] = carried[2]
+        self.rows.extend(other.rows)
+        merge_states(self.patterns, other.patterns)
+        for column, state in other.groups.items():
+            merge_states(self.groups.setdefault(column, {}), state)
+        merge_states(self.attribution, other.attribution)
+        for key, summary in other.errors.items():
+            existing = self.errors.get(key)
+            if existing is None:
+                summary.first_record += offset
+                self.errors[key] = summary
+            else:
+                existing.merge(summary)
+        self.other_lines.extend(other.other_lines)
+        self.issues.extend((number + offset, message) for number, message in other.issues)
+        if len(self.issues) > ISSUE_SAMPLE_SIZE:
+            overflow = self.issues[ISSUE_SAMPLE_SIZE:]
+            del self.issues[ISSUE_SAMPLE_SIZE:]
+            entry = self.issue_counts.setdefault(MORE_ISSUES, [0, overflow[0][0], []])
+            entry[0] += len(overflow)
+            entry[2].extend(number for number, _ in overflow[:ISSUE_EXAMPLE_SIZE - len(entry[2])])
+        for kind, (count, first_record, examples) in other.issue_counts.items():
+            entry = self.issue_counts.get(kind)
+            if entry is None:
+                self.issue_counts[kind] = [count, first_record + offset, [number + offset for number in examples]]
+            else:
+                entry[0] += count
+                entry[2].extend(number + offset for number in examples[:ISSUE_EXAMPLE_SIZE - len(entry[2])])
+        self.records += other.records
+        self.lines += other.lines
+        self.failures += other.failures
+        self.error_records += other.error_records
+        self.dropped_rows += other.dropped_rows
+        for pattern, series in other.buckets.items():
+            own = self.buckets.setdefault(pattern, {})
+            for bucket, (count, total) in series.items():
+                tally = own.setdefault(bucket, [0, 0.0])
+                tally[0] += count
+                tally[1] += total
+        for bucket, count in other.error_buckets.items():
+            self.error_buckets[bucket] = self.error_buckets.get(bucket, 0) + count
+        return self
+
+    def _resolve_carried(self, index, key_index, value):
+        # Fills a carried column of the slow queries seen before this input set it (the only ones left unset)
+        for row in self.rows:
+            if row[index] is None:
+                row[index] = value
+        if key_index is None:
+            return
+        attribution = self.attribution
+        for key in [key for key in attribution if key[key_index] is None]:
+            stats = attribution.pop(key)
+            resolved = key[:key_index] + (value,) + key[key_index + 1:]
+            existing = attribution.get(resolved)
+            if existing is None:
+                attribution[resolved] = stats
+            else:
+                existing.merge(stats)
+
+    def truncate_rows(self, max_rows):
+        # Keeps the first max_rows detailed rows; the rest stay counted in the aggregates
+        if max_rows is not None and len(self.rows) > max_rows:
+            self.dropped_rows += len(self.rows) - max_rows
+            del self.rows[max_rows:]
+
+    def issue_messages(self, fmt):
+        return ([fmt.issue_message(number, message) for number, message in self.issues] +
+                [fmt.issue_summary(kind, count, first_record, examples)
+                 for kind, (count, first_record, examples) in self.issue_counts.items()])
+
+
+class LogFormat:
+    """Base class for a log format plugin.
+
+    The engine drives every format through the same stages:
+      source      - lines from a file (in byte-range chunks, optionally in parallel) or an upload
+      decode      - decode(record) turns one record's text into a payload
+      classify    - classify(record, payload) says whether it is a slow query, an error or other
+      fingerprint - slow_row() builds the detailed row and fingerprint(row) its query pattern
+                    (redacted_shapes() when a Redactor replaces literal values)
+      aggregate   - rows, per-pattern PatternStats and error counts collect in a ParseResult
+      sink        - build_sheets() lays the result out for Excel, the store and Streamlit
+    Instances must be picklable (module-level classes) so chunks can be parsed in worker processes.
+    """
+
+    name = '' # tool name used in run summaries and the store's runs table
+    title = '' # human readable format name, e.g. 'MongoDB'
+    multi_line = False # records span several lines; is_record_start() marks the first one
+    detailed_columns = [] # slow_row() columns followed by the fingerprint column
+    duration_column = ''
+    sample_column = '' # full query text kept as each pattern's sample
+    summed_columns = () # numeric detailed columns also summed per pattern (PatternStats.totals)
+    group_columns = () # detailed columns whose non-empty values get their own PatternStats (ParseResult.groups)
+    # Detailed columns whose values (None included) and the fingerprint key PatternStats in ParseResult.attribution,
+    # summing attribution_summed, without durations: who or what the load comes from, and with which queries
+    attribution_columns = ()
+    attribution_summed = ()
+    # Detailed columns a slow query may leave unset (None) to mean "as last set earlier in the log", e.g. MySQL's
+    # `use db;` lines; records containing carry_marker may set one, so value filters never skip them unparsed
+    carried_columns = ()
+    carry_marker = None
+    pooled_columns = () # repetitive text columns stored once per distinct value in detailed rows (TextPool)
+    count_failures = False # count skipped records per failure_message() kind instead of one issue per record
+    stats_sheet = 'Query Stats'
+    record_label = 'Lines'
+    record_counter = LINES_READ
+    decoded_counter = None
+    decode_stage = 'decode'
+    fingerprint_stage = 'fingerprint'
+    slow_hint = None # raw substring of every slow record; lets aggregate-only passes skip decoding the rest
+    record_marker = None # text every record starts with; a record that fails to decode is split where it reappears
+    filter_columns = {} # RecordFilter value filter ('collection', 'user', 'db') -> detailed column it matches
+    raw_duration_pattern = None # regex whose group 1 is the duration in the raw record text (--min-duration pre-check)
+    raw_duration_scale = 1 # converts that raw duration to duration_column units
+    redacted_columns = () # detailed columns holding literal values (customer data); see Common.redaction
+    error_sample_column = None # error sheet column holding each error's sample record
+    empty_note = 'slow queries'
+    store_sheets = {} # store table -> sheet name
+    store_indexes = {}
+    store_timestamp_columns = {}
+
+    @property
+    def pattern_column(self):
+        return self.detailed_columns[-1]
+
+    def is_record_start(self, line):
+        return True
+
+    def decode(self, record):
+        raise NotImplementedError
+
+    def classify(self, record, payload):
+        return (SLOW,)
+
+    def slow_row(self, payload, result):
+        raise NotImplementedError
+
+    def fingerprint(self, row):
+        raise NotImplementedError
+
+    def error_entry(self, record, payload):
+        # Returns (key, fields) for records classified as ERROR
+        raise NotImplementedError
+
+    def redacted_shapes(self, row, payload):
+        # (fingerprint, shape of each redacted_columns value): the values with their literals replaced by placeholders
+        pattern = self.fingerprint(row)
+        return pattern, (pattern,) * len(self.redacted_columns)
+
+    def tag_shape(self, shape, digest):
+        # A shape marked with the digest of the literal text it replaces (Redactor mode 'hash')
+        return f"{shape} /* sha256:{digest} */"
+
+    def redacted_error_entry(self, record, payload):
+        # error_entry() for redacted runs; formats whose error fields can hold literals mask them here
+        return self.error_entry(record, payload)
+
+    def error_shape(self, record, payload, fields):
+        # Stand-in for the sample record of a distinct error in redacted runs
+        return " | ".join(str(field) for field in fields)
+
+    def timestamp(self, payload):
+        # Event time as a naive UTC datetime (see Common.timeutil), used for time windows
+        return None
+
+    def filter_value(self, name, value):
+        # The part of a filter column's value that RecordFilter compares with the requested values
+        return value
+
+    def failure_message(self, exc):
+        return f"{exc}. Skipped."
+
+    def issue_message(self, number, message):
+        return f"Record {number}: {message}"
+
+    def issue_summary(self, kind, count, first_record, examples=()):
+        # Message for an issue counted with ParseResult.count_issue(); examples are its first record numbers
+        if kind in ISSUE_DESCRIPTIONS:
+            return ISSUE_DESCRIPTIONS[kind].format(count=count, first=first_record)
+        return f"{count} x {kind} (first at record {first_record})"
+
+    def build_sheets(self, result, detailed_df):
+        raise NotImplementedError
+
+    def error_frame(self, errors, include_location=True):
+        # DataFrame of ErrorSummary values, or None for formats without error records
+        return None
+
+    def store_tables(self, sheets):
+        return {table: sheets[sheet] for table, sheet in self.store_sheets.items() if sheet in sheets}
+
+
+def _stage(run_stats, name):
+    return run_stats.stage(name) if run_stats is not None else nullcontext()
+
+
+def split_record(fmt, record):
+    # Pieces of a record that holds several, split where fmt.record_marker reappears; [] when there is nothing to split
+    marker = fmt.record_marker
+    starts = []
+    position = record.find(marker, 1)
+    while position != -1:
+        starts.append(position)
+        position = record.find(marker, position + 1)
+    if not starts:
+        return []
+    pieces = [record[start:end] for start, end in zip([0] + starts, starts + [len(record)])]
+    return [piece for piece in pieces if piece.strip(JUNK_CHARACTERS)]
+
+
+def _with_split_records(records, result, pieces):
+    # Source stage for formats with a record_marker: pieces split out of a damaged record follow it and keep its number
+    for record in records:
+        yield record
+        while pieces:
+            result.records -= 1 # parse_records counts every record it is given
+            yield pieces.pop(0)
+
+
+def group_records(fmt, lines, result=None, offsets=False):
+    # Source stage for multi-line formats; anything before the first record start is preamble.
+    # With offsets, lines are (byte offset, line) pairs and records come as (offset of their first line, text).
+    is_record_start = fmt.is_record_start
+    record, record_offset = [], None
+    line_count = 0
+    for line in lines:
+        line_count += 1
+        if offsets:
+            offset, line = line
+        if is_record_start(line):
+            if record:
+                yield (record_offset, ''.join(record)) if offsets else ''.join(record)
+            record = [line]
+            if offsets:
+                record_offset = offset
+        elif record:
+            record.append(line)
+    if record:
+        yield (record_offset, ''.join(record)) if offsets else ''.join(record)
+    if result is not None:
+        result.lines += line_count
+
+
+def parse_records(fmt, lines, run_stats=None, keep_rows=True, keep_other=True, since=None, until=None, slow_only=False,
+                  max_rows=None, max_samples=None, record_filter=None, bucket_seconds=None, redactor=None):
+    """Runs lines through the decode, classify, fingerprint and aggregate stages of `fmt`.
+
+    keep_rows/keep_other control whether detailed rows and unclassified lines are retained;
+    since/until restrict records to a time window and slow_only skips error/other handling
+    (and, via fmt.slow_hint, decoding of records that cannot be slow queries). max_rows caps
+    the detailed rows kept and max_samples the durations kept per pattern for percentiles,
+    so memory stays bounded however large the input is. record_filter (a RecordFilter)
+    selects slow queries, rejecting most of the others from their raw text before decoding.
+    With bucket_seconds, slow queries are also tallied per pattern and time bucket
+    (result.buckets) for anomaly detection, and error records per time bucket
+    (result.error_buckets). A redactor (Common.redaction.Redactor) replaces
+    literal values while rows are fingerprinted; unclassified lines are then not kept.
+    """
+    result = ParseResult()
+    rows, errors, other_lines, buckets = result.rows, result.errors, result.other_lines, result.buckets
+    error_buckets = result.error_buckets
+    decode, classify, slow_row, fingerprint = fmt.decode, fmt.classify, fmt.slow_row, fmt.fingerprint
+    error_entry, redact_row, redact_error = fmt.error_entry, None, None
+    if redactor is not None:
+        error_entry = fmt.redacted_error_entry
+        redact_row, redact_error = redactor.row_redactor(fmt), redactor.error_redactor(fmt)
+        keep_other = False # unclassified lines are raw log text
+    duration_index = fmt.detailed_columns.index(fmt.duration_column)
+    sample_index = fmt.detailed_columns.index(fmt.sample_column)
+    # Observations are collected as integer pattern ids plus flat numeric arrays and reduced per pattern at the end
+    patterns = PatternAccumulator(fmt.summed_columns, max_samples)
+    summed = [fmt.detailed_columns.index(name) for name in fmt.summed_columns]
+    grouped = [(fmt.detailed_columns.index(name), PatternAccumulator(limit=max_samples)) for name in fmt.group_columns]
+    attributed = [fmt.detailed_columns.index(name) for name in fmt.attribution_columns]
+    attribution = PatternAccumulator(fmt.attribution_summed, limit=0)
+    attribution_summed = [fmt.detailed_columns.index(name) for name in fmt.attribution_summed]
+    carried = [result.carried.setdefault(name, [fmt.detailed_columns.index(name), fmt.attribution_columns.index(name)
+                                                if name in fmt.attribution_columns else None, None, False])
+               for name in fmt.carried_columns]
+    pools = column_pools(fmt)
+    windowed = since is not None or until is not None
+    slow_hint = fmt.slow_hint if slow_only else None
+    raw_check = record_filter.raw_check(fmt) if record_filter is not None else None
+    row_check = record_filter.row_check(fmt) if record_filter is not None else None
+    raw_hint = fmt.slow_hint # records without it cannot be slow queries, so the filter does not apply to them
+    timed = run_stats is not None
+    clock = time.perf_counter
+    decode_time = fingerprint_time = 0.0
+
+    records = group_records(fmt, lines, result) if fmt.multi_line else lines
+    pieces = [] # split_record() output waiting to be parsed
+    if fmt.record_marker is not None:
+        records = _with_split_records(records, result, pieces)
+
+    for record in records:
+        result.records += 1
+        if slow_hint is not None and slow_hint not in record:
+            continue
+        if raw_check is not None and (raw_hint is None or raw_hint in record) and not raw_check(record):
+            continue
+        try:
+            if timed:
+                t0 = clock()
+                payload = decode(record)
+                decode_time += clock() - t0
+            else:
+                payload = decode(record)
+            if windowed and not in_window(fmt.timestamp(payload), since, until):
+                continue
+            kinds = classify(record, payload)
+            if SLOW in kinds:
+                row = slow_row(payload, result)
+                for state in carried: # before the filters, so rejected queries still carry their value forward
+                    if row[state[0]] is None:
+                        row[state[0]] = state[2]
+                        state[3] = state[3] or state[2] is None
+                    else:
+                        state[2] = row[state[0]]
+                if row_check is not None and not row_check(row):
+                    continue
+                if timed:
+                    t0 = clock()
+                    pattern = fingerprint(row) if redact_row is None else redact_row(row, payload)
+                    fingerprint_time += clock() - t0
+                else:
+                    pattern = fingerprint(row) if redact_row is None else redact_row(row, payload)
+                row.append(pattern)
+                if keep_rows and (max_rows is None or len(rows) < max_rows):
+                    for index, texts, pool in pools: # repeats are a plain dict hit
+                        pooled = texts.get(row[index])
+                        row[index] = pool.intern(row[index]) if pooled is None else pooled
+                    rows.append(row)
+                    if not len(rows) % TEXT_POOL_PROBE: # stop pooling columns that are mostly unique
+                        pools = [entry for entry in pools if len(entry[1]) * 2 <= len(rows)]
+                elif keep_rows:
+                    result.dropped_rows += 1
+                patterns.add(pattern, row[duration_index], row[sample_index], summed and [row[index] for index in summed])
+                for index, state in grouped:
+                    if row[index]:
+                        state.add(row[index], row[duration_index], row[sample_index])
+                if attributed:
+                    attribution.add((*[row[index] for index in attributed], pattern), row[duration_index], '',
+                                    [row[index] for index in attribution_summed])
+                if bucket_seconds is not None:
+                    timestamp = fmt.timestamp(payload)
+                    if timestamp is not None:
+                        series = buckets.get(pattern)
+                        if series is None:
+                            series = buckets[pattern] = {}
+                        tally = series.setdefault(bucket_of(timestamp, bucket_seconds), [0, 0.0])
+                        tally[0] += 1
+                        tally[1] += row[duration_index]
+            if slow_only:
+                continue
+            if ERROR in kinds:
+                key, fields = error_entry(record, payload)
+                summary = errors.get(key)
+                if summary is None:
+                    sample = record.strip() if redact_error is None else redact_error(record, payload, fields)
+                    summary = errors[key] = ErrorSummary(fields, sample, result.records)
+                summary.count += 1
+                result.error_records += 1
+                if bucket_seconds is not None:
+                    timestamp = fmt.timestamp(payload)
+                    if timestamp is not None:
+                        bucket = bucket_of(timestamp, bucket_seconds)
+                        error_buckets[bucket] = error_buckets.get(bucket, 0) + 1
+            elif keep_other and OTHER in kinds:
+                other_lines.append(record.strip())
+        except Exception as e:
+            split = split_record(fmt, record) if fmt.record_marker is not None else None
+            if split:
+                pieces[:0] = split # ahead of pieces still queued from the record this one was split from
+                if len(split) > 1: # a single piece only lost leading junk such as a byte order mark
+                    result.count_issue(SPLIT_RECORDS)
+                continue
+            result.failures += 1
+            if fmt.count_failures:
+                result.count_issue(fmt.failure_message(e))
+            else:
+                result.add_issue(fmt.failure_message(e))
+
+    if not fmt.multi_line:
+        result.lines = result.records
+    with _stage(run_stats, 'pattern reduction'):
+        result.patterns = patterns.to_states()
+        for name, (_, state) in zip(fmt.group_columns, grouped):
+            result.groups[name] = state.to_states()
+        if attributed:
+            result.attribution = attribution.to_states()
+    if timed:
+        run_stats.add_time(fmt.decode_stage, decode_time)
+        run_stats.add_time(fmt.fingerprint_stage, fingerprint_time)
+        if fmt.record_counter != LINES_READ:
+            run_stats.count(LINES_READ, result.lines)
+        run_stats.count(fmt.record_counter, result.records)
+        if fmt.decoded_counter:
+            run_stats.count(fmt.decoded_counter, result.records - result.failures)
+        run_stats.count(SLOW_QUERIES, sum(stats.count for stats in result.patterns.values()))
+        run_stats.count(ERRORS, result.error_records)
+        run_stats.count(PARSE_FAILURES, result.failures)
+        for kind, (count, _, _) in result.issue_counts.items():
+            run_stats.count(kind, count)
+    return result
+
+
+def _read_lines(f, fmt, start, end, offsets=False):
+    # Decodes with replacement so one bad byte cannot abort a run; records belong to the chunk they start in
+    return iter_block_lines(f, start, end, fmt.is_record_start if fmt.multi_line else None, offsets)
+
+
+def read_records(f, fmt, start, end, offsets=False):
+    # Records starting inside [start, end) of binary file f; with offsets, (byte offset, text) pairs
+    lines = _read_lines(f, fmt, start, end, offsets)
+    return group_records(fmt, lines, offsets=offsets) if fmt.multi_line else lines
+
+
+def plan_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, start=0, end=None):
+    end = os.path.getsize(path) if end is None else end
+    return [(offset, min(offset + chunk_size, end)) for offset in range(start, end, chunk_size)] or [(start, start)]
+
+
+def _probe_timestamp(fmt, f, position, size):
+    # Timestamp of the first record starting at or after `position` that has one, or None
+    records = read_records(f, fmt, position, size)
+    for record in islice(records, SEEK_PROBE_RECORDS):
+        try:
+            timestamp = fmt.timestamp(fmt.decode(record))
+        except Exception:
+            continue
+        if timestamp is not None:
+            return timestamp
+    return None
+
+
+def _bisect_offsets(fmt, f, size, is_before):
+    # (lo, hi) within SEEK_GRANULARITY: the next timestamped record after lo is_before() the edge, the one after hi not
+    lo, hi = 0, size
+    while hi - lo > SEEK_GRANULARITY:
+        mid = (lo + hi) // 2
+        if is_before(_probe_timestamp(fmt, f, mid, size)):
+            lo = mid
+        else:
+            hi = mid
+    return lo, hi
+
+
+def find_window(fmt, path, since=None, until=None):
+    """Byte range [start, end) of a time-ordered log that holds every record inside [since, until].
+
+    Two binary searches over file offsets, each probing O(log(size)) positions for the next
+    record's timestamp. Records just outside the window at either edge are still read (and
+    dropped by the window check), and a probe that finds no timestamp widens the range, so
+    nothing inside the window is lost.
+    """
+    size = os.path.getsize(path)
+    start, end = 0, size
+    with open(path, 'rb') as f:
+        if since is not None:
+            start = _bisect_offsets(fmt, f, size, lambda timestamp: timestamp is not None and timestamp < since)[0]
+        if until is not None:
+            end = _bisect_offsets(fmt, f, size, lambda timestamp: timestamp is None or timestamp <= until)[1]
+    return start, max(start, end)
+
+
+def parse_file_chunk(fmt, path, start, end, keep_rows=True, keep_other=True, max_rows=None, max_samples=None,
+                     record_filter=None, bucket_seconds=None, redactor=None):
+    # Worker entry point: parses the records starting inside [start, end) and returns (ParseResult, RunStats)
+    run_stats = RunStats(fmt.name)
+    since, until = (record_filter.since, record_filter.until) if record_filter is not None else (None, None)
+    with open(path, 'rb') as f:
+        result = parse_records(fmt, _read_lines(f, fmt, start, end), run_stats=run_stats, keep_rows=keep_rows,
+                               keep_other=keep_other, since=since, until=until, max_rows=max_rows,
+                               max_samples=max_samples, record_filter=record_filter, bucket_seconds=bucket_seconds,
+                               redactor=redactor)
+    return result, run_stats
+
+
+def parse_file(fmt, path, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE, run_stats=None, keep_rows=True, keep_other=True,
+               max_rows=None, max_samples=None, record_filter=None, byte_range=None, detector=None, redactor=None,
+               max_memory=None, spill_dir=None, row_sink=None):
+    """Streams a log file through the pipeline without reading it into memory.
+
+    Files larger than chunk_size are split into byte ranges aligned to record starts and
+    parsed by up to `jobs` worker processes; merging the chunk results in file order gives
+    the same result as a serial pass. Chunk results are merged as they arrive, so with
+    max_rows/max_samples memory does not grow with the file. Worker stage timings are
+    summed into run_stats. Only byte_range (start, end) is read when given, e.g. from a
+    sidecar index (Common.logindex); otherwise with a record_filter time window only the
+    range found by find_window() is. Record numbers count from the start of the range.
+    An AnomalyDetector is fed each chunk's time buckets in file order and finished. With a
+    redactor, literal values are replaced as rows are fingerprinted (see parse_records).
+    With max_memory (MB) the detailed rows and pattern table are spilled to temporary files
+    under spill_dir whenever they outgrow it (see Common.spill.MemoryBudget); the result then
+    holds a SpilledRows and a SpilledPatterns that read them back in order, unchanged.
+    row_sink(rows) receives each chunk's kept detailed rows in file order as soon as they are
+    merged, e.g. a PipelinedReport writing them while later chunks are still being parsed.
+    """
+    start, end = byte_range if byte_range is not None else (0, os.path.getsize(path))
+    if record_filter is not None:
+        record_filter.check_format(fmt)
+        if record_filter.windowed and byte_range is None:
+            with _stage(run_stats, 'seek'):
+                start, end = find_window(fmt, path, record_filter.since, record_filter.until)
+    if redactor is not None:
+        redactor.check_format(fmt)
+    bucket_seconds = detector.bucket_seconds if detector is not None else None
+    tasks = [(fmt, path, chunk_start, chunk_end, keep_rows, keep_other, max_rows, max_samples, record_filter,
+              bucket_seconds, redactor) for chunk_start, chunk_end in plan_chunks(path, chunk_size, start, end)]
+    result = ParseResult()
+    budget = MemoryBudget(max_memory, spill_dir) if max_memory is not None else None
+    if budget is not None:
+        result.rows = budget.rows
+    pools = column_pools(fmt) # chunks come back with their own copies of each text; share them file-wide
+    for chunk_result, chunk_stats in imap_in_processes(parse_file_chunk, tasks, max_workers=jobs):
+        intern_rows(pools, chunk_result.rows)
+        if detector is not None:
+            detector.add_buckets(chunk_result.buckets)
+            chunk_result.buckets = {} # the detector keeps O(1) state per pattern instead
+        if budget is not None:
+            budget.observe(chunk_result)
+        kept = len(result.rows)
+        result.merge(chunk_result)
+        pools = [entry for entry in pools if len(entry[1]) * 2 <= len(result.rows)]
+        result.truncate_rows(max_rows)
+        if row_sink is not None:
+            row_sink(chunk_result.rows[:len(result.rows) - kept])
+        if budget is not None:
+            with _stage(run_stats, 'spill'):
+                budget.relieve(result)
+        if run_stats is not None:
+            run_stats.merge(chunk_stats)
+    if budget is not None:
+        budget.finish(result)
+    if detector is not None:
+        with _stage(run_stats, 'anomaly detection'):
+            detector.finish()
+    if run_stats is not None:
+        run_stats.count(BYTES, end - start)
+    return result
+
+
+def aggregate_file(fmt, path, since=None, until=None, byte_range=None, max_samples=DEFAULT_PERCENTILE_SAMPLES,
+                   redactor=None):
+    # Aggregate-only pass (compare mode): {fingerprint: PatternStats} for slow queries inside [since, until].
+    # Only byte_range is read when given (e.g. from a sidecar index), else only the range find_window() seeks to.
+    if byte_range is None:
+        byte_range = find_window(fmt, path, since, until) if since is not None or until is not None \
+            else (0, os.path.getsize(path))
+    with open(path, 'rb') as f:
+        result = parse_records(fmt, _read_lines(f, fmt, *byte_range), keep_rows=False, keep_other=False,
+                               since=since, until=until, slow_only=True, max_samples=max_samples, redactor=redactor)
+    return result.patterns
+
+
+def aggregator(fmt, max_samples=DEFAULT_PERCENTILE_SAMPLES, redactor=None):
+    # aggregate_file bound to a format, picklable for Common.compare.aggregate_inputs
+    return partial(aggregate_file, fmt, max_samples=max_samples, redactor=redactor)
+
+
+def detailed_frames(fmt, rows, limit=None, columns=None):
+    # DataFrames of up to SPILL_BATCH spilled rows each, in file order (optionally only `columns`)
+    for batch in rows.batches(limit):
+        df = pd.DataFrame(batch, columns=fmt.detailed_columns)
+        yield df if columns is None else df[columns]
+
+
+def build_sheets(fmt, result, run_stats=None):
+    # Spilled rows past what an Excel sheet holds stay out of the detailed sheet (save_outputs streams them to a store)
+    with _stage(run_stats, 'dataframe construction'):
+        if isinstance(result.rows, SpilledRows):
+            detailed_df = pd.concat(list(detailed_frames(fmt, result.rows, EXCEL_MAX_DATA_ROWS)), ignore_index=True)
+        else:
+            detailed_df = pd.DataFrame(result.rows, columns=fmt.detailed_columns)
+    with _stage(run_stats, 'aggregation'):
+        return fmt.build_sheets(result, detailed_df)
+
+
+def sample_file(fmt, path, fraction, reservoir_size=DEFAULT_RESERVOIR_SIZE, seed=None, plan=None, redactor=None):
+    # Sampling mode for any format: reads a random subset of blocks, keeps a reservoir of detailed rows and
+    # extrapolates pattern/error counts to the whole file. Returns (plan, {sheet name: DataFrame}).
+    plan = plan or SamplePlan(path, fraction, seed=seed)
+    reservoir = Reservoir(reservoir_size, seed)
+    pattern_estimator = plan.new_estimator()
+    error_estimator = plan.new_estimator()
+    sampled = ParseResult()
+    for block_index, lines in iter_sampled_blocks(plan, fmt.is_record_start if fmt.multi_line else None):
+        block = parse_records(fmt, lines, keep_other=False, redactor=redactor)
+        for row in block.rows:
+            reservoir.add(row)
+        block.rows = []
+        block_bytes = plan.block_bytes(block_index)
+        pattern_estimator.observe_block(block_index, {pattern: stats.count for pattern, stats in block.patterns.items()}, block_bytes)
+        error_estimator.observe_block(block_index, {key: summary.count for key, summary in block.errors.items()}, block_bytes)
+        sampled.merge(block)
+
+    sheets = {
+        'Detailed Metrics (Sample)': pd.DataFrame(reservoir.items, columns=fmt.detailed_columns),
+        f'{fmt.stats_sheet} (Estimated)': build_estimated_stats_df(sampled.patterns, pattern_estimator, fmt.pattern_column),
+    }
+    error_df = fmt.error_frame(sampled.errors, include_location=False)
+    if error_df is not None:
+        estimates = [error_estimator.estimate(key) for key in sampled.errors]
+        error_df['Estimated Count'] = [round(estimate) for _, estimate, _, _ in estimates]
+        error_df['Count CI Low (95%)'] = [int(low) for _, _, low, _ in estimates]
+        error_df['Count CI High (95%)'] = [int(-(-high // 1)) for _, _, _, high in estimates]
+        sheets['Error Stats (Estimated)'] = error_df
+    sheets['Sampling Info'] = build_sampling_info_df(plan, reservoir, {f'{fmt.record_label} Sampled': sampled.records,
+                                                                        'Parse Failures In Sample': sampled.failures})
+    return plan, sheets
+
+
+def save_outputs(fmt, sheets, output=None, store=None, store_backend='auto', source='', run_stats=None, rows=None,
+                 report=None):
+    # Sink stage: writes the sheets to every requested destination; returns [(destination, success, error message)].
+    # With spilled rows (a SpilledRows) the store gets all of them, batch by batch, instead of the detailed sheet.
+    # A PipelinedReport that already holds the detailed rows finishes the Excel output while the store is written.
+    results = []
+    if output and report is not None:
+        report.close(sheets)
+    elif output:
+        with _stage(run_stats, 'save_to_excel'):
+            results.append((output, *save_sheets_to_excel(sheets, output)))
+    if store:
+        tables = fmt.store_tables(sheets)
+        if isinstance(rows, SpilledRows):
+            for table, sheet in fmt.store_sheets.items():
+                if sheet == DETAILED_SHEET and table in tables:
+                    tables[table] = detailed_frames(fmt, rows, columns=list(tables[table].columns))
+        with _stage(run_stats, 'save_to_store'):
+            results.append((store, *write_to_store(store, fmt.name, source, tables,
+                                                   indexes=fmt.store_indexes, timestamp_columns=fmt.store_timestamp_columns,
+                                                   backend=store_backend)))
+    if output and report is not None:
+        results.insert(0, (output, *report.wait()))
+        if run_stats is not None:
+            run_stats.add_time('save_to_excel (pipelined)', report.busy)
+    return results
@@ -0,0 +1,17 @@
+from Common.lazy import lazy_import
+
+pd = lazy_import('pandas') # pandas (and xlsxwriter through it) load only when a report is written
+
+# An xlsx sheet holds 1,048,576 rows including the header row
+EXCEL_MAX_DATA_ROWS = 1048575
+
+
+def save_sheets_to_excel(sheets, output_filepath_or_buffer):
+    # sheets: ordered mapping of sheet name -> DataFrame. Returns (success, error message) like the parsers' save_to_excel.
+    try:
+        with pd.ExcelWriter(output_filepath_or_buffer, engine='xlsxwriter') as writer:
+            for sheet_name, df in sheets.items():
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+        return True, None
+    except Exception as e:
+        return False, str(e)
@@ -0,0 +1,78 @@
+# Filter names accepted by RecordFilter and the command-line option each comes from
+FILTER_OPTIONS = {'collection': '--collection', 'user': '--user', 'db': '--db'}
+
+
+class RecordFilter:
+    """Predicates pushed down into the read: a time window, value filters and a minimum duration.
+
+    The window lets parse_file() seek straight to [since, until] in a time-ordered file. The
+    other predicates select slow queries in two steps. raw_check() runs on the record text
+    before it is decoded, with substring and duration-regex tests that can only reject
+    records that would fail anyway. row_check() is the exact test on the detailed row, run
+    before fingerprinting. A slow query that fails is skipped entirely; errors and other
+    lines are only restricted to the window.
+    """
+
+    __slots__ = ('since', 'until', 'values', 'min_duration')
+
+    def __init__(self, since=None, until=None, collections=None, users=None, databases=None, min_duration=None):
+        self.since = since
+        self.until = until
+        self.values = {name: frozenset(values) for name, values in
+                       (('collection', collections), ('user', users), ('db', databases)) if values}
+        self.min_duration = min_duration
+
+    @property
+    def windowed(self):
+        return self.since is not None or self.until is not None
+
+    @property
+    def has_predicates(self):
+        return bool(self.values) or self.min_duration is not None
+
+    def check_format(self, fmt):
+        # Raises ValueError for a filter the format has no column for (e.g. --collection on a MySQL log)
+        for name in self.values:
+            if name not in fmt.filter_columns:
+                raise ValueError(f"{FILTER_OPTIONS[name]} is not supported for {fmt.title} logs")
+
+    def raw_check(self, fmt):
+        # check(record) -> False when the raw text already rules the record out; None without predicates
+        if not self.has_predicates:
+            return None
+        # A carried column's value may have been set by an earlier record, so its text proves nothing
+        value_sets = [values for name, values in self.values.items()
+                      if fmt.filter_columns.get(name) not in fmt.carried_columns]
+        min_duration, scale = self.min_duration, fmt.raw_duration_scale
+        duration_pattern = fmt.raw_duration_pattern if min_duration is not None else None
+        carry_marker = fmt.carry_marker
+
+        def check(record):
+            if carry_marker is not None and carry_marker in record:
+                return True # may set a carried value for the records after it
+            for values in value_sets:
+                if not any(value in record for value in values):
+                    return False
+            if duration_pattern is not None:
+                match = duration_pattern.search(record)
+                if match is not None and float(match.group(1)) * scale < min_duration:
+                    return False
+            return True
+        return check
+
+    def row_check(self, fmt):
+        # check(row) -> whether a detailed row passes every predicate; None without predicates
+        if not self.has_predicates:
+            return None
+        self.check_format(fmt)
+        columns = [(fmt.detailed_columns.index(fmt.filter_columns[name]), name, values)
+                   for name, values in self.values.items()]
+        duration_index = fmt.detailed_columns.index(fmt.duration_column)
+        min_duration, filter_value = self.min_duration, fmt.filter_value
+
+        def check(row):
+            for index, name, values in columns:
+                if filter_value(name, row[index]) not in values:
+                    return False
+            return min_duration is None or (row[duration_index] or 0) >= min_duration
+        return check
@@ -0,0 +1,148 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Counter names shared by every parser so summaries line up across tools
+LINES_READ = 'lines_read'
+LINES_DECODED = 'lines_decoded'
+SLOW_QUERIES = 'slow_queries'
+ERRORS = 'errors'
+PARSE_FAILURES = 'parse_failures'
+BYTES = 'bytes'
+
+
+class RunStats:
+    """Per-stage timers and counters for one parser run.
+
+    Stages are timed either with the `stage()` context manager (coarse steps such as
+    DataFrame construction or Excel writing) or by accumulating perf_counter deltas in
+    hot loops and handing them over with `add_time()`, which avoids a context manager
+    per log line. `--profile` additionally captures cProfile and tracemalloc data.
+    """
+
+    def __init__(self, name=''):
+        self.name = name
+        self.timings = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.profile_text = ''
+        self.peak_memory_bytes = None
+        self._profiler = None
+        self._started = time.perf_counter()
+        self._finished = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def add_time(self, name, seconds):
+        self.timings[name] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def merge(self, other):
+        # Folds in timings/counters collected elsewhere (e.g. a worker process parsing one chunk);
+        # stage times of parallel workers add up, so they can exceed the wall time
+        for name, seconds in other.timings.items():
+            self.timings[name] += seconds
+        for name, n in other.counters.items():
+            self.counters[name] += n
+
+    def start_profiling(self):
+        self._profiler = cProfile.Profile()
+        tracemalloc.start()
+        self._profiler.enable()
+
+    def stop_profiling(self, top=25):
+        if self._profiler is None:
+            return
+        self._profiler.disable()
+        _, self.peak_memory_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(top)
+        self.profile_text = out.getvalue()
+        self._profiler = None
+
+    def finish(self):
+        if self._finished is None:
+            self._finished = time.perf_counter()
+
+    @property
+    def wall_time(self):
+        end = self._finished if self._finished is not None else time.perf_counter()
+        return end - self._started
+
+    def summary(self):
+        wall = self.wall_time
+        summary = {
+            'name': self.name,
+            'wall_time_s': round(wall, 4),
+            'stages_s': {k: round(v, 4) for k, v in self.timings.items()},
+            'counters': dict(self.counters),
+        }
+        if wall > 0:
+            summary['lines_per_s'] = round(self.counters.get(LINES_READ, 0) / wall, 1)
+            summary['mb_per_s'] = round(self.counters.get(BYTES, 0) / wall / (1024 * 1024), 3)
+        if self.peak_memory_bytes is not None:
+            summary['peak_memory_bytes'] = self.peak_memory_bytes
+        return summary
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = [f"Run summary ({self.name}): {summary['wall_time_s']}s wall time"]
+        for stage, seconds in sorted(self.timings.items(), key=lambda kv: kv[1], reverse=True):
+            lines.append(f"  {stage:<24} {seconds:10.4f}s")
+        for counter, value in sorted(self.counters.items()):
+            lines.append(f"  {counter:<24} {value:>10}")
+        if 'lines_per_s' in summary:
+            lines.append(f"  {'throughput':<24} {summary['lines_per_s']} lines/s, {summary['mb_per_s']} MB/s")
+        if self.peak_memory_bytes is not None:
+            lines.append(f"  {'peak traced memory':<24} {self.peak_memory_bytes / (1024 * 1024):.2f} MB")
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        payload = self.summary()
+        if self.profile_text:
+            payload['profile'] = self.profile_text
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2)
+
+
+def print_run_summary(stats, json_path=None):
+    # End-of-run reporting shared by the CLIs; always prints, optionally also writes JSON
+    stats.stop_profiling()
+    stats.finish()
+    print(stats.format_summary())
+    if stats.profile_text:
+        print(stats.profile_text)
+    if json_path:
+        try:
+            stats.write_json(json_path)
+            print(f"Run summary written to '{json_path}'")
+        except OSError as e:
+            print(f"Error writing run summary: {e}")
+
+
+def render_streamlit_sidebar(st, stats):
+    # Takes the streamlit module as an argument so this module never imports it itself
+    summary = stats.summary()
+    st.sidebar.subheader("Run Statistics")
+    st.sidebar.metric("Wall time (s)", summary['wall_time_s'])
+    if summary['stages_s']:
+        st.sidebar.write("Stage timings (s)")
+        st.sidebar.table({'Stage': list(summary['stages_s'].keys()),
+                          'Seconds': list(summary['stages_s'].values())})
+    if summary['counters']:
+        st.sidebar.write("Counters")
+        st.sidebar.table({'Counter': list(summary['counters'].keys()),
+                          'Value': list(summary['counters'].values())})
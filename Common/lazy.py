@@ -0,0 +1,21 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Returns module `name` without executing it; the real import happens on first attribute access.
+
+    Keeps heavy dependencies (pandas, numpy, duckdb) off the start-up path of CLI runs that never
+    touch them, e.g. --help. Returns None when the module is not installed.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
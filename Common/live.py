@@ -0,0 +1,137 @@
+import os
+from datetime import timedelta
+
+from Common.anomaly import EPOCH
+from Common.engine import ParseResult, parse_records
+from Common.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+DEFAULT_POLL_BYTES = 4 * 1024 * 1024 # new log read per poll (~0.5 s of parsing); a large backlog is caught up over several refreshes
+DEFAULT_LIVE_BUCKET_SECONDS = 60
+DEFAULT_LIVE_SAMPLES = 10000 # durations kept per pattern for percentiles, so a long-running tail stays bounded
+DEFAULT_HISTORY = 240 # time buckets kept for the latency and error charts (4 hours of 1-minute buckets)
+DEFAULT_TOP_PATTERNS = 20
+
+timeline_columns = ['Time', 'Slow Queries', 'Avg Latency (ms)', 'Errors']
+top_pattern_columns = ['Pattern', 'Executions', 'Total (ms)', 'Avg (ms)', 'P95 (ms)', 'Max (ms)', 'Sample']
+
+
+class LogTail:
+    """Incremental aggregate of a log file that is still being written.
+
+    Each poll() parses only the bytes appended since the previous one, up to max_bytes,
+    and merges them into one ParseResult, so a refresh costs the new lines rather than
+    the whole file. Only complete lines are consumed; for multi-line formats the last
+    record is held back until the next record starts, since more of its lines may
+    follow. Detailed rows are not kept, durations per pattern are capped at max_samples
+    and the timeline ({time bucket: [slow queries, total duration, errors]}) at the
+    latest `history` buckets, so memory stays flat however long the tail runs. A file
+    that shrinks or is replaced (log rotation) is read again from its start, adding to
+    the aggregates built so far.
+    """
+
+    def __init__(self, fmt, path, from_end=False, bucket_seconds=DEFAULT_LIVE_BUCKET_SECONDS,
+                 max_samples=DEFAULT_LIVE_SAMPLES, history=DEFAULT_HISTORY):
+        self.fmt = fmt
+        self.path = path
+        self.bucket_seconds = bucket_seconds
+        self.max_samples = max_samples
+        self.history = history
+        self.result = ParseResult()
+        self.timeline = {}
+        stat = os.stat(path)
+        self.inode = stat.st_ino
+        self.offset = stat.st_size if from_end else 0
+        self.size = stat.st_size
+        self.rotations = 0
+        self.partial = False # the first line read is the rest of one the writer was in the middle of
+        if self.offset:
+            with open(path, 'rb') as f:
+                f.seek(self.offset - 1)
+                self.partial = f.read(1) != b'\n'
+
+    @property
+    def lag(self):
+        # Bytes written but not parsed yet, as of the last poll
+        return max(0, self.size - self.offset)
+
+    def _check_rotation(self, stat):
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.inode, self.offset, self.partial = stat.st_ino, 0, False
+            self.rotations += 1
+
+    def _complete_lines(self, data, full):
+        # Lines of `data` that can be parsed now; `full` means data stopped at max_bytes rather than at the end of file
+        end = data.rfind(b'\n') + 1 or (len(data) if full else 0) # a line longer than a whole poll is cut
+        lines = data[:end].splitlines(keepends=True)
+        if not self.fmt.multi_line or not lines:
+            return lines
+        is_record_start = self.fmt.is_record_start
+        for index in range(len(lines) - 1, -1, -1):
+            if is_record_start(lines[index].decode('utf-8', errors='replace')):
+                # The record starting here may still grow; one that fills a whole poll is parsed as it is
+                return lines[:index] if index or not full else lines
+        return lines # no record start: preamble or continuation lines, skipped by the parser
+
+    def poll(self, max_bytes=DEFAULT_POLL_BYTES, final=False):
+        # Parses what was appended since the last poll; returns the number of bytes consumed.
+        # final: the writer is done, so a held-back last record (or unterminated last line) is parsed too.
+        stat = os.stat(self.path)
+        self._check_rotation(stat)
+        self.size = stat.st_size
+        if self.size <= self.offset:
+            return 0
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(min(max_bytes, self.size - self.offset))
+        if final and self.offset + len(data) == self.size:
+            lines = data.splitlines(keepends=True)
+        else:
+            lines = self._complete_lines(data, len(data) >= max_bytes)
+        consumed = sum(len(line) for line in lines)
+        if not consumed:
+            return 0
+        if self.partial:
+            lines, self.partial = lines[1:], False
+        chunk = parse_records(self.fmt, [line.decode('utf-8', errors='replace') for line in lines], keep_rows=False,
+                              keep_other=False, max_samples=self.max_samples, bucket_seconds=self.bucket_seconds)
+        self._add_timeline(chunk)
+        chunk.buckets, chunk.error_buckets = {}, {} # folded into the timeline
+        self.result.merge(chunk)
+        self.offset += consumed
+        return consumed
+
+    def _add_timeline(self, chunk):
+        for series in chunk.buckets.values():
+            for bucket, (count, total) in series.items():
+                tally = self.timeline.setdefault(bucket, [0, 0.0, 0])
+                tally[0] += count
+                tally[1] += total
+        for bucket, count in chunk.error_buckets.items():
+            self.timeline.setdefault(bucket, [0, 0.0, 0])[2] += count
+        if len(self.timeline) > self.history:
+            for bucket in sorted(self.timeline)[:-self.history]:
+                del self.timeline[bucket]
+
+    @property
+    def slow_queries(self):
+        return sum(stats.count for stats in self.result.patterns.values())
+
+    @property
+    def error_rate(self):
+        # Share of the records parsed so far that were errors
+        return self.result.error_records / self.result.records if self.result.records else 0.0
+
+    def timeline_frame(self):
+        return pd.DataFrame([[EPOCH + timedelta(seconds=bucket * self.bucket_seconds), count,
+                              round(total / count, 2) if count else None, errors]
+                             for bucket, (count, total, errors) in sorted(self.timeline.items())],
+                            columns=timeline_columns)
+
+    def top_patterns(self, limit=DEFAULT_TOP_PATTERNS):
+        # The patterns that took the most total time so far
+        top = sorted(self.result.patterns.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+        return pd.DataFrame([[pattern, stats.count, round(stats.total, 2), round(stats.mean, 2),
+                              stats.percentile(95), stats.max, stats.sample] for pattern, stats in top],
+                            columns=top_pattern_columns)
@@ -0,0 +1,185 @@
+import json
+import os
+from datetime import datetime
+
+from Common.engine import SLOW, ERROR, plan_chunks, read_records, DEFAULT_CHUNK_SIZE
+from Common.instrumentation import BYTES
+from Common.lazy import lazy_import
+from Common.parallel import imap_in_processes
+
+pd = lazy_import('pandas')
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+DEFAULT_INDEX_EVERY = 10000 # records per index block
+SUMMARY_ROWS = 40 # blocks are rolled up into at most this many rows for printed summaries
+
+summary_columns = ['Blocks', 'Start Offset', 'End Offset', 'From', 'To', 'Records', 'Slow Queries', 'Slow Total(ms)',
+                   'Errors']
+
+
+def index_path(log_path):
+    return log_path + INDEX_SUFFIX
+
+
+def index_chunk(fmt, path, start, end, every):
+    # Worker entry point: [offset, first time, last time, records, slow queries, slow total ms, errors] per block.
+    # Blocks restart at the chunk start, so a block holds at most `every` records.
+    blocks, block = [], None
+    duration_pattern, scale = fmt.raw_duration_pattern, fmt.raw_duration_scale
+    with open(path, 'rb') as f:
+        for offset, record in read_records(f, fmt, start, end, offsets=True):
+            if block is None or block[3] == every:
+                block = [offset, None, None, 0, 0, 0.0, 0]
+                blocks.append(block)
+            block[3] += 1
+            try:
+                payload = fmt.decode(record)
+                kinds = fmt.classify(record, payload)
+                timestamp = fmt.timestamp(payload)
+            except Exception:
+                continue # counted as a record only, like a parse failure
+            if timestamp is not None:
+                # min/max rather than first/last, so slightly out-of-order logs still get correct time bounds
+                block[1] = timestamp if block[1] is None else min(block[1], timestamp)
+                block[2] = timestamp if block[2] is None else max(block[2], timestamp)
+            if SLOW in kinds:
+                block[4] += 1
+                match = duration_pattern.search(record) if duration_pattern is not None else None
+                if match is not None:
+                    block[5] += float(match.group(1)) * scale
+            if ERROR in kinds:
+                block[6] += 1
+    return blocks
+
+
+class LogIndex:
+    """Sparse index of one log file, kept in a JSON sidecar next to it (<log>.idx).
+
+    Block i starts at the record at offsets[i] and runs to offsets[i + 1] (the last one to
+    the end of the file). For each block the index keeps its time bounds and counts of
+    records, slow queries and errors, so a time range maps to a byte range without reading
+    the log, and block-level summaries need no parse at all. The sidecar records the log's
+    size and mtime; an index whose log has changed since is not used.
+    """
+
+    __slots__ = ('format_name', 'size', 'mtime', 'every', 'offsets', 'first_times', 'last_times', 'records', 'slow',
+                 'slow_ms', 'errors')
+
+    def __init__(self, format_name, size, mtime, every, blocks):
+        self.format_name = format_name # format plugin class name
+        self.size = size
+        self.mtime = mtime
+        self.every = every
+        columns = list(zip(*blocks)) or [()] * 7
+        self.offsets, self.first_times, self.last_times, self.records, self.slow, self.slow_ms, self.errors = (
+            list(column) for column in columns)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def block_range(self, first, last=None):
+        # Byte range [start, end) of blocks first..last (inclusive)
+        last = first if last is None else last
+        if not 0 <= first <= last < len(self):
+            raise ValueError(f"Block range {first}..{last} is outside the index (blocks 0..{len(self) - 1})")
+        end = self.offsets[last + 1] if last + 1 < len(self) else self.size
+        return self.offsets[first], end
+
+    def window(self, since=None, until=None):
+        # Byte range of the blocks whose time bounds overlap [since, until]; blocks without timestamps are left out
+        overlapping = [i for i in range(len(self)) if self.last_times[i] is not None
+                       and (since is None or self.last_times[i] >= since)
+                       and (until is None or self.first_times[i] <= until)]
+        if not overlapping:
+            return 0, 0
+        return self.block_range(overlapping[0], overlapping[-1])
+
+    def summary(self, rows=None):
+        # summary_columns rows, adjacent blocks rolled up into at most `rows` rows
+        step = max(1, -(-len(self) // rows)) if rows else 1
+        summary = []
+        for first in range(0, len(self), step):
+            last = min(first + step, len(self)) - 1
+            times = [t for t in self.first_times[first:last + 1] + self.last_times[first:last + 1] if t is not None]
+            summary.append([f"{first}..{last}" if last > first else str(first), *self.block_range(first, last),
+                            min(times) if times else None, max(times) if times else None,
+                            sum(self.records[first:last + 1]), sum(self.slow[first:last + 1]),
+                            round(sum(self.slow_ms[first:last + 1]), 2), sum(self.errors[first:last + 1])])
+        return summary
+
+    def summary_df(self, rows=None):
+        return pd.DataFrame(self.summary(rows), columns=summary_columns)
+
+    def is_current(self, fmt, log_path):
+        try:
+            stat = os.stat(log_path)
+        except OSError:
+            return False
+        return self.format_name == type(fmt).__name__ and self.size == stat.st_size and self.mtime == stat.st_mtime
+
+    def save(self, path):
+        blocks = {
+            'offsets': self.offsets,
+            'first_times': [t.isoformat() if t is not None else None for t in self.first_times],
+            'last_times': [t.isoformat() if t is not None else None for t in self.last_times],
+            'records': self.records, 'slow': self.slow, 'slow_ms': [round(ms, 3) for ms in self.slow_ms],
+            'errors': self.errors,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'format': self.format_name, 'size': self.size, 'mtime': self.mtime,
+                       'every': self.every, 'blocks': blocks}, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version in '{path}'; rebuild it with --build-index")
+        blocks = data['blocks']
+        first_times = [datetime.fromisoformat(t) if t else None for t in blocks['first_times']]
+        last_times = [datetime.fromisoformat(t) if t else None for t in blocks['last_times']]
+        return cls(data['format'], data['size'], data['mtime'], data['every'],
+                   zip(blocks['offsets'], first_times, last_times, blocks['records'], blocks['slow'], blocks['slow_ms'],
+                       blocks['errors']))
+
+
+def build_index(fmt, path, every=DEFAULT_INDEX_EVERY, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE, run_stats=None):
+    """One pass over the log (chunks in parallel, like parse_file) that writes its sidecar index.
+
+    Records are decoded and classified but not fingerprinted or kept. Returns the LogIndex.
+    """
+    stat = os.stat(path)
+    tasks = [(fmt, path, start, end, every) for start, end in plan_chunks(path, chunk_size)]
+    blocks = []
+    for chunk_blocks in imap_in_processes(index_chunk, tasks, max_workers=jobs):
+        blocks.extend(chunk_blocks)
+    index = LogIndex(type(fmt).__name__, stat.st_size, stat.st_mtime, every, blocks)
+    index.save(index_path(path))
+    if run_stats is not None:
+        run_stats.count(fmt.record_counter, sum(index.records))
+        run_stats.count(BYTES, stat.st_size)
+        run_stats.count('index_blocks', len(index))
+    return index
+
+
+def load_index(fmt, log_path):
+    # The log's sidecar index, or None when there is none or the log has changed since it was built
+    path = index_path(log_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        index = LogIndex.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return index if index.is_current(fmt, log_path) else None
+
+
+def format_summary(index, rows=SUMMARY_ROWS):
+    # Fixed-width text table of the block summary for the CLI
+    lines = [f"{'Blocks':>11} {'From':>19} {'To':>19} {'Records':>10} {'Slow':>8} {'Slow Total(ms)':>15} {'Errors':>7}"]
+    for blocks, _, _, first, last, records, slow, slow_ms, errors in index.summary(rows):
+        first = first.isoformat(sep=' ', timespec='seconds') if first else '-'
+        last = last.isoformat(sep=' ', timespec='seconds') if last else '-'
+        lines.append(f"{blocks:>11} {first:>19} {last:>19} {records:>10} {slow:>8} {slow_ms:>15} {errors:>7}")
+    return "\n".join(lines)
@@ -0,0 +1,43 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def default_jobs():
+    return os.cpu_count() or 1
+
+
+def map_in_processes(fn, args_list, max_workers=None):
+    """Calls fn(*args) for every tuple in args_list, in worker processes, preserving order.
+
+    fn must be a module-level function so it can be pickled. With a single task or a
+    single worker everything runs in-process, which also keeps tracebacks simple.
+    """
+    max_workers = min(max_workers or default_jobs(), len(args_list))
+    if max_workers <= 1:
+        return [fn(*args) for args in args_list]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fn, *args) for args in args_list]
+        return [future.result() for future in futures]
+
+
+def imap_in_processes(fn, args_list, max_workers=None):
+    """Like map_in_processes, but yields results in order as they become available.
+
+    At most 2 * max_workers tasks are in flight, so finished results never pile up in
+    memory faster than the caller consumes them (e.g. merging chunk results of a huge file).
+    """
+    max_workers = min(max_workers or default_jobs(), len(args_list))
+    if max_workers <= 1:
+        for args in args_list:
+            yield fn(*args)
+        return
+    tasks = iter(args_list)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque(pool.submit(fn, *args) for _, args in zip(range(2 * max_workers), tasks))
+        while pending:
+            result = pending.popleft().result()
+            next_args = next(tasks, None)
+            if next_args is not None:
+                pending.append(pool.submit(fn, *next_args))
+            yield result
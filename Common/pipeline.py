@@ -0,0 +1,113 @@
+import math
+import queue
+import threading
+import time
+
+from Common.excel import EXCEL_MAX_DATA_ROWS
+from Common.lazy import lazy_import
+
+xlsxwriter = lazy_import('xlsxwriter')
+
+PIPELINE_QUEUE_DEPTH = 8 # chunks of detailed rows waiting for the writer thread before parsing blocks
+# Same header style and datetime format as pandas' to_excel, so a pipelined report looks like a sequential one
+HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+
+_FINISH = object()
+
+
+def _is_finish(item):
+    return isinstance(item, tuple) and item[0] is _FINISH
+
+
+def _clean(row):
+    # NaN/inf (which xlsxwriter rejects) become blank cells, as pandas writes them
+    return [None if isinstance(value, float) and not math.isfinite(value) else value for value in row]
+
+
+def _write_row(worksheet, row_number, row):
+    try:
+        worksheet.write_row(row_number, 0, row)
+    except TypeError:
+        worksheet.write_row(row_number, 0, _clean(row))
+
+
+def _write_frame(worksheet, df, header):
+    worksheet.write_row(0, 0, [str(column) for column in df.columns], header)
+    values = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    for row_number, row in enumerate(values, 1):
+        _write_row(worksheet, row_number, row)
+
+
+class PipelinedReport:
+    """Writes an Excel report on a background thread while the log is still being parsed.
+
+    add_rows() is parse_file()'s row_sink: each chunk's detailed rows go through a bounded
+    queue to a writer thread that appends them to the detailed sheet (xlsxwriter in
+    constant_memory mode) while later chunks are decoded by the worker processes.
+    close(sheets) hands over the finished report; the thread then writes the other sheets
+    and compresses the workbook while the caller goes on (e.g. to the store), and wait()
+    returns (success, error message) like save_sheets_to_excel. The detailed sheet keeps
+    every detailed column and stops at the Excel row limit; columns the format leaves out
+    of its detailed sheet (e.g. MySQL's empty optional ones) are hidden instead.
+    """
+
+    def __init__(self, path, detailed_sheet, columns, max_rows=EXCEL_MAX_DATA_ROWS):
+        self.path = path
+        self.detailed_sheet = detailed_sheet
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        self.queue = queue.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+        self.error = None
+        self.busy = 0.0 # seconds the writer thread spent writing, for the run summary
+        self.rows_written = 0
+        self.closed = False # the finished sheets were taken off the queue
+        self.thread = threading.Thread(target=self._run, name='report-writer', daemon=True)
+        self.thread.start()
+
+    def add_rows(self, rows):
+        if rows and self.error is None:
+            self.queue.put(rows) # blocks while the writer is PIPELINE_QUEUE_DEPTH chunks behind
+
+    def close(self, sheets):
+        self.queue.put((_FINISH, sheets)) # detailed rows are lists, so a tuple cannot be mistaken for a chunk
+
+    def wait(self):
+        self.thread.join()
+        return (False, self.error) if self.error is not None else (True, None)
+
+    def _run(self):
+        try:
+            self._write()
+        except Exception as e:
+            self.error = str(e)
+            while not self.closed and not _is_finish(self.queue.get()):
+                pass # keep draining so the parser never blocks on a dead writer
+
+    def _write(self):
+        start = time.perf_counter()
+        workbook = xlsxwriter.Workbook(self.path, {'constant_memory': True, 'default_date_format': DATETIME_FORMAT})
+        header = workbook.add_format(HEADER_FORMAT)
+        detailed = workbook.add_worksheet(self.detailed_sheet)
+        detailed.write_row(0, 0, self.columns, header)
+        self.busy += time.perf_counter() - start
+        while True:
+            item = self.queue.get()
+            start = time.perf_counter()
+            if _is_finish(item):
+                break
+            for row in item[:self.max_rows - self.rows_written]:
+                self.rows_written += 1
+                _write_row(detailed, self.rows_written, row)
+            self.busy += time.perf_counter() - start
+        self.closed = True
+        sheets = item[1]
+        for sheet_name, df in sheets.items():
+            if sheet_name == self.detailed_sheet:
+                for index, column in enumerate(self.columns):
+                    if column not in df.columns:
+                        detailed.set_column(index, index, None, None, {'hidden': True})
+            else:
+                _write_frame(workbook.add_worksheet(sheet_name), df, header)
+        workbook.close()
+        self.busy += time.perf_counter() - start
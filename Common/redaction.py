@@ -0,0 +1,89 @@
+import hashlib
+
+REDACTION_MODES = ('mask', 'hash', 'remove', 'keep')
+DIGEST_LENGTH = 16 # hex characters of the SHA-256 digest kept by 'hash'
+MASK = '<redacted>' # masked value of a column without a normalized shape (e.g. a client address)
+
+
+def parse_rule(text):
+    # "COLUMN=MODE" -> (column, mode)
+    column, sep, mode = text.rpartition('=')
+    if not sep or not column or mode not in REDACTION_MODES:
+        raise ValueError(f"Invalid redaction rule '{text}', expected COLUMN=MODE with MODE one of "
+                         f"{', '.join(REDACTION_MODES)}")
+    return column, mode
+
+
+class Redactor:
+    """Replaces literal values (customer data) in report columns while slow queries are fingerprinted.
+
+    Every column the format marks as holding literals (fmt.redacted_columns and its
+    error_sample_column) gets `mode`; `rules` ({column: mode}) override it per column and
+    may name any other detailed column, e.g. a client address. 'mask' puts the value's
+    normalized shape in its place, 'hash' the shape tagged with a salted SHA-256 digest of
+    the original text (so identical samples can still be matched up), 'remove' leaves it
+    empty and 'keep' leaves it alone. The shapes come from the format's fingerprinting of
+    the decoded record, so no second pass runs over the output; error samples are only
+    redacted once per distinct error.
+    """
+
+    __slots__ = ('mode', 'rules', 'salt')
+
+    def __init__(self, mode='mask', rules=None, salt=''):
+        for value in (mode, *(rules or {}).values()):
+            if value not in REDACTION_MODES:
+                raise ValueError(f"Unknown redaction mode '{value}' (expected one of {', '.join(REDACTION_MODES)})")
+        self.mode = mode
+        self.rules = dict(rules or {})
+        self.salt = salt
+
+    def check_format(self, fmt):
+        # Raises ValueError for a rule naming a column the format does not report
+        for column in self.rules:
+            if column not in fmt.detailed_columns[:-1] and column != fmt.error_sample_column:
+                raise ValueError(f"Cannot redact column '{column}': {fmt.title} reports have no such column")
+
+    def digest(self, text):
+        return hashlib.sha256((self.salt + str(text)).encode('utf-8')).hexdigest()[:DIGEST_LENGTH]
+
+    def _redact(self, fmt, mode, value, shape=None):
+        # shape is None for columns the format has no normalized shape for
+        if mode == 'mask':
+            return MASK if shape is None else shape
+        if mode == 'hash':
+            return f"sha256:{self.digest(value)}" if shape is None else fmt.tag_shape(shape, self.digest(value))
+        return ''
+
+    def row_redactor(self, fmt):
+        # redact(row, payload) -> the row's fingerprint, with the row's literal values replaced in place
+        self.check_format(fmt)
+        columns = fmt.detailed_columns
+        shaped = [(position, columns.index(column), self.rules.get(column, self.mode))
+                  for position, column in enumerate(fmt.redacted_columns)]
+        shaped = [entry for entry in shaped if entry[2] != 'keep']
+        masked = [(columns.index(column), mode) for column, mode in self.rules.items()
+                  if mode != 'keep' and column in columns and column not in fmt.redacted_columns]
+        redacted_shapes, redact = fmt.redacted_shapes, self._redact
+
+        def redact_row(row, payload):
+            pattern, shapes = redacted_shapes(row, payload)
+            for position, index, mode in shaped:
+                row[index] = redact(fmt, mode, row[index], shapes[position])
+            for index, mode in masked:
+                if row[index] not in (None, ''):
+                    row[index] = redact(fmt, mode, row[index])
+            return pattern
+        return redact_row
+
+    def error_redactor(self, fmt):
+        # redact(record, payload, fields) -> sample of a distinct error, or None for formats without error samples
+        if fmt.error_sample_column is None:
+            return None
+        mode = self.rules.get(fmt.error_sample_column, self.mode)
+        redact = self._redact
+
+        def redact_error(record, payload, fields):
+            if mode == 'keep':
+                return record.strip()
+            return redact(fmt, mode, record.strip(), fmt.error_shape(record, payload, fields))
+        return redact_error
@@ -0,0 +1,628 @@
+"""Golden-output and performance regression harness.
+
+Every case generates a deterministic log for one format and runs it through each execution
+mode of the engine. Every mode must reproduce the golden snapshot of the format's whole-text
+entry point (parse_log_lines, parse_mysql_log_content, parse_postgres_log_content), with the
+engine's extra sheets (e.g. Pipeline Stats) taken from a single in-process pass: sheets for
+modes that build them, aggregates (per-pattern and per-error state) for all.
+
+For the MongoDB and MySQL parsers, which predate the engine, the entry point's output was
+also recorded once from their original implementation (golden/original/). A golden may
+differ from it only where INTENDED_CHANGES says so, column by column with the request and
+the reason, so a refactor that changes any other value fails. The PostgreSQL parser was
+written on the engine and has no original to compare with.
+
+A performance check compares throughput, normalized by a pure-Python calibration loop so
+baselines carry across machines, and tracemalloc peak memory against a stored baseline. A
+quick version on small logs runs with the unit tests; the full one with SRE_PERF_CHECK=1.
+
+    python -m Common.regression                    # check everything, print a table
+    python -m Common.regression --update-golden    # after an intended output change listed in INTENDED_CHANGES
+    python -m Common.regression --update-baseline  # after an intended performance change
+    python -m Common.regression --record-original REVISION  # once: the original parsers' output at REVISION
+"""
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from Common.engine import DETAILED_SHEET, build_sheets, parse_file, parse_records, sample_file
+from Common.lazy import lazy_import
+from Common.live import LogTail
+
+pd = lazy_import('pandas')
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_DIR = os.path.join(REPO_ROOT, 'Common', 'golden')
+ORIGINAL_DIR = os.path.join(GOLDEN_DIR, 'original')
+BASELINE_PATH = os.path.join(GOLDEN_DIR, 'perf_baseline.json')
+GOLDEN_RECORDS = 400 # records per generated log for the output checks
+PERF_RECORDS = 10000 # and for the performance checks
+QUICK_RECORDS = 1000 # and for the quick performance check run with the unit tests
+PERF_REPEAT = 3 # timed runs per case; the median counts
+CALIBRATION_SECONDS = 0.2 # length of the calibration loop before each timed run
+QUICK_CALIBRATION_SECONDS = 0.02
+THROUGHPUT_TOLERANCE = 0.30 # fail below 70% of the baseline's normalized throughput
+QUICK_THROUGHPUT_TOLERANCE = 0.50 # small logs time less steadily, so the quick check only catches gross slowdowns
+MEMORY_TOLERANCE = 0.25 # fail above 125% of the baseline's peak memory
+FLOAT_DIGITS = 6 # floats are compared rounded, since merging chunks sums them in another order
+CHUNK_SIZE = 4096 # bytes per chunk in the parallel and spilled modes, so small logs still split
+SPILL_MB = 0.02
+TAIL_BYTES = 3000 # bytes per poll in the incremental mode
+START = datetime(2024, 1, 15, 10)
+
+MODES = ('serial', 'streaming', 'parallel', 'spilled', 'incremental', 'sampled-off')
+SHEET_MODES = ('streaming', 'parallel', 'spilled') # modes that build the full report
+
+# Where the output may differ from the original parsers' (golden/original/), and why:
+# (request, case, sheet or 'warnings', columns (empty: the whole part), reason). A column missing from the
+# original is an added one; any other listed column changed values. Entries that match no difference fail too.
+INTENDED_CHANGES = [
+    ('user-029', 'mongo', DETAILED_SHEET, ('Query Pattern',),
+     "added: each slow query's pattern, so stored detailed rows can be filtered and joined by it"),
+    ('user-035', 'mongo', DETAILED_SHEET, ('Pipeline Stages', 'Pipeline Id'),
+     "added: the stage sequence and fingerprint of aggregation pipelines"),
+    ('user-036', 'mongo', DETAILED_SHEET, ('Database', 'QueryHash', 'PlanCacheKey', 'Remote', 'reslen', 'cpuNanos',
+                                           'bytesRead', 'timeReadingMicros', 'LockAcquisitions', 'LockWaitMicros'),
+     "added: slow-query attr fields and the database part of `ns`"),
+    ('user-036', 'mongo', DETAILED_SHEET, ('AppName',),
+     "the original filled AppName with the database part of `ns`; it is now the client's appName, empty when "
+     "not logged, and the database has its own column"),
+    ('user-044', 'mongo', 'warnings', (),
+     "lines that are not valid JSON are counted and reported once with their first line numbers, instead of one "
+     "warning per line"),
+    ('user-033', 'mysql', DETAILED_SHEET, ('Thread_id', 'Schema', 'Rows_affected', 'Full_scan'),
+     "added: the other header fields"),
+    ('user-033', 'mysql', DETAILED_SHEET, ('Lock_time', 'Rows_sent', 'Rows_examined'),
+     "header values are numbers instead of the matched text; the original's Rows_examined also kept the rest of "
+     "its line (e.g. '7808 Rows_affected: 3 Full_scan: Yes')"),
+    ('user-033', 'mysql', 'Aggregate Results', ('Total_Rows_sent', 'Total_Rows_examined', 'Total_Rows_affected',
+                                                'Total_Full_scan'),
+     "added: per-pattern sums of the numeric header fields"),
+    ('user-033', 'mysql', 'warnings', (),
+     "problem entries are counted per kind and reported once, instead of one warning per entry"),
+    ('user-034', 'mysql', 'Aggregate Results', ('Total_Lock_time_ms', 'Avg_Lock_time_ms', 'Lock_Ratio'),
+     "added: lock time per pattern"),
+    ('user-050', 'mysql', DETAILED_SHEET, ('User', 'Host', 'IP'),
+     "added: User@Host split up for workload attribution"),
+]
+
+
+# --- Generated logs: a few query shapes with random literals, errors, noise and damaged records ---
+
+def _mongo_log(n, rng):
+    lines = []
+    for i in range(n):
+        t = {"$date": (START + timedelta(seconds=i)).isoformat(timespec='milliseconds') + "Z"}
+        kind = rng.random()
+        if kind < 0.75:
+            shape = rng.choice([
+                lambda: {"find": "orders", "filter": {"customer": rng.randint(1, 900), "status": rng.choice("ab")}},
+                lambda: {"find": "users", "filter": {"email": f"u{rng.randint(1, 99)}@x.io"}, "limit": 1},
+                lambda: {"aggregate": "orders", "pipeline": [{"$match": {"day": rng.randint(1, 28)}},
+                                                             {"$group": {"_id": "$sku", "n": {"$sum": 1}}}]},
+                lambda: {"update": "stock", "updates": [{"q": {"sku": rng.randint(1, 50)}, "u": {"$inc": {"n": -1}}}]},
+            ])()
+            attr = {"ns": f"shop.{next(iter(shape.values()))}", "command": shape,
+                    "durationMillis": rng.randint(100, 3000), "remote": f"10.0.0.{rng.randint(1, 9)}:5000",
+                    "docsExamined": rng.randint(0, 5000), "keysExamined": rng.randint(0, 500)}
+            lines.append(json.dumps({"t": t, "s": "I", "c": "COMMAND", "msg": "Slow query", "attr": attr}))
+        elif kind < 0.85:
+            error = rng.choice([("DuplicateKey", f'E11000 dup key: {{ sku: {rng.randint(1, 50)} }}'),
+                                ("NotWritablePrimary", "not primary")])
+            lines.append(json.dumps({"t": t, "s": "E", "c": "WRITE", "msg": "Write error",
+                                     "attr": {"error": {"codeName": error[0], "errmsg": error[1]}}}))
+        elif kind < 0.97:
+            lines.append(json.dumps({"t": t, "s": "I", "c": "NETWORK", "msg": "Connection accepted",
+                                     "attr": {"remote": f"10.0.0.{rng.randint(1, 9)}:5000"}}))
+        else:
+            lines.append(rng.choice(["{not json", json.dumps({"t": t, "msg": "half"})[:20]]))
+    return "".join(line + "\n" for line in lines)
+
+
+def _mysql_log(n, rng):
+    entries, database = [], None
+    for i in range(n):
+        time_text = (START + timedelta(seconds=i // 3)).strftime('%y%m%d %H:%M:%S')
+        query = rng.choice([
+            lambda: f"SELECT * FROM orders WHERE customer = {rng.randint(1, 900)} AND status = '{rng.choice('ab')}';",
+            lambda: f"UPDATE stock SET n = n - 1 WHERE sku = {rng.randint(1, 50)};",
+            lambda: f"SELECT name FROM users\n  WHERE email = 'u{rng.randint(1, 99)}@x.io'\n  LIMIT 1;",
+            lambda: "COMMIT;" if rng.random() < 0.5 else "",
+        ])()
+        extra = f" Rows_affected: {rng.randint(0, 5)} Full_scan: {rng.choice(['Yes', 'No'])}" if i % 4 == 0 else ""
+        user = rng.choice(["app[app] @ web1 [10.0.0.5]", "report[report] @  [10.0.0.7]", "root[root] @ localhost []"])
+        use = ""
+        if i > 3 and rng.random() < 0.1:
+            switch = rng.choice(["shop", "billing"])
+            if switch != database: # written only when the database changes, as the server does
+                database, use = switch, f"use {switch};\n"
+        entry = (f"# Time: {time_text}\n# User@Host: {user} thread_id: {rng.randint(1, 40)}\n"
+                 f"# Query_time: {rng.uniform(0.5, 9):.6f}  Lock_time: {rng.uniform(0, 0.01):.6f} "
+                 f"Rows_sent: {rng.randint(0, 10)}  Rows_examined: {rng.randint(0, 9000)}{extra}\n"
+                 f"{use}SET timestamp={1705312800 + i};\n{query}\n")
+        if rng.random() < 0.02:
+            entry = f"# Time: {time_text}\n# User@Host: app[app] @ 10.0.0.1 []\nSELECT 1;\n" # no Query_time
+        entries.append(entry)
+    return "/usr/sbin/mysqld, Version: 8.0.35. started with:\n" + "".join(entries)
+
+
+def _postgres_statement(rng):
+    return rng.choice([
+        lambda: f"SELECT * FROM orders\n\tWHERE customer = {rng.randint(1, 900)}\n\t  AND status IN ('a', 'b')",
+        lambda: f"UPDATE stock SET n = n - 1 WHERE sku = {rng.randint(1, 50)}",
+        lambda: f"SELECT name FROM users WHERE email = 'u{rng.randint(1, 99)}@x.io'",
+    ])()
+
+
+def _postgres_stderr_log(n, rng):
+    lines = []
+    for i in range(n):
+        prefix = f"{START + timedelta(seconds=i):%Y-%m-%d %H:%M:%S}.{i % 1000:03d} UTC [{rng.randint(100, 140)}] app@shop"
+        kind = rng.random()
+        if kind < 0.75:
+            lines.append(f"{prefix} LOG:  duration: {rng.uniform(1, 900):.3f} ms  statement: {_postgres_statement(rng)}")
+        elif kind < 0.85:
+            lines.append(f'{prefix} ERROR:  relation "t{rng.randint(1, 3)}" does not exist at character 15')
+            lines.append(f"{prefix} STATEMENT:  SELECT * FROM t1")
+        else:
+            lines.append(f"{prefix} LOG:  checkpoint starting: time")
+    return "".join(line + "\n" for line in lines)
+
+
+def _postgres_csv_log(n, rng):
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for i in range(n):
+        time_text = f"{START + timedelta(seconds=i):%Y-%m-%d %H:%M:%S}.{i % 1000:03d} UTC"
+        if rng.random() < 0.85:
+            severity, state, message = 'LOG', '00000', f"duration: {rng.uniform(1, 900):.3f} ms  statement: " + \
+                _postgres_statement(rng).replace("\t", "")
+        else:
+            severity, state, message = 'ERROR', '42P01', f'relation "t{rng.randint(1, 3)}" does not exist'
+        writer.writerow([time_text, 'app', 'shop', rng.randint(100, 140), '10.0.0.1:5000', '65a4f1.65', i, 'SELECT',
+                         '2024-01-15 09:00:00 UTC', '3/10', 0, severity, state, message, '', '', '', '', '', '', '',
+                         '', 'psql', 'client backend', '', 0])
+    return out.getvalue()
+
+
+def _postgres_json_log(n, rng):
+    lines = []
+    for i in range(n):
+        entry = {"timestamp": f"{START + timedelta(seconds=i):%Y-%m-%d %H:%M:%S}.{i % 1000:03d} UTC", "user": "app",
+                 "dbname": "shop", "pid": rng.randint(100, 140), "application_name": "psql"}
+        if rng.random() < 0.85:
+            entry.update(error_severity="LOG", message=f"duration: {rng.uniform(1, 900):.3f} ms  statement: "
+                                                       f"{_postgres_statement(rng)}")
+        else:
+            entry.update(error_severity="ERROR", state_code="57014", message="canceling statement due to statement timeout")
+        lines.append(json.dumps(entry) if rng.random() > 0.01 else "not json")
+    return "".join(line + "\n" for line in lines)
+
+
+def _mongo_entry_point(module):
+    def run(text):
+        detailed, query_stats, other, errors, warnings = module.parse_log_lines(text.splitlines(keepends=True))
+        return {DETAILED_SHEET: detailed, 'Query Stats': query_stats, 'Non-Slow Queries': other,
+                'Error Stats': errors}, warnings
+    return run
+
+
+def _mysql_entry_point(module):
+    def run(text):
+        detailed, aggregates, warnings = module.parse_mysql_log_content(text)
+        return {DETAILED_SHEET: detailed, 'Aggregate Results': aggregates}, warnings
+    return run
+
+
+# case -> (parser module path, entry point wrapper) for the cases whose parser predates the engine
+ORIGINAL_ENTRY_POINTS = {
+    'mongo': ('Mongo/mongo_parser.py', _mongo_entry_point),
+    'mysql': ('MySql/mysqlLogParser.py', _mysql_entry_point),
+}
+
+
+def _cases():
+    # name -> (format, generator, whole-text entry point returning {sheet name: DataFrame} and warnings)
+    from Mongo import mongo_parser
+    from MySql import mysqlLogParser
+    from PostgreSql.postgresLogParser import (POSTGRES_STDERR, POSTGRES_CSV, POSTGRES_JSON,
+                                              parse_postgres_log_content)
+
+    def postgres(fmt):
+        def run(text):
+            detailed, aggregates, errors, warnings = parse_postgres_log_content(text, fmt=fmt)
+            return {DETAILED_SHEET: detailed, 'Aggregate Results': aggregates, 'Error Stats': errors}, warnings
+        return run
+
+    return {
+        'mongo': (mongo_parser.MONGO, _mongo_log, _mongo_entry_point(mongo_parser)),
+        'mysql': (mysqlLogParser.MYSQL, _mysql_log, _mysql_entry_point(mysqlLogParser)),
+        'postgres_stderr': (POSTGRES_STDERR, _postgres_stderr_log, postgres(POSTGRES_STDERR)),
+        'postgres_csv': (POSTGRES_CSV, _postgres_csv_log, postgres(POSTGRES_CSV)),
+        'postgres_json': (POSTGRES_JSON, _postgres_json_log, postgres(POSTGRES_JSON)),
+    }
+
+
+def generate_log(case, records, seed=0):
+    return _cases()[case][1](records, random.Random(seed))
+
+
+# --- Snapshots: JSON-comparable views of sheets and aggregates ---
+
+def _value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NaT:
+        return None
+    if hasattr(value, 'item'): # numpy scalars
+        value = value.item()
+    if isinstance(value, float):
+        return round(value, FLOAT_DIGITS)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def frame_snapshot(df):
+    return {'columns': [str(column) for column in df.columns],
+            'rows': [[_value(value) for value in row] for row in df.astype(object).itertuples(index=False, name=None)]}
+
+
+def aggregates_snapshot(patterns, errors, records):
+    return {
+        'records': records,
+        'patterns': {pattern: [stats.count, _value(stats.total), _value(stats.min), _value(stats.max),
+                               _value(stats.percentile(50)), _value(stats.percentile(95)), stats.sample]
+                     for pattern, stats in sorted(patterns.items())},
+        'errors': {str(key): summary.count for key, summary in sorted(errors.items(), key=lambda item: str(item[0]))},
+    }
+
+
+def _sheets_snapshot(sheets):
+    return {name: frame_snapshot(df) for name, df in sheets.items()}
+
+
+def serial_snapshot(case, text):
+    # The golden run: the format's original whole-text entry point, plus the engine's aggregates of the same text
+    fmt, _, entry_point = _cases()[case]
+    sheets, warnings = entry_point(text)
+    result = parse_records(fmt, text.splitlines(keepends=True))
+    extra = {name: df for name, df in build_sheets(fmt, result).items() if name not in sheets}
+    return {'sheets': _sheets_snapshot({**sheets, **extra}), 'warnings': list(warnings),
+            'aggregates': aggregates_snapshot(result.patterns, result.errors, result.records)}
+
+
+def mode_snapshot(case, mode, path):
+    # What one execution mode produces for the log at `path`, in the shape of the golden snapshot
+    fmt, _, entry_point = _cases()[case]
+    if mode == 'serial': # the entry point's own sheets only
+        with open(path, encoding='utf-8') as f:
+            sheets, warnings = entry_point(f.read())
+        return {'sheets': _sheets_snapshot(sheets), 'warnings': list(warnings)}
+    if mode in SHEET_MODES:
+        options = {'streaming': {}, 'parallel': {'jobs': 2, 'chunk_size': CHUNK_SIZE},
+                   'spilled': {'chunk_size': CHUNK_SIZE, 'max_memory': SPILL_MB}}[mode]
+        result = parse_file(fmt, path, **options)
+        return {'sheets': _sheets_snapshot(build_sheets(fmt, result)), 'warnings': result.issue_messages(fmt),
+                'aggregates': aggregates_snapshot(result.patterns, result.errors, result.records)}
+    if mode == 'incremental':
+        tail = LogTail(fmt, path, max_samples=None)
+        while tail.poll(max_bytes=TAIL_BYTES):
+            pass
+        tail.poll(final=True) # the last multi-line record is held back until then
+        return {'aggregates': aggregates_snapshot(tail.result.patterns, tail.result.errors, tail.result.records)}
+    if mode == 'sampled-off':
+        _, sheets = sample_file(fmt, path, 1.0, seed=0)
+        stats_df = sheets[f'{fmt.stats_sheet} (Estimated)']
+        return {'estimated_counts': {row[fmt.pattern_column]: row['Estimated Executions']
+                                     for row in stats_df.to_dict('records')}}
+    raise ValueError(f"Unknown mode '{mode}' (expected one of {', '.join(MODES)})")
+
+
+def golden_path(case):
+    return os.path.join(GOLDEN_DIR, f'{case}.json')
+
+
+def load_golden(case):
+    with open(golden_path(case), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def update_golden(cases=None):
+    # Refuses to record output that differs from the original parsers' where INTENDED_CHANGES does not say so
+    for case in cases or _cases():
+        snapshot = serial_snapshot(case, generate_log(case, GOLDEN_RECORDS))
+        unexplained = original_differences(case, snapshot)
+        if unexplained:
+            raise ValueError(f"{case}: output differs from the original parser's without an entry in "
+                             f"INTENDED_CHANGES: {'; '.join(what for what, _, _ in unexplained)}")
+        _write_json(golden_path(case), snapshot)
+
+
+# --- The original parsers: output recorded once, and the intended changes since ---
+
+def original_path(case):
+    return os.path.join(ORIGINAL_DIR, f'{case}.json')
+
+
+def load_original(case):
+    # The original parser's snapshot for `case`, or None when the format has no original
+    if case not in ORIGINAL_ENTRY_POINTS:
+        return None
+    with open(original_path(case), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _load_module(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def record_original(revision, cases=None):
+    # Runs the entry points of the parsers as they were at `revision` (checked out into a temporary
+    # worktree) on the generated logs and stores their sheets and warnings in golden/original/
+    revision = subprocess.run(['git', 'rev-parse', '--verify', f'{revision}^{{commit}}'], cwd=REPO_ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, 'original')
+        subprocess.run(['git', 'worktree', 'add', '--detach', tree, revision], cwd=REPO_ROOT, check=True,
+                       capture_output=True)
+        try:
+            for case in cases or ORIGINAL_ENTRY_POINTS:
+                module_path, entry_point = ORIGINAL_ENTRY_POINTS[case]
+                module = _load_module(os.path.join(tree, module_path), f'original_{case}')
+                sheets, warnings = entry_point(module)(generate_log(case, GOLDEN_RECORDS))
+                _write_json(original_path(case), {'revision': revision, 'sheets': _sheets_snapshot(sheets),
+                                                  'warnings': list(warnings)})
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', tree], cwd=REPO_ROOT, capture_output=True)
+
+
+def _column(sheet, name):
+    position = sheet['columns'].index(name)
+    return [row[position] for row in sheet['rows']]
+
+
+def original_differences(case, snapshot):
+    # [(what, expected, actual)] for every difference between the snapshot's entry point output and the
+    # original parser's that INTENDED_CHANGES does not explain, and for every entry that explains nothing
+    original = load_original(case)
+    if original is None:
+        return []
+    changes = [change for change in INTENDED_CHANGES if change[1] == case]
+    listed = {(part, column) for _, _, part, columns, _ in changes for column in columns or (None,)}
+    used, differences = set(), []
+    if original['warnings'] != snapshot['warnings']:
+        if ('warnings', None) in listed:
+            used.add(('warnings', None))
+        else:
+            differences.append(('warnings', original['warnings'], snapshot['warnings']))
+    for name, expected in original['sheets'].items():
+        actual = snapshot['sheets'].get(name)
+        if actual is None:
+            differences.append((f'sheet {name} missing', name, None))
+            continue
+        if (name, None) in listed:
+            used.add((name, None))
+            continue
+        missing = [column for column in expected['columns'] if column not in actual['columns']]
+        if missing:
+            differences.append((f'sheet {name} lost columns {missing}', expected['columns'], actual['columns']))
+        for column in actual['columns']:
+            if column not in expected['columns'] or _column(expected, column) != _column(actual, column):
+                if (name, column) in listed:
+                    used.add((name, column))
+                elif column not in expected['columns']:
+                    differences.append((f'sheet {name} added column {column}', None, _column(actual, column)))
+                else:
+                    differences.append((f'sheet {name} column {column}', _column(expected, column),
+                                        _column(actual, column)))
+    for part, column in sorted(listed - used, key=str):
+        differences.append((f"INTENDED_CHANGES lists {column or 'all'} of {part}, which did not change", None, None))
+    return differences
+
+
+def check_goldens_against_originals(cases=None):
+    # {case: differences} between each golden and its format's original parser output
+    return {case: original_differences(case, load_golden(case)) for case in cases or _cases()}
+
+
+def compare_mode(case, mode, golden, path):
+    # [(what, expected, actual)] for every part of the mode's output that differs from the golden snapshot
+    actual = mode_snapshot(case, mode, path)
+    if mode == 'sampled-off':
+        expected = {pattern: counts[0] for pattern, counts in golden['aggregates']['patterns'].items()}
+        return [] if actual['estimated_counts'] == expected else [('estimated counts', expected,
+                                                                   actual['estimated_counts'])]
+    differences = []
+    for part in ('sheets', 'warnings', 'aggregates'):
+        if part in actual:
+            differences.extend(_differences(mode, part, golden[part], actual[part]))
+    return differences
+
+
+def _differences(mode, part, expected, actual):
+    if part != 'sheets':
+        return [] if expected == actual else [(part, expected, actual)]
+    # The entry point returns fewer sheets than the engine builds; the ones it does return must match
+    missing = [] if mode == 'serial' else [name for name in expected if name not in actual]
+    extra = [name for name in actual if name not in expected]
+    differences = [('sheet names', missing, extra)] if missing or extra else []
+    for name in expected:
+        if name in actual and expected[name] != actual[name]:
+            differences.append((f'sheet {name}', expected[name], actual[name]))
+    return differences
+
+
+def check_outputs(cases=None, modes=MODES):
+    # {(case, mode): differences} over every case and mode; empty lists mean identical output
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in cases or _cases():
+            golden = load_golden(case)
+            for mode in modes:
+                path = os.path.join(tmp, f'{case}-{mode}.log')
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(generate_log(case, GOLDEN_RECORDS))
+                report[case, mode] = compare_mode(case, mode, golden, path)
+    return report
+
+
+# --- Performance: normalized throughput and peak memory against a stored baseline ---
+
+_CALIBRATION_TEXT = json.dumps({"attr": {"command": {"find": "orders", "filter": {"a": 1, "b": [1, 2, 3]}}}})
+_CALIBRATION_PATTERN = re.compile(r'\d+')
+
+
+def calibrate(seconds=CALIBRATION_SECONDS):
+    # Iterations per second of a fixed decode + normalize workload, the yardstick throughput is measured against
+    iterations, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for _ in range(200):
+            _CALIBRATION_PATTERN.sub('?', json.dumps(json.loads(_CALIBRATION_TEXT)))
+        iterations += 200
+    return iterations / (time.perf_counter() - start)
+
+
+def measure(case, path, repeat=PERF_REPEAT, calibration=CALIBRATION_SECONDS):
+    # {'relative_throughput': records/s of parse + sheets divided by calibrate(), 'peak_mb': tracemalloc peak}
+    fmt = _cases()[case][0]
+    ratios = []
+    for _ in range(repeat):
+        speed = calibrate(calibration)
+        start = time.perf_counter()
+        result = parse_file(fmt, path)
+        build_sheets(fmt, result)
+        ratios.append(result.records / (time.perf_counter() - start) / speed)
+    tracemalloc.start()
+    try:
+        build_sheets(fmt, parse_file(fmt, path))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'relative_throughput': round(statistics.median(ratios), 4), 'peak_mb': round(peak / (1024 * 1024), 2)}
+
+
+def python_version():
+    return f"{sys.version_info.major}.{sys.version_info.minor}"
+
+
+def load_baseline(records=PERF_RECORDS):
+    # {case: measurement} on logs of `records` records, recorded with this Python version (memory use differs
+    # between versions), or None
+    if not os.path.isfile(BASELINE_PATH):
+        return None
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        baseline = json.load(f)
+    return baseline.get(python_version(), {}).get(str(records))
+
+
+def measure_cases(cases=None, records=PERF_RECORDS):
+    # The quick check's small logs are timed against a shorter calibration, so it stays cheap
+    measurements = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in cases or _cases():
+            path = os.path.join(tmp, f'{case}.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(generate_log(case, records, seed=1))
+            measurements[case] = measure(case, path, calibration=CALIBRATION_SECONDS if records >= PERF_RECORDS
+                                         else QUICK_CALIBRATION_SECONDS)
+    return measurements
+
+
+def update_baseline(cases=None):
+    # Records both the full and the quick check's baselines
+    baseline = {}
+    if os.path.isfile(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            baseline = json.load(f)
+    for records in (PERF_RECORDS, QUICK_RECORDS):
+        baseline.setdefault(python_version(), {}).setdefault(str(records), {}).update(measure_cases(cases, records))
+    _write_json(BASELINE_PATH, baseline)
+
+
+def regressions(measured, baseline, throughput_tolerance=THROUGHPUT_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    # Messages for every case slower or larger than its baseline allows
+    messages = []
+    for case, current in measured.items():
+        expected = baseline.get(case)
+        if expected is None:
+            continue
+        if current['relative_throughput'] < expected['relative_throughput'] * (1 - throughput_tolerance):
+            messages.append(f"{case}: throughput {current['relative_throughput']} is more than "
+                            f"{throughput_tolerance:.0%} below the baseline {expected['relative_throughput']}")
+        if current['peak_mb'] > expected['peak_mb'] * (1 + memory_tolerance):
+            messages.append(f"{case}: peak memory {current['peak_mb']} MB is more than {memory_tolerance:.0%} "
+                            f"above the baseline {expected['peak_mb']} MB")
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-output and performance regression checks for every parser.")
+    parser.add_argument("--update-golden", action="store_true", help="Record new golden outputs (intended changes only).")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help=f"Record the performance baseline for Python {python_version()} on this machine.")
+    parser.add_argument("--record-original", metavar="REVISION",
+                        help="Record the original MongoDB and MySQL parsers' output at this git revision (once).")
+    parser.add_argument("--cases", nargs="+", help="Only these cases (default: all).")
+    args = parser.parse_args()
+    if args.record_original:
+        record_original(args.record_original, [case for case in args.cases or ORIGINAL_ENTRY_POINTS
+                                               if case in ORIGINAL_ENTRY_POINTS])
+        print(f"Original outputs written to {ORIGINAL_DIR}")
+    if args.update_golden:
+        try:
+            update_golden(args.cases)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+        print(f"Golden outputs written to {GOLDEN_DIR}")
+    if args.update_baseline:
+        update_baseline(args.cases)
+        print(f"Performance baseline written to {BASELINE_PATH}")
+    if args.update_golden or args.update_baseline or args.record_original:
+        return 0
+    failed = False
+    for case, differences in check_goldens_against_originals(args.cases).items():
+        if differences:
+            print(f"{case:16} golden differs from the original parser's: {', '.join(d[0] for d in differences)}")
+            failed = True
+    for (case, mode), differences in check_outputs(args.cases).items():
+        print(f"{case:16} {mode:12} {'identical' if not differences else 'DIFFERS: ' + ', '.join(d[0] for d in differences)}")
+        failed = failed or bool(differences)
+    baseline = load_baseline()
+    if baseline is None:
+        print(f"No performance baseline for Python {python_version()}; record one with --update-baseline.")
+    else:
+        measured = measure_cases(args.cases)
+        for case, current in measured.items():
+            print(f"{case:16} {current['relative_throughput']:>8} x calibration  {current['peak_mb']:>8} MB peak "
+                  f"(baseline {baseline.get(case, {}).get('relative_throughput')}, {baseline.get(case, {}).get('peak_mb')} MB)")
+        for message in regressions(measured, baseline):
+            print(f"REGRESSION: {message}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
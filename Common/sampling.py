@@ -0,0 +1,223 @@
+import math
+import os
+import random
+
+from Common.aggregates import percentile
+from Common.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024 # 1 MiB
+DEFAULT_RESERVOIR_SIZE = 10000
+Z_95 = 1.96
+
+
+class SamplePlan:
+    """Which fixed-size byte blocks of a file are read in sampling mode.
+
+    The file is cut into ceil(size / block_size) blocks and a simple random sample of
+    them (without replacement) is read, in file order so seeks only move forward.
+    """
+
+    def __init__(self, path, fraction, block_size=DEFAULT_BLOCK_SIZE, seed=None):
+        if not 0 < fraction <= 1:
+            raise ValueError(f"Sample fraction must be in (0, 1], got {fraction}")
+        self.path = path
+        self.fraction = fraction
+        self.block_size = block_size
+        self.seed = seed
+        self.file_size = os.path.getsize(path)
+        self.total_blocks = max(1, math.ceil(self.file_size / block_size))
+        sampled = max(1, min(self.total_blocks, round(self.total_blocks * fraction)))
+        rng = random.Random(seed)
+        self.blocks = sorted(rng.sample(range(self.total_blocks), sampled))
+
+    def block_bytes(self, block_index):
+        return max(0, min(self.block_size, self.file_size - block_index * self.block_size))
+
+    def new_estimator(self):
+        return BlockCountEstimator(self.total_blocks, self.file_size)
+
+    @property
+    def sampled_blocks(self):
+        return len(self.blocks)
+
+    @property
+    def is_complete(self):
+        return self.sampled_blocks == self.total_blocks
+
+    def describe(self):
+        return {
+            'File': self.path,
+            'File Size (bytes)': self.file_size,
+            'Block Size (bytes)': self.block_size,
+            'Total Blocks': self.total_blocks,
+            'Sampled Blocks': self.sampled_blocks,
+            'Sampled Fraction': round(self.sampled_blocks / self.total_blocks, 6),
+            'Seed': self.seed,
+        }
+
+
+def iter_block_lines(f, start, end, is_record_start=None, offsets=False):
+    """Yields the decoded lines of every record that *starts* inside [start, end).
+
+    f is a binary file. A line belongs to the block its first byte falls in, so adjacent
+    blocks never share or lose a line; a record that starts in the block is read to its
+    end even if that crosses `end`. For multi-line formats, is_record_start(line) marks
+    the first line of a record and leading continuation lines are skipped. With offsets,
+    (byte offset, line) pairs are yielded instead.
+    """
+    if start > 0:
+        f.seek(start - 1)
+        f.readline() # finishes the line straddling the block boundary (or just its '\n')
+    else:
+        f.seek(0)
+    position = f.tell()
+    in_record = is_record_start is None
+    while True:
+        raw = f.readline()
+        if not raw:
+            return
+        line = raw.decode('utf-8', errors='replace')
+        starts_record = is_record_start is None or is_record_start(line)
+        if starts_record and position >= end:
+            return
+        if starts_record:
+            in_record = True
+        if in_record:
+            yield (position, line) if offsets else line
+        position += len(raw)
+
+
+def iter_sampled_blocks(plan, is_record_start=None):
+    # Yields (block_index, [lines]) for every block in the plan
+    with open(plan.path, 'rb') as f:
+        for block_index in plan.blocks:
+            start = block_index * plan.block_size
+            end = start + plan.block_size
+            yield block_index, list(iter_block_lines(f, start, end, is_record_start))
+
+
+class Reservoir:
+    # Algorithm R: a uniform random sample of at most `size` items from a stream of unknown length
+
+    def __init__(self, size=DEFAULT_RESERVOIR_SIZE, seed=None):
+        self.size = size
+        self.items = []
+        self.seen = 0
+        self._rng = random.Random(seed)
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            slot = self._rng.randrange(self.seen)
+            if slot < self.size:
+                self.items[slot] = item
+
+
+class BlockCountEstimator:
+    """Extrapolates per-key counts from sampled blocks (one-stage cluster sampling).
+
+    Uses a ratio estimator on bytes, so the short last block does not bias the result:
+    with per-block counts y_i and block sizes x_i, the rate R = sum(y) / sum(x) is scaled
+    to the file size X. The variance is estimated from the residuals d_i = y_i - R * x_i
+    as N^2 * (1 - n/N) * s_d^2 / n (blocks without the key count as 0). The lower bound
+    never goes below what was actually observed.
+    """
+
+    def __init__(self, total_blocks, total_bytes):
+        self.total_blocks = total_blocks
+        self.total_bytes = total_bytes
+        self.block_bytes = {} # block index -> bytes covered
+        self.counts = {} # key -> {block index: count}
+
+    def observe_block(self, block_index, key_counts, block_bytes):
+        self.block_bytes[block_index] = block_bytes
+        for key, n in key_counts.items():
+            per_block = self.counts.setdefault(key, {})
+            per_block[block_index] = per_block.get(block_index, 0) + n
+
+    def estimate(self, key, z=Z_95):
+        per_block = self.counts.get(key, {})
+        observed = sum(per_block.values())
+        n = len(self.block_bytes)
+        sampled_bytes = sum(self.block_bytes.values())
+        if n == 0 or sampled_bytes == 0:
+            return observed, float(observed), float(observed), float(observed)
+        N = self.total_blocks
+        rate = observed / sampled_bytes
+        estimate = rate * self.total_bytes
+        if n > 1:
+            residuals = [per_block.get(block, 0) - rate * size for block, size in self.block_bytes.items()]
+            variance = sum(d * d for d in residuals) / (n - 1)
+        else:
+            variance = observed ** 2 # a single block says nothing about spread; assume a coefficient of variation of 1
+        margin = z * N * math.sqrt(max(0.0, 1 - n / N) * variance / n)
+        return observed, estimate, max(float(observed), estimate - margin), estimate + margin
+
+
+def percentile_ci(sorted_values, q, z=Z_95):
+    """Distribution-free confidence interval for the q-th percentile (q in [0, 100]).
+
+    Uses the normal approximation to the binomial distribution of order statistics.
+    Sampled blocks are clusters of adjacent log lines, so the interval is optimistic
+    when latency is strongly correlated in time.
+    """
+    m = len(sorted_values)
+    if m == 0:
+        return None, None
+    p = q / 100.0
+    spread = z * math.sqrt(m * p * (1 - p))
+    lower_rank = max(1, math.floor(m * p - spread))
+    upper_rank = min(m, math.ceil(m * p + spread))
+    return sorted_values[lower_rank - 1], sorted_values[upper_rank - 1]
+
+
+def build_estimated_stats_df(state, estimator, pattern_column, q=95):
+    """Per-pattern table of extrapolated counts/totals and sample percentiles with 95% CIs.
+
+    state: {pattern: PatternStats} built from the sampled blocks only.
+    """
+    rows = []
+    for pattern, stats in state.items():
+        observed, estimate, low, high = estimator.estimate(pattern)
+        durations = sorted(stats.durations)
+        p_low, p_high = percentile_ci(durations, q)
+        scale = estimate / observed if observed else 0.0
+        rows.append({
+            pattern_column: pattern,
+            'Sampled Executions': observed,
+            'Estimated Executions': round(estimate),
+            'Executions CI Low (95%)': math.floor(low),
+            'Executions CI High (95%)': math.ceil(high),
+            'Estimated Total Duration(ms)': round(stats.total * scale, 2),
+            'Avg Duration(ms)': round(stats.mean, 2),
+            f'P{q} Duration(ms)': round(percentile(durations, q), 2),
+            f'P{q} CI Low (95%)': round(p_low, 2),
+            f'P{q} CI High (95%)': round(p_high, 2),
+            'Sample Full Query': stats.sample,
+        })
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df = df.sort_values(by=['Estimated Executions', 'Avg Duration(ms)'], ascending=[False, False])
+    return df
+
+
+def build_sampling_info_df(plan, reservoir, extra=None):
+    info = plan.describe()
+    info['Detailed Rows Seen In Sample'] = reservoir.seen
+    info['Detailed Rows Kept (Reservoir)'] = len(reservoir.items)
+    info.update(extra or {})
+    info['Note'] = ("Exact: every block was read." if plan.is_complete else
+                    "ESTIMATES: counts and totals are extrapolated from randomly sampled blocks; "
+                    "percentiles are computed from sampled rows. Intervals are approximate 95% confidence intervals.")
+    return pd.DataFrame({'Setting': list(info.keys()), 'Value': [str(value) for value in info.values()]})
+
+
+def estimate_banner(plan):
+    if plan.is_complete:
+        return "Sampling covered every block; results are exact."
+    return (f"ESTIMATED RESULTS: sampled {plan.sampled_blocks} of {plan.total_blocks} blocks "
+            f"({plan.sampled_blocks / plan.total_blocks:.2%} of the file). Counts are extrapolated with 95% confidence intervals.")
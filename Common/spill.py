@@ -0,0 +1,286 @@
+import heapq
+import os
+import pickle
+import sys
+import tempfile
+from bisect import bisect_right
+from collections import namedtuple
+from collections.abc import Mapping
+
+from Common.aggregates import PatternStats
+
+SPILL_BATCH = 10000 # rows or pattern states per pickled record of a spill file
+ROW_SHARE = 0.5 # part of the memory budget for detailed rows; the rest bounds the pattern table
+SIZE_PROBE = 32 # rows or states of each chunk measured to keep the average size estimates current
+STATE_OVERHEAD = 400 # bytes of a PatternStats, its durations array and its dict entry, besides texts and durations
+DURATION_BYTES = 8
+
+
+def row_bytes(row):
+    # Estimated memory of one detailed row; texts shared through a TextPool are counted per row (an overestimate)
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
+def state_bytes(key, stats):
+    # Estimated memory of one pattern table entry, without its durations; attribution keys are tuples of texts
+    key_bytes = sys.getsizeof(key) + (sum(sys.getsizeof(value) for value in key) if isinstance(key, tuple) else 0)
+    return STATE_OVERHEAD + key_bytes + sys.getsizeof(stats.sample) + 100 * len(stats.totals or ())
+
+
+def fingerprint_order(key):
+    return key
+
+
+def attribution_order(key):
+    # Attribution keys hold None for unset values, which does not compare with text: None sorts first
+    return tuple((value is not None, value or '') for value in key)
+
+
+# A sorted pattern table spilled to `path`; batch i starts at byte offsets[i] with the key that sorts as firsts[i]
+SpilledRun = namedtuple('SpilledRun', ['path', 'firsts', 'offsets'])
+
+
+def _dump_batches(f, items):
+    # Returns the file offset of every batch written
+    offsets = []
+    for start in range(0, len(items), SPILL_BATCH):
+        offsets.append(f.tell())
+        pickle.dump(items[start:start + SPILL_BATCH], f, protocol=pickle.HIGHEST_PROTOCOL)
+    return offsets
+
+
+def _load_batches(path):
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _average(current, samples, seen):
+    # Running average of `current` (over `seen` values so far) updated with the sizes in `samples`
+    if not samples:
+        return current, seen
+    return (current * seen + sum(samples)) / (seen + len(samples)), seen + len(samples)
+
+
+class SpilledRows:
+    """Detailed rows in file order: a spill file holding the earlier ones plus an in-memory buffer.
+
+    Rows arrive in file order, so every spill appends an already ordered run to the one file,
+    and reading the file back followed by the buffer is the merge. Supports what ParseResult
+    needs of its row list: extend, len, iteration and dropping buffered rows at the end.
+    """
+
+    __slots__ = ('directory', 'path', 'buffer', 'spilled')
+
+    def __init__(self, directory):
+        self.directory = directory # TemporaryDirectory, removed once no spill container refers to it
+        self.path = os.path.join(directory.name, 'rows.pkl')
+        self.buffer = []
+        self.spilled = 0
+
+    def __len__(self):
+        return self.spilled + len(self.buffer)
+
+    def extend(self, rows):
+        self.buffer.extend(rows)
+
+    def __delitem__(self, index):
+        # Only `del rows[n:]` with n past the spilled rows, as ParseResult.truncate_rows does
+        if not isinstance(index, slice) or index.stop is not None or (index.start or 0) < self.spilled:
+            raise ValueError("Only buffered rows at the end can be removed from spilled rows")
+        del self.buffer[index.start - self.spilled:]
+
+    def spill(self):
+        with open(self.path, 'ab') as f:
+            _dump_batches(f, self.buffer)
+        self.spilled += len(self.buffer)
+        self.buffer = []
+
+    def batches(self, limit=None):
+        # Lists of up to SPILL_BATCH rows in file order, at most `limit` rows in all
+        remaining = len(self) if limit is None else min(limit, len(self))
+        spilled = _load_batches(self.path) if self.spilled else ()
+        buffered = (self.buffer[start:start + SPILL_BATCH] for start in range(0, len(self.buffer), SPILL_BATCH))
+        for source in (spilled, buffered):
+            for batch in source:
+                if remaining <= 0:
+                    return
+                yield batch[:remaining]
+                remaining -= len(batch)
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+
+class SpilledPatterns(Mapping):
+    """Read-only {fingerprint: PatternStats} over runs spilled to disk plus the in-memory rest.
+
+    Each run is a pattern table sorted by fingerprint. Iteration k-way merges the runs
+    (heapq.merge) and merges the states of each fingerprint in run order, so every pattern
+    comes out once, in fingerprint order, with the state an in-memory merge would have
+    built, while only one batch per run is loaded. A lookup bisects each run's batch index
+    for the one batch that can hold the key and bisects that batch, keeping the last batch
+    read per run for the next lookup. `order` maps a key to what it sorts by
+    (attribution_order for ParseResult.attribution's tuple keys).
+    """
+
+    def __init__(self, directory, runs, memory, order=fingerprint_order):
+        self.directory = directory
+        self.runs = runs # SpilledRuns, oldest first
+        self.memory = memory # states merged since the last spill
+        self.order = order
+        self.length = None
+        self.loaded = {} # run path -> (batch number, batch, sort orders of its keys)
+
+    def _item_order(self, item):
+        return self.order(item[0])
+
+    def _run(self, run):
+        for batch in _load_batches(run.path):
+            yield from batch
+
+    def items(self):
+        sources = [self._run(run) for run in self.runs] + [iter(sorted(self.memory.items(), key=self._item_order))]
+        # Equal fingerprints come out in run order, the in-memory table last: its states are merged into
+        # freshly loaded ones and never merged into themselves, so iterating again gives the same result
+        merged = heapq.merge(*sources, key=self._item_order)
+        current_key, current = None, None
+        for key, stats in merged:
+            if current is not None and key == current_key:
+                current.merge(stats)
+                continue
+            if current is not None:
+                yield current_key, current
+            current_key, current = key, stats
+        if current is not None:
+            yield current_key, current
+
+    def values(self):
+        return (stats for _, stats in self.items())
+
+    def __iter__(self):
+        return (key for key, _ in self.items())
+
+    def __len__(self):
+        if self.length is None:
+            self.length = sum(1 for _ in self.items())
+        return self.length
+
+    def __bool__(self):
+        return bool(self.runs or self.memory)
+
+    def _batch(self, run, number):
+        loaded = self.loaded.get(run.path)
+        if loaded is None or loaded[0] != number:
+            with open(run.path, 'rb') as f:
+                f.seek(run.offsets[number])
+                batch = pickle.load(f)
+            loaded = self.loaded[run.path] = (number, batch, [self._item_order(item) for item in batch])
+        return loaded[1], loaded[2]
+
+    def _find(self, run, fingerprint, wanted):
+        number = bisect_right(run.firsts, wanted) - 1
+        if number < 0:
+            return None
+        batch, orders = self._batch(run, number)
+        position = bisect_right(orders, wanted) - 1
+        if position >= 0 and batch[position][0] == fingerprint:
+            return batch[position][1]
+        return None
+
+    def __getitem__(self, fingerprint):
+        wanted = self.order(fingerprint)
+        found = [stats for stats in (self._find(run, fingerprint, wanted) for run in self.runs) if stats is not None]
+        in_memory = self.memory.get(fingerprint)
+        if in_memory is not None:
+            found.append(in_memory)
+        if not found:
+            raise KeyError(fingerprint)
+        # Loaded batches are kept for later lookups, so the states are merged into a new one
+        merged = PatternStats(found[0].limit)
+        for stats in found:
+            merged.merge(stats)
+        return merged
+
+
+class MemoryBudget:
+    """Keeps the detailed rows and the pattern tables parse_file() builds within `max_mb` megabytes.
+
+    Sizes are estimated from a probe of every merged chunk. When the buffered rows outgrow
+    ROW_SHARE of the budget they are spilled to a temporary file, and when the pattern table
+    and the workload attribution table together outgrow the rest, each is spilled as a run
+    sorted by key and starts over. finish() hands the result a SpilledRows and SpilledPatterns
+    that merge it all back, so the output is the same as with everything in memory. Nothing is
+    written while the budget holds.
+    """
+
+    def __init__(self, max_mb, directory=None):
+        self.limit = max_mb * 1024 * 1024
+        self.temp = tempfile.TemporaryDirectory(prefix='sre-spill-', dir=directory)
+        self.rows = SpilledRows(self.temp)
+        self.runs = []
+        self.attribution_runs = []
+        self.row_size, self.rows_seen = 0.0, 0
+        self.state_size, self.states_seen = 0.0, 0
+        self.attribution_size, self.attribution_seen = 0.0, 0
+        self.durations = 0 # durations added to the pattern table since its last spill (an upper bound)
+
+    def observe(self, chunk_result):
+        # Updates the size estimates from a chunk result about to be merged
+        rows = chunk_result.rows
+        step = max(1, len(rows) // SIZE_PROBE)
+        self.row_size, self.rows_seen = _average(self.row_size, [row_bytes(row) for row in rows[::step]],
+                                                 self.rows_seen)
+        states = list(chunk_result.patterns.items())
+        step = max(1, len(states) // SIZE_PROBE)
+        self.state_size, self.states_seen = _average(self.state_size, [state_bytes(*item) for item in states[::step]],
+                                                     self.states_seen)
+        self.durations += sum(len(stats.durations) for _, stats in states)
+        states = list(chunk_result.attribution.items())
+        step = max(1, len(states) // SIZE_PROBE)
+        self.attribution_size, self.attribution_seen = _average(
+            self.attribution_size, [state_bytes(*item) for item in states[::step]], self.attribution_seen)
+
+    def _spill_table(self, runs, name, table, order):
+        path = os.path.join(self.temp.name, f'{name}-{len(runs)}.pkl')
+        items = sorted(table.items(), key=lambda item: order(item[0]))
+        with open(path, 'wb') as f:
+            offsets = _dump_batches(f, items)
+        runs.append(SpilledRun(path, [order(items[start][0]) for start in range(0, len(items), SPILL_BATCH)], offsets))
+
+    def relieve(self, result):
+        # Spills the rows and/or the pattern tables of `result` once they outgrow their share of the budget
+        if self.row_size * len(self.rows.buffer) > self.limit * ROW_SHARE:
+            self.rows.spill()
+        pattern_bytes = self.state_size * len(result.patterns) + DURATION_BYTES * self.durations
+        attribution_bytes = self.attribution_size * len(result.attribution)
+        if pattern_bytes + attribution_bytes > self.limit * (1 - ROW_SHARE):
+            if result.patterns:
+                self._spill_table(self.runs, 'patterns', result.patterns, fingerprint_order)
+                result.patterns = {}
+                self.durations = 0
+            if result.attribution:
+                self._spill_table(self.attribution_runs, 'attribution', result.attribution, attribution_order)
+                result.attribution = {}
+
+    @property
+    def spilled(self):
+        return bool(self.rows.spilled or self.runs or self.attribution_runs)
+
+    def finish(self, result):
+        # Gives `result` its spilled rows and patterns back; results that never spilled keep plain lists and dicts
+        if self.rows.spilled:
+            result.rows = self.rows
+        else:
+            result.rows = self.rows.buffer
+        if self.runs:
+            result.patterns = SpilledPatterns(self.temp, self.runs, result.patterns)
+        if self.attribution_runs:
+            result.attribution = SpilledPatterns(self.temp, self.attribution_runs, result.attribution,
+                                                 attribution_order)
+        if not self.spilled:
+            self.temp.cleanup()
@@ -0,0 +1,150 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from Common.lazy import lazy_import
+from Common.timeutil import parse_log_timestamp
+
+pd = lazy_import('pandas')
+duckdb = lazy_import('duckdb') # Optional (None when not installed): used when requested or for .duckdb store paths
+
+BACKENDS = ('auto', 'sqlite', 'duckdb')
+DEFAULT_BATCH_SIZE = 10000
+
+
+def sql_identifier(column):
+    # 'Duration(ms)' -> 'duration_ms', 'User@Host' -> 'user_host' so ad-hoc SQL needs no quoting
+    name = re.sub(r'[^0-9a-zA-Z]+', '_', column).strip('_').lower()
+    return name if name and not name[0].isdigit() else f"c_{name}"
+
+
+def resolve_backend(path, backend='auto'):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown store backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+    if backend == 'auto':
+        backend = 'duckdb' if path.endswith('.duckdb') and duckdb is not None else 'sqlite'
+    if backend == 'duckdb' and duckdb is None:
+        raise ValueError("The duckdb backend was requested but the duckdb package is not installed (pip install duckdb).")
+    return backend
+
+
+def _connect(path, backend):
+    if backend == 'duckdb':
+        return duckdb.connect(path)
+    return sqlite3.connect(path)
+
+
+def _sql_type(dtype, backend):
+    if dtype.kind in 'iub':
+        return 'BIGINT' if backend == 'duckdb' else 'INTEGER'
+    if dtype.kind == 'f':
+        return 'DOUBLE' if backend == 'duckdb' else 'REAL'
+    return 'TEXT'
+
+
+def _existing_columns(conn, table, backend):
+    if backend == 'duckdb':
+        rows = conn.execute("SELECT column_name FROM information_schema.columns WHERE table_name = ?", [table]).fetchall()
+        return {row[0] for row in rows}
+    return {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")').fetchall()}
+
+
+def _ensure_table(conn, table, df, backend):
+    # Creates the table on first use; later runs only add columns that are new (schema evolution across versions)
+    columns = {name: _sql_type(df[name].dtype, backend) for name in df.columns}
+    existing = _existing_columns(conn, table, backend)
+    if not existing:
+        column_sql = ", ".join(f'"{name}" {sql_type}' for name, sql_type in columns.items())
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({column_sql})')
+        return
+    for name, sql_type in columns.items():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{name}" {sql_type}')
+
+
+def _insert_batches(conn, table, df, batch_size, backend):
+    column_sql = ", ".join(f'"{name}"' for name in df.columns)
+    if backend == 'duckdb':
+        # DuckDB bulk-loads a registered DataFrame far faster than row-wise executemany
+        for start in range(0, len(df), batch_size):
+            conn.register('_store_batch', df.iloc[start:start + batch_size])
+            conn.execute(f'INSERT INTO "{table}" ({column_sql}) SELECT {column_sql} FROM _store_batch')
+            conn.unregister('_store_batch')
+        return
+    placeholders = ", ".join("?" for _ in df.columns)
+    statement = f'INSERT INTO "{table}" ({column_sql}) VALUES ({placeholders})'
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(statement, batch)
+            batch = []
+    if batch:
+        conn.executemany(statement, batch)
+
+
+def _next_run_id(conn):
+    conn.execute('CREATE TABLE IF NOT EXISTS "runs" (run_id INTEGER, tool TEXT, source TEXT, created_at TEXT, row_counts TEXT)')
+    return conn.execute('SELECT COALESCE(MAX(run_id), 0) + 1 FROM "runs"').fetchone()[0]
+
+
+def _iso(timestamp):
+    return timestamp.isoformat(sep=' ') if timestamp is not None else None
+
+
+def write_to_store(path, tool, source, tables, indexes=None, timestamp_columns=None, backend='auto',
+                   batch_size=DEFAULT_BATCH_SIZE):
+    """Appends one run's DataFrames to a local analytical database.
+
+    tables: {table name: DataFrame or iterable of DataFrames with the same columns, e.g.
+    spilled rows read back batch by batch, appended in order}; indexes: {table name: [column, ...]} using the original
+    DataFrame column names; timestamp_columns: {table name: column} whose values are parsed
+    into a sortable ISO 'event_time' column (indexed), so time ranges work across log formats.
+    Every row is tagged with a run_id recorded in the 'runs' table, so repeated runs append.
+    Returns (success, error message) like save_to_excel.
+    """
+    indexes = indexes or {}
+    timestamp_columns = timestamp_columns or {}
+    try:
+        backend = resolve_backend(path, backend)
+        conn = _connect(path, backend)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        return False, str(e)
+    try:
+        if backend == 'duckdb':
+            conn.begin()
+        run_id = _next_run_id(conn)
+        row_counts = []
+        for table, frames in tables.items():
+            count, index_columns = 0, None # None: no frame came, so there is no table to create or index
+            for position, df in enumerate([frames] if isinstance(frames, pd.DataFrame) else frames):
+                df = df.copy()
+                df.columns = [sql_identifier(column) for column in df.columns]
+                df.insert(0, 'run_id', run_id)
+                index_columns = [sql_identifier(column) for column in indexes.get(table, [])
+                                 if sql_identifier(column) in df.columns]
+                if table in timestamp_columns and sql_identifier(timestamp_columns[table]) in df.columns:
+                    raw_times = df[sql_identifier(timestamp_columns[table])]
+                    df['event_time'] = [_iso(parse_log_timestamp(value)) if isinstance(value, str) else None
+                                        for value in raw_times]
+                    index_columns.append('event_time')
+                if position == 0:
+                    _ensure_table(conn, table, df, backend)
+                if len(df):
+                    _insert_batches(conn, table, df, batch_size, backend)
+                count += len(df)
+            for column in ['run_id'] + index_columns if index_columns is not None else []:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{column}" ON "{table}" ("{column}")')
+            row_counts.append(f"{table}={count}")
+        conn.execute('INSERT INTO "runs" VALUES (?, ?, ?, ?, ?)',
+                     [run_id, tool, os.path.abspath(source) if source else '', datetime.now().isoformat(timespec='seconds'),
+                      ", ".join(row_counts)])
+        conn.commit()
+        return True, None
+    except Exception as e:
+        return False, str(e)
+    finally:
+        conn.close()
+
@@ -0,0 +1,92 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from Common.anomaly import AnomalyDetector, bucket_of
+from Common.engine import parse_records
+from Mongo.mongo_parser import MONGO
+from MySql.mysqlLogParser import MYSQL
+
+
+def _series(averages, executions=10, jitter=0.0, seed=1):
+    # {bucket: [executions, total ms]} with the given average latency per bucket
+    rng = random.Random(seed)
+    return {bucket: [executions, executions * (average + rng.uniform(-jitter, jitter))]
+            for bucket, average in enumerate(averages)}
+
+
+class TestAnomalyDetector(unittest.TestCase):
+
+    def test_latency_step_is_reported_with_onset_and_magnitude(self):
+        detector = AnomalyDetector(bucket_seconds=60)
+        detector.add_buckets({'q': _series([100] * 20 + [400] * 3 + [100] * 10, jitter=5)})
+        detector.finish()
+        [(pattern, onset, end, ongoing, buckets, executions, baseline, peak, magnitude, z, _)] = detector.rows()
+        self.assertEqual(pattern, 'q')
+        self.assertEqual(onset, datetime(1970, 1, 1, 0, 20))
+        self.assertEqual(end, datetime(1970, 1, 1, 0, 23))
+        self.assertFalse(ongoing)
+        self.assertEqual((buckets, executions), (3, 30))
+        self.assertAlmostEqual(magnitude, 4, delta=0.3)
+
+    def test_steady_pattern_and_sustained_regression(self):
+        detector = AnomalyDetector(bucket_seconds=60)
+        detector.add_buckets({'steady': _series([50] * 40, jitter=3), 'slow': _series([20] * 10 + [90] * 5)})
+        detector.finish()
+        rows = detector.rows()
+        self.assertEqual([row[0] for row in rows], ['slow'])
+        self.assertTrue(rows[0][3]) # still ongoing at the end of the log
+
+    def test_chunks_fed_in_order_match_one_pass(self):
+        series = _series([100] * 15 + [500] * 2 + [100] * 5, jitter=5)
+        one = AnomalyDetector()
+        one.add_buckets({'q': series})
+        chunked = AnomalyDetector()
+        # A bucket split across two chunks is merged before it is judged
+        first = {bucket: tally for bucket, tally in series.items() if bucket <= 16}
+        last = {bucket: tally for bucket, tally in series.items() if bucket >= 16}
+        first[16], last[16] = [5, series[16][1] / 2], [5, series[16][1] / 2]
+        chunked.add_buckets({'q': first})
+        chunked.add_buckets({'q': last})
+        self.assertEqual(one.finish().rows(), chunked.finish().rows())
+
+    def test_json_output(self):
+        detector = AnomalyDetector(bucket_seconds=60)
+        detector.add_buckets({'q': _series([100] * 10 + [1000])})
+        detector.finish()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'anomalies.json')
+            detector.write_json(path, 'kv.log')
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        self.assertEqual(data['source'], 'kv.log')
+        self.assertEqual(data['anomalies'][0]['onset'], '1970-01-01T00:10:00Z')
+        self.assertTrue(data['anomalies'][0]['ongoing'])
+
+    def test_parse_records_tallies_buckets(self):
+        start = datetime(2023, 10, 25, 10)
+        lines = [json.dumps({"t": {"$date": (start + timedelta(seconds=20 * i)).isoformat() + "Z"}, "s": "I",
+                             "msg": "Slow query", "attr": {"ns": "shop.orders", "command": {"find": "orders"},
+                                                           "durationMillis": i % 3 + 1}}) + "\n" for i in range(30)]
+        result = parse_records(MONGO, lines, bucket_seconds=60)
+        [series] = result.buckets.values()
+        first = bucket_of(start, 60)
+        self.assertEqual(sorted(series), list(range(first, first + 10)))
+        self.assertEqual(sum(count for count, _ in series.values()), 30)
+        self.assertEqual(series[first], [3, 6.0])
+
+    def test_frame_names_the_pattern_column_after_the_format(self):
+        detector = AnomalyDetector(bucket_seconds=60)
+        detector.add_buckets({'SELECT ?': _series([100] * 10 + [1000])})
+        detector.finish()
+        self.assertEqual(detector.to_frame().columns[0], 'Query Pattern')
+        frame = detector.to_frame(pattern_column=MYSQL.pattern_column)
+        self.assertEqual(frame.columns[0], 'Normalized_Query')
+        self.assertEqual(frame['Normalized_Query'].tolist(), ['SELECT ?'])
+
+
+if __name__ == '__main__':
+    unittest.main()
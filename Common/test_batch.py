@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import pandas as pd
+
+from Common.batch import (BatchJob, detect_log_format, read_manifest, collect_inputs, schedule, run_batch,
+                          estimate_memory_mb, JOURNAL_NAME, ROLLUP_NAME)
+
+MONGO_LINE = ('{"t":{"$date":"2023-10-25T10:00:00.000Z"},"s":"I","c":"COMMAND","id":51803,"ctx":"conn1",'
+              '"msg":"Slow query","attr":{"type":"command","ns":"testdb.orders","command":{"find":"orders",'
+              '"filter":{"name":"%s"}},"planSummary":"COLLSCAN","durationMillis":%d}}\n')
+MYSQL_LOG = """# Time: 231026 10:01:00
+# User@Host: user1[user1] @ 192.168.1.5 []
+# Query_time: 0.004500 Lock_time: 0.000050 Rows_sent: 5 Rows_examined: 100
+SET timestamp=1698300060;
+SELECT name FROM users WHERE id = 7;
+"""
+
+
+def _job(path, size):
+    return BatchJob(path, path, 'mongo', size, None, None, None, None)
+
+
+def _echo(job):
+    return {'path': job.path, 'size': job.size}
+
+
+def _echo_or_die(job):
+    if job.path == 'killed':
+        os._exit(9) # the worker disappears the way an OOM-killed one does
+    if job.path == 'slow':
+        time.sleep(0.5) # still running when the other worker dies
+    return _echo(job)
+
+
+def _crashed(job, exc):
+    return {'path': job.path, 'crashed': type(exc).__name__}
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.tmp.name, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_detect_log_format(self):
+        self.assertEqual(detect_log_format(['', MONGO_LINE % ('a', 150)]), 'mongo')
+        self.assertEqual(detect_log_format(MYSQL_LOG.splitlines()), 'mysql')
+        self.assertEqual(detect_log_format(['2024-01-15 10:00:00.123 UTC [123] LOG:  duration: 12.5 ms  statement: SELECT 1']),
+                         'postgres-stderr')
+        self.assertEqual(detect_log_format(['2024-01-15 10:00:00.123 UTC,"app","db",123,...']), 'postgres-csvlog')
+        self.assertEqual(detect_log_format(['{"timestamp":"2024-01-15","error_severity":"LOG"}']), 'postgres-jsonlog')
+        self.assertIsNone(detect_log_format(['just some text']))
+
+    def test_read_manifest(self):
+        manifest = self._write('fleet.txt', "# nightly\ndb01=logs/mongod.log\nlogs/slow.log mysql\n\n")
+        self.assertEqual(read_manifest(manifest), [
+            ('db01', os.path.join(self.tmp.name, 'logs/mongod.log'), None),
+            (None, os.path.join(self.tmp.name, 'logs/slow.log'), 'mysql'),
+        ])
+        bad = self._write('bad.txt', "db01=mongod.log oracle\n")
+        with self.assertRaises(ValueError):
+            read_manifest(bad)
+
+    def test_collect_inputs_skips_hidden_and_output(self):
+        self._write('logs/db01/mongod.log', '')
+        self._write('logs/.hidden.log', '')
+        self._write('logs/out/report.xlsx', '')
+        inputs = collect_inputs(os.path.join(self.tmp.name, 'logs'), exclude_dir=os.path.join(self.tmp.name, 'logs/out'))
+        self.assertEqual([host for host, _, _ in inputs], ['db01/mongod'])
+
+    def test_schedule_runs_largest_first(self):
+        jobs = [_job('small', 1), _job('large', 100), _job('medium', 10)]
+        self.assertEqual([r['path'] for r in schedule(jobs, _echo, max_workers=1)], ['large', 'medium', 'small'])
+
+    def test_schedule_respects_memory_budget(self):
+        jobs = [_job(str(i), 1024 * 1024 * (i + 1)) for i in range(4)]
+        budget = estimate_memory_mb(jobs[-1].size) # room for only one job at a time
+        results = list(schedule(jobs, _echo, max_workers=2, memory_budget_mb=budget))
+        self.assertEqual([r['path'] for r in results], ['3', '2', '1', '0'])
+
+    def test_schedule_continues_after_a_worker_dies(self):
+        jobs = [_job('killed', 100)] + [_job(f'small{i}', i) for i in range(4)]
+        results = {r['path']: r for r in schedule(jobs, _echo_or_die, max_workers=2, on_crash=_crashed)}
+        self.assertEqual(results['killed'], {'path': 'killed', 'crashed': 'BrokenProcessPool'})
+        self.assertEqual(len(results), 5)
+        # the jobs that were not running when the pool broke finish in a new one
+        self.assertEqual(results['small0'], {'path': 'small0', 'size': 0})
+
+    def test_only_the_job_that_kills_its_worker_is_reported_crashed(self):
+        jobs = [_job('killed', 100), _job('slow', 90)] # both start at once and share the pool that breaks
+        results = {r['path']: r for r in schedule(jobs, _echo_or_die, max_workers=2, on_crash=_crashed)}
+        self.assertEqual(results, {'killed': {'path': 'killed', 'crashed': 'BrokenProcessPool'},
+                                   'slow': {'path': 'slow', 'size': 90}})
+
+    def test_run_batch_writes_reports_rollup_and_resumes(self):
+        logs = os.path.join(self.tmp.name, 'logs')
+        out = os.path.join(self.tmp.name, 'out')
+        self._write('logs/db01/mongod.log', MONGO_LINE % ('a', 150) + MONGO_LINE % ('b', 50))
+        self._write('logs/db02/mongod.log', MONGO_LINE % ('c', 300))
+        self._write('logs/db03/slow.log', MYSQL_LOG)
+        self._write('logs/notes.txt', 'not a log\n')
+
+        summaries = run_batch(logs, out, jobs=1)
+        self.assertEqual(sorted((s['host'], s['format'], s['status']) for s in summaries), [
+            ('db01/mongod', 'mongo', 'done'), ('db02/mongod', 'mongo', 'done'), ('db03/slow', 'mysql', 'done')])
+        for name in ('db01_mongod.xlsx', 'db02_mongod.xlsx', 'db03_slow.xlsx', ROLLUP_NAME):
+            self.assertTrue(os.path.exists(os.path.join(out, name)), name)
+
+        fleet = pd.read_excel(os.path.join(out, ROLLUP_NAME), sheet_name='Fleet Query Stats')
+        mongo = fleet[fleet['Format'] == 'mongo'].iloc[0]
+        self.assertEqual(mongo['Hosts'], 2)
+        self.assertEqual(mongo['Executions'], 3)
+        self.assertEqual(mongo['Total Duration(ms)'], 500)
+        self.assertTrue(mongo['Top Hosts'].startswith('db02/mongod'))
+
+        # A second run only parses logs that changed since
+        self._write('logs/db02/mongod.log', MONGO_LINE % ('c', 300) + MONGO_LINE % ('d', 100))
+        summaries = run_batch(logs, out, jobs=1)
+        with open(os.path.join(out, JOURNAL_NAME), encoding='utf-8') as f:
+            journal = [json.loads(line) for line in f]
+        self.assertEqual(len(journal), 4)
+        self.assertEqual(journal[-1]['host'], 'db02/mongod')
+        self.assertEqual(len(summaries), 3)
+        hosts = pd.read_excel(os.path.join(out, ROLLUP_NAME), sheet_name='Hosts')
+        self.assertEqual(hosts.set_index('Host').loc['db02/mongod', 'Slow Queries'], 2)
+
+    def test_failed_log_is_retried(self):
+        logs = os.path.join(self.tmp.name, 'logs')
+        out = os.path.join(self.tmp.name, 'out')
+        self._write('logs/db01/mongod.log', MONGO_LINE % ('a', 150))
+        os.makedirs(os.path.join(out, 'db01_mongod.xlsx')) # a directory where the report goes makes saving fail
+        summaries = run_batch(logs, out, jobs=1)
+        self.assertEqual(summaries[0]['status'], 'failed')
+        os.rmdir(os.path.join(out, 'db01_mongod.xlsx'))
+        summaries = run_batch(logs, out, jobs=1)
+        self.assertEqual(summaries[0]['status'], 'done')
+
+
+if __name__ == '__main__':
+    unittest.main()
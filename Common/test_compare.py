@@ -0,0 +1,162 @@
+import unittest
+from datetime import datetime
+
+from Common.aggregates import PatternStats, PatternAccumulator, add_observation, group_percentiles, merge_states, percentile
+from Common.compare import compare_aggregates, aggregate_inputs
+from Common.timeutil import parse_log_timestamp, parse_input_spec, in_window
+
+
+def _state(observations):
+    state = {}
+    for fingerprint, duration in observations:
+        add_observation(state, fingerprint, duration, f"sample {fingerprint}")
+    return state
+
+
+def _fake_aggregate(path, since, until):
+    return _state([(path, 10)])
+
+
+class TestAggregates(unittest.TestCase):
+
+    def test_percentile_matches_linear_interpolation(self):
+        self.assertIsNone(percentile([], 95))
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertAlmostEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertAlmostEqual(percentile(list(range(1, 101)), 95), 95.05)
+
+    def test_merge_states(self):
+        left = _state([('a', 10), ('a', 30)])
+        right = _state([('a', 20), ('b', 5)])
+        merged = merge_states(left, right)
+        self.assertEqual(merged['a'].count, 3)
+        self.assertEqual(merged['a'].min, 10)
+        self.assertEqual(merged['a'].max, 30)
+        self.assertAlmostEqual(merged['a'].mean, 20)
+        self.assertEqual(merged['b'].count, 1)
+
+    def test_empty_pattern_stats(self):
+        stats = PatternStats()
+        self.assertEqual(stats.mean, 0.0)
+        self.assertIsNone(stats.percentile(95))
+
+    def test_limited_pattern_stats_keep_exact_totals(self):
+        state = {}
+        for i in range(1, 1001):
+            add_observation(state, 'q', float(i), limit=100)
+        other = PatternStats(limit=100)
+        for i in range(1001, 1501):
+            other.add(float(i))
+        stats = merge_states(state, {'q': other})['q']
+        self.assertEqual(len(stats.durations), 100)
+        self.assertEqual((stats.count, stats.total, stats.min, stats.max), (1500, sum(range(1, 1501)), 1.0, 1500.0))
+        self.assertTrue(all(1 <= d <= 1500 for d in stats.durations))
+
+    def test_accumulator_matches_per_observation_state(self):
+        observations = [('a', 10, 'first a', (5, None)), ('b', 7, '', (None, None)), ('a', 30, 'second a', (1, 2.5)),
+                        ('b', 3, 'late b', (4, None)), ('a', 20, '', (None, 0.5))]
+        expected = {}
+        for fingerprint, duration, sample, totals in observations:
+            add_observation(expected, fingerprint, duration, sample).add_totals(zip(('rows', 'lock'), totals))
+        for flush_size in (2, 100): # reductions over several flushes merge into the same state
+            accumulator = PatternAccumulator(('rows', 'lock'), flush_size=flush_size)
+            for observation in observations:
+                accumulator.add(*observation)
+            states = accumulator.to_states()
+            for fingerprint, stats in expected.items():
+                got = states[fingerprint]
+                self.assertEqual((got.count, got.total, got.min, got.max, got.sample, list(got.durations)),
+                                 (stats.count, stats.total, stats.min, stats.max, stats.sample, list(stats.durations)))
+                self.assertEqual(got.totals, stats.totals)
+                self.assertIsInstance(got.min, int) # whole-number durations stay ints
+        self.assertEqual(states['b'].totals, {'rows': 4})
+
+    def test_accumulator_limit_samples_durations(self):
+        accumulator = PatternAccumulator(limit=100)
+        for i in range(1, 1001):
+            accumulator.add('q', i + 0.5)
+        stats = accumulator.to_states()['q']
+        self.assertEqual(len(stats.durations), 100)
+        self.assertEqual((stats.count, stats.min, stats.max), (1000, 1.5, 1000.5))
+        self.assertEqual(len(set(stats.durations)), 100)
+
+    def test_group_percentiles_match_per_pattern_percentiles(self):
+        state = {}
+        for i in range(500):
+            add_observation(state, f'q{i % 7}', (i * 37) % 101 + 0.25)
+        state['single'], state['empty'] = PatternStats(), PatternStats()
+        state['single'].add(4.5)
+        for block_size in (1, 3, 100):
+            tails = group_percentiles(state, (0, 50, 95, 99.9, 100), block_size=block_size)
+            self.assertEqual(tails['empty'], [None] * 5)
+            for fingerprint, stats in state.items():
+                if stats.count:
+                    self.assertEqual(tails[fingerprint], [stats.percentile(q) for q in (0, 50, 95, 99.9, 100)])
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_compare_aggregates(self):
+        baseline = _state([('slower', 10), ('slower', 10), ('same', 5), ('gone', 50)])
+        target = _state([('slower', 100), ('slower', 100), ('same', 5), ('new', 1), ('new', 2)])
+        deltas_df, new_df, disappeared_df = compare_aggregates(baseline, target)
+
+        self.assertEqual(list(deltas_df['Query Pattern']), ['slower', 'same']) # ranked by impact
+        self.assertEqual(list(deltas_df['Change']), ['Regression', 'Unchanged'])
+        slower = deltas_df.iloc[0]
+        self.assertEqual(slower['Delta Total(ms)'], 180)
+        self.assertEqual(slower['Delta P95(ms)'], 90)
+        self.assertEqual(slower['Delta Executions'], 0)
+        self.assertEqual(list(new_df['Query Pattern']), ['new'])
+        self.assertEqual(new_df.iloc[0]['Executions'], 2)
+        self.assertEqual(list(disappeared_df['Query Pattern']), ['gone'])
+
+    def test_regressions_rank_before_improvements(self):
+        baseline = _state([('faster', 500), ('slower', 10), ('same', 5)])
+        target = _state([('faster', 100), ('slower', 60), ('same', 5)])
+        deltas_df, new_df, _ = compare_aggregates(baseline, target, pattern_column='Normalized_Query')
+        self.assertEqual(list(deltas_df['Normalized_Query']), ['slower', 'same', 'faster'])
+        self.assertEqual(list(deltas_df['Change']), ['Regression', 'Unchanged', 'Improvement'])
+        self.assertEqual(new_df.columns[0], 'Normalized_Query')
+
+    def test_compare_empty_states(self):
+        deltas_df, new_df, disappeared_df = compare_aggregates({}, {})
+        self.assertTrue(deltas_df.empty and new_df.empty and disappeared_df.empty)
+
+    def test_aggregate_inputs_parallel_and_serial(self):
+        inputs = [('a.log', None, None), ('b.log', None, None)]
+        for parallel in (True, False):
+            states = aggregate_inputs(_fake_aggregate, inputs, parallel=parallel)
+            self.assertEqual([list(state) for state in states], [['a.log'], ['b.log']])
+
+
+class TestTimeUtil(unittest.TestCase):
+
+    def test_parse_log_timestamp(self):
+        self.assertEqual(parse_log_timestamp('2023-10-25T10:00:00.000Z'), datetime(2023, 10, 25, 10))
+        self.assertEqual(parse_log_timestamp('2023-10-25T12:00:00.000+02:00'), datetime(2023, 10, 25, 10))
+        self.assertEqual(parse_log_timestamp('231026 10:01:00'), datetime(2023, 10, 26, 10, 1))
+        self.assertEqual(parse_log_timestamp('231026  9:01:00'), datetime(2023, 10, 26, 9, 1))
+        self.assertEqual(parse_log_timestamp('2023-10-26 10:00:00.123 UTC'), datetime(2023, 10, 26, 10, 0, 0, 123000))
+        self.assertEqual(parse_log_timestamp('2023-10-26 10:00:00 CEST'), datetime(2023, 10, 26, 10))
+        self.assertIsNone(parse_log_timestamp('not a time'))
+        self.assertIsNone(parse_log_timestamp(''))
+
+    def test_parse_input_spec(self):
+        self.assertEqual(parse_input_spec('mongod.log'), ('mongod.log', None, None))
+        self.assertEqual(parse_input_spec('mongod.log@2023-10-25T10:00..2023-10-25T11:00'),
+                         ('mongod.log', datetime(2023, 10, 25, 10), datetime(2023, 10, 25, 11)))
+        self.assertEqual(parse_input_spec('mongod.log@..2023-10-25'), ('mongod.log', None, datetime(2023, 10, 25)))
+        with self.assertRaises(ValueError):
+            parse_input_spec('mongod.log@yesterday..today')
+
+    def test_in_window(self):
+        ts = datetime(2023, 10, 25, 10, 30)
+        self.assertTrue(in_window(None, None, None))
+        self.assertFalse(in_window(None, ts, None))
+        self.assertTrue(in_window(ts, datetime(2023, 10, 25, 10), datetime(2023, 10, 25, 11)))
+        self.assertFalse(in_window(ts, datetime(2023, 10, 25, 11), None))
+
+
+if __name__ == '__main__':
+    unittest.main()
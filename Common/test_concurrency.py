@@ -0,0 +1,98 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Common.concurrency import sweep, find_pileups, analyze_concurrency, to_datetimes
+
+
+class TestConcurrency(unittest.TestCase):
+
+    def test_sweep_treats_intervals_as_half_open(self):
+        times, levels = sweep(np.array([0, 1, 2, 5]), np.array([5, 3, 4, 6]))
+        self.assertEqual(times.tolist(), [0, 1, 2, 3, 4, 5, 5, 6])
+        # the interval ending at 5 is gone before the one starting at 5 begins
+        self.assertEqual(levels.tolist(), [1, 2, 3, 2, 1, 0, 1, 0])
+
+    def test_sweep_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        starts = rng.integers(0, 1000, 500)
+        ends = starts + rng.integers(1, 50, 500)
+        times, levels = sweep(starts, ends)
+        for k in range(len(times) - 1):
+            if times[k] < times[k + 1]:
+                expected = int(((starts <= times[k]) & (ends > times[k])).sum())
+                self.assertEqual(levels[k], expected)
+
+    def test_find_pileups(self):
+        times, levels = sweep(np.array([0, 1, 2, 10, 10]), np.array([5, 3, 4, 11, 12]))
+        starts, ends, peaks = find_pileups(times, levels, 2)
+        self.assertEqual(list(zip(starts.tolist(), ends.tolist(), peaks.tolist())), [(1, 4, 3), (10, 11, 2)])
+        self.assertEqual(len(find_pileups(times, levels, 4)[2]), 0)
+
+    def test_to_datetimes_mixed_formats(self):
+        parsed = to_datetimes(np.array(['2023-10-26T10:00:00.500Z', '231026 10:00:01', 'garbage'], dtype=object))
+        self.assertEqual(parsed[0], datetime(2023, 10, 26, 10, 0, 0, 500000))
+        self.assertEqual(parsed[1], datetime(2023, 10, 26, 10, 0, 1))
+        self.assertTrue(pd.isna(parsed[2]))
+
+    def test_analyze_concurrency(self):
+        df = pd.DataFrame({
+            'Time': ['231026 10:00:05', '231026 10:00:05', '231026 10:00:06', '231026 10:00:20', 'not a time'],
+            'Duration': [3000.0, 1000.0, 2500.0, 100.0, 10.0],
+            'Pattern': ['a', 'b', 'a', 'c', 'd'],
+            'Lock': [1.0, 0.0, 0.5, 0.0, 0.0],
+        })
+        peaks_df, patterns_df = analyze_concurrency(df, 'Time', 'Duration', 'Pattern', 'Lock')
+        self.assertEqual(len(peaks_df), 1)
+        peak = peaks_df.iloc[0]
+        self.assertEqual((peak['Peak_Concurrent_Queries'], peak['Queries_Overlapping']), (3, 3))
+        self.assertEqual(peak['Window_Start'], pd.Timestamp('2023-10-26 10:00:03.500'))
+        self.assertEqual(peak['Window_End'], pd.Timestamp('2023-10-26 10:00:05'))
+        self.assertAlmostEqual(peak['Total_Lock_time'], 1.5)
+        self.assertEqual(peak['Running_Patterns'], '2x a | 1x b')
+        self.assertEqual(patterns_df['Pattern'].tolist(), ['a', 'b'])
+        self.assertEqual(patterns_df.iloc[0][['Pileups', 'Queries_In_Pileups', 'Highest_Peak']].tolist(), [1, 2, 3])
+
+    def test_pileup_patterns_count_every_window_not_only_the_listed_ones(self):
+        # Three separate pile-ups of two queries each; 'a' runs in all of them, 'b' and 'c' in one or two
+        df = pd.DataFrame({
+            'Time': ['2023-10-26T10:00:02Z', '2023-10-26T10:00:02Z', '2023-10-26T10:01:02Z', '2023-10-26T10:01:02Z',
+                     '2023-10-26T10:02:02Z', '2023-10-26T10:02:02Z'],
+            'Duration': [1000.0, 1000.0, 1000.0, 1000.0, 1000.0, 1000.0],
+            'Pattern': ['a', 'b', 'a', 'c', 'a', 'c'],
+            'Lock': [0.25, 0.0, 0.25, 0.5, 0.25, 0.5],
+        })
+        peaks_df, patterns_df = analyze_concurrency(df, 'Time', 'Duration', 'Pattern', 'Lock', top_n=1)
+        self.assertEqual(len(peaks_df), 1)
+        self.assertEqual(patterns_df.values.tolist(), [['a', 3, 3, 0.75, 2], ['c', 2, 2, 1.0, 2], ['b', 1, 1, 0.0, 2]])
+
+    def test_pileup_patterns_match_brute_force(self):
+        rng = np.random.default_rng(3)
+        ends = rng.integers(0, 2000, 300) * 10**8
+        df = pd.DataFrame({'Time': pd.to_datetime(ends).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                           'Duration': rng.integers(1, 30, 300) * 100.0, 'Pattern': rng.choice(list('abcdef'), 300)})
+        peaks_df, patterns_df = analyze_concurrency(df, 'Time', 'Duration', 'Pattern', threshold=4, top_n=10**6)
+        expected = {}
+        starts = ends - (df['Duration'].values * 1e6).astype(np.int64)
+        for start, end in zip(peaks_df['Window_Start'].values.astype(np.int64), peaks_df['Window_End'].values.astype(np.int64)):
+            overlapping = (starts < max(end, start + 1)) & (ends > start)
+            for pattern, count in df['Pattern'][overlapping].value_counts().items():
+                entry = expected.setdefault(pattern, [0, 0])
+                entry[0] += 1
+                entry[1] += int(count)
+        self.assertGreater(len(peaks_df), 1)
+        self.assertEqual({row[0]: [row[1], row[2]] for row in patterns_df.values.tolist()}, expected)
+
+    def test_analyze_concurrency_without_overlap(self):
+        df = pd.DataFrame({'Time': ['2023-10-26T10:00:01Z', '2023-10-26T10:00:03Z'], 'Duration': [500.0, 500.0],
+                           'Pattern': ['a', 'b']})
+        peaks_df, patterns_df = analyze_concurrency(df, 'Time', 'Duration', 'Pattern')
+        self.assertTrue(peaks_df.empty)
+        self.assertTrue(patterns_df.empty)
+        self.assertTrue(analyze_concurrency(df.iloc[:0], 'Time', 'Duration', 'Pattern')[0].empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from Common.aggregates import DEFAULT_PERCENTILE_SAMPLES
+from Common.engine import (LogFormat, RecordError, SLOW, ERROR, OTHER, parse_records, parse_file, aggregate_file,
+                           aggregator, build_sheets, sample_file, save_outputs)
+from Common.instrumentation import RunStats
+from Common.sampling import SamplePlan
+from Common.timeutil import parse_log_timestamp
+import pandas as pd
+
+
+class KeyValueFormat(LogFormat):
+    # Minimal plugin: "<time> SLOW <ms> <query>", "<time> ERROR <code>" or anything else
+    name = 'kv'
+    title = 'Key/Value'
+    detailed_columns = ['Time', 'Duration(ms)', 'Query', 'Pattern']
+    duration_column = 'Duration(ms)'
+    sample_column = 'Query'
+    pooled_columns = ('Query',)
+    slow_hint = ' SLOW '
+
+    def decode(self, record):
+        parts = record.rstrip('\n').split(' ', 3)
+        if len(parts) < 2:
+            raise RecordError("too few fields")
+        return parts
+
+    def classify(self, record, payload):
+        return {'SLOW': (SLOW,), 'ERROR': (ERROR,)}.get(payload[1], (OTHER,))
+
+    def slow_row(self, payload, result):
+        return [payload[0], float(payload[2]), payload[3]]
+
+    def fingerprint(self, row):
+        return ''.join('?' if c.isdigit() else c for c in row[2])
+
+    def timestamp(self, payload):
+        return parse_log_timestamp(payload[0])
+
+    def error_entry(self, record, payload):
+        return payload[2], (payload[2],)
+
+    def build_sheets(self, result, detailed_df):
+        return {'Detailed': detailed_df,
+                'Errors': pd.DataFrame([[key, s.count, s.first_record] for key, s in result.errors.items()],
+                                       columns=['Code', 'Count', 'First Record'])}
+
+    def error_frame(self, errors, include_location=True):
+        return pd.DataFrame([[key] for key in errors], columns=['Code'])
+
+
+KV = KeyValueFormat()
+
+
+class TestEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = []
+        for i in range(200):
+            self.lines.append(f"2023-10-25T10:{i % 60:02d}:00 SLOW {i % 7 + 1} select {i % 3}\n")
+            if i % 10 == 0:
+                self.lines.append(f"2023-10-25T10:{i % 60:02d}:00 ERROR E{i % 20}\n")
+            if i % 25 == 0:
+                self.lines.append("garbage\n")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'kv.log')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(self.lines)
+
+    def test_parse_records_runs_every_stage(self):
+        stats = RunStats('kv')
+        result = parse_records(KV, self.lines, run_stats=stats)
+        self.assertEqual(len(result.rows), 200)
+        self.assertEqual(result.rows[0], ['2023-10-25T10:00:00', 1.0, 'select 0', 'select ?'])
+        self.assertEqual(result.patterns['select ?'].count, 200)
+        self.assertEqual(result.errors['E0'].count, 10)
+        self.assertEqual(result.errors['E0'].first_record, 2)
+        self.assertEqual(result.failures, 8)
+        self.assertEqual(result.issue_messages(KV)[0], "Record 3: too few fields. Skipped.")
+        self.assertEqual(stats.counters['slow_queries'], 200)
+        self.assertEqual(stats.counters['lines_read'], len(self.lines))
+
+    def test_chunked_parallel_parse_matches_serial_pass(self):
+        serial = parse_records(KV, self.lines)
+        chunked = parse_file(KV, self.path, jobs=2, chunk_size=500)
+        self.assertEqual(chunked.rows, serial.rows)
+        self.assertEqual(chunked.issues, serial.issues)
+        self.assertEqual({key: (s.count, s.first_record) for key, s in chunked.errors.items()},
+                         {key: (s.count, s.first_record) for key, s in serial.errors.items()})
+        self.assertEqual(chunked.records, serial.records)
+        self.assertEqual(list(chunked.patterns['select ?'].durations), list(serial.patterns['select ?'].durations))
+
+    def test_aggregate_file_respects_time_window(self):
+        state = aggregate_file(KV, self.path, since=datetime(2023, 10, 25, 10, 0), until=datetime(2023, 10, 25, 10, 9))
+        self.assertEqual(state['select ?'].count, sum(1 for i in range(200) if i % 60 < 10))
+        self.assertEqual(aggregate_file(KV, self.path, since=datetime(2023, 10, 25, 10, 0), byte_range=(0, 0)), {})
+
+    def test_aggregate_file_bounds_durations(self):
+        self.assertEqual(aggregator(KV).keywords['max_samples'], DEFAULT_PERCENTILE_SAMPLES)
+        state = aggregate_file(KV, self.path, max_samples=5)
+        self.assertEqual(state['select ?'].count, 200)
+        self.assertEqual(len(state['select ?'].durations), 5)
+
+    def test_sample_and_sinks_work_for_any_format(self):
+        plan = SamplePlan(self.path, 1.0, block_size=256, seed=1)
+        plan, sheets = sample_file(KV, self.path, 1.0, reservoir_size=10, seed=1, plan=plan)
+        self.assertEqual(list(sheets), ['Detailed Metrics (Sample)', 'Query Stats (Estimated)', 'Error Stats (Estimated)',
+                                        'Sampling Info'])
+        self.assertEqual(sheets['Query Stats (Estimated)'].iloc[0]['Estimated Executions'], 200)
+
+        result_sheets = build_sheets(KV, parse_file(KV, self.path))
+        output = os.path.join(self.tmp.name, 'kv.xlsx')
+        self.assertEqual(save_outputs(KV, result_sheets, output=output), [(output, True, None)])
+
+
+    def test_repeated_text_is_stored_once(self):
+        result = parse_records(KV, self.lines)
+        for rows in (result.rows, parse_file(KV, self.path, jobs=2, chunk_size=500).rows): # also across chunks
+            self.assertEqual(len({id(row[2]) for row in rows}), 3) # select 0/1/2
+            self.assertEqual(len({id(row[3]) for row in rows}), 1)
+            self.assertEqual(len({id(row[0]) for row in rows}), 200) # Time is not pooled
+
+
+if __name__ == '__main__':
+    unittest.main()
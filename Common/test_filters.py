@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from Common import engine
+from Common.engine import parse_file, find_window
+from Common.filters import RecordFilter
+from Common.instrumentation import RunStats, BYTES
+from Mongo.mongo_parser import MONGO
+from MySql.mysqlLogParser import MYSQL
+
+START = datetime(2023, 10, 25)
+
+
+def _mongo_line(i):
+    timestamp = (START + timedelta(seconds=10 * i)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    return json.dumps({"t": {"$date": timestamp}, "s": "I", "c": "COMMAND", "id": 51803, "ctx": "conn1",
+                       "msg": "Slow query", "attr": {"ns": f"shop.{('orders', 'users', 'carts')[i % 3]}",
+                                                     "command": {"find": "x", "filter": {"n": i}},
+                                                     "durationMillis": i % 400}}) + "\n"
+
+
+class TestRecordFilter(unittest.TestCase):
+
+    def test_raw_check_only_rejects_records_that_cannot_match(self):
+        record_filter = RecordFilter(collections=['orders'], min_duration=100)
+        raw_check, row_check = record_filter.raw_check(MONGO), record_filter.row_check(MONGO)
+        for i in range(30):
+            line = _mongo_line(i)
+            if not raw_check(line):
+                self.assertFalse(row_check(MONGO.slow_row(MONGO.decode(line), None)))
+        self.assertTrue(raw_check(_mongo_line(300)))
+        self.assertFalse(raw_check(_mongo_line(301))) # users
+        self.assertFalse(raw_check(_mongo_line(3))) # 3 ms
+
+    def test_mysql_user_and_duration_in_seconds(self):
+        entry = ("# Time: 231026 10:01:00\n# User@Host: app[app] @ 10.0.0.5 []\n"
+                 "# Query_time: 0.250000 Lock_time: 0.000050 Rows_sent: 5 Rows_examined: 100\nSELECT 1;\n")
+        self.assertTrue(RecordFilter(users=['app'], min_duration=250).raw_check(MYSQL)(entry))
+        self.assertFalse(RecordFilter(min_duration=251).raw_check(MYSQL)(entry))
+        row = MYSQL.slow_row(MYSQL.decode(entry), None)
+        self.assertTrue(RecordFilter(users=['app']).row_check(MYSQL)(row))
+        self.assertFalse(RecordFilter(users=['ap']).row_check(MYSQL)(row))
+
+    def test_unsupported_filter(self):
+        with self.assertRaises(ValueError):
+            RecordFilter(collections=['orders']).check_format(MYSQL)
+
+
+class TestWindowPushdown(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'mongod.log')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(_mongo_line(i) for i in range(5000))
+        patcher = mock.patch.object(engine, 'SEEK_GRANULARITY', 4096)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_find_window_covers_the_window(self):
+        since, until = datetime(2023, 10, 25, 6), datetime(2023, 10, 25, 6, 30)
+        start, end = find_window(MONGO, self.path, since, until)
+        self.assertLess(end - start, os.path.getsize(self.path) / 10)
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            text = f.read(end - start).decode()
+        self.assertIn('"2023-10-25T06:00:00.000Z"', text)
+        self.assertIn('"2023-10-25T06:30:00.000Z"', text)
+
+    def test_filtered_parse_matches_full_parse(self):
+        since, until = datetime(2023, 10, 25, 6), datetime(2023, 10, 25, 6, 30)
+        record_filter = RecordFilter(since, until, collections=['orders', 'carts'], min_duration=50)
+        stats = RunStats()
+        result = parse_file(MONGO, self.path, record_filter=record_filter, run_stats=stats, chunk_size=16 * 1024)
+        expected = [row for row in parse_file(MONGO, self.path).rows
+                    if since <= MONGO.timestamp({'t': {'$date': row[11]}}) <= until
+                    and row[1] in ('orders', 'carts') and row[4] >= 50]
+        self.assertEqual([row[11] for row in result.rows], [row[11] for row in expected])
+        self.assertEqual(sum(s.count for s in result.patterns.values()), len(expected))
+        self.assertLess(stats.counters[BYTES], os.path.getsize(self.path) / 10)
+
+    def test_window_outside_the_file(self):
+        result = parse_file(MONGO, self.path, record_filter=RecordFilter(since=datetime(2024, 1, 1)))
+        self.assertEqual(result.rows, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
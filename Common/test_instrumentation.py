@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from Common.instrumentation import RunStats, LINES_READ, BYTES
+
+
+class TestRunStats(unittest.TestCase):
+
+    def test_stage_and_counters(self):
+        stats = RunStats("test")
+        with stats.stage('work'):
+            time.sleep(0.01)
+        stats.add_time('work', 0.5)
+        stats.count(LINES_READ, 10)
+        stats.count(LINES_READ)
+        stats.count(BYTES, 2048)
+        stats.finish()
+
+        summary = stats.summary()
+        self.assertGreaterEqual(summary['stages_s']['work'], 0.51)
+        self.assertEqual(summary['counters'][LINES_READ], 11)
+        self.assertIn('lines_per_s', summary)
+        self.assertIn('work', stats.format_summary())
+
+    def test_profiling_captures_profile_and_memory(self):
+        stats = RunStats("test")
+        stats.start_profiling()
+        sorted([str(i) for i in range(1000)])
+        stats.stop_profiling()
+        self.assertTrue(stats.profile_text)
+        self.assertIsNotNone(stats.peak_memory_bytes)
+        # Stopping twice is a no-op
+        stats.stop_profiling()
+
+    def test_write_json(self):
+        stats = RunStats("test")
+        stats.count(LINES_READ, 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'stats.json')
+            stats.write_json(path)
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+        self.assertEqual(payload['name'], 'test')
+        self.assertEqual(payload['counters'][LINES_READ], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
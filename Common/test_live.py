@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import unittest
+
+from Common.engine import parse_records
+from Common.live import LogTail
+from Mongo.mongo_parser import MONGO
+from MySql.mysqlLogParser import MYSQL
+
+
+def _slow(i):
+    return json.dumps({"t": {"$date": f"2023-10-25T10:{i // 30:02d}:{i * 2 % 60:02d}.000Z"}, "s": "I",
+                       "msg": "Slow query", "attr": {"ns": "shop.orders", "durationMillis": 100 + i % 5,
+                                                     "command": {"find": "orders", "filter": {f"f{i % 3}": i}}}},
+                      separators=(",", ":")) + "\n"
+
+
+def _error(i):
+    return json.dumps({"t": {"$date": f"2023-10-25T10:{i // 30:02d}:{i * 2 % 60:02d}.000Z"}, "s": "E",
+                       "msg": "Write error", "attr": {"error": {"codeName": "DuplicateKey", "errmsg": "E11000"}}},
+                      separators=(",", ":")) + "\n"
+
+
+def _mysql(i):
+    return (f"# Time: 231026 10:00:{i:02d}\n# User@Host: app[app] @ 10.0.0.5 []\n"
+            f"# Query_time: 0.{i + 1:06d} Lock_time: 0.000050 Rows_sent: 1 Rows_examined: 10\n"
+            f"SELECT * FROM t{i % 2} WHERE id = {i};\n")
+
+
+class TestLogTail(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'app.log')
+        open(self.path, 'w').close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _append(self, text):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_polls_add_up_to_one_pass(self):
+        lines = [_error(i) if i % 10 == 9 else _slow(i) for i in range(120)]
+        tail = LogTail(MONGO, self.path)
+        self._append(''.join(lines[:50]) + lines[50][:30]) # the writer is in the middle of a line
+        self.assertEqual(tail.poll(), sum(len(line) for line in lines[:50]))
+        self._append(lines[50][30:] + ''.join(lines[51:]))
+        while tail.poll(max_bytes=4096):
+            pass
+        expected = parse_records(MONGO, lines)
+        self.assertEqual({key: stats.count for key, stats in tail.result.patterns.items()},
+                         {key: stats.count for key, stats in expected.patterns.items()})
+        self.assertEqual((tail.result.records, tail.result.error_records), (120, 12))
+        self.assertAlmostEqual(tail.error_rate, 0.1)
+        timeline = tail.timeline_frame()
+        self.assertEqual(list(timeline['Slow Queries']), [27, 27, 27, 27])
+        self.assertEqual(list(timeline['Errors']), [3, 3, 3, 3])
+        self.assertEqual(tail.top_patterns(limit=2)['Executions'].sum(), 72)
+        self.assertEqual(tail.lag, 0)
+
+    def test_multi_line_record_is_held_back_until_the_next_starts(self):
+        tail = LogTail(MYSQL, self.path)
+        self._append(_mysql(0) + _mysql(1))
+        tail.poll()
+        self.assertEqual(tail.slow_queries, 1) # entry 1 may still be getting lines
+        self._append(_mysql(2))
+        tail.poll()
+        self.assertEqual(tail.slow_queries, 2)
+        tail.poll(final=True) # the writer is done: the last entry is complete
+        self.assertEqual(tail.slow_queries, 3)
+
+    def test_from_end_and_rotation(self):
+        self._append(''.join(_slow(i) for i in range(10)) + _slow(10)[:20])
+        tail = LogTail(MONGO, self.path, from_end=True)
+        self._append(_slow(10)[20:] + _slow(11))
+        tail.poll()
+        self.assertEqual((tail.slow_queries, tail.result.failures), (1, 0)) # the cut line is skipped
+        with open(self.path, 'w', encoding='utf-8') as f: # rotated: a new, shorter file
+            f.write(_slow(12))
+        tail.poll()
+        self.assertEqual((tail.slow_queries, tail.rotations), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
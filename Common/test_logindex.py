@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from Common.cli import window_byte_range
+from Common.engine import parse_file, aggregate_file
+from Common.logindex import build_index, load_index, index_path, format_summary
+from MySql.mysqlLogParser import MYSQL
+
+
+def _entry(i):
+    return (f"# Time: 231026 10:{i // 60:02d}:{i % 60:02d}\n# User@Host: app[app] @ 10.0.0.5 []\n"
+            f"# Query_time: {i % 5 + 1}.000000 Lock_time: 0.000050 Rows_sent: 5 Rows_examined: 100\n"
+            f"SET timestamp=1698300060;\nSELECT * FROM t WHERE id = {i};\n")
+
+
+class TestLogIndex(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'mysql-slow.log')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write("/usr/sbin/mysqld, Version: 8.0.32 started with:\n")
+            f.writelines(_entry(i) for i in range(1000))
+
+    def test_build_and_load(self):
+        index = build_index(MYSQL, self.path, every=100, jobs=2, chunk_size=20000)
+        self.assertTrue(os.path.exists(index_path(self.path)))
+        self.assertEqual(sum(index.records), 1000)
+        self.assertEqual(sum(index.slow), 1000)
+        self.assertAlmostEqual(sum(index.slow_ms), sum((i % 5 + 1) * 1000 for i in range(1000)))
+        self.assertTrue(all(count <= 100 for count in index.records))
+        self.assertEqual(index.first_times[0], datetime(2023, 10, 26, 10, 0, 0))
+
+        loaded = load_index(MYSQL, self.path)
+        self.assertEqual(loaded.offsets, index.offsets)
+        self.assertEqual(loaded.last_times, index.last_times)
+        self.assertEqual(len(index.summary(rows=4)), 4)
+        self.assertIn('Slow Total(ms)', format_summary(loaded))
+
+    def test_changed_log_invalidates_index(self):
+        build_index(MYSQL, self.path, every=100)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(_entry(1000))
+        self.assertIsNone(load_index(MYSQL, self.path))
+
+    def test_block_and_window_ranges_hold_their_records(self):
+        index = build_index(MYSQL, self.path, every=100)
+        start, end = index.block_range(2, 3)
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            text = f.read(end - start).decode()
+        self.assertEqual(text.count('# Time: '), sum(index.records[2:4]))
+        self.assertTrue(text.startswith('# Time: '))
+
+        since, until = datetime(2023, 10, 26, 10, 5), datetime(2023, 10, 26, 10, 6)
+        result = parse_file(MYSQL, self.path, byte_range=index.window(since, until))
+        times = {row[0] for row in result.rows}
+        self.assertIn('231026 10:05:00', times)
+        self.assertIn('231026 10:06:00', times)
+        self.assertLessEqual(len(result.rows), 200)
+        self.assertEqual(index.window(datetime(2024, 1, 1)), (0, 0))
+        with self.assertRaises(ValueError):
+            index.block_range(5, 50)
+
+    def test_compare_window_reads_only_the_indexed_blocks(self):
+        since, until = datetime(2023, 10, 26, 10, 5), datetime(2023, 10, 26, 10, 6)
+        self.assertIsNone(window_byte_range(MYSQL, self.path, since, until))
+        index = build_index(MYSQL, self.path, every=100)
+        byte_range = window_byte_range(MYSQL, self.path, since, until)
+        self.assertEqual(byte_range, index.window(since, until))
+        self.assertIsNone(window_byte_range(MYSQL, self.path, None, None))
+
+        windowed = aggregate_file(MYSQL, self.path, since, until, byte_range)
+        scanned = aggregate_file(MYSQL, self.path, since, until, (0, os.path.getsize(self.path)))
+        self.assertEqual(sum(s.count for s in windowed.values()), 61)
+        self.assertEqual({key: s.count for key, s in windowed.items()}, {key: s.count for key, s in scanned.items()})
+
+
+if __name__ == '__main__':
+    unittest.main()
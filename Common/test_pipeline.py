@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+from Common.engine import DETAILED_SHEET, build_sheets, parse_file, save_outputs
+from Common.pipeline import PipelinedReport
+from Common.test_spill import _slow
+from Mongo.mongo_parser import MONGO
+
+
+class TestPipelinedReport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'mongod.log')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(_slow(i) + "\n" for i in range(500))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_same_workbook_as_sequential_save(self):
+        sequential, pipelined = (os.path.join(self.tmp.name, name) for name in ('seq.xlsx', 'pipe.xlsx'))
+        sheets = build_sheets(MONGO, parse_file(MONGO, self.path, chunk_size=8192))
+        sheets['Timeline'] = pd.DataFrame({'Time': [datetime(2023, 10, 25, 10, 5), None], 'Avg': [1.5, float('nan')]})
+        save_outputs(MONGO, sheets, output=sequential)
+
+        report = PipelinedReport(pipelined, DETAILED_SHEET, MONGO.detailed_columns)
+        result = parse_file(MONGO, self.path, chunk_size=8192, row_sink=report.add_rows)
+        sheets = build_sheets(MONGO, result)
+        sheets['Timeline'] = pd.DataFrame({'Time': [datetime(2023, 10, 25, 10, 5), None], 'Avg': [1.5, float('nan')]})
+        self.assertEqual(save_outputs(MONGO, sheets, output=pipelined, report=report), [(pipelined, True, None)])
+
+        expected, actual = pd.read_excel(sequential, sheet_name=None), pd.read_excel(pipelined, sheet_name=None)
+        self.assertEqual(list(actual), list(expected))
+        for name, df in expected.items():
+            pd.testing.assert_frame_equal(actual[name], df)
+        self.assertEqual(len(actual[DETAILED_SHEET]), 500)
+
+    def test_row_limit_hidden_columns_and_errors(self):
+        path = os.path.join(self.tmp.name, 'small.xlsx')
+        report = PipelinedReport(path, 'Rows', ['A', 'B', 'C'], max_rows=3)
+        report.add_rows([[1, 'x', 2.0], [2, 'y', float('inf')]])
+        report.add_rows([[3, 'z', 1.0], [4, 'w', 1.0]])
+        report.close({'Rows': pd.DataFrame(columns=['A', 'C'])})
+        self.assertEqual(report.wait(), (True, None))
+        sheet = openpyxl.load_workbook(path)['Rows']
+        self.assertEqual([[cell.value for cell in row] for row in sheet.iter_rows()],
+                         [['A', 'B', 'C'], [1, 'x', 2], [2, 'y', None], [3, 'z', 1]])
+        self.assertTrue(sheet.column_dimensions['B'].hidden)
+
+        report = PipelinedReport(os.path.join(self.tmp.name, 'missing', 'r.xlsx'), 'Rows', ['A'])
+        report.add_rows([[1]])
+        report.close({})
+        success, error = report.wait()
+        self.assertFalse(success)
+        self.assertTrue(error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import unittest
+
+from Common.engine import parse_records
+from Common.redaction import Redactor, parse_rule
+from Mongo.mongo_parser import MONGO, output_columns
+from MySql.mysqlLogParser import MYSQL
+
+COMMAND, FILTER, REMOTE = (output_columns.index(column) for column in ('Command', 'Filter', 'Remote'))
+
+
+def _line(entry):
+    return json.dumps(entry, separators=(',', ':')) + "\n"
+
+
+FIND = _line({"t": {"$date": "2023-10-25T10:00:00.000Z"}, "s": "I", "msg": "Slow query",
+              "attr": {"ns": "shop.users", "remote": "10.0.0.7:5512", "durationMillis": 120,
+                       "command": {"find": "users", "filter": {"email": "a@b.com", "tags": {"$in": [1, 2, 3]}}}}})
+AGGREGATE = _line({"t": {"$date": "2023-10-25T10:00:01.000Z"}, "s": "I", "msg": "Slow query",
+                   "attr": {"ns": "shop.orders", "durationMillis": 300,
+                            "command": {"aggregate": "orders", "pipeline": [
+                                {"$match": {"customer": "C42"}},
+                                {"$lookup": {"from": "items", "localField": "i", "foreignField": "_id", "as": "x"}}]}}})
+DUPLICATE_KEY = _line({"t": {"$date": "2023-10-25T10:00:02.000Z"}, "s": "E", "msg": "Write error",
+                       "attr": {"error": {"codeName": "DuplicateKey",
+                                          "errmsg": 'E11000 dup key: { email: "a@b.com" }'}}})
+MYSQL_ENTRY = ("# Time: 231026 10:00:00\n# User@Host: app[app] @ 10.0.0.5 []\n"
+               "# Query_time: 1.000000 Lock_time: 0.000050 Rows_sent: 1 Rows_examined: 10\n"
+               "SELECT * FROM users WHERE email = 'a@b.com' AND id = 5;\n")
+
+
+class TestRedaction(unittest.TestCase):
+
+    def test_mask_keeps_only_shapes(self):
+        lines = [FIND, AGGREGATE, DUPLICATE_KEY, '{"t":{"$date":"2023-10-25T10:00:03Z"},"msg":"Connection accepted"}\n']
+        plain = parse_records(MONGO, lines)
+        result = parse_records(MONGO, lines, redactor=Redactor())
+        text = json.dumps([result.rows, [(s.fields, s.sample) for s in result.errors.values()],
+                           [stats.sample for stats in result.patterns.values()]])
+        for literal in ('a@b.com', 'C42', '[1, 2, 3]'):
+            self.assertNotIn(literal, text)
+        self.assertEqual(json.loads(result.rows[0][COMMAND]),
+                         {"find": "users", "filter": {"email": "?", "tags": {"$in": ["?"]}}})
+        self.assertEqual(json.loads(result.rows[1][FILTER]), {"customer": "?"})
+        self.assertEqual(result.rows[1][-2], plain.rows[1][-2]) # same Pipeline Id
+        self.assertEqual(result.other_lines, [])
+
+    def test_hash_tags_shapes_with_salted_digests(self):
+        rows = parse_records(MONGO, [FIND, FIND], redactor=Redactor('hash', salt='s1')).rows
+        command = json.loads(rows[0][COMMAND])
+        self.assertEqual(command['filter'], {"email": "?", "tags": {"$in": ["?"]}})
+        self.assertEqual(rows[0][COMMAND], rows[1][COMMAND])
+        salted = parse_records(MONGO, [FIND], redactor=Redactor('hash', salt='s2')).rows
+        self.assertNotEqual(json.loads(salted[0][COMMAND])['$sha256'], command['$sha256'])
+
+        [row] = parse_records(MYSQL, [MYSQL_ENTRY], redactor=Redactor('hash')).rows
+        self.assertRegex(row[-2], r"^SELECT \* FROM USERS WHERE EMAIL = \? AND ID = \?; /\* sha256:[0-9a-f]{16} \*/$")
+
+    def test_rules_override_the_mode_per_column(self):
+        [row] = parse_records(MONGO, [FIND], redactor=Redactor('remove', {'Filter': 'keep', 'Remote': 'mask'})).rows
+        self.assertEqual(row[COMMAND], '')
+        self.assertIn('a@b.com', row[FILTER])
+        self.assertEqual(row[REMOTE], '<redacted>')
+        self.assertEqual(parse_rule('Remote=hash'), ('Remote', 'hash'))
+        with self.assertRaises(ValueError):
+            parse_rule('Remote=blur')
+        with self.assertRaises(ValueError):
+            Redactor(rules={'Collection': 'mask'}).check_format(MYSQL)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import copy
+import os
+import unittest
+
+from Common.regression import (MODES, ORIGINAL_ENTRY_POINTS, QUICK_RECORDS, QUICK_THROUGHPUT_TOLERANCE, _cases,
+                               check_goldens_against_originals, check_outputs, load_baseline, load_golden,
+                               load_original, measure_cases, original_differences, python_version, regressions)
+
+
+class TestGoldenOutputs(unittest.TestCase):
+
+    def test_every_mode_matches_the_golden_output(self):
+        for (case, mode), differences in check_outputs().items():
+            with self.subTest(case=case, mode=mode):
+                self.assertEqual([what for what, _, _ in differences], [])
+
+    def test_all_cases_and_modes_are_covered(self):
+        self.assertEqual(len(check_outputs(cases=['postgres_json'])), len(MODES))
+        self.assertEqual(set(_cases()), {'mongo', 'mysql', 'postgres_stderr', 'postgres_csv', 'postgres_json'})
+
+
+class TestOriginalOutputs(unittest.TestCase):
+
+    def test_goldens_differ_from_the_original_parsers_only_as_intended(self):
+        for case, differences in check_goldens_against_originals().items():
+            with self.subTest(case=case):
+                self.assertEqual([what for what, _, _ in differences], [])
+
+    def test_originals_were_recorded_from_the_same_revision(self):
+        revisions = {load_original(case)['revision'] for case in ORIGINAL_ENTRY_POINTS}
+        self.assertEqual(len(revisions), 1)
+        self.assertIsNone(load_original('postgres_csv'))
+
+    def test_unlisted_and_stale_differences_are_reported(self):
+        golden = load_golden('mongo')
+        changed = copy.deepcopy(golden)
+        query_stats = changed['sheets']['Query Stats']
+        query_stats['rows'][0][query_stats['columns'].index('Executions')] += 1
+        self.assertEqual([what for what, _, _ in original_differences('mongo', changed)],
+                         ['sheet Query Stats column Executions'])
+
+        original = load_original('mongo')
+        changed = copy.deepcopy(golden)
+        changed['warnings'] = original['warnings'] # no longer differs, so its INTENDED_CHANGES entry is stale
+        self.assertEqual([what for what, _, _ in original_differences('mongo', changed)],
+                         ["INTENDED_CHANGES lists all of warnings, which did not change"])
+
+
+class TestPerformanceBaseline(unittest.TestCase):
+
+    def test_regressions_beyond_the_tolerance(self):
+        baseline = {'mongo': {'relative_throughput': 1.0, 'peak_mb': 10.0}}
+        self.assertEqual(regressions({'mongo': {'relative_throughput': 0.8, 'peak_mb': 12.0}}, baseline), [])
+        messages = regressions({'mongo': {'relative_throughput': 0.6, 'peak_mb': 13.0}, 'mysql': {}}, baseline)
+        self.assertEqual(len(messages), 2)
+        self.assertIn('throughput 0.6', messages[0])
+        self.assertIn('peak memory 13.0 MB', messages[1])
+
+    def test_no_gross_regression_on_small_logs(self):
+        baseline = load_baseline(QUICK_RECORDS)
+        if baseline is None:
+            self.skipTest(f"no performance baseline for Python {python_version()}")
+        measured = measure_cases(records=QUICK_RECORDS)
+        self.assertEqual(regressions(measured, baseline, throughput_tolerance=QUICK_THROUGHPUT_TOLERANCE), [])
+
+    @unittest.skipUnless(os.environ.get('SRE_PERF_CHECK'), "timing check; set SRE_PERF_CHECK=1 to run it")
+    def test_no_regression_against_the_stored_baseline(self):
+        baseline = load_baseline()
+        if baseline is None:
+            self.skipTest(f"no performance baseline for Python {python_version()}")
+        self.assertEqual(regressions(measure_cases(), baseline), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+
+from Common.engine import parse_records, parse_file, ISSUE_SAMPLE_SIZE
+from Mongo.mongo_parser import MongoFormat, MONGO
+
+
+def _slow(i):
+    return json.dumps({"t": {"$date": f"2023-10-25T10:00:{i % 60:02d}.000Z"}, "s": "I", "msg": "Slow query",
+                       "attr": {"ns": "shop.orders", "command": {"find": "orders", "filter": {"id": i}},
+                                "durationMillis": 100 + i}}, separators=(",", ":"))
+
+
+class ListingFormat(MongoFormat):
+    # Reports every failed line on its own, as formats without counted issue kinds do
+    count_failures = False
+
+    def failure_message(self, exc):
+        return "Invalid JSON. Skipped."
+
+
+LISTING = ListingFormat()
+
+
+class TestResilientParsing(unittest.TestCase):
+
+    def test_damaged_lines_are_recovered(self):
+        lines = ["﻿" + _slow(0) + "\n",
+                 _slow(1)[:40] + _slow(2) + "\n", # truncated record with the next one glued on
+                 _slow(3) + _slow(4) + "\n", # two whole records on one line
+                 "\x00\x00\x00\n"]
+        result = parse_records(MONGO, lines)
+        self.assertEqual(len(result.rows), 4) # 0, 2, 3 and 4
+        self.assertEqual(result.records, 4) # pieces keep the number of the line they came from
+        self.assertEqual(result.failures, 2) # the truncated head and the NUL padding
+        self.assertEqual(result.issue_counts['split_records'], [2, 2, [2, 3]]) # the BOM is only stripped, not counted
+        self.assertEqual(result.issue_counts['invalid_json'], [2, 2, [2, 4]])
+        self.assertEqual(result.issues, [])
+
+    def test_invalid_lines_are_counted_with_a_few_examples_across_chunks(self):
+        lines = [_slow(i) + "\n" if i % 2 else "{not json\n" for i in range(600)]
+        serial = parse_records(MONGO, lines)
+        self.assertEqual(serial.issue_counts, {'invalid_json': [300, 1, [1, 3, 5, 7, 9]]})
+        self.assertEqual(serial.issue_messages(MONGO),
+                         ["Skipped 300 lines that are not valid JSON (lines 1, 3, 5, 7, 9, ...)."])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mongod.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            chunked = parse_file(MONGO, path, jobs=2, chunk_size=4096)
+        self.assertEqual(chunked.issue_counts, serial.issue_counts)
+
+    def test_a_single_invalid_line_is_reported_in_the_singular(self):
+        result = parse_records(MONGO, [_slow(0) + "\n", "{not json\n"])
+        self.assertEqual(result.issue_messages(MONGO), ["Skipped 1 line that is not valid JSON (line 2)."])
+
+    def test_issue_list_is_capped_across_chunks(self):
+        lines = [_slow(i) + "\n" if i % 2 else "{not json\n" for i in range(600)]
+        serial = parse_records(LISTING, lines)
+        self.assertEqual(len(serial.issues), ISSUE_SAMPLE_SIZE)
+        self.assertEqual(serial.issue_counts['more_issues'][0], 300 - ISSUE_SAMPLE_SIZE)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mongod.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            chunked = parse_file(LISTING, path, jobs=2, chunk_size=4096)
+        self.assertEqual(chunked.issues, serial.issues)
+        self.assertEqual(chunked.issue_counts, serial.issue_counts)
+        self.assertEqual(chunked.issue_messages(LISTING), serial.issue_messages(LISTING))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+from Common.sampling import (SamplePlan, Reservoir, BlockCountEstimator, iter_block_lines, iter_sampled_blocks,
+                             percentile_ci)
+
+
+class TestSampling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'test.log')
+        self.lines = [f"# Time: {i}\n" if i % 3 == 0 else f"line {i} " + "x" * (i % 17) + "\n" for i in range(300)]
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(self.lines)
+
+    def _read_all_blocks(self, block_size, is_record_start=None):
+        plan = SamplePlan(self.path, 1.0, block_size=block_size, seed=1)
+        return [line for _, lines in iter_sampled_blocks(plan, is_record_start) for line in lines]
+
+    def test_blocks_partition_lines_exactly_once(self):
+        for block_size in (7, 64, 100, 4096):
+            self.assertEqual(self._read_all_blocks(block_size), self.lines)
+
+    def test_blocks_partition_multi_line_records(self):
+        is_record_start = lambda line: line.startswith('# Time: ')
+        for block_size in (7, 64, 100, 4096):
+            self.assertEqual(self._read_all_blocks(block_size, is_record_start), self.lines)
+
+    def test_block_starting_mid_line_skips_partial_line(self):
+        with open(self.path, 'rb') as f:
+            lines = list(iter_block_lines(f, 3, 20))
+            pairs = list(iter_block_lines(f, 3, 20, offsets=True))
+        self.assertEqual(lines[0], self.lines[1])
+        self.assertEqual([line for _, line in pairs], lines)
+        self.assertEqual(pairs[0][0], len(self.lines[0].encode('utf-8')))
+
+    def test_plan_is_reproducible(self):
+        first = SamplePlan(self.path, 0.25, block_size=64, seed=7)
+        second = SamplePlan(self.path, 0.25, block_size=64, seed=7)
+        self.assertEqual(first.blocks, second.blocks)
+        self.assertFalse(first.is_complete)
+        self.assertEqual(first.blocks, sorted(first.blocks))
+        with self.assertRaises(ValueError):
+            SamplePlan(self.path, 0)
+
+    def test_reservoir_keeps_bounded_uniform_sample(self):
+        reservoir = Reservoir(10, seed=3)
+        for i in range(1000):
+            reservoir.add(i)
+        self.assertEqual(len(reservoir.items), 10)
+        self.assertEqual(reservoir.seen, 1000)
+        self.assertTrue(any(item >= 10 for item in reservoir.items))
+
+    def test_estimator_is_exact_when_every_block_is_read(self):
+        estimator = BlockCountEstimator(total_blocks=2, total_bytes=150)
+        estimator.observe_block(0, {'a': 10, 'b': 1}, 100)
+        estimator.observe_block(1, {'a': 5}, 50)
+        self.assertEqual(estimator.estimate('a'), (15, 15.0, 15.0, 15.0))
+        self.assertEqual(estimator.estimate('b')[1], 1.0)
+
+    def test_estimator_extrapolates_with_interval(self):
+        estimator = BlockCountEstimator(total_blocks=10, total_bytes=1000)
+        estimator.observe_block(0, {'a': 8}, 100)
+        estimator.observe_block(5, {'a': 12}, 100)
+        observed, estimate, low, high = estimator.estimate('a')
+        self.assertEqual(observed, 20)
+        self.assertAlmostEqual(estimate, 100.0)
+        self.assertTrue(observed <= low < estimate < high)
+
+    def test_percentile_ci(self):
+        values = list(range(1, 1001))
+        low, high = percentile_ci(values, 95)
+        self.assertTrue(low < 950 < high)
+        self.assertEqual(percentile_ci([], 95), (None, None))
+        self.assertEqual(percentile_ci([5], 95), (5, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from Common.aggregates import PatternStats
+from Common.engine import parse_file
+from Common import spill
+from Common.spill import MemoryBudget, SpilledPatterns, SpilledRows
+from Mongo.mongo_parser import MONGO
+
+
+def _slow(i):
+    return json.dumps({"t": {"$date": f"2023-10-25T10:{i // 60 % 60:02d}:{i % 60:02d}.000Z"}, "s": "I",
+                       "msg": "Slow query", "attr": {"ns": f"shop.c{i % 40}", "command": {"find": f"c{i % 40}",
+                                                                                            "filter": {f"f{i % 40}": i}},
+                                                     "durationMillis": 100 + i % 7}}, separators=(",", ":"))
+
+
+def _state(*durations, sample=''):
+    stats = PatternStats()
+    for duration in durations:
+        stats.add(duration, sample)
+    return stats
+
+
+def _summary(patterns):
+    return {key: (s.count, s.total, s.min, s.max, s.sample, sorted(s.durations)) for key, s in patterns.items()}
+
+
+class TestSpill(unittest.TestCase):
+
+    def test_spilled_rows_keep_file_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            budget = MemoryBudget(1, tmp)
+            rows = budget.rows
+            rows.extend([[i] for i in range(5)])
+            rows.spill()
+            rows.extend([[i] for i in range(5, 12)])
+            rows.spill()
+            rows.extend([[i] for i in range(12, 15)])
+            del rows[14:]
+            self.assertEqual(len(rows), 14)
+            self.assertEqual([row[0] for row in rows], list(range(14)))
+            self.assertEqual([row[0] for batch in rows.batches(limit=7) for row in batch], list(range(7)))
+            with self.assertRaises(ValueError):
+                del rows[3:]
+
+    def test_pattern_runs_merge_like_one_table(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            budget = MemoryBudget(1, tmp)
+            budget.limit, budget.state_size = 0, 1 # every relieve() spills the pattern table
+            result = type('Result', (), {})()
+            result.patterns, result.attribution = {'b': _state(1, sample='b1'), 'a': _state(2)}, {}
+            budget.relieve(result)
+            result.patterns = {'a': _state(3, sample='a2'), 'c': _state(4)}
+            budget.relieve(result)
+            result.patterns = {'b': _state(5, sample='b3')}
+            budget.finish(result)
+            patterns = result.patterns
+            self.assertIsInstance(patterns, SpilledPatterns)
+            self.assertEqual(list(patterns), ['a', 'b', 'c'])
+            for _ in range(2): # iterating again reads the runs afresh
+                self.assertEqual(_summary(patterns), {'a': (2, 5.0, 2, 3, 'a2', [2.0, 3.0]),
+                                                      'b': (2, 6.0, 1, 5, 'b1', [1.0, 5.0]),
+                                                      'c': (1, 4.0, 4, 4, '', [4.0])})
+            self.assertEqual(patterns['c'].count, 1)
+            self.assertNotIn('d', patterns)
+
+    def test_lookups_seek_to_one_batch_per_run(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(spill, 'SPILL_BATCH', 3):
+            budget = MemoryBudget(1, tmp)
+            budget.limit, budget.state_size = 0, 1
+            result = type('Result', (), {})()
+            result.patterns, result.attribution = {f'k{i:02d}': _state(i) for i in range(0, 40, 2)}, {}
+            budget.relieve(result)
+            result.patterns = {f'k{i:02d}': _state(i + 100) for i in range(0, 40, 3)}
+            budget.relieve(result)
+            result.patterns = {'k05': _state(7), 'k06': _state(1)}
+            budget.finish(result)
+            patterns = result.patterns
+            expected = _summary(patterns)
+            with mock.patch.object(SpilledPatterns, 'items', side_effect=AssertionError("lookup scanned the runs")):
+                for key in reversed(sorted(expected)):
+                    self.assertEqual(_summary({key: patterns[key]}), {key: expected[key]})
+                self.assertEqual(patterns['k06'].count, 3) # kept batches are not merged into twice
+                for key in ('k01', 'k99', 'a'):
+                    self.assertNotIn(key, patterns)
+
+    def test_attribution_runs_merge_keys_with_unset_values(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            budget = MemoryBudget(1, tmp)
+            budget.limit, budget.attribution_size = 0, 1 # every relieve() spills the attribution table
+            result = type('Result', (), {})()
+            result.patterns = {}
+            result.attribution = {('app', 'shop', 'q1'): _state(1), ('app', None, 'q1'): _state(2)}
+            budget.relieve(result)
+            self.assertEqual(result.attribution, {})
+            result.attribution = {('app', None, 'q1'): _state(3), ('bob', 'crm', 'q2'): _state(4)}
+            budget.relieve(result)
+            result.attribution = {('app', 'shop', 'q1'): _state(5)}
+            budget.finish(result)
+            attribution = result.attribution
+            self.assertIsInstance(attribution, SpilledPatterns)
+            self.assertEqual(list(attribution), [('app', None, 'q1'), ('app', 'shop', 'q1'), ('bob', 'crm', 'q2')])
+            self.assertEqual(_summary(attribution)[('app', None, 'q1')][:2], (2, 5.0))
+            self.assertEqual(attribution[('app', 'shop', 'q1')].total, 6.0)
+            self.assertNotIn(('app', None, 'q9'), attribution)
+
+    def test_budgeted_parse_matches_in_memory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mongod.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(_slow(i) + "\n" for i in range(2000))
+            plain = parse_file(MONGO, path, chunk_size=16 * 1024)
+            spilled = parse_file(MONGO, path, chunk_size=16 * 1024, max_memory=0.02, spill_dir=tmp)
+            self.assertIsInstance(spilled.rows, SpilledRows)
+            self.assertIsInstance(spilled.patterns, SpilledPatterns)
+            self.assertEqual(list(spilled.rows), plain.rows)
+            self.assertEqual(_summary(spilled.patterns), _summary(plain.patterns))
+            unbounded = parse_file(MONGO, path, chunk_size=16 * 1024, max_memory=1024)
+            self.assertEqual(unbounded.rows, plain.rows) # nothing spilled: plain list and dict
+            self.assertIsInstance(unbounded.patterns, dict)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from Common.lazy import lazy_import
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ['Mongo/mongo_parser.py', 'MySql/mysqlLogParser.py', 'PostgreSql/postgresLogParser.py']
+HEAVY_MODULES = ('pandas', 'numpy', 'streamlit', 'duckdb', 'xlsxwriter')
+# Generous ceiling for `--help` (~0.1s here); eager pandas + streamlit imports alone take several times that
+STARTUP_BUDGET_S = 1.5
+
+
+def _startup(script):
+    # (wall seconds, top-level modules imported) for `python <script> --help` in a fresh interpreter
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(REPO_ROOT, script), '--help'],
+                               capture_output=True, text=True, cwd=REPO_ROOT)
+    elapsed = time.perf_counter() - start
+    modules = {line.rsplit('|', 1)[-1].strip().split('.')[0] for line in completed.stderr.splitlines()
+               if line.startswith('import time:') and '|' in line}
+    return completed, elapsed, modules
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_cli_help_skips_heavy_imports(self):
+        for script in SCRIPTS:
+            with self.subTest(script=script):
+                completed, elapsed, modules = _startup(script)
+                self.assertEqual(completed.returncode, 0, completed.stderr[-500:])
+                self.assertIn('usage:', completed.stdout)
+                self.assertEqual(modules & set(HEAVY_MODULES), set())
+                self.assertLess(elapsed, STARTUP_BUDGET_S)
+
+    def test_lazy_import(self):
+        self.assertIsNone(lazy_import('no_such_module_here'))
+        json_module = lazy_import('json')
+        self.assertEqual(json_module.loads('[1]'), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
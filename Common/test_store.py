@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import pandas as pd
+
+from Common.store import write_to_store, sql_identifier, resolve_backend, duckdb
+
+
+def _detailed(durations):
+    return pd.DataFrame({
+        'Query Pattern': ['{"find":<value>}'] * len(durations),
+        'Collection': ['orders'] * len(durations),
+        'Duration(ms)': durations,
+        'timestamp': ['2023-10-25T14:0%d:00.000Z' % i for i in range(len(durations))],
+    })
+
+
+class TestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write(self, path, detailed, backend='auto', batch_size=2):
+        return write_to_store(path, 'test', 'mongod.log', {'slow_queries': detailed, 'query_stats': pd.DataFrame()},
+                              indexes={'slow_queries': ['Query Pattern', 'Collection', 'Duration(ms)']},
+                              timestamp_columns={'slow_queries': 'timestamp'}, backend=backend, batch_size=batch_size)
+
+    def test_sql_identifier(self):
+        self.assertEqual(sql_identifier('Duration(ms)'), 'duration_ms')
+        self.assertEqual(sql_identifier('User@Host'), 'user_host')
+        self.assertEqual(sql_identifier('Query_time (ms)'), 'query_time_ms')
+
+    def test_sqlite_appends_runs_with_indexes(self):
+        path = os.path.join(self.tmp.name, 'report.db')
+        self.assertEqual(self._write(path, _detailed([100, 200, 300])), (True, None))
+        detailed = _detailed([400])
+        detailed['Node'] = ['rs0-a'] # new column in a later run is added to the existing table
+        self.assertEqual(self._write(path, detailed), (True, None))
+
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute('SELECT run_id, COUNT(*) FROM slow_queries GROUP BY run_id').fetchall(), [(1, 3), (2, 1)])
+        self.assertEqual([row[0] for row in conn.execute('SELECT run_id FROM runs').fetchall()], [1, 2])
+        rows = conn.execute("SELECT duration_ms, node FROM slow_queries "
+                            "WHERE event_time BETWEEN '2023-10-25 14:01:00' AND '2023-10-25 14:05:00' ORDER BY duration_ms").fetchall()
+        self.assertEqual(rows, [(200, None), (300, None)])
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for column in ('query_pattern', 'collection', 'duration_ms', 'event_time', 'run_id'):
+            self.assertIn(f'idx_slow_queries_{column}', indexes)
+
+    def test_table_without_any_frame_is_skipped(self):
+        path = os.path.join(self.tmp.name, 'report.db')
+        self.assertEqual(self._write(path, iter([])), (True, None)) # e.g. no spilled rows to read back
+        self.assertEqual(self._write(path, iter([_detailed([100])])), (True, None))
+        self.assertEqual(self._write(path, iter([])), (True, None)) # the table exists now and is left as is
+
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute('SELECT run_id, COUNT(*) FROM slow_queries GROUP BY run_id').fetchall(), [(2, 1)])
+        self.assertEqual([row[0] for row in conn.execute('SELECT row_counts FROM runs ORDER BY run_id')],
+                         ['slow_queries=0, query_stats=0', 'slow_queries=1, query_stats=0',
+                          'slow_queries=0, query_stats=0'])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            resolve_backend('x.db', 'postgres')
+
+    @unittest.skipUnless(duckdb is not None, "duckdb is not installed")
+    def test_duckdb_backend(self):
+        path = os.path.join(self.tmp.name, 'report.duckdb')
+        self.assertEqual(resolve_backend(path), 'duckdb')
+        self.assertEqual(self._write(path, _detailed([100, 200, 300])), (True, None))
+        self.assertEqual(self._write(path, _detailed([400])), (True, None))
+        conn = duckdb.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute('SELECT COUNT(*), MAX(run_id) FROM slow_queries').fetchone(), (4, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import re
+from datetime import datetime, timezone
+
+# MySQL < 5.7 slow logs: "# Time: 231026 10:00:00" (hour may be space padded, e.g. "231026  9:05:00")
+_MYSQL_LEGACY_TIME = re.compile(r'^(\d{2})(\d{2})(\d{2})\s+(\d{1,2}):(\d{2}):(\d{2})$')
+# PostgreSQL %t/%m prefixes and csvlog: "2023-10-26 10:00:00.123 UTC" (zone abbreviation after the time)
+_ZONE_ABBREVIATION = re.compile(r'^(.*\d)\s+([A-Za-z]{2,5})$')
+_UTC_ABBREVIATIONS = {'UTC', 'GMT', 'Z'}
+
+
+def parse_log_timestamp(text):
+    """Parses the timestamp formats found in MongoDB and MySQL logs into a naive UTC datetime.
+
+    Accepts ISO-8601 (with or without offset / trailing 'Z', date-only too), the legacy
+    MySQL "YYMMDD H:MM:SS" form and PostgreSQL's "... UTC" zone abbreviations (UTC/GMT are
+    converted; other abbreviations are ambiguous, so the local time is kept as is).
+    Returns None when the text is empty or unrecognised.
+    """
+    if not text:
+        return None
+    text = text.strip()
+    legacy = _MYSQL_LEGACY_TIME.match(text)
+    if legacy:
+        yy, mm, dd, hh, mi, ss = (int(part) for part in legacy.groups())
+        return datetime(2000 + yy, mm, dd, hh, mi, ss)
+    zone = _ZONE_ABBREVIATION.match(text)
+    if zone:
+        text = zone.group(1) + ('+00:00' if zone.group(2).upper() in _UTC_ABBREVIATIONS else '')
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_input_spec(spec):
+    """Splits a "FILE[@SINCE..UNTIL]" input spec into (path, since, until).
+
+    Either bound may be omitted ("mongod.log@..2023-10-25T11:00" or "mongod.log@2023-10-25T10:00..").
+    Raises ValueError for bounds that are not parseable timestamps.
+    """
+    path, sep, window = spec.rpartition('@')
+    if not sep or '..' not in window:
+        return spec, None, None
+    since_text, _, until_text = window.partition('..')
+    since = parse_log_timestamp(since_text) if since_text else None
+    until = parse_log_timestamp(until_text) if until_text else None
+    if (since_text and since is None) or (until_text and until is None):
+        raise ValueError(f"Invalid time range in input spec '{spec}'")
+    return path, since, until
+
+
+def in_window(timestamp, since, until):
+    # Entries without a usable timestamp are only kept when no window is requested
+    if since is None and until is None:
+        return True
+    if timestamp is None:
+        return False
+    if since is not None and timestamp < since:
+        return False
+    if until is not None and timestamp > until:
+        return False
+    return True
@@ -0,0 +1,164 @@
+from io import BytesIO, StringIO
+
+import os
+
+from Common.engine import parse_records, parse_file, build_sheets
+from Common.excel import save_sheets_to_excel
+from Common.instrumentation import RunStats, render_streamlit_sidebar, BYTES
+from Common.live import LogTail
+from Common.logindex import build_index, load_index
+
+SNIFF_BYTES = 64 * 1024
+DEFAULT_REFRESH_SECONDS = 5
+
+
+def run_streamlit_app(st, fmt, uploader_label, file_types, report_file_name, detect_format=None):
+    # Upload -> pipeline -> one table per report sheet plus an Excel download; st is the streamlit module.
+    # detect_format(lines) may pick the plugin from the uploaded content (formats sharing one title).
+    st.set_page_config(page_title=f"{fmt.title} Log Parser", layout="wide")
+    st.title(f"{fmt.title} Log Parser & Analyzer")
+
+    log_path = st.sidebar.text_input("Or analyze a log file on this machine (path):")
+    if log_path and st.sidebar.toggle("Live tail (auto-refresh)"):
+        run_live_tail(st, fmt, log_path, detect_format)
+        return
+    if log_path:
+        run_indexed_file(st, fmt, log_path, report_file_name, detect_format)
+        return
+
+    uploaded_file = st.file_uploader(uploader_label, type=file_types)
+    if uploaded_file is None:
+        st.info(f"Please upload a {fmt.title} log file to get started.")
+        return
+
+    stats = RunStats(fmt.name)
+    with stats.stage('read'):
+        raw_bytes = uploaded_file.getvalue()
+        stats.count(BYTES, len(raw_bytes))
+        lines = StringIO(raw_bytes.decode("utf-8", errors="replace")).readlines()
+    if detect_format is not None:
+        fmt = detect_format(lines)
+
+    result = parse_records(fmt, lines, run_stats=stats)
+    show_result(st, fmt, result, stats, report_file_name)
+
+
+def run_indexed_file(st, fmt, path, report_file_name, detect_format=None):
+    # Large logs stay on disk: the sidecar index gives an instant block summary, then only the chosen blocks are parsed
+    if not os.path.isfile(path):
+        st.error(f"Log file '{path}' not found.")
+        return
+    fmt = sniff_format(fmt, path, detect_format)
+
+    index = load_index(fmt, path)
+    if index is None:
+        st.info("This log has no current index. Building one reads the whole file once; afterwards block "
+                "summaries are instant and any block range can be parsed directly.")
+        if not st.button("Build index"):
+            return
+        with st.spinner(f"Indexing '{path}'..."):
+            index = build_index(fmt, path)
+    if not len(index):
+        st.info("The log file contains no records.")
+        return
+
+    summary_df = index.summary_df()
+    st.subheader("Block Summary")
+    st.bar_chart(summary_df.set_index('Blocks')[['Slow Queries', 'Errors']])
+    st.dataframe(summary_df)
+
+    labels = {i: f"{i} ({time:%Y-%m-%d %H:%M:%S})" if time else str(i) for i, time in enumerate(index.first_times)}
+    first, last = st.select_slider("Blocks to parse", options=list(labels), value=(0, len(index) - 1),
+                                   format_func=labels.get)
+    if not st.button("Parse selected blocks"):
+        return
+    stats = RunStats(fmt.name)
+    with st.spinner(f"Parsing blocks {first}..{last}..."):
+        result = parse_file(fmt, path, run_stats=stats, byte_range=index.block_range(first, last))
+    show_result(st, fmt, result, stats, report_file_name)
+
+
+def sniff_format(fmt, path, detect_format=None):
+    if detect_format is None:
+        return fmt
+    with open(path, 'rb') as f:
+        return detect_format(f.read(SNIFF_BYTES).decode('utf-8', errors='replace').splitlines())
+
+
+def run_live_tail(st, fmt, path, detect_format=None):
+    # Live dashboard over a log that is still being written. The LogTail lives in the session, so every refresh
+    # parses only the lines appended since the previous one; only the dashboard fragment reruns on the timer.
+    if not os.path.isfile(path):
+        st.error(f"Log file '{path}' not found.")
+        return
+    fmt = sniff_format(fmt, path, detect_format)
+    from_end = st.sidebar.checkbox("Only lines written from now on", value=False)
+    interval = st.sidebar.number_input("Refresh every (seconds)", min_value=1, max_value=300,
+                                       value=DEFAULT_REFRESH_SECONDS)
+    key = ('live-tail', fmt.name, os.path.abspath(path), from_end)
+    if key not in st.session_state or st.sidebar.button("Restart tail"):
+        st.session_state[key] = LogTail(fmt, path, from_end=from_end)
+    tail = st.session_state[key]
+
+    @st.fragment(run_every=interval)
+    def dashboard():
+        tail.poll()
+        show_live(st, tail)
+    dashboard()
+
+
+def show_live(st, tail):
+    # Headline counters, latency and errors over time, and the patterns that took the most time so far
+    result = tail.result
+    records, slow, errors, error_rate, lag = st.columns(5)
+    records.metric(tail.fmt.record_label, f"{result.records:,}")
+    slow.metric("Slow Queries", f"{tail.slow_queries:,}")
+    errors.metric("Errors", f"{result.error_records:,}")
+    error_rate.metric("Error Rate", f"{tail.error_rate:.2%}")
+    lag.metric("Unparsed Backlog", f"{tail.lag / (1024 * 1024):.1f} MB")
+    if tail.rotations:
+        st.caption(f"The log was rotated or truncated {tail.rotations} time(s); totals include the earlier files.")
+
+    timeline_df = tail.timeline_frame()
+    if timeline_df.empty:
+        st.info("No timestamped slow queries or errors yet. Waiting for the log to grow...")
+    else:
+        timeline_df = timeline_df.set_index('Time')
+        st.subheader("Latency Over Time")
+        st.line_chart(timeline_df[['Avg Latency (ms)']])
+        st.subheader("Slow Queries and Errors per Minute" if tail.bucket_seconds == 60 else
+                     f"Slow Queries and Errors per {tail.bucket_seconds} s")
+        st.bar_chart(timeline_df[['Slow Queries', 'Errors']])
+    st.subheader("Top Slow Patterns")
+    st.dataframe(tail.top_patterns())
+
+
+def show_result(st, fmt, result, stats, report_file_name):
+    # One table per report sheet, the run summary in the sidebar and an Excel download
+    for message in result.issue_messages(fmt): # Display parsing warnings in Streamlit UI
+        st.warning(message)
+
+    sheets = build_sheets(fmt, result, stats)
+    for sheet_name, df in sheets.items():
+        st.subheader(sheet_name)
+        if df.empty:
+            st.info(f"No {sheet_name} were generated. Check warnings above if any.")
+        else:
+            st.dataframe(df)
+
+    excel_buffer = BytesIO()
+    with stats.stage('save_to_excel'):
+        success, error_msg = save_sheets_to_excel(sheets, excel_buffer)
+    stats.finish()
+    render_streamlit_sidebar(st, stats)
+
+    if success:
+        excel_buffer.seek(0)
+        st.download_button(
+            label="Download Excel report",
+            data=excel_buffer,
+            file_name=report_file_name,
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+    else:
+        st.error(f"Failed to generate Excel file: {error_msg}")
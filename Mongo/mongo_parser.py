@@ -1,134 +1,410 @@
-import streamlit as st
-import pandas as pd
+import copy
+import heapq
 import json
 import os
 import re
-from collections import defaultdict
-from statistics import mean
-from io import StringIO, BytesIO
-import argparse # Added import
+import sys
+
+# Make the shared Common/ package importable when run as a script (python Mongo/mongo_parser.py)
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from Common.engine import (LogFormat, SLOW, ERROR, OTHER, counted_issue, parse_records, parse_file, build_sheets,
+                           aggregate_file, sample_file, save_outputs)
+from Common.lazy import lazy_import
+from Common.instrumentation import LINES_DECODED
+from Common.aggregates import group_percentiles, merge_states
+from Common.attribution import build_attribution_sheets
+from Common.parallel import map_in_processes
+from Common.sampling import DEFAULT_RESERVOIR_SIZE
+from Common.store import write_to_store
+from Common.timeutil import parse_log_timestamp
+from Common.cli import build_arg_parser, run_cli, destinations, record_filter, redactor
+from Common.ui import run_streamlit_app as run_format_streamlit_app
+from Mongo.pipeline_analyzer import analyze_pipeline, pipeline_shape, shape_value
+from datetime import datetime
+
+pd = lazy_import('pandas') # CLI runs that never build a DataFrame (e.g. --help) skip the pandas import
 
 # --- Helper Functions ---
 def normalize_query(query):
     normalized_query = re.sub(r'(:\s*["\']?[^,{}\[\]]+["\']?\s*(?=[,}]))', ':<value>', query)
     return normalized_query
 
+def command_filter(command_obj):
+    # The filter a command applies: a find's filter or the $match leading an aggregation pipeline
+    if 'pipeline' in command_obj: # Handle aggregate queries
+        # Try to extract $match from the first stage of a pipeline
+        pipeline = command_obj.get('pipeline', [])
+        if pipeline and isinstance(pipeline, list) and pipeline[0] and '$match' in pipeline[0]:
+            return pipeline[0]['$match']
+        return {'pipeline_info': 'Complex pipeline, see full command'} # Fallback for complex pipelines
+    return command_obj.get('filter', {}) # Handle find queries
+
+def shape_command(command_obj):
+    # The command with literal values replaced by '?'; the command name's collection, $db and the pipeline's
+    # stage structure ($lookup sources, $sort keys, ...) stay, so the shape is still valid, readable JSON
+    shape = {}
+    for position, (key, value) in enumerate(command_obj.items()):
+        if (position == 0 or key == '$db') and isinstance(value, str): # e.g. "find": "orders"
+            shape[key] = value
+        elif key == 'pipeline' and isinstance(value, list):
+            shape[key] = pipeline_shape(value)
+        else:
+            shape[key] = shape_value(value)
+    return shape
+
 # --- Core Parsing Logic ---
-def parse_log_lines(lines):
-    output_columns = ['Command', 'Collection', 'AppName', 'Duration(ms)', 'KeysExamined', 'DocsExamined', 'numYields',
-                    'nreturned', 'Filter', 'Plan', 'timestamp']
-    error_columns = ['OriginalLineNumber', 'msg', 'error', 'errmsg', 'totalCount', 'SampleLine'] # Adjusted error_columns
-
-    data = []
-    non_slow_query_data = []
-    error_summary_map = defaultdict(lambda: {"totalCount": 0, "SampleLine": "", "msg": "", "error": "", "errmsg": "", "lines": []})
-    query_stats = defaultdict(lambda: {"count": 0, "durations": [], "sample_query": ""})
-    parse_errors = [] # To collect errors for CLI/logging
-
-    for index, line in enumerate(lines):
-        try:
-            json_payload = json.loads(line)
-            if "Slow query" in line: # Heuristic for slow query log lines
-                timestamp = json_payload.get('t', {}).get('$date', '')
-                attr = json_payload.get('attr', {})
-                command_obj = attr.get('command', {}) # Keep command as obj for now
-                ns_split = attr.get('ns', '').split('.')
-                app_name = ns_split[0] if len(ns_split) > 0 else 'N/A'
-                collection = ns_split[1] if len(ns_split) > 1 else 'N/A'
-                duration = attr.get('durationMillis', 0)
-                keys_examined = attr.get('keysExamined', 0)
-                docs_examined = attr.get('docsExamined', 0)
-                num_yields = attr.get('numYields', 0)
-                nreturned = attr.get('nreturned', 0)
-
-                filter_ = {}
-                if 'pipeline' in command_obj: # Handle aggregate queries
-                    # Try to extract $match from the first stage of a pipeline
-                    pipeline = command_obj.get('pipeline', [])
-                    if pipeline and isinstance(pipeline, list) and pipeline[0] and '$match' in pipeline[0]:
-                        filter_ = pipeline[0]['$match']
-                    else: # Fallback for complex pipelines or other structures
-                        filter_ = {'pipeline_info': 'Complex pipeline, see full command'}
-                elif 'filter' in command_obj: # Handle find queries
-                    filter_ = command_obj.get('filter', {})
-                
-                plan = attr.get('planSummary', '')
-
-                data.append([
-                    json.dumps(command_obj), collection, app_name, duration, keys_examined, docs_examined, num_yields, nreturned,
-                    json.dumps(filter_), plan, timestamp
-                ])
-
-                # For query stats, normalize the command structure
-                normalized_query_key_str = normalize_query(json.dumps(command_obj))
-                query_stats[normalized_query_key_str]["count"] += 1
-                query_stats[normalized_query_key_str]["durations"].append(duration)
-                if not query_stats[normalized_query_key_str]["sample_query"]: # Store first encountered full query as sample
-                    query_stats[normalized_query_key_str]["sample_query"] = json.dumps(command_obj)
-            
-            # Check for errors in any line, not just non-slow query lines
-            # This captures errors that might be reported on lines that also get parsed as slow queries (though less common)
-            # or on lines that are neither slow queries nor typical app messages.
-            if 'msg' in json_payload and json_payload.get('s', '') == 'E' and 'attr' in json_payload and 'error' in json_payload['attr']:
-                msg = json_payload.get('msg', 'N/A')
-                error_details = json_payload['attr'].get('error', {})
-                err_code_name = error_details.get('codeName', 'N/A')
-                errmsg_text = error_details.get('errmsg', 'N/A')
-                
-                error_key = f"{msg}|{err_code_name}|{errmsg_text}" # Create a unique key for error aggregation
-                
-                error_summary_map[error_key]["totalCount"] += 1
-                if not error_summary_map[error_key]["SampleLine"]: # Store first sample line
-                     error_summary_map[error_key]["SampleLine"] = line.strip()
-                error_summary_map[error_key]["msg"] = msg
-                error_summary_map[error_key]["error"] = err_code_name
-                error_summary_map[error_key]["errmsg"] = errmsg_text
-                error_summary_map[error_key]["lines"].append(index + 1)
-
-            elif "Slow query" not in line : # Store other non-slow, non-error lines
-                non_slow_query_data.append(line.strip())
-
-        except json.JSONDecodeError:
-            parse_errors.append(f"Line {index + 1}: Invalid JSON. Skipped.")
-        except Exception as e:
-            parse_errors.append(f"Line {index + 1}: Error parsing line: {e}. Skipped.")
+output_columns = ['Command', 'Collection', 'Database', 'AppName', 'Duration(ms)', 'KeysExamined', 'DocsExamined',
+                'numYields', 'nreturned', 'Filter', 'Plan', 'timestamp', 'Pipeline Stages', 'Pipeline Id', 'QueryHash',
+                'PlanCacheKey', 'Remote', 'reslen', 'cpuNanos', 'bytesRead', 'timeReadingMicros', 'LockAcquisitions',
+                'LockWaitMicros', 'Query Pattern']
+# Per-query resource columns summed per pattern: (detailed column, Query Stats label, scale applied to the total)
+resource_columns = [('bytesRead', 'Bytes Read', 1), ('timeReadingMicros', 'Storage Read(ms)', 1e-3),
+                    ('cpuNanos', 'CPU(ms)', 1e-6), ('LockWaitMicros', 'Lock Wait(ms)', 1e-3), ('reslen', 'Response Bytes', 1)]
+QUERY_HASH_INDEX = output_columns.index('QueryHash')
+DATABASE_INDEX = output_columns.index('Database')
+COLLECTION_INDEX = output_columns.index('Collection')
+ERROR_ENVELOPE = ('t', 's', 'c', 'id', 'ctx', 'msg') # top-level error line fields kept in redacted samples
+error_columns = ['OriginalLineNumber', 'msg', 'error', 'errmsg', 'totalCount', 'SampleLine'] # Adjusted error_columns
+# Lines that could not be parsed are counted per kind rather than reported one by one (a damaged log can have millions)
+issue_descriptions = {
+    'invalid_json': "Skipped {count} {records} that {are} not valid JSON ({examples}).",
+    'lines_failed': "Skipped {count} {records} that could not be parsed ({examples}).",
+}
 
-    output_df = pd.DataFrame(data, columns=output_columns)
-    non_slow_query_df = pd.DataFrame(non_slow_query_data, columns=['LogLine'])
-    
+class MongoFormat(LogFormat):
+    # MongoDB structured (JSON, 4.4+) logs: one record per line, slow queries are "Slow query" lines
+    name = "mongo_parser"
+    title = "MongoDB"
+    detailed_columns = output_columns
+    duration_column = 'Duration(ms)'
+    sample_column = 'Command'
+    summed_columns = tuple(column for column, _, _ in resource_columns)
+    group_columns = ('Pipeline Id',) # aggregation pipelines are also grouped by their stage-sequence fingerprint
+    attribution_columns = ('Database', 'Collection', 'AppName')
+    attribution_summed = ('KeysExamined', 'DocsExamined')
+    pooled_columns = ('Command', 'Collection', 'Database', 'AppName', 'Filter', 'Plan', 'QueryHash', 'PlanCacheKey',
+                      'Remote')
+    stats_sheet = 'Query Stats'
+    decoded_counter = LINES_DECODED
+    decode_stage = 'json.loads'
+    count_failures = True
+    fingerprint_stage = 'normalize_query'
+    slow_hint = "Slow query"
+    record_marker = '{"t":{"$date":'
+    filter_columns = {'collection': 'Collection', 'db': 'Database'}
+    redacted_columns = ('Command', 'Filter')
+    error_sample_column = 'SampleLine'
+    raw_duration_pattern = re.compile(r'"durationMillis":\s*(\d+(?:\.\d+)?)')
+    empty_note = 'slow queries or errors'
+    store_sheets = {'slow_queries': 'Detailed Metrics', 'query_stats': 'Query Stats', 'pipeline_stats': 'Pipeline Stats',
+                    'errors': 'Error Stats'}
+    store_indexes = {
+        'slow_queries': ['Query Pattern', 'Collection', 'AppName', 'Duration(ms)', 'Plan', 'Node', 'Pipeline Id',
+                         'QueryHash'],
+        'query_stats': ['Query Pattern'],
+        'pipeline_stats': ['Pipeline Id'],
+        'errors': ['error'],
+    }
+    store_timestamp_columns = {'slow_queries': 'timestamp'}
+
+    def decode(self, record):
+        return json.loads(record)
+
+    def classify(self, record, payload):
+        slow = "Slow query" in record # Heuristic for slow query log lines
+        # Errors are checked on every line, not just non-slow ones; other lines are kept as non-slow lines
+        error = 'msg' in payload and payload.get('s', '') == 'E' and 'attr' in payload and 'error' in payload['attr']
+        if slow:
+            return (SLOW, ERROR) if error else (SLOW,)
+        return (ERROR,) if error else (OTHER,)
+
+    def slow_row(self, payload, result):
+        timestamp = payload.get('t', {}).get('$date', '')
+        attr = payload.get('attr', {})
+        command_obj = attr.get('command', {}) # Keep command as obj for now
+        database, _, collection = attr.get('ns', '').partition('.')
+        collection = collection or 'N/A'
+        storage = attr.get('storage', {}).get('data', {})
+        lock_acquisitions, lock_wait = lock_totals(attr.get('locks'))
+
+        stages = pipeline_id = ''
+        if isinstance(command_obj.get('pipeline'), list):
+            # Fingerprint of the whole stage sequence, so $lookup/$unwind/$group costs are not hidden behind $match
+            analysis = analyze_pipeline(command_obj.get('aggregate', ''), command_obj['pipeline'])
+            stages, pipeline_id = analysis.stages, analysis.pipeline_id
+
+        # The command is serialized once; the engine fingerprints it into the 'Query Pattern' column
+        return [
+            json.dumps(command_obj), collection, database, attr.get('appName', ''), attr.get('durationMillis', 0),
+            attr.get('keysExamined', 0), attr.get('docsExamined', 0), attr.get('numYields', 0), attr.get('nreturned', 0),
+            json.dumps(command_filter(command_obj)), attr.get('planSummary', ''), timestamp, stages, pipeline_id, attr.get('queryHash', ''),
+            attr.get('planCacheKey', ''), attr.get('remote', ''), attr.get('reslen'), attr.get('cpuNanos'),
+            storage.get('bytesRead'), storage.get('timeReadingMicros'), lock_acquisitions, lock_wait
+        ]
+
+    def fingerprint(self, row):
+        # mongod's own query shape hash (per namespace) is used when logged, skipping the normalize_query regex
+        query_hash = row[QUERY_HASH_INDEX]
+        if query_hash:
+            return f"{row[DATABASE_INDEX]}.{row[COLLECTION_INDEX]} queryHash:{query_hash}"
+        return normalize_query(row[0])
+
+    def redacted_shapes(self, row, payload):
+        # The command shape replaces normalize_query's input too: it also drops array elements, which the regex keeps
+        shape = shape_command(payload.get('attr', {}).get('command', {}))
+        command = json.dumps(shape)
+        query_hash = row[QUERY_HASH_INDEX]
+        pattern = (f"{row[DATABASE_INDEX]}.{row[COLLECTION_INDEX]} queryHash:{query_hash}" if query_hash
+                   else normalize_query(command))
+        return pattern, (command, json.dumps(command_filter(shape)))
+
+    def tag_shape(self, shape, digest):
+        # Shapes are JSON objects; the digest goes in as one more field so they still load
+        return f'{shape[:-1]}, "$sha256": "{digest}"}}' if shape != '{}' else f'{{"$sha256": "{digest}"}}'
+
+    def error_entry(self, record, payload):
+        error_details = payload['attr'].get('error', {})
+        fields = (payload.get('msg', 'N/A'), error_details.get('codeName', 'N/A'), error_details.get('errmsg', 'N/A'))
+        return "|".join(str(field) for field in fields), fields # Create a unique key for error aggregation
+
+    def redacted_error_entry(self, record, payload):
+        # errmsg can quote the offending values (e.g. a duplicate key), so its literals are masked
+        key, (msg, code_name, errmsg) = self.error_entry(record, payload)
+        fields = (msg, code_name, normalize_query(errmsg) if isinstance(errmsg, str) else errmsg)
+        return "|".join(str(field) for field in fields), fields
+
+    def error_shape(self, record, payload, fields):
+        shape = {key: payload[key] for key in ERROR_ENVELOPE if key in payload}
+        shape['attr'] = shape_value(payload['attr'])
+        return json.dumps(shape)
+
+    def timestamp(self, payload):
+        return parse_log_timestamp(payload.get('t', {}).get('$date', ''))
+
+    def failure_message(self, exc):
+        # An issue kind (see issue_descriptions), since failures are counted
+        return 'invalid_json' if isinstance(exc, json.JSONDecodeError) else 'lines_failed'
+
+    def issue_message(self, number, message):
+        return f"Line {number}: {message}"
+
+    def issue_summary(self, kind, count, first_record, examples=()):
+        if kind in issue_descriptions:
+            return counted_issue(issue_descriptions[kind], count, examples)
+        return super().issue_summary(kind, count, first_record, examples)
+
+    def build_sheets(self, result, detailed_df):
+        attribution_df, attribution_top_df = build_attribution_sheets(result.attribution, self.attribution_columns,
+                                                                      self.attribution_summed, 'Query Pattern',
+                                                                      'Duration(ms)')
+        return {
+            'Detailed Metrics': detailed_df,
+            'Query Stats': build_query_stats_df(result.patterns),
+            'Pipeline Stats': build_pipeline_stats_df(result.groups.get('Pipeline Id', {})),
+            'Workload Attribution': attribution_df,
+            'Attribution Top Patterns': attribution_top_df,
+            'Non-Slow Queries': pd.DataFrame(result.other_lines, columns=['LogLine']),
+            'Error Stats': build_error_df(result.errors),
+        }
+
+    def error_frame(self, errors, include_location=True):
+        error_df = build_error_df(errors)
+        return error_df if include_location else error_df.drop(columns=['OriginalLineNumber'])
+
+MONGO = MongoFormat()
+
+def lock_totals(locks):
+    # attr.locks: {resource: {"acquireCount": {mode: n}, "timeAcquiringMicros": {mode: us}, ...}}
+    # -> (total acquisitions, total microseconds spent waiting for locks); (None, None) when not logged
+    if not isinstance(locks, dict):
+        return None, None
+    acquisitions = wait = 0
+    for resource in locks.values():
+        if isinstance(resource, dict):
+            acquisitions += sum(resource.get('acquireCount', {}).values())
+            wait += sum(resource.get('timeAcquiringMicros', {}).values())
+    return acquisitions, wait
+
+def build_error_df(errors):
+    # errors: {key: ErrorSummary} with fields (msg, codeName, errmsg)
     error_data_for_df = []
-    for key, err_info in error_summary_map.items():
-        # Use the first line number for 'OriginalLineNumber' for now, or consider how to represent multiple lines
-        first_line_num = err_info["lines"][0] if err_info["lines"] else "N/A"
-        error_data_for_df.append([
-            first_line_num,
-            err_info["msg"], 
-            err_info["error"], 
-            err_info["errmsg"], 
-            err_info["totalCount"], 
-            err_info["SampleLine"]
-        ])
-    error_df = pd.DataFrame(error_data_for_df, columns=error_columns)
+    for summary in errors.values():
+        # The first line the error was seen on is reported as 'OriginalLineNumber'
+        error_data_for_df.append([summary.first_record or "N/A", *summary.fields, summary.count, summary.sample])
+    return pd.DataFrame(error_data_for_df, columns=error_columns)
 
+def resource_stats(stats, present):
+    # Total/Avg storage I/O, CPU and lock wait of one pattern, for the resource columns logged by this mongod
+    totals = stats.totals or {}
+    columns = {}
+    for column, label, scale in present:
+        total = totals.get(column)
+        columns[f"Total {label}"] = None if total is None else round(total * scale, 3)
+        columns[f"Avg {label}"] = None if total is None else round(total * scale / stats.count, 3)
+    return columns
+
+def build_query_stats_df(query_stats):
+    # Resource columns only appear when some pattern has them (older mongod versions log no storage/cpuNanos)
+    present = [entry for entry in resource_columns if any(stats.totals and entry[0] in stats.totals
+                                                          for stats in query_stats.values())]
     query_stats_data = []
     for query, stats in query_stats.items():
-        durations = stats["durations"]
-        if durations:
+        if stats.count:
             query_stats_data.append({
                 "Query Pattern": query, # Renamed for clarity
-                "Executions": stats["count"],
-                "Min Duration(ms)": min(durations),
-                "Max Duration(ms)": max(durations),
-                "Avg Duration(ms)": round(mean(durations), 2), # Rounded Average
-                "Sample Full Query": stats["sample_query"] # Renamed for clarity
+                "Executions": stats.count,
+                "Min Duration(ms)": stats.min,
+                "Max Duration(ms)": stats.max,
+                "Avg Duration(ms)": round(stats.mean, 2), # Rounded Average
+                **resource_stats(stats, present),
+                "Sample Full Query": stats.sample # Renamed for clarity
             })
     query_stats_df = pd.DataFrame(query_stats_data)
     
     # Sort by executions and then by average duration
     if not query_stats_df.empty:
         query_stats_df = query_stats_df.sort_values(by=['Executions', 'Avg Duration(ms)'], ascending=[False, False])
-    
-    return output_df, query_stats_df, non_slow_query_df, error_df, parse_errors
+    return query_stats_df
+
+pipeline_stats_columns = ['Pipeline Id', 'Collection', 'Stages', 'Cost Drivers', 'Executions', 'Min Duration(ms)',
+                          'Max Duration(ms)', 'Avg Duration(ms)', 'P95 Duration(ms)', 'Total Duration(ms)',
+                          'Normalized Pipeline', 'Sample Full Query']
+
+def build_pipeline_stats_df(pipeline_stats):
+    # pipeline_stats: {Pipeline Id: PatternStats}; the shape details come back from the (cached) analyzer via the sample
+    pipeline_data = []
+    p95 = group_percentiles(pipeline_stats, (95,))
+    for pipeline_id, stats in pipeline_stats.items():
+        if not stats.sample: # removed by redaction
+            pipeline_data.append([pipeline_id, '', '', '', stats.count, stats.min, stats.max, round(stats.mean, 2),
+                                  round(p95[pipeline_id][0], 2), round(stats.total, 2), '', ''])
+            continue
+        command = json.loads(stats.sample)
+        analysis = analyze_pipeline(command.get('aggregate', ''), command['pipeline'])
+        pipeline_data.append([pipeline_id, command.get('aggregate', ''), analysis.stages, analysis.cost_drivers,
+                              stats.count, stats.min, stats.max, round(stats.mean, 2), round(p95[pipeline_id][0], 2),
+                              round(stats.total, 2), analysis.shape, stats.sample])
+    pipeline_df = pd.DataFrame(pipeline_data, columns=pipeline_stats_columns)
+    if not pipeline_df.empty:
+        pipeline_df = pipeline_df.sort_values(by=['Total Duration(ms)', 'Executions'], ascending=[False, False])
+    return pipeline_df
+
+# run_stats: optional RunStats collecting per-stage timings and line counters
+def parse_log_lines(lines, run_stats=None):
+    result = parse_records(MONGO, lines, run_stats=run_stats)
+    sheets = build_sheets(MONGO, result, run_stats)
+    return (sheets['Detailed Metrics'], sheets['Query Stats'], sheets['Non-Slow Queries'], sheets['Error Stats'],
+            result.issue_messages(MONGO))
+
+# --- Aggregate-only Parsing (compare mode) ---
+def aggregate_log_file(path, since=None, until=None):
+    # Streams the file and returns {Query Pattern: PatternStats} for slow queries inside [since, until].
+    # No detailed rows are kept, so memory depends on the number of distinct patterns, not the file size.
+    return aggregate_file(MONGO, path, since, until)
+
+# --- Multi-node (replica set / sharded cluster) Analysis ---
+def parse_node_specs(specs):
+    # Each spec is NODE=PATH or just PATH; unnamed nodes are named after the file (or parent dir/file on clashes)
+    nodes = []
+    for spec in specs:
+        name, sep, path = spec.partition('=')
+        if not sep or not name or os.sep in name:
+            name, path = '', spec
+        nodes.append([name, path])
+    base_names = [os.path.splitext(os.path.basename(path))[0] for _, path in nodes]
+    for node, base_name in zip(nodes, base_names):
+        if not node[0]:
+            parent = os.path.basename(os.path.dirname(os.path.abspath(node[1])))
+            node[0] = base_name if base_names.count(base_name) == 1 else f"{parent}/{base_name}"
+    return [tuple(node) for node in nodes]
+
+def parse_node_log(node, path, record_filter=None, redactor=None):
+    # Worker entry point (runs in a separate process): ParseResult for one node's log
+    return node, parse_file(MONGO, path, keep_other=False, record_filter=record_filter, redactor=redactor)
+
+def _event_time(row, timestamp_index=output_columns.index('timestamp') + 1):
+    # Sort key for node-tagged detailed rows; rows without a usable timestamp sort first
+    return parse_log_timestamp(row[timestamp_index]) or datetime.min
+
+def _tag_rows(node, rows):
+    return ([node] + row for row in rows)
+
+def merge_node_results(node_results):
+    # node_results: [(node, ParseResult), ...]
+    # Each node's log is already in time order, so a k-way heap merge orders events cluster-wide
+    # in O(n log k) without concatenating and re-sorting everything.
+    tagged_rows = [_tag_rows(node, result.rows) for node, result in node_results]
+    detailed_df = pd.DataFrame(list(heapq.merge(*tagged_rows, key=_event_time)), columns=['Node'] + output_columns)
+
+    node_query_frames, node_error_frames, node_summary = [], [], []
+    cluster_query_stats, cluster_pipeline_stats, cluster_errors, error_nodes = {}, {}, {}, {}
+    for node, result in node_results:
+        node_query_df = build_query_stats_df(result.patterns)
+        node_error_df = build_error_df(result.errors)
+        node_query_df.insert(0, 'Node', node)
+        node_error_df.insert(0, 'Node', node)
+        node_query_frames.append(node_query_df)
+        node_error_frames.append(node_error_df)
+        node_summary.append([node, len(result.rows), sum(stats.total for stats in result.patterns.values()),
+                             len(result.patterns), result.error_records, result.failures])
+
+        merge_states(cluster_query_stats, result.patterns) # after the per-node frames: merging reuses the node's objects
+        merge_states(cluster_pipeline_stats, result.groups.get('Pipeline Id', {}))
+        for key, summary in result.errors.items():
+            if key in cluster_errors:
+                cluster_errors[key].count += summary.count
+                error_nodes[key].append(node)
+            else:
+                cluster_errors[key] = copy.copy(summary)
+                error_nodes[key] = [node]
+
+    cluster_error_df = build_error_df(cluster_errors)
+    cluster_error_df['Nodes'] = [", ".join(error_nodes[key]) for key in cluster_errors]
+    summary_df = pd.DataFrame(node_summary, columns=['Node', 'Slow Queries', 'Total Duration(ms)', 'Distinct Patterns',
+                                                     'Errors', 'Parse Errors'])
+    return {
+        'Detailed Metrics': detailed_df,
+        'Query Stats': build_query_stats_df(cluster_query_stats),
+        'Pipeline Stats': build_pipeline_stats_df(cluster_pipeline_stats),
+        'Node Query Stats': pd.concat(node_query_frames, ignore_index=True) if node_query_frames else pd.DataFrame(),
+        'Error Stats': cluster_error_df,
+        'Node Error Stats': pd.concat(node_error_frames, ignore_index=True) if node_error_frames else pd.DataFrame(),
+        'Node Summary': summary_df,
+    }
+
+def run_multi_node(node_specs, output_filepath, jobs=None, store_path=None, store_backend='auto', record_filter=None,
+                   redactor=None):
+    # Returns a list of (destination, success, error message), one per requested output
+    nodes = parse_node_specs(node_specs)
+    node_results = map_in_processes(parse_node_log, [(node, path, record_filter, redactor) for node, path in nodes],
+                                    max_workers=jobs)
+    for node, result in node_results:
+        for err in result.issue_messages(MONGO):
+            print(f"Parsing Warning [{node}]: {err}")
+    sheets = merge_node_results(node_results)
+    print(f"Merged {len(nodes)} nodes: {len(sheets['Detailed Metrics'])} slow queries, "
+          f"{len(sheets['Query Stats'])} distinct patterns, {len(sheets['Error Stats'])} distinct errors")
+    return save_outputs(MONGO, sheets, output_filepath, store_path, store_backend, ", ".join(path for _, path in nodes))
+
+# --- Sampling Mode (quick triage of huge logs) ---
+def sample_log_file(path, fraction, reservoir_size=DEFAULT_RESERVOIR_SIZE, seed=None, plan=None):
+    # Reads a random subset of fixed-size blocks, keeps a reservoir sample of detailed rows and
+    # extrapolates pattern/error counts to the whole file. Returns (plan, {sheet name: DataFrame}).
+    return sample_file(MONGO, path, fraction, reservoir_size, seed, plan)
+
+# --- Analytical Store Output ---
+def save_to_store(output_df, query_stats_df, error_df, store_path, source, backend='auto'):
+    # Appends this run to a SQLite/DuckDB file for ad-hoc SQL (see Common/store.py for the table layout)
+    return write_to_store(
+        store_path, MONGO.name, source,
+        tables={'slow_queries': output_df, 'query_stats': query_stats_df, 'errors': error_df},
+        indexes=MONGO.store_indexes,
+        timestamp_columns=MONGO.store_timestamp_columns,
+        backend=backend,
+    )
 
 # --- Excel Saving Logic ---
 def save_to_excel(output_df, query_stats_df, non_slow_query_df, error_df, output_filepath):
@@ -144,165 +420,45 @@ def save_to_excel(output_df, query_stats_df, non_slow_query_df, error_df, output
 
 # --- Streamlit UI ---
 def run_streamlit_app():
-    st.set_page_config(page_title="MongoDB Log Parser", layout="wide") 
-    st.title("MongoDB Log Parser & Analyzer") 
-
-    # Local file uploader for Streamlit mode
-    local_uploaded_file = st.file_uploader(
-        "Upload your MongoDB log file (one JSON log per line):",
-        type=["log", "txt", "json"]
-    )
-    
-    if local_uploaded_file is not None:
-        stringio = StringIO(local_uploaded_file.getvalue().decode("utf-8"))
-        lines = stringio.readlines()
-        
-        output_df, query_stats_df, non_slow_query_df, error_df, parse_errors = parse_log_lines(lines)
-
-        for err in parse_errors: # Display parsing errors in Streamlit UI
-            st.warning(err)
-
-        st.subheader("Detailed Metrics")
-        st.dataframe(output_df)
-
-        st.subheader("Query Stats")
-        st.dataframe(query_stats_df)
-
-        st.subheader("Non-Slow Queries")
-        st.dataframe(non_slow_query_df)
-
-        st.subheader("Error Stats")
-        st.dataframe(error_df)
-
-        output_excel_bytes = BytesIO()
-        success, error_msg = save_to_excel(output_df, query_stats_df, non_slow_query_df, error_df, output_excel_bytes)
-        
-        if success:
-            output_excel_bytes.seek(0)
-            st.download_button(
-                label="Download Excel report",
-                data=output_excel_bytes,
-                file_name="mongo_log_report.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-        else:
-            st.error(f"Failed to generate Excel file: {error_msg}")
-            
-    else:
-        st.info("Please upload a MongoDB log file to get started.")
+    import streamlit as st # UI mode only; streamlit alone takes seconds to import
+    run_format_streamlit_app(st, MONGO, "Upload your MongoDB log file (one JSON log per line):", ["log", "txt", "json"],
+                             "mongo_log_report.xlsx")
 
 # --- Main Execution Logic ---
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(
-        description="MongoDB Log Parser & Analyzer. Processes MongoDB log files to extract slow queries, errors, and other statistics.",
-        epilog="If no arguments are provided, the script will run in interactive Streamlit mode."
-    )
-    parser.add_argument(
-        "-i", "--input", 
-        help="Path to the input MongoDB log file (e.g., mongod.log)."
-    )
-    parser.add_argument(
-        "-o", "--output", 
-        help="Path to save the generated Excel report (e.g., report.xlsx)."
-    )
-    
-    args = parser.parse_args()
-
-    if args.input and args.output:
-        # CLI Mode
-        print(f"CLI Mode: Parsing file '{args.input}' and saving report to '{args.output}'...")
-        try:
-            with open(args.input, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            if not lines:
-                print(f"Warning: Input file '{args.input}' is empty.")
-                # Create empty dataframes or handle as appropriate
-                output_df, query_stats_df, non_slow_query_df, error_df = pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-                parse_errors = ["Input file is empty."]
-            else:
-                output_df, query_stats_df, non_slow_query_df, error_df, parse_errors = parse_log_lines(lines)
-            
-            if parse_errors:
-                for err in parse_errors:
-                    print(f"Parsing Warning: {err}")
-            
-            success, error_msg = save_to_excel(output_df, query_stats_df, non_slow_query_df, error_df, args.output)
-            if success:
-                print(f"Successfully parsed '{args.input}' and saved Excel report to '{args.output}'")
-                if output_df.empty and query_stats_df.empty and error_df.empty:
-                     print("Note: The log file did not contain any parsable slow queries or errors matching the defined patterns.")
-            else:
-                print(f"Error saving Excel file: {error_msg}")
-
-        except FileNotFoundError:
-            print(f"Error: Input file '{args.input}' not found.")
-        except Exception as e:
-            print(f"An unexpected error occurred during CLI processing: {e}")
-    elif args.input or args.output:
-        # User provided one argument but not the other
-        print("Error: Both --input and --output arguments are required for CLI mode.")
-        print("To run in interactive Streamlit mode, please provide no arguments.")
-        parser.print_help()
-    else:
-        # Streamlit Mode
-        # Streamlit mode doesn't need any specific print statements here now,
-        # as the run_streamlit_app function handles its own UI.
-        run_streamlit_app()
-
 def main():
-    parser = argparse.ArgumentParser(
-        description="MongoDB Log Parser & Analyzer. Processes MongoDB log files to extract slow queries, errors, and other statistics.",
-        epilog="If no arguments are provided, the script will run in interactive Streamlit mode."
+    parser = build_arg_parser(
+        MONGO,
+        "MongoDB Log Parser & Analyzer. Processes MongoDB log files to extract slow queries, errors, and other statistics.",
+        "mongod.log", "report.xlsx", "mongod.log@2023-10-25T10:00..2023-10-25T11:00"
     )
     parser.add_argument(
-        "-i", "--input", 
-        help="Path to the input MongoDB log file (e.g., mongod.log)."
-    )
-    parser.add_argument(
-        "-o", "--output", 
-        help="Path to save the generated Excel report (e.g., report.xlsx)."
+        "--nodes", nargs="+", metavar="[NODE=]FILE",
+        help="Multi-node mode: parse logs from several replica set / cluster members in parallel and merge them "
+             "into one cluster-wide report with per-node breakdowns. Requires --output."
     )
     
     args = parser.parse_args()
 
-    if args.input and args.output:
-        # CLI Mode
-        print(f"CLI Mode: Parsing file '{args.input}' and saving report to '{args.output}'...")
+    if args.nodes and (args.output or args.store):
+        # Multi-node Mode
+        print(f"Multi-node Mode: Parsing {len(args.nodes)} node logs and saving report to {destinations(args)}...")
         try:
-            with open(args.input, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            if not lines:
-                print(f"Warning: Input file '{args.input}' is empty.")
-                # Create empty dataframes or handle as appropriate
-                output_df, query_stats_df, non_slow_query_df, error_df = pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-                parse_errors = ["Input file is empty."]
-            else:
-                output_df, query_stats_df, non_slow_query_df, error_df, parse_errors = parse_log_lines(lines)
-            
-            if parse_errors:
-                for err in parse_errors:
-                    print(f"Parsing Warning: {err}")
-            
-            success, error_msg = save_to_excel(output_df, query_stats_df, non_slow_query_df, error_df, args.output)
-            if success:
-                print(f"Successfully parsed '{args.input}' and saved Excel report to '{args.output}'")
-                if output_df.empty and query_stats_df.empty and error_df.empty:
-                     print("Note: The log file did not contain any parsable slow queries or errors matching the defined patterns.")
-            else:
-                print(f"Error saving Excel file: {error_msg}")
-
-        except FileNotFoundError:
-            print(f"Error: Input file '{args.input}' not found.")
+            for destination, success, error_msg in run_multi_node(args.nodes, args.output, jobs=args.jobs,
+                                                                   store_path=args.store, store_backend=args.store_backend,
+                                                                   record_filter=record_filter(args),
+                                                                   redactor=redactor(args)):
+                if success:
+                    print(f"Successfully saved cluster report to '{destination}'")
+                else:
+                    print(f"Error saving '{destination}': {error_msg}")
+        except FileNotFoundError as e:
+            print(f"Error: Input file '{e.filename}' not found.")
         except Exception as e:
-            print(f"An unexpected error occurred during CLI processing: {e}")
-    elif args.input or args.output:
-        # User provided one argument but not the other
-        print("Error: Both --input and --output arguments are required for CLI mode.")
-        print("To run in interactive Streamlit mode, please provide no arguments.")
+            print(f"An unexpected error occurred during multi-node processing: {e}")
+    elif args.nodes:
+        print("Error: --output or --store is required for multi-node mode.")
         parser.print_help()
-    else:
+    elif not run_cli(MONGO, args, parser):
         # Streamlit Mode
         run_streamlit_app()
 
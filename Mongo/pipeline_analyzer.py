@@ -0,0 +1,149 @@
+import hashlib
+import json
+from collections import namedtuple
+
+# Result of analyzing one pipeline shape:
+#   pipeline_id  - short stable hash of (collection, normalized stages), the grouping key
+#   stages       - readable stage sequence, e.g. "$match > $lookup(orders) > $unwind > $group > $sort"
+#   cost_drivers - stages that usually dominate cost ($lookup, $unwind, $group, in-memory $sort, ...)
+#   shape        - normalized pipeline as JSON (literal values replaced by '?')
+PipelineAnalysis = namedtuple('PipelineAnalysis', ['pipeline_id', 'stages', 'cost_drivers', 'shape'])
+
+PLACEHOLDER = '?'
+MAX_CACHED_SHAPES = 10000
+# Stages whose scalar values are part of the shape (sort directions, projection inclusion flags)
+STRUCTURAL_STAGES = ('$sort', '$project', '$unset')
+# $lookup/$graphLookup fields naming collections and fields rather than holding values
+LOOKUP_NAME_FIELDS = ('from', 'localField', 'foreignField', 'as', 'startWith', 'connectFromField', 'connectToField')
+COSTLY_STAGES = ('$lookup', '$graphLookup', '$unwind', '$group', '$bucket', '$bucketAuto', '$facet', '$sortByCount',
+                 '$setWindowFields', '$unionWith')
+# A $sort can only use an index when nothing but $match (or another $sort) runs before it
+INDEX_FRIENDLY_PREDECESSORS = ('$match', '$sort')
+# Bodies whose key order means something: {a: 1, b: -1} and {b: -1, a: 1} sort differently
+ORDERED_KEYS = ('$sort', 'sortBy')
+LEADING_FILTER_STAGES = ('$match', '$geoNear', '$search', '$searchMeta', '$vectorSearch')
+
+_cache = {}
+_raw_cache = {} # (collection, pipeline as logged) -> analysis, checked before the pipeline is shaped
+cache_stats = {'hits': 0, 'misses': 0}
+
+
+def shape_value(value, keep_scalars=False):
+    # Replaces literals with '?' keeping keys, operators and "$field" references; literal lists collapse to ['?']
+    if isinstance(value, dict):
+        return {key: shape_value(item, keep_scalars) for key, item in value.items()}
+    if isinstance(value, list):
+        items = [shape_value(item, keep_scalars) for item in value]
+        return [PLACEHOLDER] if items and all(item == PLACEHOLDER for item in items) else items
+    if isinstance(value, str) and value.startswith('$'):
+        return value
+    if keep_scalars and isinstance(value, (int, float, bool)):
+        return value
+    return PLACEHOLDER
+
+
+def stage_name(stage):
+    return next(iter(stage)) if isinstance(stage, dict) and stage else PLACEHOLDER
+
+
+def stage_shape(stage):
+    name = stage_name(stage)
+    if name == PLACEHOLDER:
+        return PLACEHOLDER
+    body = stage[name]
+    if name in STRUCTURAL_STAGES:
+        return {name: shape_value(body, keep_scalars=True)}
+    if name in ('$lookup', '$graphLookup') and isinstance(body, dict):
+        return {name: {key: (item if key in LOOKUP_NAME_FIELDS and isinstance(item, str) else
+                             pipeline_shape(item) if key == 'pipeline' and isinstance(item, list) else shape_value(item))
+                       for key, item in body.items()}}
+    if name == '$facet' and isinstance(body, dict):
+        return {name: {key: pipeline_shape(item) if isinstance(item, list) else shape_value(item)
+                       for key, item in body.items()}}
+    if name == '$unionWith':
+        if isinstance(body, dict):
+            return {name: {key: item if key == 'coll' else pipeline_shape(item) if isinstance(item, list) else shape_value(item)
+                           for key, item in body.items()}}
+        return {name: body}
+    if name in ('$out', '$merge'):
+        return {name: body if isinstance(body, str) else shape_value(body)}
+    return {name: shape_value(body)}
+
+
+def pipeline_shape(pipeline):
+    return [stage_shape(stage) for stage in pipeline]
+
+
+def stage_label(stage):
+    name = stage_name(stage)
+    body = stage.get(name) if name != PLACEHOLDER else None
+    if name in ('$lookup', '$graphLookup') and isinstance(body, dict) and isinstance(body.get('from'), str):
+        return f"{name}({body['from']})"
+    if name == '$unionWith':
+        coll = body.get('coll') if isinstance(body, dict) else body
+        return f"{name}({coll})" if isinstance(coll, str) else name
+    return name
+
+
+def find_cost_drivers(pipeline):
+    names = [stage_name(stage) for stage in pipeline]
+    drivers = []
+    if names and names[0] not in LEADING_FILTER_STAGES:
+        drivers.append('no leading $match')
+    for position, name in enumerate(names):
+        if name in COSTLY_STAGES and name not in drivers:
+            drivers.append(name)
+        elif name == '$sort' and any(previous not in INDEX_FRIENDLY_PREDECESSORS for previous in names[:position]):
+            if 'in-memory $sort' not in drivers:
+                drivers.append('in-memory $sort')
+    return ", ".join(drivers)
+
+
+def shape_key(value, ordered=False):
+    # The shape with its keys sorted so that {a, b} and {b, a} filters match, except in bodies where order matters
+    if isinstance(value, dict):
+        items = value.items() if ordered else sorted(value.items())
+        return {key: shape_key(item, key in ORDERED_KEYS) for key, item in items}
+    if isinstance(value, list):
+        return [shape_key(item) for item in value]
+    return value
+
+
+def analyze_pipeline(collection, pipeline):
+    """Fingerprints an aggregation pipeline by its stage sequence and per-stage shape.
+
+    Pipelines that differ only in literal values or in the key order of their filters share one
+    PipelineAnalysis; $sort keys keep their order, as it is the sort order. The analysis is
+    cached per distinct (collection, shape) key, so each shape is hashed and analyzed once, and
+    per pipeline as logged, so a pipeline seen before skips the shaping as well.
+    """
+    raw_key = (collection, json.dumps(pipeline))
+    analysis = _raw_cache.get(raw_key)
+    if analysis is not None:
+        cache_stats['hits'] += 1
+        return analysis
+    if len(_raw_cache) >= MAX_CACHED_SHAPES: # bounded memory on logs with endless distinct shapes
+        _raw_cache.clear()
+    shape = pipeline_shape(pipeline)
+    key = json.dumps([collection, shape_key(shape)])
+    analysis = _cache.get(key)
+    if analysis is not None:
+        cache_stats['hits'] += 1
+        _raw_cache[raw_key] = analysis
+        return analysis
+    cache_stats['misses'] += 1
+    if len(_cache) >= MAX_CACHED_SHAPES:
+        _cache.clear()
+    analysis = _raw_cache[raw_key] = _cache[key] = PipelineAnalysis(
+        pipeline_id=hashlib.sha1(key.encode('utf-8')).hexdigest()[:12],
+        stages=" > ".join(stage_label(stage) for stage in pipeline),
+        cost_drivers=find_cost_drivers(pipeline),
+        shape=json.dumps(shape),
+    )
+    return analysis
+
+
+def clear_cache():
+    _cache.clear()
+    _raw_cache.clear()
+    cache_stats['hits'] = cache_stats['misses'] = 0
@@ -2,10 +2,17 @@ import unittest
 import pandas as pd
 from pandas.testing import assert_frame_equal, assert_series_equal
 import json
+import os
+import tempfile
+from datetime import datetime
 from io import BytesIO
 
 # Assuming mongo_parser.py is in the same directory or accessible via PYTHONPATH
-from Mongo.mongo_parser import normalize_query, parse_log_lines, save_to_excel
+from Mongo.mongo_parser import (normalize_query, parse_log_lines, save_to_excel, aggregate_log_file,
+                                 parse_node_specs, parse_node_log, merge_node_results, sample_log_file, MONGO)
+from Common.engine import parse_file, parse_records, build_sheets
+from Common.sampling import SamplePlan
+from Common.instrumentation import RunStats
 
 class TestMongoParser(unittest.TestCase):
 
@@ -96,10 +103,8 @@ class TestMongoParser(unittest.TestCase):
         # So, non_slow_df should be empty if only invalid JSON is provided.
         self.assertTrue(non_slow_df.empty, f"Non-slow DF should be empty, got: {non_slow_df}")
         self.assertTrue(error_df.empty)
-        self.assertEqual(len(parse_errors), 3) # one for each invalid line
-        self.assertIn("Line 1: Invalid JSON. Skipped.", parse_errors)
-        self.assertIn("Line 2: Invalid JSON. Skipped.", parse_errors) # Empty line
-        self.assertIn("Line 3: Invalid JSON. Skipped.", parse_errors) # Whitespace line
+        # invalid lines (the empty and whitespace ones included) are counted, with their line numbers as examples
+        self.assertEqual(parse_errors, ["Skipped 3 lines that are not valid JSON (lines 1, 2, 3)."])
 
     def test_parse_log_lines_single_slow_query(self):
         lines = [self.sample_slow_query_line]
@@ -114,7 +119,9 @@ class TestMongoParser(unittest.TestCase):
         expected_command_obj = {"find":"mycollection","filter":{"name":"test"},"sort":{"age":-1},"limit":10,"comment":"slow_query_example"}
         self.assertEqual(json.loads(output_df.iloc[0]['Command']), expected_command_obj)
         self.assertEqual(output_df.iloc[0]['Collection'], "mycollection")
-        self.assertEqual(output_df.iloc[0]['AppName'], "testdb")
+        self.assertEqual(output_df.iloc[0]['Database'], "testdb")
+        self.assertEqual(output_df.iloc[0]['AppName'], "") # no attr.appName logged
+        self.assertEqual(output_df.iloc[0]['Remote'], "127.0.0.1:12345")
         self.assertEqual(output_df.iloc[0]['Duration(ms)'], 150)
         self.assertEqual(output_df.iloc[0]['KeysExamined'], 0)
         self.assertEqual(output_df.iloc[0]['DocsExamined'], 1000)
@@ -178,8 +185,7 @@ class TestMongoParser(unittest.TestCase):
         ]
         output_df, query_stats_df, non_slow_df, error_df, parse_errors = parse_log_lines(lines)
 
-        self.assertEqual(len(parse_errors), 1)
-        self.assertIn("Line 2: Invalid JSON. Skipped.", parse_errors)
+        self.assertEqual(parse_errors, ["Skipped 1 lines that are not valid JSON (lines 2)."])
 
         # output_df (detailed metrics for slow queries)
         self.assertEqual(len(output_df), 3) # 3 slow queries
@@ -269,6 +275,166 @@ class TestMongoParser(unittest.TestCase):
         # assert_frame_equal(df_detailed_read, output_df)
 
 
+    def test_parse_log_lines_collects_run_stats(self):
+        lines = [self.sample_slow_query_line, self.invalid_json_line, self.sample_error_line, self.sample_non_slow_non_error_line]
+        stats = RunStats("mongo_parser")
+        parse_log_lines(lines, run_stats=stats)
+        self.assertEqual(stats.counters['lines_read'], 4)
+        self.assertEqual(stats.counters['lines_decoded'], 3)
+        self.assertEqual(stats.counters['slow_queries'], 1)
+        self.assertEqual(stats.counters['errors'], 1)
+        self.assertEqual(stats.counters['parse_failures'], 1)
+        for stage in ('json.loads', 'normalize_query', 'dataframe construction'):
+            self.assertIn(stage, stats.timings)
+
+
+    def test_aggregate_log_file_with_time_window(self):
+        lines = [self.sample_slow_query_line, self.sample_error_line, self.another_slow_query_line_agg, self.sample_slow_query_line]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mongod.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            full_state = aggregate_log_file(path)
+            windowed_state = aggregate_log_file(path, since=datetime(2023, 10, 25, 10, 5))
+
+        cmd1 = normalize_query(json.dumps(json.loads(self.sample_slow_query_line)['attr']['command']))
+        self.assertEqual(len(full_state), 2)
+        self.assertEqual(full_state[cmd1].count, 2)
+        self.assertEqual(full_state[cmd1].total, 300)
+        self.assertEqual(len(windowed_state), 1) # only the 10:10 aggregate query is inside the window
+        self.assertNotIn(cmd1, windowed_state)
+
+
+    def test_multi_node_merge_orders_events_and_keeps_node_breakdowns(self):
+        node_a_lines = [self.sample_slow_query_line, self.sample_error_line, self.another_slow_query_line_agg] # 10:00, 10:05, 10:10
+        node_b_lines = [self.sample_slow_query_line.replace("10:00:00", "10:07:00"), self.sample_error_line]
+        with tempfile.TemporaryDirectory() as tmp:
+            specs = []
+            for name, lines in (('node-a', node_a_lines), ('node-b', node_b_lines)):
+                path = os.path.join(tmp, f"{name}.log")
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+                specs.append(path)
+            nodes = parse_node_specs(specs)
+            self.assertEqual([node for node, _ in nodes], ['node-a', 'node-b'])
+            sheets = merge_node_results([parse_node_log(node, path) for node, path in nodes])
+
+        detailed = sheets['Detailed Metrics']
+        self.assertEqual(list(detailed['Node']), ['node-a', 'node-b', 'node-a'])
+        self.assertEqual(list(detailed['Duration(ms)']), [150, 150, 250])
+
+        cmd1 = normalize_query(json.dumps(json.loads(self.sample_slow_query_line)['attr']['command']))
+        cluster_row = sheets['Query Stats'].set_index('Query Pattern').loc[cmd1]
+        self.assertEqual(cluster_row['Executions'], 2)
+        self.assertEqual(len(sheets['Node Query Stats']), 3)
+
+        self.assertEqual(len(sheets['Error Stats']), 1)
+        self.assertEqual(sheets['Error Stats'].iloc[0]['totalCount'], 2)
+        self.assertEqual(sheets['Error Stats'].iloc[0]['Nodes'], 'node-a, node-b')
+        self.assertEqual(list(sheets['Node Error Stats']['Node']), ['node-a', 'node-b'])
+        self.assertEqual(list(sheets['Node Summary']['Slow Queries']), [2, 1])
+
+    def test_parse_node_specs_names(self):
+        nodes = parse_node_specs(['rs0-a=/logs/a/mongod.log', '/logs/b/mongod.log', '/logs/c/mongod.log'])
+        self.assertEqual(nodes, [('rs0-a', '/logs/a/mongod.log'), ('b/mongod', '/logs/b/mongod.log'), ('c/mongod', '/logs/c/mongod.log')])
+
+
+    def test_sample_log_file_full_fraction_matches_full_parse(self):
+        lines = [self.sample_slow_query_line, self.sample_error_line, self.another_slow_query_line_agg] * 20
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mongod.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            plan = SamplePlan(path, 1.0, block_size=1024, seed=1)
+            plan, sheets = sample_log_file(path, 1.0, reservoir_size=5, seed=1, plan=plan)
+
+        self.assertTrue(plan.is_complete)
+        self.assertGreater(plan.total_blocks, 1)
+        self.assertEqual(len(sheets['Detailed Metrics (Sample)']), 5)
+        stats = sheets['Query Stats (Estimated)']
+        self.assertEqual(sorted(stats['Estimated Executions']), [20, 20])
+        self.assertEqual(list(stats['Sampled Executions']), list(stats['Executions CI High (95%)']))
+        self.assertEqual(sheets['Error Stats (Estimated)'].iloc[0]['Estimated Count'], 20)
+
+
+    def test_parse_file_in_parallel_chunks_keeps_line_numbers(self):
+        lines = [self.sample_slow_query_line, self.invalid_json_line, self.sample_error_line, self.another_slow_query_line_agg] * 25
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mongod.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            result = parse_file(MONGO, path, jobs=2, chunk_size=2048)
+        output_df, query_stats_df, non_slow_df, error_df, parse_errors = parse_log_lines(lines)
+
+        self.assertEqual(result.issue_messages(MONGO), parse_errors)
+        self.assertEqual(result.rows, output_df.values.tolist())
+        sheets = build_sheets(MONGO, result)
+        assert_frame_equal(sheets['Error Stats'], error_df)
+        self.assertEqual(sheets['Error Stats'].iloc[0]['OriginalLineNumber'], 3)
+        self.assertEqual(sheets['Error Stats'].iloc[0]['totalCount'], 25)
+
+
+    def test_pipeline_stats_group_by_stage_sequence(self):
+        agg = json.loads(self.another_slow_query_line_agg)
+        lines = []
+        for i, status in enumerate(["active", "closed", "pending"]):
+            agg['attr']['command']['pipeline'][0]['$match']['status'] = status
+            agg['attr']['durationMillis'] = 100 * (i + 1)
+            lines.append(json.dumps(agg) + "\n")
+        lines.append(self.sample_slow_query_line)
+        result = parse_records(MONGO, lines)
+        sheets = build_sheets(MONGO, result)
+
+        detailed = sheets['Detailed Metrics']
+        self.assertEqual(detailed['Pipeline Stages'].tolist()[:3], ["$match > $group"] * 3)
+        self.assertEqual(detailed['Pipeline Id'].nunique(), 2) # three pipelines plus '' for the find
+        self.assertEqual(detailed['Pipeline Id'].iloc[3], '')
+        pipeline_df = sheets['Pipeline Stats']
+        self.assertEqual(len(pipeline_df), 1)
+        row = pipeline_df.iloc[0]
+        self.assertEqual((row['Collection'], row['Stages'], row['Cost Drivers']), ("anothercollection", "$match > $group", "$group"))
+        self.assertEqual((row['Executions'], row['Min Duration(ms)'], row['Max Duration(ms)'], row['Total Duration(ms)']),
+                         (3, 100, 300, 600))
+        self.assertAlmostEqual(row['P95 Duration(ms)'], 290.0)
+
+        # Per-collection rollup of the same observations
+        collections = sheets['Workload Attribution'].set_index(['Dimension', 'Value']).loc['Collection']
+        self.assertEqual(list(collections.index), ["anothercollection", "mycollection"])
+        self.assertEqual((collections.loc["anothercollection", 'Executions'],
+                          collections.loc["anothercollection", 'Total_Duration(ms)']), (3, 600))
+
+
+    def test_attr_fields_and_query_hash_grouping(self):
+        slow = json.loads(self.sample_slow_query_line)
+        lines = []
+        for i, name in enumerate(["a", "b"]):
+            slow['attr'].update({
+                "appName": "billing-api", "queryHash": "3E4A1F2B", "planCacheKey": "9C1D2E3F", "reslen": 200 * (i + 1),
+                "cpuNanos": 2000000, "storage": {"data": {"bytesRead": 4096, "timeReadingMicros": 1500}},
+                "locks": {"Global": {"acquireCount": {"r": 2}, "timeAcquiringMicros": {"r": 300}},
+                          "Collection": {"acquireCount": {"r": 1}}},
+            })
+            slow['attr']['command']['filter'] = {"name": name}
+            lines.append(json.dumps(slow) + "\n")
+        lines.append(self.sample_slow_query_line)
+        sheets = build_sheets(MONGO, parse_records(MONGO, lines))
+
+        row = sheets['Detailed Metrics'].iloc[0]
+        self.assertEqual((row['AppName'], row['QueryHash'], row['PlanCacheKey']), ("billing-api", "3E4A1F2B", "9C1D2E3F"))
+        self.assertEqual((row['reslen'], row['cpuNanos'], row['bytesRead'], row['timeReadingMicros']), (200, 2000000, 4096, 1500))
+        self.assertEqual((row['LockAcquisitions'], row['LockWaitMicros']), (3, 300))
+        self.assertEqual(row['Query Pattern'], "testdb.mycollection queryHash:3E4A1F2B")
+
+        stats = sheets['Query Stats'].set_index('Query Pattern')
+        self.assertEqual(len(stats), 2) # both hashed queries share mongod's shape; the unhashed one is normalized
+        hashed = stats.loc["testdb.mycollection queryHash:3E4A1F2B"]
+        self.assertEqual(hashed['Executions'], 2)
+        self.assertEqual((hashed['Total Bytes Read'], hashed['Avg Bytes Read']), (8192, 4096))
+        self.assertEqual((hashed['Total CPU(ms)'], hashed['Total Storage Read(ms)'], hashed['Total Lock Wait(ms)']), (4.0, 3.0, 0.6))
+        self.assertEqual(hashed['Total Response Bytes'], 600)
+        self.assertTrue(pd.isna(stats.iloc[1]['Total CPU(ms)']))
+
+
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
 
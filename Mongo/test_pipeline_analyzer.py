@@ -0,0 +1,78 @@
+import unittest
+import json
+from unittest import mock
+
+from Mongo.pipeline_analyzer import analyze_pipeline, pipeline_shape, find_cost_drivers, clear_cache, cache_stats
+
+class TestPipelineAnalyzer(unittest.TestCase):
+
+    lookup_pipeline = [
+        {"$match": {"status": "active", "tier": {"$in": [1, 2, 3]}}},
+        {"$lookup": {"from": "orders", "localField": "_id", "foreignField": "customerId", "as": "orders"}},
+        {"$unwind": "$orders"},
+        {"$group": {"_id": "$region", "total": {"$sum": "$orders.amount"}}},
+        {"$sort": {"total": -1}},
+        {"$limit": 10},
+    ]
+
+    def setUp(self):
+        clear_cache()
+
+    def test_shape_keeps_structure_and_drops_literals(self):
+        shape = pipeline_shape(self.lookup_pipeline)
+        self.assertEqual(shape[0], {"$match": {"status": "?", "tier": {"$in": ["?"]}}})
+        self.assertEqual(shape[1]["$lookup"]["from"], "orders")
+        self.assertEqual(shape[2], {"$unwind": "$orders"})
+        self.assertEqual(shape[3], {"$group": {"_id": "$region", "total": {"$sum": "$orders.amount"}}})
+        self.assertEqual(shape[4], {"$sort": {"total": -1}}) # sort direction is part of the shape
+        self.assertEqual(shape[5], {"$limit": "?"})
+
+    def test_pipelines_differing_only_in_literals_share_a_fingerprint(self):
+        other = json.loads(json.dumps(self.lookup_pipeline).replace('"active"', '"closed"').replace('[1, 2, 3]', '[7]'))
+        first = analyze_pipeline("customers", self.lookup_pipeline)
+        second = analyze_pipeline("customers", other)
+        self.assertIs(first, second)
+        self.assertEqual(cache_stats, {'hits': 1, 'misses': 1})
+        self.assertEqual(first.stages, "$match > $lookup(orders) > $unwind > $group > $sort > $limit")
+        self.assertEqual(json.loads(first.shape), pipeline_shape(self.lookup_pipeline))
+
+        reordered = [self.lookup_pipeline[0], self.lookup_pipeline[4], self.lookup_pipeline[1]]
+        self.assertNotEqual(analyze_pipeline("customers", reordered).pipeline_id, first.pipeline_id)
+        self.assertNotEqual(analyze_pipeline("archive", self.lookup_pipeline).pipeline_id, first.pipeline_id)
+
+    def test_repeated_pipeline_is_not_shaped_again(self):
+        first = analyze_pipeline("customers", self.lookup_pipeline)
+        with mock.patch('Mongo.pipeline_analyzer.pipeline_shape', wraps=pipeline_shape) as shape:
+            self.assertIs(analyze_pipeline("customers", json.loads(json.dumps(self.lookup_pipeline))), first)
+            self.assertIsNot(analyze_pipeline("archive", self.lookup_pipeline), first)
+        self.assertEqual(shape.call_count, 1)
+        self.assertEqual(cache_stats, {'hits': 1, 'misses': 2})
+
+    def test_sort_key_order_is_part_of_the_fingerprint(self):
+        by_a = analyze_pipeline("orders", [{"$match": {"x": 1, "y": 2}}, {"$sort": {"a": 1, "b": -1}}])
+        by_b = analyze_pipeline("orders", [{"$match": {"x": 1, "y": 2}}, {"$sort": {"b": -1, "a": 1}}])
+        self.assertNotEqual(by_a.pipeline_id, by_b.pipeline_id)
+        self.assertEqual(json.loads(by_b.shape)[1], {"$sort": {"b": -1, "a": 1}})
+        # filter key order does not change what a stage matches
+        swapped = analyze_pipeline("orders", [{"$match": {"y": 5, "x": 6}}, {"$sort": {"a": 1, "b": -1}}])
+        self.assertIs(swapped, by_a)
+        window = [{"$setWindowFields": {"sortBy": {"b": 1, "a": 1}, "output": {"n": {"$count": {}}}}}]
+        reversed_window = [{"$setWindowFields": {"output": {"n": {"$count": {}}}, "sortBy": {"a": 1, "b": 1}}}]
+        self.assertNotEqual(analyze_pipeline("orders", window).pipeline_id,
+                            analyze_pipeline("orders", reversed_window).pipeline_id)
+
+    def test_cost_drivers(self):
+        self.assertEqual(find_cost_drivers(self.lookup_pipeline), "$lookup, $unwind, $group, in-memory $sort")
+        self.assertEqual(find_cost_drivers([{"$match": {"a": 1}}, {"$sort": {"b": 1}}]), "")
+        self.assertEqual(find_cost_drivers([{"$group": {"_id": "$a"}}]), "no leading $match, $group")
+
+    def test_nested_pipelines(self):
+        facet = [{"$facet": {"recent": [{"$match": {"day": 3}}, {"$sort": {"ts": -1}}], "count": [{"$count": "n"}]}}]
+        self.assertEqual(pipeline_shape(facet), [{"$facet": {"recent": [{"$match": {"day": "?"}}, {"$sort": {"ts": -1}}],
+                                                             "count": [{"$count": "?"}]}}])
+        union = [{"$unionWith": {"coll": "archive", "pipeline": [{"$match": {"y": 2024}}]}}]
+        self.assertEqual(analyze_pipeline("events", union).stages, "$unionWith(archive)")
+
+
+if __name__ == '__main__':
+    unittest.main()
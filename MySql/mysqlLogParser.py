@@ -1,8 +1,24 @@
+import os
 import re
-import pandas as pd
-import streamlit as st
-from io import StringIO, BytesIO
-import argparse
+import sys
+from functools import lru_cache
+
+# Make the shared Common/ package importable when run as a script (python MySql/mysqlLogParser.py)
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from Common.engine import LogFormat, RecordError, parse_records, build_sheets, aggregate_file, sample_file
+from Common.attribution import build_attribution_sheets
+from Common.concurrency import analyze_concurrency
+from Common.lazy import lazy_import
+from Common.sampling import DEFAULT_RESERVOIR_SIZE
+from Common.store import write_to_store
+from Common.timeutil import parse_log_timestamp
+from Common.cli import build_arg_parser, run_cli
+from Common.ui import run_streamlit_app as run_format_streamlit_app
+
+pd = lazy_import('pandas') # CLI runs that never build a DataFrame (e.g. --help) skip the pandas import
 
 # Function to normalize queries by removing specific values
 def normalize_query(query):
@@ -12,126 +28,230 @@ def normalize_query(query):
     normalized_query = normalized_query.upper()
     return normalized_query
 
-# Function to parse the log content and extract the required metrics
-def parse_mysql_log_content(log_content_string):
-    # Regular expressions to extract the required fields
-    time_pattern = re.compile(r'# Time: (.*)')
-    user_host_pattern = re.compile(r'# User@Host: (.*?) thread_id:') # Kept original, assuming it's correct for target logs
-    query_time_pattern = re.compile(r'# Query_time: (.*?) Lock_time:')
-    lock_time_pattern = re.compile(r'Lock_time: (.*?) Rows_sent:')
-    rows_sent_pattern = re.compile(r'Rows_sent: (.*?) Rows_examined:')
-    rows_examined_pattern = re.compile(r'Rows_examined: (.*?)\n')
-    # query_pattern looks for a query that might span multiple lines, starting after SET timestamp=...;
-    # and ending before the next # Time:
-    # It assumes there's always a SET timestamp before the actual query of interest.
-    query_pattern = re.compile(r'SET timestamp=.*?;\n(.*?)(?=\n# Time:|\Z)', re.DOTALL)
-
-
-    # Lists to store the extracted data
-    time_list = []
-    user_host_list = []
-    query_time_list = []
-    lock_time_list = []
-    rows_sent_list = []
-    rows_examined_list = []
-    query_list = []
-    normalized_query_list = []
-    parse_warnings = []
-
-    # Split log content by "# Time" for individual entries
-    # The first element after split will be empty if log starts with # Time, or contain pre-amble.
-    # We only care about sections starting with # Time that represent a query block.
-    log_entries = log_content_string.split('# Time: ')
-    if not log_entries:
-        parse_warnings.append("Log content seems empty or not structured as expected (missing '# Time: ' delimiters).")
-        return pd.DataFrame(), pd.DataFrame(), parse_warnings
-
-    # The first item in log_entries might be a header or empty if the file starts with # Time.
-    # We iterate from the second item, prepending '# Time: ' to reconstruct the entry.
-    processed_entries = 0
-    for i, entry_content in enumerate(log_entries[1:]): # Skip the part before the first "# Time: "
-        full_entry = '# Time: ' + entry_content # Reconstruct the full log entry segment
-
-        time_match = time_pattern.search(full_entry) # Time is already extracted by split, but good for consistency check
-        user_host_match = user_host_pattern.search(full_entry)
-        query_time_match = query_time_pattern.search(full_entry)
-        lock_time_match = lock_time_pattern.search(full_entry)
-        rows_sent_match = rows_sent_pattern.search(full_entry)
-        rows_examined_match = rows_examined_pattern.search(full_entry)
-        
-        # For query_match, we need to ensure it operates on a segment that potentially includes a following # Time
-        # to correctly delimit the query. We search within full_entry.
-        # The regex uses a positive lookahead `(?=\n# Time:|\Z)` to find the end of the query.
-        query_match = query_pattern.search(full_entry)
-
-        if time_match and user_host_match and query_time_match and lock_time_match and rows_sent_match and rows_examined_match and query_match:
-            time_list.append(time_match.group(1).strip())
-            user_host_list.append(user_host_match.group(1).strip())
-            try:
-                query_time_list.append(float(query_time_match.group(1).strip()) * 1000)  # Convert to ms
-            except ValueError:
-                parse_warnings.append(f"Could not parse Query_time: '{query_time_match.group(1)}' in entry {i+1}. Skipping field.")
-                query_time_list.append(0.0) # Default value
-            
-            lock_time_list.append(lock_time_match.group(1).strip())
-            rows_sent_list.append(rows_sent_match.group(1).strip())
-            rows_examined_list.append(rows_examined_match.group(1).strip())
-            
-            query = query_match.group(1).strip()
-            # If the query is empty (e.g. just "COMMIT" or "ROLLBACK" that might not be captured by query_pattern)
-            # or if query_pattern fails, we might want to log a warning or skip.
-            if not query:
-                parse_warnings.append(f"Empty query string found in entry {i+1}. It might be a non-SELECT/INSERT/UPDATE/DELETE statement or a parsing issue.")
-                # Decide if to append empty or skip entry
-                query_list.append("N/A (Query not captured)")
-                normalized_query_list.append("N/A (Query not captured)")
+# Yes/No header flags (Full_scan, Filesort, ...) become 1/0 so they can be summed per query pattern
+def parse_flag(value):
+    if value not in ('Yes', 'No'):
+        raise ValueError(value)
+    return 1 if value == 'Yes' else 0
+
+# "Name: value" pairs on '# ' header lines. MySQL writes Query_time/Lock_time/Rows_sent/Rows_examined; Percona Server
+# and MariaDB add Schema, Rows_affected, Bytes_sent, temporary table, plan and (log_slow_verbosity=innodb) InnoDB fields.
+header_field_pattern = re.compile(r'\b([A-Za-z_]+): +([^\s:]+)(?=\s|$)')
+# "# User@Host: user[user] @ host [ip]  Id: 12" (MySQL) or "... thread_id: 12 ..."; the thread id is optional
+user_host_pattern = re.compile(r'# User@Host: (.*?)(?:\s+(?:Id|thread_id):\s*(\d+).*)?$')
+# "priv_user[user] @ host [ip]": the host is empty when the server does not resolve names, the IP for local connections
+account_pattern = re.compile(r'([^\[\s]*)\[([^\]]*)\]\s*@\s*([^\[\s]*)\s*(?:\[([^\]]*)\])?')
+header_fields = {
+    'Thread_id': int, 'Schema': str, 'Lock_time': float, 'Rows_sent': int, 'Rows_examined': int,
+    'Rows_affected': int, 'Bytes_sent': int, 'Tmp_tables': int, 'Tmp_disk_tables': int,
+    'Full_scan': parse_flag, 'Full_join': parse_flag, 'Filesort': parse_flag, 'Filesort_on_disk': parse_flag,
+    'Merge_passes': int, 'InnoDB_IO_r_ops': int, 'InnoDB_IO_r_bytes': int, 'InnoDB_IO_r_wait': float,
+    'InnoDB_rec_lock_wait': float, 'InnoDB_queue_wait': float, 'InnoDB_pages_distinct': int,
+}
+# Columns only some servers write; they are left out of the report when no entry has them
+optional_columns = ['IP', 'Thread_id', 'Schema', 'Rows_affected', 'Bytes_sent', 'Tmp_tables', 'Tmp_disk_tables', 'Full_scan',
+                    'Full_join', 'Filesort', 'Filesort_on_disk', 'Merge_passes', 'InnoDB_IO_r_ops', 'InnoDB_IO_r_bytes',
+                    'InnoDB_IO_r_wait', 'InnoDB_rec_lock_wait', 'InnoDB_queue_wait', 'InnoDB_pages_distinct']
+# Numeric header fields summed per query pattern in the Aggregate Results sheet (flags sum to a count of entries)
+summed_columns = [field for field, convert in header_fields.items() if convert is not str and field != 'Thread_id']
+
+# User, Host and IP are split from User@Host; Schema is the header field or the database of the last `use db;` line
+detailed_columns = (['Time', 'User@Host', 'User', 'Host', 'IP', 'Thread_id', 'Schema', 'Query_time (ms)', 'Lock_time',
+                     'Rows_sent', 'Rows_examined'] + optional_columns[3:] + ['Query', 'Normalized_Query'])
+row_fields = detailed_columns[5:-2]
+QUERY_INDEX = len(detailed_columns) - 2
+QUERY_NOT_CAPTURED = "N/A (Query not captured)"
+
+# Entries with problems are counted per kind rather than reported one by one (a large log can have millions)
+issue_descriptions = {
+    'entries_missing_query_time': "Skipped {count} log entries without a '# Query_time:' header (first: entry {first}).",
+    'entries_failed': "Skipped {count} log entries that could not be parsed (first: entry {first}).",
+    'invalid_query_time': "{count} entries had an unparsable Query_time, recorded as 0 (first: entry {first}).",
+    'empty_queries': "{count} entries had no query text, recorded as '" + QUERY_NOT_CAPTURED + "' (first: entry {first}). "
+                     "They might be non-SELECT/INSERT/UPDATE/DELETE statements or a parsing issue.",
+    'invalid_header_values': "{count} header values could not be parsed and were left empty (first: entry {first}).",
+}
+
+# (user, host, IP) of a User@Host value, None where empty; the host falls back to the IP when names are not resolved
+@lru_cache(maxsize=4096) # a log has few distinct accounts
+def split_account(user_host):
+    match = account_pattern.match(user_host)
+    if match is None:
+        return user_host or None, None, None
+    priv_user, user, host, ip = match.groups()
+    return priv_user or user or None, host or ip or None, ip or None
+
+class MySqlFormat(LogFormat):
+    # MySQL slow query log: each entry starts with '# Time: ' and may span many lines
+    name = "mysqlLogParser"
+    title = "MySQL"
+    multi_line = True
+    detailed_columns = detailed_columns
+    duration_column = 'Query_time (ms)'
+    sample_column = 'Query'
+    summed_columns = summed_columns
+    pooled_columns = ('Time', 'User@Host', 'User', 'Host', 'IP', 'Schema', 'Query') # one-second timestamps repeat too
+    count_failures = True
+    stats_sheet = 'Aggregate Results'
+    record_label = 'Entries'
+    record_counter = 'entries'
+    decode_stage = 'regex extraction'
+    fingerprint_stage = 'normalize_query'
+    empty_note = 'query entries'
+    filter_columns = {'user': 'User', 'db': 'Schema'}
+    raw_duration_pattern = re.compile(r'# Query_time: (\d+(?:\.\d+)?)')
+    raw_duration_scale = 1000 # Query_time is logged in seconds
+    redacted_columns = ('Query',) # its shape is the normalized query
+    attribution_columns = ('User', 'Host', 'Schema')
+    attribution_summed = ('Rows_examined', 'Rows_sent', 'Lock_time')
+    # The server writes `use db;` only when the database differs from the previous entry's, so later entries inherit it
+    carried_columns = ('Schema',)
+    carry_marker = '\nuse '
+    store_sheets = {'slow_queries': 'Detailed Metrics', 'aggregates': 'Aggregate Results'}
+    store_indexes = {
+        'slow_queries': ['Normalized_Query', 'User@Host', 'Query_time (ms)'],
+        'aggregates': ['Normalized_Query'],
+    }
+    store_timestamp_columns = {'slow_queries': 'Time'}
+
+    def is_record_start(self, line):
+        return line.startswith('# Time: ')
+
+    def decode(self, record):
+        # Returns {header field: raw text} plus 'Time', 'User@Host' and 'Query'; only Query_time is required
+        lines = record.splitlines()
+        entry = {'Time': lines[0][len('# Time: '):].strip(), 'User@Host': ''}
+        body_start = 1
+        for line in lines[1:]:
+            if not line.startswith('#'):
+                break
+            body_start += 1
+            if line.startswith('# User@Host: '):
+                match = user_host_pattern.match(line)
+                entry['User@Host'] = match.group(1).strip()
+                if match.group(2):
+                    entry['Thread_id'] = match.group(2)
             else:
-                query_list.append(query)
-                normalized_query_list.append(normalize_query(query))
-            processed_entries +=1
-        else:
-            # This warning helps identify which entries are not fully matching.
-            # It could be due to variations in log format or incomplete entries.
-            details = f"T:{bool(time_match)}, UH:{bool(user_host_match)}, QT:{bool(query_time_match)}, LT:{bool(lock_time_match)}, RS:{bool(rows_sent_match)}, RE:{bool(rows_examined_match)}, Q:{bool(query_match)}"
-            parse_warnings.append(f"Skipped log entry {i+1} due to missing fields. Details: {details}. Content snippet: {full_entry[:200]}...")
+                entry.update(header_field_pattern.findall(line))
+        if 'Query_time' not in entry:
+            raise RecordError('entries_missing_query_time')
+        # 'use <db>;' and 'SET timestamp=...;' precede the statement itself
+        while body_start < len(lines) and lines[body_start].startswith(('SET timestamp=', 'use ')):
+            if lines[body_start].startswith('use ') and 'Schema' not in entry:
+                entry['Schema'] = lines[body_start][4:].strip().rstrip(';').strip('`')
+            body_start += 1
+        entry['Query'] = '\n'.join(lines[body_start:]).strip()
+        return entry
+
+    def slow_row(self, entry, result):
+        try:
+            query_time_ms = float(entry['Query_time']) * 1000 # Convert to ms
+        except ValueError:
+            result.count_issue('invalid_query_time')
+            query_time_ms = 0.0 # Default value
+        query = entry['Query']
+        # If the query is empty (e.g. just "COMMIT" or "ROLLBACK" that might not be captured)
+        if not query:
+            result.count_issue('empty_queries')
+            query = QUERY_NOT_CAPTURED
+        row = [entry['Time'], entry['User@Host'], *split_account(entry['User@Host'])]
+        for field in row_fields:
+            value = entry.get(field)
+            if field == self.duration_column:
+                value = query_time_ms
+            elif value is not None:
+                try:
+                    value = header_fields[field](value)
+                except ValueError:
+                    result.count_issue('invalid_header_values')
+                    value = None
+            row.append(value)
+        row.append(query)
+        return row
+
+    def fingerprint(self, row):
+        query = row[QUERY_INDEX]
+        return query if query == QUERY_NOT_CAPTURED else normalize_query(query)
+
+    def timestamp(self, entry):
+        return parse_log_timestamp(entry['Time'])
+
+    def failure_message(self, exc):
+        # An issue kind (see issue_descriptions), since failures are counted
+        return str(exc) if isinstance(exc, RecordError) else 'entries_failed'
+
+    def issue_summary(self, kind, count, first_record, examples=()):
+        if kind in issue_descriptions:
+            return issue_descriptions[kind].format(count=count, first=first_record)
+        return super().issue_summary(kind, count, first_record, examples)
+
+    def build_sheets(self, result, detailed_df):
+        empty_optional = [column for column in optional_columns if detailed_df[column].isna().all()]
+        # '# Time:' is written when a query finishes, so each entry ran over [Time - Query_time, Time]
+        peaks_df, pileups_df = analyze_concurrency(detailed_df, 'Time', 'Query_time (ms)', 'Normalized_Query', 'Lock_time')
+        attribution_df, attribution_top_df = build_attribution_sheets(result.attribution, self.attribution_columns,
+                                                                      self.attribution_summed, 'Normalized_Query',
+                                                                      'Query_time_ms')
+        return {'Detailed Metrics': detailed_df.drop(columns=empty_optional),
+                'Aggregate Results': build_aggregate_df(result.patterns),
+                'Concurrency Peaks': peaks_df,
+                'Pile-up Patterns': pileups_df,
+                'Workload Attribution': attribution_df,
+                'Attribution Top Patterns': attribution_top_df}
+
+MYSQL = MySqlFormat()
+
+# Per-pattern aggregate table, ordered by normalized query. Header fields present in the log are summed per
+# pattern as Total_<field> columns (e.g. Total_Rows_examined, Total_Full_scan = entries that did a full scan).
+# Lock_time is logged in seconds but reported in ms like the query time, as Total_Lock_time_ms and
+# Avg_Lock_time_ms; Lock_Ratio is the share of the pattern's query time spent waiting for locks.
+def build_aggregate_df(patterns):
+    present = [field for field in summed_columns if any(stats.totals and field in stats.totals for stats in patterns.values())]
+    lock_columns = ['Total_Lock_time_ms', 'Avg_Lock_time_ms', 'Lock_Ratio'] if 'Lock_time' in present else []
+    present = [field for field in present if field != 'Lock_time']
+    aggregate_df = pd.DataFrame([
+        [pattern, stats.count, stats.min, stats.max, round(stats.mean, 2)] +
+        [(stats.totals or {}).get(field) for field in present] + lock_stats(stats, lock_columns) + [stats.sample]
+        for pattern, stats in sorted(patterns.items())
+    ], columns=['Normalized_Query', 'Executions', 'Min_Query_time_ms', 'Max_Query_time_ms', 'Avg_Query_time_ms'] +
+               [f'Total_{field}' for field in present] + lock_columns + ['Sample_Query'])
+    return aggregate_df
+
+def lock_stats(stats, lock_columns):
+    if not lock_columns:
+        return []
+    lock_ms = (stats.totals or {}).get('Lock_time', 0) * 1000 # Lock_time is logged in seconds
+    return [round(lock_ms, 6), round(lock_ms / stats.count, 3), round(lock_ms / stats.total, 6) if stats.total else None]
 
+# Function to parse the log content and extract the required metrics
+# run_stats: optional RunStats collecting per-stage timings and entry counters
+def parse_mysql_log_content(log_content_string, run_stats=None):
+    if run_stats is not None:
+        with run_stats.stage('split entries'):
+            lines = log_content_string.splitlines(keepends=True)
+    else:
+        lines = log_content_string.splitlines(keepends=True)
+    result = parse_records(MYSQL, lines, run_stats=run_stats, keep_other=False)
+    parse_warnings = result.issue_messages(MYSQL)
 
-    if not processed_entries and not time_list: # check if any data was actually processed
+    if not result.rows: # check if any data was actually processed
         parse_warnings.append("No valid log entries were parsed. The log might be in an unexpected format or empty.")
         return pd.DataFrame(), pd.DataFrame(), parse_warnings
 
-    # Create a DataFrame from the lists
-    df_detailed = pd.DataFrame({
-        'Time': time_list,
-        'User@Host': user_host_list,
-        'Query_time (ms)': query_time_list,
-        'Lock_time': lock_time_list,
-        'Rows_sent': rows_sent_list,
-        'Rows_examined': rows_examined_list,
-        'Query': query_list,
-        'Normalized_Query': normalized_query_list
-    })
-
-    if df_detailed.empty:
-        parse_warnings.append("Detailed metrics DataFrame is empty after processing.")
-        return df_detailed, pd.DataFrame(), parse_warnings
-
-    # Calculate aggregate results
-    try:
-        aggregate_df = df_detailed.groupby('Normalized_Query').agg(
-            Executions=('Normalized_Query', 'count'),
-            Min_Query_time_ms=('Query_time (ms)', 'min'), # Added ms for clarity
-            Max_Query_time_ms=('Query_time (ms)', 'max'), # Added ms for clarity
-            Avg_Query_time_ms=('Query_time (ms)', 'mean'), # Added ms for clarity
-            Sample_Query=('Query', 'first')
-        ).reset_index()
-        if not aggregate_df.empty:
-             aggregate_df['Avg_Query_time_ms'] = aggregate_df['Avg_Query_time_ms'].round(2)
-    except Exception as e:
-        parse_warnings.append(f"Error during aggregation: {str(e)}")
-        aggregate_df = pd.DataFrame() # Return empty if aggregation fails
+    sheets = build_sheets(MYSQL, result, run_stats)
+    return sheets['Detailed Metrics'], sheets['Aggregate Results'], parse_warnings
 
-    return df_detailed, aggregate_df, parse_warnings
+# --- Aggregate-only Parsing (compare mode) ---
+# Streams the file and returns {Normalized_Query: PatternStats} for entries inside [since, until].
+# No detailed rows are kept, so memory depends on the number of distinct patterns, not the file size.
+def aggregate_mysql_log_file(path, since=None, until=None):
+    return aggregate_file(MYSQL, path, since, until)
+
+# --- Sampling Mode (quick triage of huge logs) ---
+# Reads a random subset of fixed-size blocks (aligned to '# Time: ' entries), keeps a reservoir sample of
+# detailed rows and extrapolates per-pattern counts to the whole file. Returns (plan, {sheet name: DataFrame}).
+def sample_mysql_log_file(path, fraction, reservoir_size=DEFAULT_RESERVOIR_SIZE, seed=None, plan=None):
+    return sample_file(MYSQL, path, fraction, reservoir_size, seed, plan)
 
 # Function to save DataFrames to an Excel file
 def save_to_excel(df_detailed, df_aggregated, output_filepath_or_buffer):
@@ -143,167 +263,31 @@ def save_to_excel(df_detailed, df_aggregated, output_filepath_or_buffer):
     except Exception as e:
         return False, str(e)
 
-# --- Streamlit App Function ---
-def run_streamlit_app():
-    st.set_page_config(page_title="MySQL Log Parser", layout="wide")
-    st.title("MySQL Log Parser & Analyzer")
-
-    uploaded_file = st.file_uploader(
-        "Upload your MySQL log file:",
-        type=["log", "txt"] # MySQL logs can be .log or .txt
+# Function to append DataFrames to a SQLite/DuckDB file for ad-hoc SQL (see Common/store.py for the table layout)
+def save_to_store(df_detailed, df_aggregated, store_path, source, backend='auto'):
+    return write_to_store(
+        store_path, MYSQL.name, source,
+        tables={'slow_queries': df_detailed, 'aggregates': df_aggregated},
+        indexes=MYSQL.store_indexes,
+        timestamp_columns=MYSQL.store_timestamp_columns,
+        backend=backend,
     )
 
-    if uploaded_file is not None:
-        stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-        log_content_string = stringio.read() # Read the whole content as a single string
-
-        df_detailed, df_aggregated, parse_warnings = parse_mysql_log_content(log_content_string)
-
-        if parse_warnings:
-            for warning in parse_warnings:
-                st.warning(warning)
-
-        if not df_detailed.empty:
-            st.subheader("Detailed Metrics")
-            st.dataframe(df_detailed)
-        else:
-            st.info("No detailed metrics were generated. Check warnings above if any.")
-
-        if not df_aggregated.empty:
-            st.subheader("Aggregate Results")
-            st.dataframe(df_aggregated)
-        else:
-            st.info("No aggregate results were generated. Check warnings above if any.")
-
-        if not df_detailed.empty or not df_aggregated.empty:
-            excel_buffer = BytesIO()
-            success, error_msg = save_to_excel(df_detailed, df_aggregated, excel_buffer)
-            if success:
-                excel_buffer.seek(0)
-                st.download_button(
-                    label="Download Excel Report",
-                    data=excel_buffer,
-                    file_name="mysql_log_report.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-            else:
-                st.error(f"Failed to generate Excel report for download: {error_msg}")
-        else:
-            st.info("No data available to download.")
-            
-    else:
-        st.info("Please upload a MySQL log file to begin analysis.")
+# --- Streamlit App Function ---
+def run_streamlit_app():
+    import streamlit as st # UI mode only; streamlit alone takes seconds to import
+    run_format_streamlit_app(st, MYSQL, "Upload your MySQL log file:", ["log", "txt"], # MySQL logs can be .log or .txt
+                             "mysql_log_report.xlsx")
 
 # --- Main Execution Logic ---
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(
-        description="MySQL Log Parser & Analyzer.",
-        epilog="If no arguments are provided, the script will run in interactive Streamlit mode."
-    )
-    parser.add_argument(
-        "-i", "--input",
-        help="Path to the input MySQL log file (e.g., mysql-slow.log)."
-    )
-    parser.add_argument(
-        "-o", "--output",
-        help="Path to save the generated Excel report (e.g., mysql_report.xlsx)."
-    )
-
-    args = parser.parse_args()
-
-    if args.input and args.output:
-        # CLI Mode
-        print(f"CLI Mode: Parsing file '{args.input}' and saving report to '{args.output}'...")
-        try:
-            with open(args.input, 'r', encoding='utf-8') as f:
-                log_content_string = f.read()
-            
-            if not log_content_string.strip():
-                print(f"Warning: Input file '{args.input}' is empty or contains only whitespace.")
-                # save_to_excel can handle empty dataframes if parse_mysql_log_content returns them
-                df_detailed, df_aggregated, parse_warnings = pd.DataFrame(), pd.DataFrame(), ["Input file is empty."]
-            else:
-                df_detailed, df_aggregated, parse_warnings = parse_mysql_log_content(log_content_string)
-
-            if parse_warnings:
-                for warning in parse_warnings:
-                    print(f"Parsing Warning: {warning}")
-            
-            success, error_msg = save_to_excel(df_detailed, df_aggregated, args.output)
-            if success:
-                print(f"Successfully parsed '{args.input}' and saved Excel report to '{args.output}'")
-                if df_detailed.empty and df_aggregated.empty:
-                    print("Note: The log file did not contain any parsable query entries matching the defined patterns.")
-            else:
-                print(f"Error saving Excel file: {error_msg}")
-
-        except FileNotFoundError:
-            print(f"Error: Input file '{args.input}' not found.")
-        except Exception as e:
-            print(f"An unexpected error occurred during CLI processing: {e}")
-    elif args.input or args.output:
-        # User provided one argument but not the other
-        print("Error: Both --input and --output arguments are required for CLI mode.")
-        print("To run in interactive Streamlit mode, please provide no arguments.")
-        parser.print_help()
-    else:
-        # Streamlit Mode
-        run_streamlit_app()
-
 def main():
-    parser = argparse.ArgumentParser(
-        description="MySQL Log Parser & Analyzer.",
-        epilog="If no arguments are provided, the script will run in interactive Streamlit mode."
-    )
-    parser.add_argument(
-        "-i", "--input",
-        help="Path to the input MySQL log file (e.g., mysql-slow.log)."
-    )
-    parser.add_argument(
-        "-o", "--output",
-        help="Path to save the generated Excel report (e.g., mysql_report.xlsx)."
-    )
-
+    parser = build_arg_parser(MYSQL, "MySQL Log Parser & Analyzer.", "mysql-slow.log", "mysql_report.xlsx",
+                              "mysql-slow.log@2023-10-26T10:00..2023-10-26T11:00")
     args = parser.parse_args()
 
-    if args.input and args.output:
-        # CLI Mode
-        print(f"CLI Mode: Parsing file '{args.input}' and saving report to '{args.output}'...")
-        try:
-            with open(args.input, 'r', encoding='utf-8') as f:
-                log_content_string = f.read()
-            
-            if not log_content_string.strip():
-                print(f"Warning: Input file '{args.input}' is empty or contains only whitespace.")
-                # save_to_excel can handle empty dataframes if parse_mysql_log_content returns them
-                df_detailed, df_aggregated, parse_warnings = pd.DataFrame(), pd.DataFrame(), ["Input file is empty."]
-            else:
-                df_detailed, df_aggregated, parse_warnings = parse_mysql_log_content(log_content_string)
-
-            if parse_warnings:
-                for warning in parse_warnings:
-                    print(f"Parsing Warning: {warning}")
-            
-            success, error_msg = save_to_excel(df_detailed, df_aggregated, args.output)
-            if success:
-                print(f"Successfully parsed '{args.input}' and saved Excel report to '{args.output}'")
-                if df_detailed.empty and df_aggregated.empty:
-                    print("Note: The log file did not contain any parsable query entries matching the defined patterns.")
-            else:
-                print(f"Error saving Excel file: {error_msg}")
-
-        except FileNotFoundError:
-            print(f"Error: Input file '{args.input}' not found.")
-        except Exception as e:
-            print(f"An unexpected error occurred during CLI processing: {e}")
-    elif args.input or args.output:
-        # User provided one argument but not the other
-        print("Error: Both --input and --output arguments are required for CLI mode.")
-        print("To run in interactive Streamlit mode, please provide no arguments.")
-        parser.print_help()
-    else:
+    if not run_cli(MYSQL, args, parser):
         # Streamlit Mode
         run_streamlit_app()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,10 +1,18 @@
 import unittest
 import pandas as pd
 from pandas.testing import assert_frame_equal
+import os
+import tempfile
+from datetime import datetime
 from io import BytesIO
 
 # Assuming mysqlLogParser.py is in the same directory or accessible via PYTHONPATH
-from MySql.mysqlLogParser import normalize_query, parse_mysql_log_content, save_to_excel
+from MySql.mysqlLogParser import (normalize_query, parse_mysql_log_content, save_to_excel, aggregate_mysql_log_file,
+                                    sample_mysql_log_file, MYSQL)
+from Common.engine import parse_file, parse_records, build_sheets, group_records
+from Common.filters import RecordFilter
+from Common.sampling import SamplePlan
+from Common.instrumentation import RunStats
 
 class TestMySqlParser(unittest.TestCase):
 
@@ -107,9 +115,10 @@ SELECT * FROM table1 WHERE id = 1;
         self.assertEqual(df_detailed.iloc[0]['Time'], '231026 10:00:00')
         self.assertEqual(df_detailed.iloc[0]['User@Host'], 'root[root] @ localhost []')
         self.assertAlmostEqual(df_detailed.iloc[0]['Query_time (ms)'], 0.200) # 0.000200s * 1000
-        self.assertEqual(df_detailed.iloc[0]['Lock_time'], '0.000010')
-        self.assertEqual(df_detailed.iloc[0]['Rows_sent'], '1')
-        self.assertEqual(df_detailed.iloc[0]['Rows_examined'], '1')
+        self.assertAlmostEqual(df_detailed.iloc[0]['Lock_time'], 0.000010)
+        self.assertEqual(df_detailed.iloc[0]['Rows_sent'], 1)
+        self.assertEqual(df_detailed.iloc[0]['Rows_examined'], 1)
+        self.assertEqual(df_detailed.iloc[0]['Thread_id'], 1234)
         self.assertEqual(df_detailed.iloc[0]['Query'], 'SELECT * FROM table1 WHERE id = 1;')
         self.assertEqual(df_detailed.iloc[0]['Normalized_Query'], 'SELECT * FROM TABLE1 WHERE ID = ?;')
 
@@ -200,6 +209,191 @@ Another line of text
         # Further checks could involve reading with pd.read_excel as in mongo tests
 
 
+    def test_parse_mysql_log_content_collects_run_stats(self):
+        stats = RunStats("mysqlLogParser")
+        parse_mysql_log_content(self.sample_log_content_adjusted, run_stats=stats)
+        self.assertEqual(stats.counters['entries'], 5)
+        self.assertEqual(stats.counters['slow_queries'], 5)
+        self.assertGreater(stats.counters['lines_read'], 0)
+        for stage in ('split entries', 'regex extraction', 'normalize_query', 'dataframe construction', 'aggregation'):
+            self.assertIn(stage, stats.timings)
+
+
+    def test_aggregate_mysql_log_file_with_time_window(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mysql-slow.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.sample_log_content_adjusted)
+            full_state = aggregate_mysql_log_file(path)
+            windowed_state = aggregate_mysql_log_file(path, since=datetime(2023, 10, 26, 10, 1), until=datetime(2023, 10, 26, 10, 2))
+
+        self.assertEqual(full_state['SELECT * FROM TABLE1 WHERE ID = ?;'].count, 2)
+        self.assertAlmostEqual(full_state['SELECT * FROM TABLE1 WHERE ID = ?;'].total, 0.4)
+        self.assertEqual(sum(stats.count for stats in full_state.values()), 5)
+        self.assertEqual(set(windowed_state), {"SELECT NAME, EMAIL FROM USERS WHERE STATUS = ? AND AGE > ?;", "COMMIT;"})
+
+    def test_group_records_skips_preamble(self):
+        lines = ["mysqld, Version: 8.0\n", "# Time: 231026 10:00:00\n", "SELECT 1;\n", "# Time: 231026 10:01:00\n", "SELECT 2;\n"]
+        entries = list(group_records(MYSQL, lines))
+        self.assertEqual(entries, ["# Time: 231026 10:00:00\nSELECT 1;\n", "# Time: 231026 10:01:00\nSELECT 2;\n"])
+
+
+    def test_sample_mysql_log_file_full_fraction_matches_full_parse(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mysql-slow.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.sample_log_content_adjusted * 10)
+            plan = SamplePlan(path, 1.0, block_size=512, seed=1)
+            plan, sheets = sample_mysql_log_file(path, 1.0, reservoir_size=3, seed=1, plan=plan)
+
+        self.assertTrue(plan.is_complete)
+        self.assertEqual(len(sheets['Detailed Metrics (Sample)']), 3)
+        stats = sheets['Aggregate Results (Estimated)'].set_index('Normalized_Query')
+        self.assertEqual(stats.loc['SELECT * FROM TABLE1 WHERE ID = ?;', 'Estimated Executions'], 20)
+        self.assertEqual(stats['Sampled Executions'].sum(), 50)
+
+
+    def test_parse_file_in_chunks_matches_in_memory_parse(self):
+        content = self.sample_log_content_adjusted * 4
+        df_detailed, df_aggregated, _ = parse_mysql_log_content(content)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mysql-slow.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            result = parse_file(MYSQL, path, jobs=2, chunk_size=300)
+        sheets = build_sheets(MYSQL, result)
+        assert_frame_equal(sheets['Detailed Metrics'], df_detailed)
+        assert_frame_equal(sheets['Aggregate Results'], df_aggregated)
+
+
+    extended_log_content = """# Time: 2023-10-26T10:00:00.123456Z
+# User@Host: app[app] @ web1 [10.0.0.5]  Id:    42
+# Query_time: 0.250000  Lock_time: 0.000100 Rows_sent: 5  Rows_examined: 50000
+use shop;
+SET timestamp=1698314400;
+SELECT * FROM orders WHERE customer_id = 7;
+# Time: 2023-10-26T10:00:01.000000Z
+# User@Host: app[app] @ web1 [10.0.0.5]
+# Thread_id: 43  Schema: shop  QC_hit: No
+# Query_time: 0.500000  Lock_time: 0.002000  Rows_sent: 1  Rows_examined: 100000
+# Rows_affected: 0  Bytes_sent: 120
+# Tmp_tables: 1  Tmp_disk_tables: 0  Tmp_table_sizes: 0
+# Full_scan: Yes  Full_join: No  Tmp_table: Yes  Tmp_table_on_disk: No
+# Filesort: Yes  Filesort_on_disk: No  Merge_passes: 0  Priority_queue: No
+#   InnoDB_IO_r_ops: 3  InnoDB_IO_r_bytes: 49152  InnoDB_IO_r_wait: 0.001000
+#   InnoDB_rec_lock_wait: 0.000000  InnoDB_queue_wait: 0.000000
+#   InnoDB_pages_distinct: 8
+SET timestamp=1698314401;
+SELECT * FROM orders WHERE customer_id = 9;
+"""
+
+    def test_extended_header_fields_are_typed_and_summed(self):
+        df_detailed, df_aggregated, parse_warnings = parse_mysql_log_content(self.extended_log_content)
+        self.assertEqual(parse_warnings, [])
+        self.assertEqual(df_detailed['Thread_id'].tolist(), [42, 43])
+        self.assertEqual(df_detailed.iloc[1]['Schema'], 'shop')
+        self.assertEqual(df_detailed.iloc[1]['Bytes_sent'], 120)
+        self.assertEqual(df_detailed['Full_scan'].tolist()[1], 1)
+        self.assertAlmostEqual(df_detailed.iloc[1]['InnoDB_IO_r_wait'], 0.001)
+        self.assertEqual(df_detailed.iloc[0]['Query'], 'SELECT * FROM orders WHERE customer_id = 7;')
+        self.assertTrue(pd.api.types.is_numeric_dtype(df_detailed['Rows_examined']))
+
+        row = df_aggregated.iloc[0]
+        self.assertEqual(row['Executions'], 2)
+        self.assertEqual(row['Total_Rows_examined'], 150000)
+        self.assertAlmostEqual(row['Total_Lock_time_ms'], 2.1)
+        self.assertEqual((row['Total_Full_scan'], row['Total_Filesort'], row['Total_InnoDB_pages_distinct']), (1, 1, 8))
+
+    def test_build_sheets_lock_ratio_and_concurrency(self):
+        result = parse_records(MYSQL, self.extended_log_content.splitlines(keepends=True))
+        sheets = build_sheets(MYSQL, result)
+        row = sheets['Aggregate Results'].iloc[0]
+        self.assertAlmostEqual(row['Avg_Lock_time_ms'], 1.05)
+        self.assertAlmostEqual(row['Lock_Ratio'], 2.1 / 750, places=6)
+        # 10:00:00.123 minus 250 ms and 10:00:01 minus 500 ms do not overlap
+        self.assertTrue(sheets['Concurrency Peaks'].empty)
+
+        overlapping = self.extended_log_content.replace('# Query_time: 0.500000', '# Query_time: 1.500000')
+        sheets = build_sheets(MYSQL, parse_records(MYSQL, overlapping.splitlines(keepends=True)))
+        peak = sheets['Concurrency Peaks'].iloc[0]
+        self.assertEqual(peak['Peak_Concurrent_Queries'], 2)
+        self.assertEqual(peak['Running_Patterns'], '2x SELECT * FROM ORDERS WHERE CUSTOMER_ID = ?;')
+        self.assertEqual(sheets['Pile-up Patterns']['Queries_In_Pileups'].tolist(), [2])
+
+    def test_plain_log_omits_extended_columns(self):
+        df_detailed, df_aggregated, _ = parse_mysql_log_content(self.sample_log_content_adjusted)
+        self.assertNotIn('Bytes_sent', df_detailed.columns)
+        self.assertNotIn('Schema', df_detailed.columns)
+        self.assertNotIn('Total_Bytes_sent', df_aggregated.columns)
+        self.assertIn('Total_Rows_examined', df_aggregated.columns)
+
+    def test_problem_entries_are_counted_not_listed(self):
+        bad_entry = "# Time: 231026 10:05:00\n# User@Host: root[root] @ localhost []\nSET timestamp=1698300300;\nSELECT 1;\n"
+        empty_query = "# Time: 231026 10:06:00\n# Query_time: 0.1 Lock_time: 0.0 Rows_sent: x Rows_examined: 0\n"
+        stats = RunStats("mysqlLogParser")
+        _, _, parse_warnings = parse_mysql_log_content(self.sample_log_content_adjusted + bad_entry * 3 + empty_query,
+                                                       run_stats=stats)
+        self.assertEqual(parse_warnings[0], "Skipped 3 log entries without a '# Query_time:' header (first: entry 6).")
+        self.assertIn("1 entries had no query text", parse_warnings[1])
+        self.assertEqual(len(parse_warnings), 3)
+        self.assertEqual(stats.counters['entries_missing_query_time'], 3)
+        self.assertEqual(stats.counters['invalid_header_values'], 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mysql-slow.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.sample_log_content_adjusted + bad_entry * 3)
+            result = parse_file(MYSQL, path, jobs=2, chunk_size=200)
+        self.assertEqual(result.issue_counts, {'entries_missing_query_time': [3, 6, [6, 7, 8]]})
+
+    @staticmethod
+    def attribution_entry(i, account, use=None):
+        return (f"# Time: 231026 10:{i // 60:02d}:{i % 60:02d}\n# User@Host: {account}  Id: {i % 3}\n"
+                f"# Query_time: 0.{i + 1:06d}  Lock_time: 0.000010 Rows_sent: 1  Rows_examined: {i * 10}\n" +
+                (f"use {use};\n" if use else "") + f"SET timestamp={1698314400 + i};\nSELECT * FROM t{i % 4 // 2} WHERE id = {i};\n")
+
+    def attribution_log(self):
+        # The server writes `use db;` only when the database changed since the previous entry
+        accounts = ["app[app] @ web1 [10.0.0.5]", "report[report] @  [10.0.0.7]"]
+        return "".join(self.attribution_entry(i, accounts[i % 2], {2: 'shop', 30: 'billing'}.get(i)) for i in range(60))
+
+    def test_accounts_are_split_and_schema_is_carried(self):
+        result = parse_records(MYSQL, self.attribution_log().splitlines(keepends=True))
+        sheets = build_sheets(MYSQL, result)
+        detailed = sheets['Detailed Metrics']
+        self.assertEqual(detailed[['User', 'Host', 'IP']].drop_duplicates().values.tolist(),
+                         [['app', 'web1', '10.0.0.5'], ['report', '10.0.0.7', '10.0.0.7']])
+        self.assertTrue(detailed['Schema'][:2].isna().all()) # before the first `use`
+        self.assertEqual(detailed['Schema'][2:].tolist(), ['shop'] * 28 + ['billing'] * 30)
+
+        summary = sheets['Workload Attribution'].set_index(['Dimension', 'Value'])
+        self.assertEqual(summary.loc[('Schema', 'billing'), 'Executions'], 30)
+        self.assertEqual(summary.loc[('Schema', 'billing'), 'Total_Rows_examined'], sum(i * 10 for i in range(30, 60)))
+        self.assertEqual(summary.loc[('Schema', '(none)'), 'Executions'], 2)
+        self.assertAlmostEqual(summary.loc[('User', 'report'), 'Total_Query_time_ms'], sum(i + 1 for i in range(1, 60, 2)) / 1000)
+        self.assertAlmostEqual(summary.xs('Host', level='Dimension')['Share_of_Total'].sum(), 1.0, places=3)
+        top = sheets['Attribution Top Patterns']
+        report = top[(top['Dimension'] == 'User') & (top['Value'] == 'report')]
+        self.assertEqual(report['Normalized_Query'].tolist(), ['SELECT * FROM T1 WHERE ID = ?;', 'SELECT * FROM T0 WHERE ID = ?;'])
+        self.assertEqual(report['Share_of_Value'].tolist(), [round(480 / 930, 4), round(450 / 930, 4)])
+        self.assertEqual(summary.loc[('User', 'report'), 'Top_Normalized_Query'], 'SELECT * FROM T1 WHERE ID = ?;')
+
+    def test_schema_carries_across_chunks_and_filters(self):
+        content = self.attribution_log()
+        expected = build_sheets(MYSQL, parse_records(MYSQL, content.splitlines(keepends=True)))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'mysql-slow.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            sheets = build_sheets(MYSQL, parse_file(MYSQL, path, jobs=2, chunk_size=1000))
+            for name in ('Detailed Metrics', 'Workload Attribution', 'Attribution Top Patterns'):
+                assert_frame_equal(sheets[name], expected[name])
+
+            # --user report skips the entries of app, including the one that switched to billing
+            result = parse_file(MYSQL, path, record_filter=RecordFilter(users=['report'], databases=['billing']))
+        self.assertEqual(len(result.rows), 15)
+
+
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
 
@@ -0,0 +1,317 @@
+import csv
+import io
+import json
+import os
+import re
+import sys
+
+# Make the shared Common/ package importable when run as a script (python PostgreSql/postgresLogParser.py)
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from Common.engine import (LogFormat, RecordError, SLOW, ERROR, ISSUE_DESCRIPTIONS, counted_issue, parse_records, build_sheets,
+                           aggregate_file, sample_file)
+from Common.aggregates import DEFAULT_PERCENTILE_SAMPLES, group_percentiles
+from Common.lazy import lazy_import
+from Common.sampling import DEFAULT_RESERVOIR_SIZE
+from Common.timeutil import parse_log_timestamp, parse_input_spec
+from Common.cli import build_arg_parser, run_cli
+from Common.ui import run_streamlit_app as run_format_streamlit_app
+
+pd = lazy_import('pandas') # CLI runs that never build a DataFrame (e.g. --help) skip the pandas import
+
+# Memory budget (MB) for the detailed rows and pattern table by default; what outgrows it is spilled to disk
+DEFAULT_MAX_MEMORY_MB = 512
+
+# Function to normalize statements by replacing literals and bind parameters with '?'
+def normalize_query(query):
+    normalized_query = re.sub(r"[Ee]?'(?:[^']|'')*'", "?", query) # String literals ('' is an escaped quote)
+    normalized_query = re.sub(r"\$\d+", "?", normalized_query) # Bind parameters of prepared statements
+    normalized_query = re.sub(r"\b\d+(?:\.\d+)?\b", "?", normalized_query)
+    normalized_query = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?)", normalized_query) # IN lists of any length
+    normalized_query = re.sub(r"\s+", " ", normalized_query).strip()
+    # Convert to uppercase for consistency
+    return normalized_query.upper()
+
+# Function to group error messages: literal values and numbers become '?' but the wording keeps its case, and
+# quoted identifiers (relation "orders", constraint "users_pkey") stay, as they tell the errors apart
+def normalize_error_message(message):
+    normalized_message = re.sub(r"'(?:[^']|'')*'", "?", message)
+    normalized_message = re.sub(r"\b\d+(?:\.\d+)?\b", "?", normalized_message)
+    return re.sub(r"\s+", " ", normalized_message).strip()
+
+# "duration: 12.345 ms  statement: SELECT ..." as written by log_min_duration_statement. Extended-protocol
+# queries log "execute <name>: ..." (and with log_duration also parse/bind); only statement/execute are counted
+# so a prepared statement is not counted once per protocol step.
+duration_pattern = re.compile(r'duration: (\d+(?:\.\d+)?) ms\s+(statement|execute|parse|bind)[^:]*: (.*)', re.DOTALL)
+SLOW_PHASES = ('statement', 'execute')
+ERROR_SEVERITIES = ('ERROR', 'FATAL', 'PANIC')
+
+# stderr: "<log_line_prefix>LEVEL:  message", continuation lines of a multi-line statement start with a tab
+stderr_line_pattern = re.compile(r'^([^\t]*?)\b(LOG|ERROR|FATAL|PANIC|WARNING|NOTICE|INFO|DEBUG[1-5]?|DETAIL|HINT|'
+                                 r'STATEMENT|CONTEXT|LOCATION|QUERY):  (.*)', re.DOTALL)
+# Fields found in common log_line_prefix settings ('%m [%p] ', '%t [%p]: user=%u,db=%d,app=%a ', '%m [%p] %q%u@%d ')
+prefix_time_pattern = re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?: ?[A-Z]{2,5}\b| ?[+-]\d{2}(?::?\d{2})?)?')
+prefix_pid_pattern = re.compile(r'\[(\d+)\]')
+prefix_key_pattern = re.compile(r'\b(user|db|app)=([^,\s]*)')
+prefix_user_db_pattern = re.compile(r'(?:^|\s)([^\s@\[\]=,]+)@([^\s@\[\]=,:]+)')
+# csvlog: every record starts with its log_time column
+csv_start_pattern = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?(?: [A-Za-z0-9+:-]+)?,')
+
+detailed_columns = ['Time', 'User', 'Database', 'Process_id', 'Application', 'Query_time (ms)', 'Query', 'Normalized_Query']
+error_columns = ['First_Entry', 'Severity', 'SQL_State', 'Error_Pattern', 'Count', 'Sample']
+
+# csvlog column positions (PostgreSQL 13+ layout; older versions only lack trailing columns)
+CSV_TIME, CSV_USER, CSV_DATABASE, CSV_PID = 0, 1, 2, 3
+CSV_SEVERITY, CSV_STATE, CSV_MESSAGE, CSV_APPLICATION = 11, 12, 13, 22
+
+# Records that could not be parsed are counted per kind rather than reported one by one (a damaged log can have millions)
+issue_descriptions = {
+    'invalid_json': "Skipped {count} {records} that {are} not valid JSON ({examples}).",
+    'entries_failed': "Skipped {count} {records} that could not be parsed ({examples}).",
+}
+
+def make_payload(time, user, database, pid, application, severity, state, message):
+    # Decoded record shared by the three formats; 'duration' is the duration_pattern match of LOG messages
+    return {
+        'time': time, 'user': user, 'database': database, 'pid': pid, 'application': application,
+        'severity': severity, 'state': state, 'message': message,
+        'duration': duration_pattern.match(message) if severity == 'LOG' else None,
+    }
+
+class PostgresFormat(LogFormat):
+    # Shared behaviour of the stderr, csvlog and jsonlog formats; subclasses only decode records
+    name = "postgresLogParser"
+    title = "PostgreSQL"
+    detailed_columns = detailed_columns
+    pooled_columns = ('User', 'Database', 'Application', 'Query')
+    duration_column = 'Query_time (ms)'
+    sample_column = 'Query'
+    stats_sheet = 'Aggregate Results'
+    record_label = 'Entries'
+    record_counter = 'entries'
+    fingerprint_stage = 'normalize_query'
+    slow_hint = 'duration: '
+    filter_columns = {'user': 'User', 'db': 'Database'}
+    raw_duration_pattern = re.compile(r'duration: (\d+(?:\.\d+)?) ms')
+    redacted_columns = ('Query',) # its shape is the normalized query
+    error_sample_column = 'Sample' # redacted to the error's normalized fields
+    empty_note = 'duration entries or errors'
+    store_sheets = {'slow_queries': 'Detailed Metrics', 'aggregates': 'Aggregate Results', 'errors': 'Error Stats'}
+    store_indexes = {
+        'slow_queries': ['Normalized_Query', 'User', 'Database', 'Query_time (ms)'],
+        'aggregates': ['Normalized_Query'],
+        'errors': ['SQL_State'],
+    }
+    store_timestamp_columns = {'slow_queries': 'Time'}
+    count_failures = True
+    issue_noun = ('entry', 'entries') # what the record numbers of counted issues refer to
+
+    def classify(self, record, payload):
+        # Everything that is neither a slow statement nor an error is dropped, so memory does not grow with the log
+        duration = payload['duration']
+        if duration is not None and duration.group(2) in SLOW_PHASES:
+            return (SLOW,)
+        if payload['severity'] in ERROR_SEVERITIES:
+            return (ERROR,)
+        return ()
+
+    def slow_row(self, payload, result):
+        duration = payload['duration']
+        return [payload['time'], payload['user'], payload['database'], payload['pid'], payload['application'],
+                float(duration.group(1)), duration.group(3).strip()]
+
+    def fingerprint(self, row):
+        return normalize_query(row[6])
+
+    def error_entry(self, record, payload):
+        fields = (payload['severity'], payload['state'], normalize_error_message(payload['message']))
+        return "|".join(str(field) for field in fields), fields
+
+    def timestamp(self, payload):
+        return parse_log_timestamp(payload['time'])
+
+    def issue_message(self, number, message):
+        return f"Entry {number}: {message}"
+
+    def failure_message(self, exc):
+        # An issue kind (see issue_descriptions), since failures are counted; a RecordError's message is its own kind
+        if isinstance(exc, RecordError):
+            return str(exc)
+        return 'invalid_json' if isinstance(exc, json.JSONDecodeError) else 'entries_failed'
+
+    def issue_summary(self, kind, count, first_record, examples=()):
+        if kind in issue_descriptions:
+            return counted_issue(issue_descriptions[kind], count, examples, self.issue_noun)
+        if kind in ISSUE_DESCRIPTIONS:
+            return super().issue_summary(kind, count, first_record, examples)
+        return counted_issue("Skipped {count} {records} ({examples}): " + kind, count, examples, self.issue_noun)
+
+    def build_sheets(self, result, detailed_df):
+        return {
+            'Detailed Metrics': detailed_df,
+            'Aggregate Results': build_aggregate_df(result.patterns),
+            'Error Stats': build_error_df(result.errors),
+        }
+
+    def error_frame(self, errors, include_location=True):
+        error_df = build_error_df(errors)
+        return error_df if include_location else error_df.drop(columns=['First_Entry'])
+
+class PostgresStderrFormat(PostgresFormat):
+    # Default 'stderr' destination: one entry per log line plus tab-indented continuation lines
+    multi_line = True
+    decode_stage = 'regex extraction'
+
+    def is_record_start(self, line):
+        return stderr_line_pattern.match(line) is not None
+
+    def decode(self, record):
+        match = stderr_line_pattern.match(record)
+        if match is None:
+            raise RecordError(f"Unrecognised log line: {record[:200]}")
+        prefix, severity, message = match.groups()
+        time_match = prefix_time_pattern.search(prefix)
+        pid_match = prefix_pid_pattern.search(prefix)
+        keys = dict(prefix_key_pattern.findall(prefix))
+        user_db = prefix_user_db_pattern.search(prefix)
+        user = keys.get('user', user_db.group(1) if user_db else '')
+        database = keys.get('db', user_db.group(2) if user_db else '')
+        message = message.rstrip('\n').replace('\n\t', '\n')
+        return make_payload(time_match.group(0) if time_match else '', user, database,
+                            pid_match.group(1) if pid_match else '', keys.get('app', ''), severity, '', message)
+
+class PostgresCsvFormat(PostgresFormat):
+    # 'csvlog' destination: one CSV row per entry; quoted fields (statements, messages) may span lines
+    multi_line = True
+    decode_stage = 'csv decoding'
+
+    def is_record_start(self, line):
+        return csv_start_pattern.match(line) is not None
+
+    def decode(self, record):
+        fields = next(csv.reader(io.StringIO(record)), [])
+        if len(fields) <= CSV_MESSAGE:
+            raise RecordError(f"Expected at least {CSV_MESSAGE + 1} CSV columns, found {len(fields)}")
+        application = fields[CSV_APPLICATION] if len(fields) > CSV_APPLICATION else ''
+        return make_payload(fields[CSV_TIME], fields[CSV_USER], fields[CSV_DATABASE], fields[CSV_PID], application,
+                            fields[CSV_SEVERITY], fields[CSV_STATE], fields[CSV_MESSAGE])
+
+class PostgresJsonFormat(PostgresFormat):
+    # 'jsonlog' destination (PostgreSQL 15+): one JSON object per line
+    record_label = 'Lines'
+    record_counter = 'lines_read'
+    decode_stage = 'json.loads'
+    record_marker = '{"timestamp":"'
+    issue_noun = ('line', 'lines')
+
+    def decode(self, record):
+        entry = json.loads(record)
+        return make_payload(entry.get('timestamp', ''), entry.get('user', ''), entry.get('dbname', ''),
+                            str(entry.get('pid', '')), entry.get('application_name', ''),
+                            entry.get('error_severity', ''), entry.get('state_code', ''), entry.get('message', ''))
+
+    def issue_message(self, number, message):
+        return f"Line {number}: {message}"
+
+POSTGRES_STDERR = PostgresStderrFormat()
+POSTGRES_CSV = PostgresCsvFormat()
+POSTGRES_JSON = PostgresJsonFormat()
+FORMATS = {'stderr': POSTGRES_STDERR, 'csvlog': POSTGRES_CSV, 'jsonlog': POSTGRES_JSON}
+
+# Picks the format from the first non-blank line: jsonlog entries are JSON objects, csvlog rows start with "<time>,"
+def detect_format(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        if line.lstrip().startswith('{'):
+            return POSTGRES_JSON
+        if csv_start_pattern.match(line):
+            return POSTGRES_CSV
+        return POSTGRES_STDERR
+    return POSTGRES_STDERR
+
+def detect_file_format(path, sniff_bytes=64 * 1024):
+    # Missing files fall back to stderr; the selected mode then reports the missing file itself
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(sniff_bytes).decode('utf-8', errors='replace')
+    except OSError:
+        return POSTGRES_STDERR
+    return detect_format(head.splitlines())
+
+# Per-pattern aggregate table with percentiles, most total time first
+def build_aggregate_df(patterns):
+    tails = group_percentiles(patterns, (95, 99))
+    aggregate_df = pd.DataFrame([
+        [pattern, stats.count, round(stats.total, 3), stats.min, stats.max, round(stats.mean, 2),
+         round(tails[pattern][0], 3), round(tails[pattern][1], 3), stats.sample]
+        for pattern, stats in patterns.items()
+    ], columns=['Normalized_Query', 'Executions', 'Total_Query_time_ms', 'Min_Query_time_ms', 'Max_Query_time_ms',
+                'Avg_Query_time_ms', 'P95_Query_time_ms', 'P99_Query_time_ms', 'Sample_Query'])
+    if not aggregate_df.empty:
+        aggregate_df = aggregate_df.sort_values(by=['Total_Query_time_ms', 'Executions'], ascending=[False, False])
+    return aggregate_df
+
+def build_error_df(errors):
+    # errors: {key: ErrorSummary} with fields (severity, SQLSTATE, normalized message)
+    return pd.DataFrame([[summary.first_record, *summary.fields, summary.count, summary.sample] for summary in errors.values()],
+                        columns=error_columns)
+
+# Function to parse log content (any of the three formats) into (detailed, aggregate, error DataFrames, warnings)
+# run_stats: optional RunStats collecting per-stage timings and entry counters
+def parse_postgres_log_content(log_content_string, run_stats=None, fmt=None):
+    lines = log_content_string.splitlines(keepends=True)
+    fmt = fmt or detect_format(lines)
+    result = parse_records(fmt, lines, run_stats=run_stats)
+    sheets = build_sheets(fmt, result, run_stats)
+    return sheets['Detailed Metrics'], sheets['Aggregate Results'], sheets['Error Stats'], result.issue_messages(fmt)
+
+# --- Aggregate-only Parsing (compare mode) ---
+# Streams the file and returns {Normalized_Query: PatternStats} for statements inside [since, until].
+def aggregate_postgres_log_file(path, since=None, until=None, fmt=None):
+    return aggregate_file(fmt or detect_file_format(path), path, since, until)
+
+# --- Sampling Mode (quick triage of huge logs) ---
+def sample_postgres_log_file(path, fraction, reservoir_size=DEFAULT_RESERVOIR_SIZE, seed=None, plan=None, fmt=None):
+    return sample_file(fmt or detect_file_format(path), path, fraction, reservoir_size, seed, plan)
+
+# --- Streamlit App Function ---
+def run_streamlit_app():
+    import streamlit as st # UI mode only; streamlit alone takes seconds to import
+    run_format_streamlit_app(st, POSTGRES_STDERR, "Upload your PostgreSQL log file (stderr, csvlog or jsonlog):",
+                             ["log", "txt", "csv", "json"], "postgres_log_report.xlsx", detect_format=detect_format)
+
+# --- Main Execution Logic ---
+def main():
+    parser = build_arg_parser(POSTGRES_STDERR, "PostgreSQL Log Parser & Analyzer. Reports statements logged by "
+                              "log_min_duration_statement and error counts.", "postgresql.log", "postgres_report.xlsx",
+                              "postgresql.log@2023-10-26T10:00..2023-10-26T11:00")
+    parser.add_argument(
+        "--format", choices=['auto', *FORMATS], default="auto",
+        help="Log destination format (default: auto, detected from the first line of the input)."
+    )
+    # Multi-GB logs must fit in bounded memory: detailed rows and patterns spill to disk past a memory budget and
+    # percentiles use a bounded sample per pattern unless the user asks for something else
+    parser.set_defaults(max_memory=DEFAULT_MAX_MEMORY_MB, percentile_samples=DEFAULT_PERCENTILE_SAMPLES)
+    args = parser.parse_args()
+
+    if args.format != 'auto':
+        fmt = FORMATS[args.format]
+    elif args.input:
+        fmt = detect_file_format(args.input)
+    elif args.compare:
+        try:
+            fmt = detect_file_format(parse_input_spec(args.compare[0])[0])
+        except ValueError: # compare mode reports the bad spec itself
+            fmt = POSTGRES_STDERR
+    else:
+        fmt = POSTGRES_STDERR
+
+    if not run_cli(fmt, args, parser):
+        # Streamlit Mode
+        run_streamlit_app()
+
+if __name__ == "__main__":
+    main()
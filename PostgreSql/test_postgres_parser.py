@@ -0,0 +1,145 @@
+import unittest
+import os
+import tempfile
+from pandas.testing import assert_frame_equal
+
+from PostgreSql.postgresLogParser import (normalize_query, normalize_error_message, parse_postgres_log_content, detect_format, detect_file_format,
+                                          aggregate_postgres_log_file, POSTGRES_STDERR, POSTGRES_CSV, POSTGRES_JSON)
+from Common.engine import parse_file, build_sheets
+from Common.timeutil import parse_log_timestamp
+
+class TestPostgresParser(unittest.TestCase):
+
+    stderr_log = """2024-01-15 10:00:00.123 UTC [101] app@shop LOG:  duration: 12.500 ms  statement: SELECT * FROM orders
+\tWHERE id = 42
+\t  AND status IN ('a', 'b', 'c')
+2024-01-15 10:00:01.000 UTC [102] app@shop LOG:  duration: 3.000 ms  execute <unnamed>: SELECT * FROM users WHERE id = $1
+2024-01-15 10:00:01.000 UTC [102] app@shop DETAIL:  parameters: $1 = '7'
+2024-01-15 10:00:01.500 UTC [102] app@shop LOG:  duration: 1.000 ms  parse <unnamed>: SELECT 1
+2024-01-15 10:00:02.000 UTC [103] app@shop ERROR:  relation "missing" does not exist at character 15
+2024-01-15 10:00:02.000 UTC [103] app@shop STATEMENT:  SELECT * FROM missing
+2024-01-15 10:00:03.000 UTC [101] app@shop LOG:  duration: 20.000 ms  statement: SELECT * FROM orders WHERE id = 7 AND status IN ('x')
+2024-01-15 10:00:04.000 UTC [104] LOG:  checkpoint starting: time
+"""
+
+    csv_log = """2024-01-15 10:00:00.123 UTC,"app","shop",101,"10.0.0.1:5000",65a4f1.65,1,"SELECT",2024-01-15 09:00:00 UTC,3/10,0,LOG,00000,"duration: 12.500 ms  statement: SELECT *
+FROM orders WHERE note = 'it''s, ""quoted""'",,,,,,,,,"psql","client backend",,0
+2024-01-15 10:00:02.000 UTC,"app","shop",103,"10.0.0.1:5001",65a4f2.66,1,"SELECT",2024-01-15 09:00:00 UTC,3/11,0,ERROR,42P01,"relation ""missing"" does not exist",,,,,,"SELECT * FROM missing",15,,"psql","client backend",,0
+"""
+
+    json_log = """{"timestamp":"2024-01-15 10:00:00.123 UTC","user":"app","dbname":"shop","pid":101,"error_severity":"LOG","message":"duration: 5.0 ms  statement: SELECT 1","application_name":"psql"}
+{"timestamp":"2024-01-15 10:00:01.123 UTC","user":"app","dbname":"shop","pid":101,"error_severity":"ERROR","state_code":"57014","message":"canceling statement due to statement timeout"}
+not json
+"""
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("SELECT * FROM t WHERE a = 'it''s' AND b = 10.5 AND c = $2"),
+                         "SELECT * FROM T WHERE A = ? AND B = ? AND C = ?")
+        self.assertEqual(normalize_query("SELECT *\n  FROM t1 WHERE id IN (1, 2,3)"), "SELECT * FROM T1 WHERE ID IN (?)")
+        self.assertEqual(normalize_query("SELECT * FROM t1 WHERE id IN (4)"), "SELECT * FROM T1 WHERE ID IN (?)")
+
+    def test_normalize_error_message_keeps_the_wording(self):
+        self.assertEqual(normalize_error_message('relation "Orders_2024" does not exist at character 15'),
+                         'relation "Orders_2024" does not exist at character ?')
+        self.assertEqual(normalize_error_message("invalid input syntax for type integer: 'it''s'"),
+                         "invalid input syntax for type integer: ?")
+        log = ("2024-01-15 10:00:02.000 UTC [103] app@shop ERROR:  relation \"missing\" does not exist at character 15\n"
+               "2024-01-15 10:00:03.000 UTC [104] app@shop ERROR:  relation \"missing\" does not exist at character 22\n")
+        _, _, df_errors, _ = parse_postgres_log_content(log)
+        self.assertEqual(df_errors[['Error_Pattern', 'Count']].values.tolist(),
+                         [['relation "missing" does not exist at character ?', 2]])
+        self.assertIn('at character 15', df_errors.iloc[0]['Sample'])
+
+    def test_stderr_multi_line_statements_and_errors(self):
+        df_detailed, df_aggregated, df_errors, warnings = parse_postgres_log_content(self.stderr_log)
+        self.assertEqual(warnings, [])
+        # parse/bind steps of the extended protocol are not counted again
+        self.assertEqual(df_detailed['Query_time (ms)'].tolist(), [12.5, 3.0, 20.0])
+        first = df_detailed.iloc[0]
+        self.assertEqual((first['Time'], first['User'], first['Database'], first['Process_id']),
+                         ('2024-01-15 10:00:00.123 UTC', 'app', 'shop', '101'))
+        self.assertEqual(first['Query'], "SELECT * FROM orders\nWHERE id = 42\n  AND status IN ('a', 'b', 'c')")
+        orders = df_aggregated.iloc[0]
+        self.assertEqual(orders['Normalized_Query'], "SELECT * FROM ORDERS WHERE ID = ? AND STATUS IN (?)")
+        self.assertEqual((orders['Executions'], orders['Total_Query_time_ms'], orders['Max_Query_time_ms']), (2, 32.5, 20.0))
+        self.assertAlmostEqual(orders['P95_Query_time_ms'], 19.625)
+        self.assertEqual(df_errors[['First_Entry', 'Severity', 'Count']].values.tolist(), [[5, 'ERROR', 1]])
+
+    def test_stderr_prefix_with_key_value_fields(self):
+        log = "2024-01-15 10:00:00 UTC [7]: [1-1] user=bob,db=crm,app=psql,client=[local] LOG:  duration: 1.5 ms  statement: SELECT 1\n"
+        df_detailed, _, _, _ = parse_postgres_log_content(log)
+        self.assertEqual(df_detailed[['User', 'Database', 'Process_id', 'Application']].values.tolist(),
+                         [['bob', 'crm', '7', 'psql']])
+
+    def test_csvlog_quoted_multi_line_fields(self):
+        df_detailed, df_aggregated, df_errors, warnings = parse_postgres_log_content(self.csv_log)
+        self.assertEqual(warnings, [])
+        self.assertEqual(df_detailed.iloc[0]['Query'], 'SELECT *\nFROM orders WHERE note = \'it\'\'s, "quoted"\'')
+        self.assertEqual(df_detailed.iloc[0]['Application'], 'psql')
+        self.assertEqual(df_aggregated['Normalized_Query'].tolist(), ['SELECT * FROM ORDERS WHERE NOTE = ?'])
+        self.assertEqual(df_errors[['SQL_State', 'Error_Pattern']].values.tolist(),
+                         [['42P01', 'relation "missing" does not exist']])
+
+    def test_jsonlog(self):
+        df_detailed, _, df_errors, warnings = parse_postgres_log_content(self.json_log)
+        self.assertEqual(df_detailed['Normalized_Query'].tolist(), ['SELECT ?'])
+        self.assertEqual(df_errors['SQL_State'].tolist(), ['57014'])
+        self.assertEqual(warnings, ['Skipped 1 line that is not valid JSON (line 3).'])
+
+    def test_invalid_records_are_counted_not_listed(self):
+        slow = self.json_log.splitlines()[0]
+        log = "".join(slow + "\n" if i % 3 else "not json\n" for i in range(300))
+        df_detailed, _, _, warnings = parse_postgres_log_content(log, fmt=POSTGRES_JSON)
+        self.assertEqual(len(df_detailed), 200)
+        self.assertEqual(warnings, ['Skipped 100 lines that are not valid JSON (lines 1, 4, 7, 10, 13, ...).'])
+
+        short_row = '2024-01-15 10:00:05.000 UTC,"app","shop",105\n'
+        _, _, _, warnings = parse_postgres_log_content(self.csv_log + short_row * 2, fmt=POSTGRES_CSV)
+        self.assertEqual(warnings, ['Skipped 2 entries (entries 3, 4): Expected at least 14 CSV columns, found 4'])
+
+    def test_detect_format(self):
+        self.assertIs(detect_format(['\n'] + self.stderr_log.splitlines()), POSTGRES_STDERR)
+        self.assertIs(detect_format(self.csv_log.splitlines()), POSTGRES_CSV)
+        self.assertIs(detect_format(self.json_log.splitlines()), POSTGRES_JSON)
+        self.assertIs(detect_format([]), POSTGRES_STDERR)
+        self.assertIs(detect_file_format('/nonexistent/postgresql.log'), POSTGRES_STDERR)
+
+    def test_aggregate_with_time_window(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'postgresql.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.csv_log)
+            self.assertEqual(len(aggregate_postgres_log_file(path)), 1)
+            self.assertEqual(aggregate_postgres_log_file(path, since=parse_log_timestamp('2024-01-15 10:00:01')), {})
+
+    def test_parse_file_in_chunks_matches_in_memory_parse(self):
+        content = self.stderr_log * 4
+        df_detailed, df_aggregated, df_errors, _ = parse_postgres_log_content(content)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'postgresql.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            result = parse_file(POSTGRES_STDERR, path, jobs=2, chunk_size=300)
+        sheets = build_sheets(POSTGRES_STDERR, result)
+        assert_frame_equal(sheets['Detailed Metrics'], df_detailed)
+        assert_frame_equal(sheets['Aggregate Results'], df_aggregated)
+        assert_frame_equal(sheets['Error Stats'], df_errors)
+
+    def test_parse_file_caps_detail_rows_and_samples(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'postgresql.log')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.stderr_log * 50)
+            result = parse_file(POSTGRES_STDERR, path, jobs=2, chunk_size=500, max_rows=10, max_samples=5)
+        self.assertEqual(len(result.rows), 10)
+        self.assertEqual(result.dropped_rows, 140)
+        stats = result.patterns["SELECT * FROM ORDERS WHERE ID = ? AND STATUS IN (?)"]
+        self.assertEqual((stats.count, stats.total), (100, 1625.0))
+        self.assertLessEqual(len(stats.durations), 5)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
+
+# To run these tests from the SREssentials root directory:
+# python -m unittest PostgreSql.test_postgres_parser